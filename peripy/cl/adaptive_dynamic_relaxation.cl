@@ -0,0 +1,160 @@
+#pragma OPENCL EXTENSION cl_khr_fp64 : enable
+
+/* The layout of the state arrays, STRIDE is the number of doubles per node.
+ * If VECTOR_LAYOUT is defined, the state arrays are padded to (n,4) and the
+ * fourth component of each node is skipped. */
+#ifdef VECTOR_LAYOUT
+#define STRIDE 4
+#define PADDING(i) ((i) % 4 == 3)
+#else
+#define STRIDE 3
+#define PADDING(i) 0
+#endif
+
+
+void reduce_sums(double2 sums, __local double2* local_cache) {
+    /* Tree reduction of the sums of a work group into local_cache[0].
+     *
+     * sums - The sums of the work item.
+     * local_cache - A local (local_size) array, a power of two. */
+    const int local_id = get_local_id(0);
+    local_cache[local_id] = sums;
+    for (int i = get_local_size(0) / 2; i > 0; i /= 2) {
+        barrier(CLK_LOCAL_MEM_FENCE);
+        if (local_id < i) {
+            local_cache[local_id] += local_cache[local_id + i];
+        }
+    }
+    barrier(CLK_LOCAL_MEM_FENCE);
+}
+
+
+__kernel void
+	damping_partial_sums(
+        __global double const* force,
+        __global double const* u,
+        __global double const* ud,
+        __global double const* udd,
+        __global double const* inverse_masses,
+        __global double* partial_sums,
+        __local double2* local_cache,
+        int ndofs,
+        double dt
+	){
+    /* Reduce the Rayleigh quotient of the local stiffness of each work
+     * group.
+     *
+     * The diagonal local stiffness of each degree of freedom is estimated
+     * from the change of its acceleration over the last time-step,
+     *     k = -(force / mass - udd) / (dt * ud),
+     * and the work group sums u * k * u and u * u over its degrees of
+     * freedom. Degrees of freedom that did not move, which include those
+     * with a displacement boundary condition, are not included.
+     *
+     * force - An (n,3) array of the forces of each node.
+     * u - An (n,3) array of the current displacements of each node.
+     * ud - An (n,3) array of the half-step velocities of each node.
+     * udd - An (n,3) array of the accelerations of each node at the last
+     *     time-step.
+     * inverse_masses - An (n,) array of the reciprocal of the fictitious
+     *     mass of each node.
+     * partial_sums - A (ngroups,2) array of the sums of each work group.
+     * local_cache - A local (local_size) array to reduce the sums.
+     * ndofs - The number of degrees of freedom, STRIDE * n.
+     * dt - The time step.
+     *
+     * If VECTOR_LAYOUT is defined, the state arrays are padded to (n,4). */
+    const int i = get_global_id(0);
+    double2 sums = (double2)(0.0, 0.0);
+    if (i < ndofs && !PADDING(i) && ud[i] != 0.0) {
+        const double stiffness = -(force[i] * inverse_masses[i / STRIDE]
+                                   - udd[i]) / (dt * ud[i]);
+        const double u2 = u[i] * u[i];
+        sums = (double2)(u2 * stiffness, u2);
+    }
+    reduce_sums(sums, local_cache);
+    if (!get_local_id(0)) {
+        vstore2(local_cache[0], get_group_id(0), partial_sums);
+    }
+}
+
+
+__kernel void
+	damping_coefficient(
+        __global double const* partial_sums,
+        __global double* damping,
+        __local double2* local_cache,
+        int ngroups,
+        double dt
+	){
+    /* Calculate the adaptive damping coefficient from the partial sums of
+     * the Rayleigh quotient, with a single work group.
+     *
+     * The coefficient is twice the square root of the Rayleigh quotient,
+     * the critical damping of the lowest mode it estimates. It is zero if
+     * the quotient is not positive, and at most 2 / dt.
+     *
+     * partial_sums - A (ngroups,2) array of the sums of each work group of
+     *     damping_partial_sums.
+     * damping - A (1,) array of the damping coefficient.
+     * local_cache - A local (local_size) array to reduce the sums.
+     * ngroups - The number of work groups of damping_partial_sums.
+     * dt - The time step. */
+    double2 sums = (double2)(0.0, 0.0);
+    for (int i = get_local_id(0); i < ngroups; i += get_local_size(0)) {
+        sums += vload2(i, partial_sums);
+    }
+    reduce_sums(sums, local_cache);
+    if (!get_local_id(0)) {
+        const double2 total = local_cache[0];
+        double coefficient = 0.0;
+        if (total.x > 0.0 && total.y > 0.0) {
+            coefficient = 2.0 * sqrt(total.x / total.y);
+        }
+        damping[0] = min(coefficient, 2.0 / dt);
+    }
+}
+
+
+__kernel void
+	update_displacement(
+        __global double const* force,
+        __global double* u,
+        __global double* ud,
+        __global double* udd,
+        __global double const* inverse_masses,
+        __global double const* damping,
+        double dt,
+        int first
+	){
+    /* Calculate the displacement and velocity of each node using adaptive
+     * dynamic relaxation.
+     *
+     * force - An (n,3) array of the forces of each node.
+     * u - An (n,3) array of the current displacements of each node.
+     * ud - An (n,3) array of the half-step velocities of each node.
+     * udd - An (n,3) array of the accelerations of each node.
+     * inverse_masses - An (n,) array of the reciprocal of the fictitious
+     *     mass of each node.
+     * damping - A (1,) array of the damping coefficient.
+     * dt - The time step.
+     * first - Whether this is the first time-step, which starts the
+     *     half-step velocities from rest.
+     *
+     * If VECTOR_LAYOUT is defined, the state arrays are padded to (n,4). */
+	const int i = get_global_id(0);
+    if (PADDING(i)) {
+        return;
+    }
+    const double uddi = force[i] * inverse_masses[i / STRIDE];
+    const double cdt = damping[0] * dt;
+    double udi;
+    if (first) {
+        udi = (dt / 2) * uddi;
+    } else {
+        udi = ((2.0 - cdt) * ud[i] + 2.0 * dt * uddi) / (2.0 + cdt);
+    }
+    ud[i] = udi;
+    udd[i] = uddi;
+    u[i] += dt * udi;
+}
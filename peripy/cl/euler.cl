@@ -1,12 +1,23 @@
 #pragma OPENCL EXTENSION cl_khr_fp64 : enable
 
+/* The degrees of freedom of each sample of an ensemble. If NNODES is defined,
+ * they do not depend on the size of the launch, so that the kernel may be
+ * launched over a range of nodes with a global offset. */
+#ifdef VECTOR_LAYOUT
+#define STRIDE 4
+#else
+#define STRIDE 3
+#endif
+#ifdef NNODES
+#define SAMPLE_DOFS (STRIDE * NNODES)
+#else
+#define SAMPLE_DOFS ((int) get_global_size(0))
+#endif
+
 __kernel void
 	update_displacement(
     	__global double const* force,
     	__global double* u,
-		__global int const* bc_types,
-		__global double const* bc_values,
-		double bc_scale,
         double dt
 	){
     /* Calculate the displacement of each node using an Euler
@@ -14,11 +25,21 @@ __kernel void
      *
      * force - An (n,3) array of the forces of each node.
      * u - An (n,3) array of the current displacements of each node.
-     * bc_types - An (n,3) array of the boundary condition types.
-     * bc_values - An (n,3) array of the boundary condition values applied to the nodes.
-     * bc_scale - The scalar value applied to the displacement BCs.
-     * dt - The time step in [s]. */
+     * dt - The time step in [s].
+     *
+     * If VECTOR_LAYOUT is defined, the state arrays are padded to (n,4).
+     *
+     * For an ensemble, the second dimension of the NDRange is the sample and
+     * force and u are (nsamples, n, 3) arrays. */
 	const int i = get_global_id(0);
+    // k is the degree of freedom of the sample
+    const int k = get_global_id(1) * SAMPLE_DOFS + i;
+#ifdef VECTOR_LAYOUT
+    // The state arrays are padded to four components per node
+    if (i % 4 == 3) {
+        return;
+    }
+#endif
 
-	u[i] = (bc_types[i] == 0 ? (u[i] + dt * force[i]) : (bc_scale * bc_values[i]));
+    u[k] += dt * force[k];
 }
@@ -1,27 +1,296 @@
 #pragma OPENCL EXTENSION cl_khr_fp64 : enable
 
+/* The layout of the state arrays.
+ *
+ * By default r0, u, force and body_force are (n,3) arrays of interleaved
+ * components. If VECTOR_LAYOUT is defined, they are (n,4) arrays padded to
+ * double4, so that the components of a node are read with one aligned vector
+ * load. STRIDE is the number of doubles per node and LOAD_DOF(p, node) loads
+ * the components of a node as a double3. The boundary condition arrays are
+ * not padded. */
+#ifdef VECTOR_LAYOUT
+#define STRIDE 4
+#define LOAD_DOF(p, node) (vload4((node), (p)).xyz)
+#else
+#define STRIDE 3
+#define LOAD_DOF(p, node) vload3((node), (p))
+#endif
+
+/* The reference geometry of the bonds.
+ *
+ * By default the bond_force kernels calculate the reference bond vector, xi,
+ * and its length from r0, an (n,3) array of the initial coordinates of the
+ * nodes. If BOND_GEOMETRY is defined, r0 is instead an (n, local_size, 4)
+ * array of the precomputed reference bond vectors and lengths, which is read
+ * sequentially by each work group rather than gathered. If
+ * BOND_GEOMETRY_FLOAT is also defined, the bond vectors are stored in single
+ * precision and the lengths are recalculated from the rounded vectors, so
+ * that bonds remain unstretched at zero displacement. */
+#if defined(BOND_GEOMETRY) && defined(BOND_GEOMETRY_FLOAT)
+#define REFERENCE_TYPE float
+#define REFERENCE_BOND(r0, bond, node_id_i, node_id_j) \
+    const double4 reference_bond = convert_double4(vload4((bond), r0)); \
+    const double xi_x = reference_bond.x; \
+    const double xi_y = reference_bond.y; \
+    const double xi_z = reference_bond.z; \
+    const double xi = sqrt(xi_x * xi_x + xi_y * xi_y + xi_z * xi_z)
+#elif defined(BOND_GEOMETRY)
+#define REFERENCE_TYPE double
+#define REFERENCE_BOND(r0, bond, node_id_i, node_id_j) \
+    const double4 reference_bond = vload4((bond), r0); \
+    const double xi_x = reference_bond.x; \
+    const double xi_y = reference_bond.y; \
+    const double xi_z = reference_bond.z; \
+    const double xi = reference_bond.w
+#else
+#define REFERENCE_TYPE double
+#define REFERENCE_BOND(r0, bond, node_id_i, node_id_j) \
+    const double3 reference_bond = \
+        LOAD_DOF(r0, node_id_j) - LOAD_DOF(r0, node_id_i); \
+    const double xi_x = reference_bond.x; \
+    const double xi_y = reference_bond.y; \
+    const double xi_z = reference_bond.z; \
+    const double xi = length(reference_bond)
+#endif
+
+/* The types of the bond metadata.
+ *
+ * By default the neighbour lists, bond types and regimes are int arrays and
+ * the stiffness corrections are double arrays. BOND_TYPE and REGIME_TYPE may
+ * be defined as a smaller integer type, e.g. uchar, and CORRECTION_TYPE as
+ * float, to reduce the memory footprint of the bonds. If NEIGHBOUR_OFFSETS is
+ * defined, the neighbour lists are short arrays of the offset of each
+ * neighbour from its node, which requires the neighbours of every node to be
+ * within SHRT_MAX nodes of it, e.g. after the nodes are reordered.
+ * BROKEN_BOND is the value of a broken bond in the neighbour lists and
+ * NEIGHBOUR(nlist, bond, node_id_i) is the neighbour of node_id_i in a bond
+ * of its neighbour list, or -1 if the bond is broken. */
+#ifndef BOND_TYPE
+#define BOND_TYPE int
+#endif
+#ifndef REGIME_TYPE
+#define REGIME_TYPE int
+#endif
+#ifndef CORRECTION_TYPE
+#define CORRECTION_TYPE double
+#endif
+#ifdef NEIGHBOUR_OFFSETS
+#define NEIGHBOUR_TYPE short
+#define BROKEN_BOND SHRT_MIN
+#define NEIGHBOUR(nlist, bond, node_id_i) \
+    ((nlist)[bond] == BROKEN_BOND ? -1 : (node_id_i) + (nlist)[bond])
+#else
+#define NEIGHBOUR_TYPE int
+#define BROKEN_BOND (-1)
+#define NEIGHBOUR(nlist, bond, node_id_i) ((nlist)[bond])
+#endif
+
+/* The layout of the work groups of the bond_force and damage kernels.
+ *
+ * By default each work group is the family of one node, with a work item per
+ * bond. If NODES_PER_GROUP is defined, each work group packs the families of
+ * NODES_PER_GROUP nodes, which are reduced as separate segments, so that
+ * small families still fill a work group. If BONDS_PER_ITEM is defined, each
+ * work item calculates BONDS_PER_ITEM bonds of its family, so that families
+ * larger than the maximum work group size fit in one work group.
+ * FAMILY_SIZE is the number of work items per node, NNODES the number of
+ * nodes and MAX_NEIGHBOURS the length of the neighbour lists. BOND_ID is the
+ * position in the neighbour lists of bond k of a work item. If the number of
+ * nodes is not a multiple of NODES_PER_GROUP, or the kernels are launched
+ * over a range of nodes with a global offset, NNODES must be defined and the
+ * work items of the nodes past the last node only take part in the
+ * reductions. */
+#ifndef NODES_PER_GROUP
+#define NODES_PER_GROUP 1
+#endif
+#ifndef BONDS_PER_ITEM
+#define BONDS_PER_ITEM 1
+#endif
+#define FAMILY_SIZE ((int) get_local_size(0) / NODES_PER_GROUP)
+#ifndef NNODES
+#define NNODES ((int) get_global_size(0) / FAMILY_SIZE)
+#endif
+#define MAX_NEIGHBOURS (FAMILY_SIZE * BONDS_PER_ITEM)
+#define BOND_ID(node_id_i, local_id, k) \
+    ((node_id_i) * MAX_NEIGHBOURS + (k) * FAMILY_SIZE + (local_id))
+
+/* The reduction of the bond forces and the unbroken bonds of a work group
+ * onto its node.
+ *
+ * By default the components of the bond forces are reduced with a tree
+ * reduction in three local caches, one per component. If VECTOR_REDUCTION is
+ * defined, local_cache_x is instead a (local_size) double4 cache, so the
+ * components and the unbroken bonds are reduced together, and the tree has
+ * four branches per level, which halves the number of barriers. If
+ * SUBGROUP_REDUCTION is defined, each sub-group is reduced with
+ * sub_group_reduce_add and only the partial sums of the sub-groups are
+ * reduced through local memory, after a single barrier. The families packed
+ * by NODES_PER_GROUP are reduced separately, which is not supported with
+ * SUBGROUP_REDUCTION. reduce_bonds returns the force on the node and its
+ * number of unbroken bonds, and count_bonds the number of unbroken bonds,
+ * which are only valid in the first work item of each family. */
+#ifdef SUBGROUP_REDUCTION
+#if NODES_PER_GROUP > 1
+#error "SUBGROUP_REDUCTION does not support NODES_PER_GROUP"
+#endif
+#pragma OPENCL EXTENSION cl_khr_subgroups : enable
+
+inline double4 reduce_bonds(
+    double3 bond_force, int bonded, __local double* local_cache_x,
+    __local double* local_cache_y, __local double* local_cache_z) {
+    __local double4* local_cache = (__local double4*) local_cache_x;
+    const double4 partial_bonds = (double4)(
+        sub_group_reduce_add(bond_force.x),
+        sub_group_reduce_add(bond_force.y),
+        sub_group_reduce_add(bond_force.z),
+        (double) sub_group_reduce_add(bonded));
+    if (get_sub_group_local_id() == 0) {
+        local_cache[get_sub_group_id()] = partial_bonds;
+    }
+    barrier(CLK_LOCAL_MEM_FENCE);
+    double4 node_bonds = (double4)(0.00);
+    if (!get_local_id(0)) {
+        for (uint i = 0; i < get_num_sub_groups(); i++) {
+            node_bonds += local_cache[i];
+        }
+    }
+    return node_bonds;
+}
+
+inline int count_bonds(int bonded, __local double* local_cache) {
+    __local int* local_count = (__local int*) local_cache;
+    const int partial_count = sub_group_reduce_add(bonded);
+    if (get_sub_group_local_id() == 0) {
+        local_count[get_sub_group_id()] = partial_count;
+    }
+    barrier(CLK_LOCAL_MEM_FENCE);
+    int count = 0;
+    if (!get_local_id(0)) {
+        for (uint i = 0; i < get_num_sub_groups(); i++) {
+            count += local_count[i];
+        }
+    }
+    return count;
+}
+#else
+inline int count_bonds(int bonded, __local double* local_cache) {
+    // The count is exact, so it is reduced in integers
+    __local int* local_count = (__local int*) local_cache;
+    const int local_id = get_local_id(0);
+    const int family_id = local_id % FAMILY_SIZE;
+    local_count[local_id] = bonded;
+    barrier(CLK_LOCAL_MEM_FENCE);
+    for (int i = FAMILY_SIZE/2; i > 0; i /= 2) {
+        if (family_id < i) {
+            local_count[local_id] += local_count[local_id + i];
+        }
+        barrier(CLK_LOCAL_MEM_FENCE);
+    }
+    return local_count[local_id];
+}
+
+#ifdef VECTOR_REDUCTION
+inline double4 reduce_bonds(
+    double3 bond_force, int bonded, __local double* local_cache_x,
+    __local double* local_cache_y, __local double* local_cache_z) {
+    __local double4* local_cache = (__local double4*) local_cache_x;
+    const int local_id = get_local_id(0);
+    const int family_id = local_id % FAMILY_SIZE;
+    // The count is exact in double precision
+    local_cache[local_id] = (double4)(bond_force, (double) bonded);
+    barrier(CLK_LOCAL_MEM_FENCE);
+    for (int i = FAMILY_SIZE; i > 1;) {
+        if (i % 4 == 0) {
+            i /= 4;
+            if (family_id < i) {
+                local_cache[local_id] += local_cache[local_id + i]
+                    + local_cache[local_id + 2 * i]
+                    + local_cache[local_id + 3 * i];
+            }
+        }
+        else {
+            i /= 2;
+            if (family_id < i) {
+                local_cache[local_id] += local_cache[local_id + i];
+            }
+        }
+        barrier(CLK_LOCAL_MEM_FENCE);
+    }
+    return local_cache[local_id];
+}
+#else
+inline double4 reduce_bonds(
+    double3 bond_force, int bonded, __local double* local_cache_x,
+    __local double* local_cache_y, __local double* local_cache_z) {
+    const int local_id = get_local_id(0);
+    const int family_id = local_id % FAMILY_SIZE;
+    const int neighbours = count_bonds(bonded, local_cache_x);
+    // Wait for the count to be read before reusing its local cache
+    barrier(CLK_LOCAL_MEM_FENCE);
+    local_cache_x[local_id] = bond_force.x;
+    local_cache_y[local_id] = bond_force.y;
+    local_cache_z[local_id] = bond_force.z;
+    // Wait for all threads to catch up
+    barrier(CLK_LOCAL_MEM_FENCE);
+    for (int i = FAMILY_SIZE/2; i > 0; i /= 2) {
+        if(family_id < i) {
+            local_cache_x[local_id] += local_cache_x[local_id + i];
+            local_cache_y[local_id] += local_cache_y[local_id + i];
+            local_cache_z[local_id] += local_cache_z[local_id + i];
+        }
+        //Wait for all threads to catch up
+        barrier(CLK_LOCAL_MEM_FENCE);
+    }
+    return (double4)(
+        local_cache_x[local_id], local_cache_y[local_id],
+        local_cache_z[local_id], (double) neighbours);
+}
+#endif
+#endif
+
+/* The log of the broken bonds.
+ *
+ * bond_events is a (max_bond_events, 4) ring buffer of the bonds broken by
+ * the bond_force kernels, each a node, its neighbour, the step and the
+ * stretch at which the bond broke, and nbond_events counts the bonds logged
+ * since the buffer was reset. Once it is full, the oldest events are
+ * overwritten. Each bond is logged by both of its nodes. If max_bond_events
+ * is zero no bonds are logged. */
+inline void log_bond_event(
+    __global double* bond_events, volatile __global uint* nbond_events,
+    int max_bond_events, int step, int node_id_i, int node_id_j, double s) {
+    if (max_bond_events) {
+        const uint event = atomic_inc(nbond_events) % max_bond_events;
+        vstore4((double4)(node_id_i, node_id_j, step, s), event, bond_events);
+    }
+}
+
 
 __kernel void
 	bond_force1(
     __global double const* u,
     __global double* force,
     __global double* body_force,
-    __global double const* r0,
+    __global REFERENCE_TYPE const* r0,
     __global double const* vols,
-	__global int* nlist,
-    __global int const* fc_types,
-    __global double const* fc_values,
-    __global double const* stiffness_corrections,
-    __global int const* bond_types,
-    __global int* regimes,
+	__global NEIGHBOUR_TYPE* nlist,
+    __global int const* family,
+    __global int* n_neigh,
+    __global double* damage,
+    __global CORRECTION_TYPE const* stiffness_corrections,
+    __global BOND_TYPE const* bond_types,
+    __global REGIME_TYPE* regimes,
     __global float const* plus_cs,
     __local double* local_cache_x,
     __local double* local_cache_y,
     __local double* local_cache_z,
     double bond_stiffness,
     double critical_stretch,
-    double fc_scale,
-    int nregimes
+    int nregimes,
+    __global double* bond_events,
+    __global uint* nbond_events,
+    int max_bond_events,
+    int step
 	) {
     /* Calculate the force due to bonds on each node.
      *
@@ -30,13 +299,16 @@ __kernel void
      * u - An (n,3) array of the current displacements of the particles.
      * force - An (n,3) array of the current forces on the particles.
      * body_force - An (n,3) array of the current internal body forces of the particles.
-     * r0 - An (n,3) array of the coordinates of the nodes in the initial state.
+     * r0 - An (n,3) array of the coordinates of the nodes in the initial state,
+     *     or the reference bond geometry if BOND_GEOMETRY is defined.
      * vols - the volumes of each of the nodes.
      * nlist - An (n, local_size) array containing the neighbour lists,
      *     a value of -1 corresponds to a broken bond.
-     * fc_types - An (n,3) array of force boundary condition types,
-     *     a value of 0 denotes a particle that is not externally loaded.
-     * fc_values - An (n,3) array of the force boundary condition values applied to particles.
+     * family - An (n) array of the initial number of neighbours for each node.
+     * n_neigh - An (n) array of the number of neighbours (particles bound) for
+     *     each node, which is updated with the bonds that remain unbroken.
+     * damage - An (n) array of the damage for each node, which is updated with
+     *     the bonds that remain unbroken.
      * stiffness_corrections - Not applied in this bond_force kernel. Placeholder argument.
      * bond_types - Not applied in this bond_force kernel. Placeholder argument.
      * regimes - Not applied in this bond_force kernel. Placeholder argument.
@@ -46,87 +318,87 @@ __kernel void
      * local_cache_z - local (local_size) array to store the z components of the bond forces.
      * bond_stiffness - The bond stiffness.
      * critical_stretch - The critical stretch, at and above which bonds will be broken.
-     * fc_scale - scale factor appied to the force bondary conditions.
-     * nregimes - Not applied in this bond_force kernel. Placeholder argument. */
-    // global_id is the bond number
-    const int global_id = get_global_id(0);
-    // local_id is the LOCAL node id in range [0, max_neigh] of a node in this parent node's family
-	const int local_id = get_local_id(0);
-    // local_size is the max_neigh, usually 128 or 256 depending on the problem
-    const int local_size = get_local_size(0);
-	// group_id is the node i
-	const int node_id_i = get_group_id(0);
-
-	// Access local node within node_id_i's horizon with corresponding node_id_j,
-	const int node_id_j = nlist[global_id];
-
-	// If bond is not broken
-	if (node_id_j != -1) {
-		const double xi_x = r0[3 * node_id_j + 0] - r0[3 * node_id_i + 0];
-		const double xi_y = r0[3 * node_id_j + 1] - r0[3 * node_id_i + 1];
-		const double xi_z = r0[3 * node_id_j + 2] - r0[3 * node_id_i + 2];
-
-		const double xi_eta_x = u[3 * node_id_j + 0] - u[3 * node_id_i + 0] + xi_x;
-		const double xi_eta_y = u[3 * node_id_j + 1] - u[3 * node_id_i + 1] + xi_y;
-		const double xi_eta_z = u[3 * node_id_j + 2] - u[3 * node_id_i + 2] + xi_z;
-
-		const double xi = sqrt(xi_x * xi_x + xi_y * xi_y + xi_z * xi_z);
-		const double y = sqrt(xi_eta_x * xi_eta_x + xi_eta_y * xi_eta_y + xi_eta_z * xi_eta_z);
-		const double s = (y -  xi)/ xi;
-
-        // Check for state of bonds here, and break it if necessary
-		if (s < critical_stretch) {
-            const double cx = xi_eta_x / y;
-		    const double cy = xi_eta_y / y;
-		    const double cz = xi_eta_z / y;
-
-		    const double f = s * bond_stiffness * vols[node_id_j];
-            // Copy bond forces into local memory
-		    local_cache_x[local_id] = f * cx;
-		    local_cache_y[local_id] = f * cy;
-		    local_cache_z[local_id] = f * cz;
-		}
-        else {
-            // bond is broken
-			nlist[global_id] = -1;  // Break the bond
-            local_cache_x[local_id] = 0.00;
-            local_cache_y[local_id] = 0.00;
-            local_cache_z[local_id] = 0.00;
+     * nregimes - Not applied in this bond_force kernel. Placeholder argument.
+     * bond_events - A (max_bond_events, 4) ring buffer of the broken bonds.
+     * nbond_events - The number of broken bonds logged in bond_events.
+     * max_bond_events - The length of bond_events, or zero to not log broken bonds.
+     * step - The step number, which is logged with the broken bonds. */
+    // local_id is the position of the work item in node_id_i's family
+	const int local_id = get_local_id(0) % FAMILY_SIZE;
+	// node_id_i is the node of the work item's family
+	const int node_id_i = get_global_id(0) / FAMILY_SIZE;
+
+    // The force of the bonds of the work item on node_id_i
+    double3 bond_force = (double3)(0.00, 0.00, 0.00);
+    // The number of bonds of the work item which remain unbroken
+    int bonded = 0;
+    // Work items past the last node have no bonds
+    const int bonds = node_id_i < NNODES ? BONDS_PER_ITEM : 0;
+    for (int k = 0; k < bonds; k++) {
+        // global_id is the bond number
+        const int global_id = BOND_ID(node_id_i, local_id, k);
+
+        // Access local node within node_id_i's horizon with corresponding node_id_j,
+        const int node_id_j = NEIGHBOUR(nlist, global_id, node_id_i);
+
+        // If bond is not broken
+        if (node_id_j != -1) {
+            REFERENCE_BOND(r0, global_id, node_id_i, node_id_j);
+
+            const double3 xi_eta = LOAD_DOF(u, node_id_j) - LOAD_DOF(u, node_id_i)
+                + (double3)(xi_x, xi_y, xi_z);
+            const double xi_eta_x = xi_eta.x;
+            const double xi_eta_y = xi_eta.y;
+            const double xi_eta_z = xi_eta.z;
+
+            const double y = length(xi_eta);
+            const double s = (y -  xi)/ xi;
+
+            // Check for state of bonds here, and break it if necessary
+            if (s < critical_stretch) {
+                const double cx = xi_eta_x / y;
+                const double cy = xi_eta_y / y;
+                const double cz = xi_eta_z / y;
+
+                const double f = s * bond_stiffness * vols[node_id_j];
+                // Copy bond forces into local memory
+                bond_force.x += f * cx;
+                bond_force.y += f * cy;
+                bond_force.z += f * cz;
+                bonded += 1;
+            }
+            else {
+                // bond is broken
+                nlist[global_id] = BROKEN_BOND;  // Break the bond
+                log_bond_event(
+                    bond_events, nbond_events, max_bond_events, step, node_id_i,
+                    node_id_j, s);
+            }
         }
     }
-    // bond is broken
-    else {
-        local_cache_x[local_id] = 0.00;
-        local_cache_y[local_id] = 0.00;
-        local_cache_z[local_id] = 0.00;
-    }
 
-    // Wait for all threads to catch up
-    barrier(CLK_LOCAL_MEM_FENCE);
-    // Parallel reduction of the bond force onto node force
-    for (int i = local_size/2; i > 0; i /= 2) {
-        if(local_id < i) {
-            local_cache_x[local_id] += local_cache_x[local_id + i];
-            local_cache_y[local_id] += local_cache_y[local_id + i];
-            local_cache_z[local_id] += local_cache_z[local_id + i];
-        } 
-        //Wait for all threads to catch up 
-        barrier(CLK_LOCAL_MEM_FENCE);
-    }
+    // Parallel reduction of the bond forces and unbroken bonds onto the node
+    const double4 node_bonds = reduce_bonds(
+        bond_force, bonded, local_cache_x, local_cache_y, local_cache_z);
 
-    if (!local_id) {
+    if (!local_id && node_id_i < NNODES) {
         //Get the reduced forces
-        double const force_x = local_cache_x[0];
-        double const force_y = local_cache_y[0];
-        double const force_z = local_cache_z[0];
+        double const force_x = node_bonds.x;
+        double const force_y = node_bonds.y;
+        double const force_z = node_bonds.z;
         // Update body forces in each direction
-        body_force[3 * node_id_i + 0] = force_x;
-        body_force[3 * node_id_i + 1] = force_y;
-        body_force[3 * node_id_i + 2] = force_z;
-        // Update forces in each direction
-        force[3 * node_id_i + 0] = (fc_types[3 * node_id_i + 0] == 0 ? force_x : (force_x + fc_scale * fc_values[3 * node_id_i + 0]));
-        force[3 * node_id_i + 1] = (fc_types[3 * node_id_i + 1] == 0 ? force_y : (force_y + fc_scale * fc_values[3 * node_id_i + 1]));
-        force[3 * node_id_i + 2] = (fc_types[3 * node_id_i + 2] == 0 ? force_z : (force_z + fc_scale * fc_values[3 * node_id_i + 2]));
+        body_force[STRIDE * node_id_i + 0] = force_x;
+        body_force[STRIDE * node_id_i + 1] = force_y;
+        body_force[STRIDE * node_id_i + 2] = force_z;
+        // Update forces in each direction, the force boundary conditions
+        // are applied by apply_force_boundary_conditions
+        force[STRIDE * node_id_i + 0] = force_x;
+        force[STRIDE * node_id_i + 1] = force_y;
+        force[STRIDE * node_id_i + 2] = force_z;
+        // Update damage and n_neigh
+        const int neighbours = node_bonds.w;
+        n_neigh[node_id_i] = neighbours;
+        damage[node_id_i] = 1.00 - (double) neighbours / (double) (family[node_id_i]);
     }
 }
 
@@ -136,22 +408,26 @@ __kernel void
     __global double const* u,
     __global double* force,
     __global double* body_force,
-    __global double const* r0,
+    __global REFERENCE_TYPE const* r0,
     __global double const* vols,
-	__global int* nlist,
-    __global int const* fc_types,
-    __global double const* fc_values,
-    __global double const* stiffness_corrections,
-    __global int const* bond_types,
-    __global int* regimes,
+	__global NEIGHBOUR_TYPE* nlist,
+    __global int const* family,
+    __global int* n_neigh,
+    __global double* damage,
+    __global CORRECTION_TYPE const* stiffness_corrections,
+    __global BOND_TYPE const* bond_types,
+    __global REGIME_TYPE* regimes,
     __global float const* plus_cs,
     __local double* local_cache_x,
     __local double* local_cache_y,
     __local double* local_cache_z,
     double bond_stiffness,
     double critical_stretch,
-    double fc_scale,
-    int nregimes
+    int nregimes,
+    __global double* bond_events,
+    __global uint* nbond_events,
+    int max_bond_events,
+    int step
 	) {
     /* Calculate the force due to bonds on each node.
      *
@@ -160,13 +436,16 @@ __kernel void
      * u - An (n,3) array of the current displacements of the particles.
      * force - An (n,3) array of the current forces on the particles.
      * body_force - An (n,3) array of the current internal body forces of the particles.
-     * r0 - An (n,3) array of the coordinates of the nodes in the initial state.
+     * r0 - An (n,3) array of the coordinates of the nodes in the initial state,
+     *     or the reference bond geometry if BOND_GEOMETRY is defined.
      * vols - the volumes of each of the nodes.
      * nlist - An (n, local_size) array containing the neighbour lists,
      *     a value of -1 corresponds to a broken bond.
-     * fc_types - An (n,3) array of force boundary condition types,
-     *     a value of 0 denotes a particle that is not externally loaded.
-     * fc_values - An (n,3) array of the force boundary condition values applied to particles.
+     * family - An (n) array of the initial number of neighbours for each node.
+     * n_neigh - An (n) array of the number of neighbours (particles bound) for
+     *     each node, which is updated with the bonds that remain unbroken.
+     * damage - An (n) array of the damage for each node, which is updated with
+     *     the bonds that remain unbroken.
      * stiffness_corrections - An (n, local_size) array of bond stiffness correction
      *     factors multiplied by the partial volume correction factors.
      * bond_types - Not applied in this bond_force kernel. Placeholder argument.
@@ -177,87 +456,87 @@ __kernel void
      * local_cache_z - local (local_size) array to store the z components of the bond forces.
      * bond_stiffness - The bond stiffness.
      * critical_stretch - The critical stretch, at and above which bonds will be broken.
-     * fc_scale - scale factor appied to the force bondary conditions.
-     * nregimes - Not applied in this bond_force kernel. Placeholder argument. */
-    // global_id is the bond number
-    const int global_id = get_global_id(0);
-    // local_id is the LOCAL node id in range [0, max_neigh] of a node in this parent node's family
-	const int local_id = get_local_id(0);
-    // local_size is the max_neigh, usually 128 or 256 depending on the problem
-    const int local_size = get_local_size(0);
-	// group_id is node i
-	const int node_id_i = get_group_id(0);
-
-	// Access local node within node_id_i's horizon with corresponding node_id_j,
-	const int node_id_j = nlist[global_id];
-
-	// If bond is not broken
-	if (node_id_j != -1) {
-		const double xi_x = r0[3 * node_id_j + 0] - r0[3 * node_id_i + 0];
-		const double xi_y = r0[3 * node_id_j + 1] - r0[3 * node_id_i + 1];
-		const double xi_z = r0[3 * node_id_j + 2] - r0[3 * node_id_i + 2];
-
-		const double xi_eta_x = u[3 * node_id_j + 0] - u[3 * node_id_i + 0] + xi_x;
-		const double xi_eta_y = u[3 * node_id_j + 1] - u[3 * node_id_i + 1] + xi_y;
-		const double xi_eta_z = u[3 * node_id_j + 2] - u[3 * node_id_i + 2] + xi_z;
-
-		const double xi = sqrt(xi_x * xi_x + xi_y * xi_y + xi_z * xi_z);
-		const double y = sqrt(xi_eta_x * xi_eta_x + xi_eta_y * xi_eta_y + xi_eta_z * xi_eta_z);
-		const double s = (y -  xi)/ xi;
-
-        // Check for state of bonds here, and break it if necessary
-		if (s < critical_stretch) {
-            const double cx = xi_eta_x / y;
-		    const double cy = xi_eta_y / y;
-		    const double cz = xi_eta_z / y;
-
-		    const double f = s * bond_stiffness * stiffness_corrections[global_id] * vols[node_id_j];
-            // Copy bond forces into local memory
-		    local_cache_x[local_id] = f * cx;
-		    local_cache_y[local_id] = f * cy;
-		    local_cache_z[local_id] = f * cz;
-		}
-        else {
-            // bond is broken
-			nlist[global_id] = -1;  // Break the bond
-            local_cache_x[local_id] = 0.00;
-            local_cache_y[local_id] = 0.00;
-            local_cache_z[local_id] = 0.00;
+     * nregimes - Not applied in this bond_force kernel. Placeholder argument.
+     * bond_events - A (max_bond_events, 4) ring buffer of the broken bonds.
+     * nbond_events - The number of broken bonds logged in bond_events.
+     * max_bond_events - The length of bond_events, or zero to not log broken bonds.
+     * step - The step number, which is logged with the broken bonds. */
+    // local_id is the position of the work item in node_id_i's family
+	const int local_id = get_local_id(0) % FAMILY_SIZE;
+	// node_id_i is the node of the work item's family
+	const int node_id_i = get_global_id(0) / FAMILY_SIZE;
+
+    // The force of the bonds of the work item on node_id_i
+    double3 bond_force = (double3)(0.00, 0.00, 0.00);
+    // The number of bonds of the work item which remain unbroken
+    int bonded = 0;
+    // Work items past the last node have no bonds
+    const int bonds = node_id_i < NNODES ? BONDS_PER_ITEM : 0;
+    for (int k = 0; k < bonds; k++) {
+        // global_id is the bond number
+        const int global_id = BOND_ID(node_id_i, local_id, k);
+
+        // Access local node within node_id_i's horizon with corresponding node_id_j,
+        const int node_id_j = NEIGHBOUR(nlist, global_id, node_id_i);
+
+        // If bond is not broken
+        if (node_id_j != -1) {
+            REFERENCE_BOND(r0, global_id, node_id_i, node_id_j);
+
+            const double3 xi_eta = LOAD_DOF(u, node_id_j) - LOAD_DOF(u, node_id_i)
+                + (double3)(xi_x, xi_y, xi_z);
+            const double xi_eta_x = xi_eta.x;
+            const double xi_eta_y = xi_eta.y;
+            const double xi_eta_z = xi_eta.z;
+
+            const double y = length(xi_eta);
+            const double s = (y -  xi)/ xi;
+
+            // Check for state of bonds here, and break it if necessary
+            if (s < critical_stretch) {
+                const double cx = xi_eta_x / y;
+                const double cy = xi_eta_y / y;
+                const double cz = xi_eta_z / y;
+
+                const double f = s * bond_stiffness * stiffness_corrections[global_id] * vols[node_id_j];
+                // Copy bond forces into local memory
+                bond_force.x += f * cx;
+                bond_force.y += f * cy;
+                bond_force.z += f * cz;
+                bonded += 1;
+            }
+            else {
+                // bond is broken
+                nlist[global_id] = BROKEN_BOND;  // Break the bond
+                log_bond_event(
+                    bond_events, nbond_events, max_bond_events, step, node_id_i,
+                    node_id_j, s);
+            }
         }
     }
-    // bond is broken
-    else {
-        local_cache_x[local_id] = 0.00;
-        local_cache_y[local_id] = 0.00;
-        local_cache_z[local_id] = 0.00;
-    }
 
-    // Wait for all threads to catch up
-    barrier(CLK_LOCAL_MEM_FENCE);
-    // Parallel reduction of the bond force onto node force
-    for (int i = local_size/2; i > 0; i /= 2) {
-        if(local_id < i) {
-            local_cache_x[local_id] += local_cache_x[local_id + i];
-            local_cache_y[local_id] += local_cache_y[local_id + i];
-            local_cache_z[local_id] += local_cache_z[local_id + i];
-        } 
-        //Wait for all threads to catch up 
-        barrier(CLK_LOCAL_MEM_FENCE);
-    }
+    // Parallel reduction of the bond forces and unbroken bonds onto the node
+    const double4 node_bonds = reduce_bonds(
+        bond_force, bonded, local_cache_x, local_cache_y, local_cache_z);
 
-    if (!local_id) {
+    if (!local_id && node_id_i < NNODES) {
         //Get the reduced forces
-        double const force_x = local_cache_x[0];
-        double const force_y = local_cache_y[0];
-        double const force_z = local_cache_z[0];
+        double const force_x = node_bonds.x;
+        double const force_y = node_bonds.y;
+        double const force_z = node_bonds.z;
         // Update body forces in each direction
-        body_force[3 * node_id_i + 0] = force_x;
-        body_force[3 * node_id_i + 1] = force_y;
-        body_force[3 * node_id_i + 2] = force_z;
-        // Update forces in each direction
-        force[3 * node_id_i + 0] = (fc_types[3 * node_id_i + 0] == 0 ? force_x : (force_x + fc_scale * fc_values[3 * node_id_i + 0]));
-        force[3 * node_id_i + 1] = (fc_types[3 * node_id_i + 1] == 0 ? force_y : (force_y + fc_scale * fc_values[3 * node_id_i + 1]));
-        force[3 * node_id_i + 2] = (fc_types[3 * node_id_i + 2] == 0 ? force_z : (force_z + fc_scale * fc_values[3 * node_id_i + 2]));
+        body_force[STRIDE * node_id_i + 0] = force_x;
+        body_force[STRIDE * node_id_i + 1] = force_y;
+        body_force[STRIDE * node_id_i + 2] = force_z;
+        // Update forces in each direction, the force boundary conditions
+        // are applied by apply_force_boundary_conditions
+        force[STRIDE * node_id_i + 0] = force_x;
+        force[STRIDE * node_id_i + 1] = force_y;
+        force[STRIDE * node_id_i + 2] = force_z;
+        // Update damage and n_neigh
+        const int neighbours = node_bonds.w;
+        n_neigh[node_id_i] = neighbours;
+        damage[node_id_i] = 1.00 - (double) neighbours / (double) (family[node_id_i]);
     }
 }
 
@@ -267,22 +546,26 @@ __kernel void
     __global double const* u,
     __global double* force,
     __global double* body_force,
-    __global double const* r0,
+    __global REFERENCE_TYPE const* r0,
     __global double const* vols,
-	__global int* nlist,
-    __global int const* fc_types,
-    __global double const* fc_values,
-    __global double const* stiffness_corrections,
-    __global int const* bond_types,
-    __global int* regimes,
+	__global NEIGHBOUR_TYPE* nlist,
+    __global int const* family,
+    __global int* n_neigh,
+    __global double* damage,
+    __global CORRECTION_TYPE const* stiffness_corrections,
+    __global BOND_TYPE const* bond_types,
+    __global REGIME_TYPE* regimes,
     __global double const* plus_cs,
     __local double* local_cache_x,
     __local double* local_cache_y,
     __local double* local_cache_z,
     __global double* bond_stiffness,
     __global double* critical_stretch,
-    double fc_scale,
-    int nregimes
+    int nregimes,
+    __global double* bond_events,
+    __global uint* nbond_events,
+    int max_bond_events,
+    int step
 	) {
     /* Calculate the force due to bonds on each node.
      *
@@ -291,13 +574,16 @@ __kernel void
      * u - An (n,3) array of the current displacements of the particles.
      * force - An (n,3) array of the current forces on the particles.
      * body_force - An (n,3) array of the current internal body forces of the particles.
-     * r0 - An (n,3) array of the coordinates of the nodes in the initial state.
+     * r0 - An (n,3) array of the coordinates of the nodes in the initial state,
+     *     or the reference bond geometry if BOND_GEOMETRY is defined.
      * vols - the volumes of each of the nodes.
      * nlist - An (n, local_size) array containing the neighbour lists,
      *     a value of -1 corresponds to a broken bond.
-     * fc_types - An (n,3) array of force boundary condition types,
-     *     a value of 0 denotes a particle that is not externally loaded.
-     * fc_values - An (n,3) array of the force boundary condition values applied to particles.
+     * family - An (n) array of the initial number of neighbours for each node.
+     * n_neigh - An (n) array of the number of neighbours (particles bound) for
+     *     each node, which is updated with the bonds that remain unbroken.
+     * damage - An (n) array of the damage for each node, which is updated with
+     *     the bonds that remain unbroken.
      * stiffness_corrections - Not applied in this bond_force kernel. Placeholder argument.
      * bond_types - An (n, local_size) array of bond types.
      * regimes - An (n, local_size) array of the bonds' current regime in the damage model.
@@ -307,109 +593,108 @@ __kernel void
      * local_cache_z - local (local_size) array to store the z components of the bond forces.
      * bond_stiffness - The bond stiffness.
      * critical_stretch - The critical stretch, at and above which bonds will be broken.
-     * fc_scale - scale factor appied to the force bondary conditions.
-     * nregimes - Total number of regimes in the damage model. */
-    // global_id is the bond number
-    const int global_id = get_global_id(0);
-    // local_id is the LOCAL node id in range [0, max_neigh] of a node in this parent node's family
-	const int local_id = get_local_id(0);
-    // local_size is the max_neigh, usually 128 or 256 depending on the problem
-    const int local_size = get_local_size(0);
-    // group_id is node i
-	const int node_id_i = get_group_id(0);
-
-
-	// Access local node within node_id_i's horizon with corresponding node_id_j,
-	const int node_id_j = nlist[global_id];
-
-    // Find bond type, which chooses the damage model
-    const int bond_type = bond_types[global_id];
-    int regime = regimes[global_id];
-    const double current_critical_stretch = critical_stretch[bond_type * nregimes + regime];
-
-	// If bond is not broken
-	if (node_id_j != -1) {
-		const double xi_x = r0[3 * node_id_j + 0] - r0[3 * node_id_i + 0];
-		const double xi_y = r0[3 * node_id_j + 1] - r0[3 * node_id_i + 1];
-		const double xi_z = r0[3 * node_id_j + 2] - r0[3 * node_id_i + 2];
-
-		const double xi_eta_x = u[3 * node_id_j + 0] - u[3 * node_id_i + 0] + xi_x;
-		const double xi_eta_y = u[3 * node_id_j + 1] - u[3 * node_id_i + 1] + xi_y;
-		const double xi_eta_z = u[3 * node_id_j + 2] - u[3 * node_id_i + 2] + xi_z;
-
-		const double xi = sqrt(xi_x * xi_x + xi_y * xi_y + xi_z * xi_z);
-		const double y = sqrt(xi_eta_x * xi_eta_x + xi_eta_y * xi_eta_y + xi_eta_z * xi_eta_z);
-		const double s = (y -  xi)/ xi;
-
-        // Check for state of bonds
-		if (s < current_critical_stretch) {
-            // Check if the bond has entered the previous regime
-            if (regime > 0) {
-                const double previous_critical_stretch = critical_stretch[bond_type * nregimes + regime - 1];
-                if (s < previous_critical_stretch) {
-                    // bond enters previous regime
-                    regime -= 1;
-                    regimes[global_id] = regime;
+     * nregimes - Total number of regimes in the damage model.
+     * bond_events - A (max_bond_events, 4) ring buffer of the broken bonds.
+     * nbond_events - The number of broken bonds logged in bond_events.
+     * max_bond_events - The length of bond_events, or zero to not log broken bonds.
+     * step - The step number, which is logged with the broken bonds. */
+    // local_id is the position of the work item in node_id_i's family
+	const int local_id = get_local_id(0) % FAMILY_SIZE;
+	// node_id_i is the node of the work item's family
+	const int node_id_i = get_global_id(0) / FAMILY_SIZE;
+
+    // The force of the bonds of the work item on node_id_i
+    double3 bond_force = (double3)(0.00, 0.00, 0.00);
+    // The number of bonds of the work item which remain unbroken
+    int bonded = 0;
+    // Work items past the last node have no bonds
+    const int bonds = node_id_i < NNODES ? BONDS_PER_ITEM : 0;
+    for (int k = 0; k < bonds; k++) {
+        // global_id is the bond number
+        const int global_id = BOND_ID(node_id_i, local_id, k);
+
+        // Access local node within node_id_i's horizon with corresponding node_id_j,
+        const int node_id_j = NEIGHBOUR(nlist, global_id, node_id_i);
+
+        // Find bond type, which chooses the damage model
+        const int bond_type = bond_types[global_id];
+        int regime = regimes[global_id];
+        const double current_critical_stretch = critical_stretch[bond_type * nregimes + regime];
+
+        // If bond is not broken
+        if (node_id_j != -1) {
+            REFERENCE_BOND(r0, global_id, node_id_i, node_id_j);
+
+            const double3 xi_eta = LOAD_DOF(u, node_id_j) - LOAD_DOF(u, node_id_i)
+                + (double3)(xi_x, xi_y, xi_z);
+            const double xi_eta_x = xi_eta.x;
+            const double xi_eta_y = xi_eta.y;
+            const double xi_eta_z = xi_eta.z;
+
+            const double y = length(xi_eta);
+            const double s = (y -  xi)/ xi;
+
+            // Check for state of bonds
+            if (s < current_critical_stretch) {
+                // Check if the bond has entered the previous regime
+                if (regime > 0) {
+                    const double previous_critical_stretch = critical_stretch[bond_type * nregimes + regime - 1];
+                    if (s < previous_critical_stretch) {
+                        // bond enters previous regime
+                        regime -= 1;
+                        regimes[global_id] = regime;
+                    }
                 }
             }
-		}
-        else {
-            // Bond enters the next regime
-            regime += 1;
-            regimes[global_id] = regime;
-        }
-        // Break bond if necessary
-        if (regime >= nregimes) {
-            nlist[global_id] = -1;  // Break the bond
-            local_cache_x[local_id] = 0.00;
-            local_cache_y[local_id] = 0.00;
-            local_cache_z[local_id] = 0.00;
-        }
-        else{
-            const double cx = xi_eta_x / y;
-            const double cy = xi_eta_y / y;
-            const double cz = xi_eta_z / y;
-
-            const double f = (s * bond_stiffness[bond_type * nregimes + regime] + plus_cs[bond_type * nregimes + regime]) * vols[node_id_j];
-            // Copy bond forces into local memory
-            local_cache_x[local_id] = f * cx;
-            local_cache_y[local_id] = f * cy;
-            local_cache_z[local_id] = f * cz;
+            else {
+                // Bond enters the next regime
+                regime += 1;
+                regimes[global_id] = regime;
+            }
+            // Break bond if necessary
+            if (regime >= nregimes) {
+                nlist[global_id] = BROKEN_BOND;  // Break the bond
+                log_bond_event(
+                    bond_events, nbond_events, max_bond_events, step, node_id_i,
+                    node_id_j, s);
+            }
+            else{
+                const double cx = xi_eta_x / y;
+                const double cy = xi_eta_y / y;
+                const double cz = xi_eta_z / y;
+
+                const double f = (s * bond_stiffness[bond_type * nregimes + regime] + plus_cs[bond_type * nregimes + regime]) * vols[node_id_j];
+                // Copy bond forces into local memory
+                bond_force.x += f * cx;
+                bond_force.y += f * cy;
+                bond_force.z += f * cz;
+                bonded += 1;
+            }
         }
     }
-    // bond is broken
-    else {
-        local_cache_x[local_id] = 0.00;
-        local_cache_y[local_id] = 0.00;
-        local_cache_z[local_id] = 0.00;
-    }
 
-    // Wait for all threads to catch up
-    barrier(CLK_LOCAL_MEM_FENCE);
-    // Parallel reduction of the bond force onto node force
-    for (int i = local_size/2; i > 0; i /= 2) {
-        if(local_id < i) {
-            local_cache_x[local_id] += local_cache_x[local_id + i];
-            local_cache_y[local_id] += local_cache_y[local_id + i];
-            local_cache_z[local_id] += local_cache_z[local_id + i];
-        } 
-        //Wait for all threads to catch up 
-        barrier(CLK_LOCAL_MEM_FENCE);
-    }
+    // Parallel reduction of the bond forces and unbroken bonds onto the node
+    const double4 node_bonds = reduce_bonds(
+        bond_force, bonded, local_cache_x, local_cache_y, local_cache_z);
 
-    if (!local_id) {
+    if (!local_id && node_id_i < NNODES) {
         //Get the reduced forces
-        double const force_x = local_cache_x[0];
-        double const force_y = local_cache_y[0];
-        double const force_z = local_cache_z[0];
+        double const force_x = node_bonds.x;
+        double const force_y = node_bonds.y;
+        double const force_z = node_bonds.z;
         // Update body forces in each direction
-        body_force[3 * node_id_i + 0] = force_x;
-        body_force[3 * node_id_i + 1] = force_y;
-        body_force[3 * node_id_i + 2] = force_z;
-        // Update forces in each direction
-        force[3 * node_id_i + 0] = (fc_types[3 * node_id_i + 0] == 0 ? force_x : (force_x + fc_scale * fc_values[3 * node_id_i + 0]));
-        force[3 * node_id_i + 1] = (fc_types[3 * node_id_i + 1] == 0 ? force_y : (force_y + fc_scale * fc_values[3 * node_id_i + 1]));
-        force[3 * node_id_i + 2] = (fc_types[3 * node_id_i + 2] == 0 ? force_z : (force_z + fc_scale * fc_values[3 * node_id_i + 2]));
+        body_force[STRIDE * node_id_i + 0] = force_x;
+        body_force[STRIDE * node_id_i + 1] = force_y;
+        body_force[STRIDE * node_id_i + 2] = force_z;
+        // Update forces in each direction, the force boundary conditions
+        // are applied by apply_force_boundary_conditions
+        force[STRIDE * node_id_i + 0] = force_x;
+        force[STRIDE * node_id_i + 1] = force_y;
+        force[STRIDE * node_id_i + 2] = force_z;
+        // Update damage and n_neigh
+        const int neighbours = node_bonds.w;
+        n_neigh[node_id_i] = neighbours;
+        damage[node_id_i] = 1.00 - (double) neighbours / (double) (family[node_id_i]);
     }
 }
 
@@ -419,22 +704,26 @@ __kernel void
     __global double const* u,
     __global double* force,
     __global double* body_force,
-    __global double const* r0,
+    __global REFERENCE_TYPE const* r0,
     __global double const* vols,
-	__global int* nlist,
-    __global int const* fc_types,
-    __global double const* fc_values,
-    __global double const* stiffness_corrections,
-    __global int const* bond_types,
-    __global int* regimes,
+	__global NEIGHBOUR_TYPE* nlist,
+    __global int const* family,
+    __global int* n_neigh,
+    __global double* damage,
+    __global CORRECTION_TYPE const* stiffness_corrections,
+    __global BOND_TYPE const* bond_types,
+    __global REGIME_TYPE* regimes,
     __global double const* plus_cs,
     __local double* local_cache_x,
     __local double* local_cache_y,
     __local double* local_cache_z,
     __global double* bond_stiffness,
     __global double* critical_stretch,
-    double fc_scale,
-    int nregimes
+    int nregimes,
+    __global double* bond_events,
+    __global uint* nbond_events,
+    int max_bond_events,
+    int step
 	) {
     /* Calculate the force due to bonds on each node.
      *
@@ -443,13 +732,16 @@ __kernel void
      * u - An (n,3) array of the current displacements of the particles.
      * force - An (n,3) array of the current forces on the particles.
      * body_force - An (n,3) array of the current internal body forces of the particles.
-     * r0 - An (n,3) array of the coordinates of the nodes in the initial state.
+     * r0 - An (n,3) array of the coordinates of the nodes in the initial state,
+     *     or the reference bond geometry if BOND_GEOMETRY is defined.
      * vols - the volumes of each of the nodes.
      * nlist - An (n, local_size) array containing the neighbour lists,
      *     a value of -1 corresponds to a broken bond.
-     * fc_types - An (n,3) array of force boundary condition types,
-     *     a value of 0 denotes a particle that is not externally loaded.
-     * fc_values - An (n,3) array of the force boundary condition values applied to particles.
+     * family - An (n) array of the initial number of neighbours for each node.
+     * n_neigh - An (n) array of the number of neighbours (particles bound) for
+     *     each node, which is updated with the bonds that remain unbroken.
+     * damage - An (n) array of the damage for each node, which is updated with
+     *     the bonds that remain unbroken.
      * stiffness_corrections - An (n, local_size) array of bond stiffness correction factors.
      * bond_types - An (n, local_size) array of bond types.
      * regimes - An (n, local_size) array of the bonds' current regime in the damage model.
@@ -459,114 +751,114 @@ __kernel void
      * local_cache_z - local (local_size) array to store the z components of the bond forces.
      * bond_stiffness - The bond stiffness.
      * critical_stretch - The critical stretch, at and above which bonds will be broken.
-     * fc_scale - scale factor appied to the force bondary conditions.
-     * nregimes - Total number of regimes in the damage model. */
-    // global_id is the bond number
-    const int global_id = get_global_id(0);
-    // local_id is the LOCAL node id in range [0, max_neigh] of a node in this parent node's family
-	const int local_id = get_local_id(0);
-    // local_size is the max_neigh, usually 128 or 256 depending on the problem
-    const int local_size = get_local_size(0);
-    // group_id is node i
-	const int node_id_i = get_group_id(0);
-
-	// Access local node within node_id_i's horizon with corresponding node_id_j,
-	const int node_id_j = nlist[global_id];
-
-    // Find bond type, which chooses the damage model
-    const int bond_type = bond_types[global_id];
-    int regime = regimes[global_id];
-    const double current_critical_stretch = critical_stretch[bond_type * nregimes + regime];
-
-	// If bond is not broken
-	if (node_id_j != -1) {
-		const double xi_x = r0[3 * node_id_j + 0] - r0[3 * node_id_i + 0];
-		const double xi_y = r0[3 * node_id_j + 1] - r0[3 * node_id_i + 1];
-		const double xi_z = r0[3 * node_id_j + 2] - r0[3 * node_id_i + 2];
-
-		const double xi_eta_x = u[3 * node_id_j + 0] - u[3 * node_id_i + 0] + xi_x;
-		const double xi_eta_y = u[3 * node_id_j + 1] - u[3 * node_id_i + 1] + xi_y;
-		const double xi_eta_z = u[3 * node_id_j + 2] - u[3 * node_id_i + 2] + xi_z;
-
-		const double xi = sqrt(xi_x * xi_x + xi_y * xi_y + xi_z * xi_z);
-		const double y = sqrt(xi_eta_x * xi_eta_x + xi_eta_y * xi_eta_y + xi_eta_z * xi_eta_z);
-		const double s = (y -  xi)/ xi;
-
-        // Check for state of bonds
-		if (s < current_critical_stretch) {
-            // Check if the bond has entered the previous regime
-            if (regime > 0) {
-                const double previous_critical_stretch = critical_stretch[bond_type * nregimes + regime - 1];
-                if (s < previous_critical_stretch) {
-                    // bond enters previous regime
-                    regime -= 1;
-                    regimes[global_id] = regime;
+     * nregimes - Total number of regimes in the damage model.
+     * bond_events - A (max_bond_events, 4) ring buffer of the broken bonds.
+     * nbond_events - The number of broken bonds logged in bond_events.
+     * max_bond_events - The length of bond_events, or zero to not log broken bonds.
+     * step - The step number, which is logged with the broken bonds. */
+    // local_id is the position of the work item in node_id_i's family
+	const int local_id = get_local_id(0) % FAMILY_SIZE;
+	// node_id_i is the node of the work item's family
+	const int node_id_i = get_global_id(0) / FAMILY_SIZE;
+
+    // The force of the bonds of the work item on node_id_i
+    double3 bond_force = (double3)(0.00, 0.00, 0.00);
+    // The number of bonds of the work item which remain unbroken
+    int bonded = 0;
+    // Work items past the last node have no bonds
+    const int bonds = node_id_i < NNODES ? BONDS_PER_ITEM : 0;
+    for (int k = 0; k < bonds; k++) {
+        // global_id is the bond number
+        const int global_id = BOND_ID(node_id_i, local_id, k);
+
+        // Access local node within node_id_i's horizon with corresponding node_id_j,
+        const int node_id_j = NEIGHBOUR(nlist, global_id, node_id_i);
+
+        // Find bond type, which chooses the damage model
+        const int bond_type = bond_types[global_id];
+        int regime = regimes[global_id];
+        const double current_critical_stretch = critical_stretch[bond_type * nregimes + regime];
+
+        // If bond is not broken
+        if (node_id_j != -1) {
+            REFERENCE_BOND(r0, global_id, node_id_i, node_id_j);
+
+            const double3 xi_eta = LOAD_DOF(u, node_id_j) - LOAD_DOF(u, node_id_i)
+                + (double3)(xi_x, xi_y, xi_z);
+            const double xi_eta_x = xi_eta.x;
+            const double xi_eta_y = xi_eta.y;
+            const double xi_eta_z = xi_eta.z;
+
+            const double y = length(xi_eta);
+            const double s = (y -  xi)/ xi;
+
+            // Check for state of bonds
+            if (s < current_critical_stretch) {
+                // Check if the bond has entered the previous regime
+                if (regime > 0) {
+                    const double previous_critical_stretch = critical_stretch[bond_type * nregimes + regime - 1];
+                    if (s < previous_critical_stretch) {
+                        // bond enters previous regime
+                        regime -= 1;
+                        regimes[global_id] = regime;
+                    }
                 }
             }
-		}
-        else {
-            // Bond enters the next regime
-            regime += 1;
-            regimes[global_id] = regime;
-        }
-        // Break bond if necessary
-        if (regime >= nregimes) {
-            nlist[global_id] = -1;  // Break the bond
-            local_cache_x[local_id] = 0.00;
-            local_cache_y[local_id] = 0.00;
-            local_cache_z[local_id] = 0.00;
-        }
-        else{
-            const double cx = xi_eta_x / y;
-            const double cy = xi_eta_y / y;
-            const double cz = xi_eta_z / y;
-
-            const double f = (s * bond_stiffness[bond_type * nregimes + regime] + plus_cs[bond_type * nregimes + regime]) * stiffness_corrections[global_id] * vols[node_id_j];
-            // Copy bond forces into local memory
-            local_cache_x[local_id] = f * cx;
-            local_cache_y[local_id] = f * cy;
-            local_cache_z[local_id] = f * cz;
+            else {
+                // Bond enters the next regime
+                regime += 1;
+                regimes[global_id] = regime;
+            }
+            // Break bond if necessary
+            if (regime >= nregimes) {
+                nlist[global_id] = BROKEN_BOND;  // Break the bond
+                log_bond_event(
+                    bond_events, nbond_events, max_bond_events, step, node_id_i,
+                    node_id_j, s);
+            }
+            else{
+                const double cx = xi_eta_x / y;
+                const double cy = xi_eta_y / y;
+                const double cz = xi_eta_z / y;
+
+                const double f = (s * bond_stiffness[bond_type * nregimes + regime] + plus_cs[bond_type * nregimes + regime]) * stiffness_corrections[global_id] * vols[node_id_j];
+                // Copy bond forces into local memory
+                bond_force.x += f * cx;
+                bond_force.y += f * cy;
+                bond_force.z += f * cz;
+                bonded += 1;
+            }
         }
     }
-    // bond is broken
-    else {
-        local_cache_x[local_id] = 0.00;
-        local_cache_y[local_id] = 0.00;
-        local_cache_z[local_id] = 0.00;
-    }
 
-    // Wait for all threads to catch up
-    barrier(CLK_LOCAL_MEM_FENCE);
-    // Parallel reduction of the bond force onto node force
-    for (int i = local_size/2; i > 0; i /= 2) {
-        if(local_id < i) {
-            local_cache_x[local_id] += local_cache_x[local_id + i];
-            local_cache_y[local_id] += local_cache_y[local_id + i];
-            local_cache_z[local_id] += local_cache_z[local_id + i];
-        } 
-        //Wait for all threads to catch up 
-        barrier(CLK_LOCAL_MEM_FENCE);
-    }
+    // Parallel reduction of the bond forces and unbroken bonds onto the node
+    const double4 node_bonds = reduce_bonds(
+        bond_force, bonded, local_cache_x, local_cache_y, local_cache_z);
 
-    if (!local_id) {
+    if (!local_id && node_id_i < NNODES) {
         //Get the reduced forces
-        double const force_x = local_cache_x[0];
-        double const force_y = local_cache_y[0];
-        double const force_z = local_cache_z[0];
+        double const force_x = node_bonds.x;
+        double const force_y = node_bonds.y;
+        double const force_z = node_bonds.z;
         // Update body forces in each direction
-        body_force[3 * node_id_i + 0] = force_x;
-        body_force[3 * node_id_i + 1] = force_y;
-        body_force[3 * node_id_i + 2] = force_z;
-        // Update forces in each direction
-        force[3 * node_id_i + 0] = (fc_types[3 * node_id_i + 0] == 0 ? force_x : (force_x + fc_scale * fc_values[3 * node_id_i + 0]));
-        force[3 * node_id_i + 1] = (fc_types[3 * node_id_i + 1] == 0 ? force_y : (force_y + fc_scale * fc_values[3 * node_id_i + 1]));
-        force[3 * node_id_i + 2] = (fc_types[3 * node_id_i + 2] == 0 ? force_z : (force_z + fc_scale * fc_values[3 * node_id_i + 2]));
+        body_force[STRIDE * node_id_i + 0] = force_x;
+        body_force[STRIDE * node_id_i + 1] = force_y;
+        body_force[STRIDE * node_id_i + 2] = force_z;
+        // Update forces in each direction, the force boundary conditions
+        // are applied by apply_force_boundary_conditions
+        force[STRIDE * node_id_i + 0] = force_x;
+        force[STRIDE * node_id_i + 1] = force_y;
+        force[STRIDE * node_id_i + 2] = force_z;
+        // Update damage and n_neigh
+        const int neighbours = node_bonds.w;
+        n_neigh[node_id_i] = neighbours;
+        damage[node_id_i] = 1.00 - (double) neighbours / (double) (family[node_id_i]);
     }
 }
 
 
 __kernel void damage(
-        __global int const *nlist,
+        __global NEIGHBOUR_TYPE const *nlist,
 		__global int const *family,
         __global int *n_neigh,
         __global double *damage,
@@ -581,30 +873,381 @@ __kernel void damage(
      * n_neigh - An (n) array of the number of neighbours (particles bound) for
      *     each node.
      * damage - An (n) array of the damage for each node. 
-     * local_cache - local (local_size) array to store the bond breakages.*/
-    int global_id = get_global_id(0); 
-    int local_id = get_local_id(0); 
-    int local_size = get_local_size(0); 
-    
-    //Copy values into local memory 
-    local_cache[local_id] = nlist[global_id] != -1 ? 1.00 : 0.00; 
-
-    //Wait for all threads to catch up 
-    barrier(CLK_LOCAL_MEM_FENCE);
-    for (int i = local_size/2; i > 0; i /= 2){
-        if(local_id < i){
-            local_cache[local_id] += local_cache[local_id + i];
-        } 
-        //Wait for all threads to catch up 
-        barrier(CLK_LOCAL_MEM_FENCE);
+     * local_cache - local (local_size) array to store the bond breakages.
+     *
+     * For an ensemble, the second dimension of the NDRange is the sample and
+     * nlist, n_neigh and damage have a leading (nsamples) axis. */
+    int local_id = get_local_id(0) % FAMILY_SIZE;
+    int node_id_i = get_global_id(0) / FAMILY_SIZE;
+    // sample is the realisation of the ensemble
+    int sample = get_global_id(1);
+
+    // Count the unbroken bonds of the work item
+    int bonded = 0;
+    // Work items past the last node have no bonds
+    const int bonds = node_id_i < NNODES ? BONDS_PER_ITEM : 0;
+    for (int k = 0; k < bonds; k++) {
+        int bond_id = sample * NNODES * MAX_NEIGHBOURS
+            + BOND_ID(node_id_i, local_id, k);
+        bonded += nlist[bond_id] != BROKEN_BOND;
     }
+    // Count the unbroken bonds of the node
+    const int neighbours = count_bonds(bonded, local_cache);
 
-    if (!local_id) {
+    if (!local_id && node_id_i < NNODES) {
         //Get the reduced damages
-        int node_id_i = get_group_id(0);
+        int node = sample * NNODES + node_id_i;
         // Update damage and n_neigh
-        int neighbours = local_cache[0];
-        n_neigh[node_id_i] = neighbours;
-        damage[node_id_i] = 1.00 - (double) neighbours / (double) (family[node_id_i]);
+        n_neigh[node] = neighbours;
+        damage[node] = 1.00 - (double) neighbours / (double) (family[node_id_i]);
+    }
+}
+
+
+__kernel void compact_bonds(
+        __global NEIGHBOUR_TYPE const *nlist,
+        __global NEIGHBOUR_TYPE *compact_nlist,
+        __global int const *positions,
+        __global int *compact_positions,
+        __global REFERENCE_TYPE const *r0,
+        __global REFERENCE_TYPE *compact_r0,
+        __global CORRECTION_TYPE const *stiffness_corrections,
+        __global CORRECTION_TYPE *compact_stiffness_corrections,
+        __global BOND_TYPE const *bond_types,
+        __global BOND_TYPE *compact_bond_types,
+        __global REGIME_TYPE const *regimes,
+        __global REGIME_TYPE *compact_regimes,
+        int max_neighbours,
+        int compact_max_neighbours,
+        int bond_arrays
+    )
+{
+    /* Pack the unbroken bonds of each node to the front of narrower bond arrays.
+     *
+     * Each work item compacts the bonds of one node, in order. The bonds past
+     * the unbroken bonds of a node are broken.
+     *
+     * nlist - An (n, max_neighbours) array containing the neighbour lists,
+     *     a value of -1 corresponds to a broken bond.
+     * compact_nlist - An (n, compact_max_neighbours) array of the compacted
+     *     neighbour lists.
+     * positions - An (n, max_neighbours) array of the positions of the bonds
+     *     in the neighbour lists before they were first compacted.
+     * compact_positions - An (n, compact_max_neighbours) array of the
+     *     positions of the compacted bonds.
+     * r0 - The reference bond geometry if BOND_GEOMETRY is defined, which is
+     *     compacted into compact_r0. Otherwise not applied.
+     * stiffness_corrections - An (n, max_neighbours) array of the stiffness
+     *     corrections of the bonds, which are compacted into
+     *     compact_stiffness_corrections.
+     * bond_types - An (n, max_neighbours) array of the types of the bonds,
+     *     which are compacted into compact_bond_types.
+     * regimes - An (n, max_neighbours) array of the regimes of the bonds,
+     *     which are compacted into compact_regimes.
+     * max_neighbours - The width of the bond arrays.
+     * compact_max_neighbours - The width of the compacted bond arrays, which
+     *     is at least the number of unbroken bonds of every node.
+     * bond_arrays - The sum of 1 if the stiffness corrections, 2 if the bond
+     *     types and 4 if the regimes are compacted, and 8 if positions is
+     *     given, otherwise the bonds are in their original positions. */
+    const int node_id_i = get_global_id(0);
+    // The next bond of the compacted bond arrays
+    int bond = node_id_i * compact_max_neighbours;
+    const int last_bond = bond + compact_max_neighbours;
+
+    for (int k = 0; k < max_neighbours; k++) {
+        const int bond_id = node_id_i * max_neighbours + k;
+        // The bonds are copied as they are stored, which is independent of
+        // the position of the bond in the neighbour list
+        const NEIGHBOUR_TYPE neighbour = nlist[bond_id];
+        if (neighbour != BROKEN_BOND) {
+            compact_nlist[bond] = neighbour;
+            compact_positions[bond] = (bond_arrays & 8) ? positions[bond_id] : k;
+#ifdef BOND_GEOMETRY
+            vstore4(vload4(bond_id, r0), bond, compact_r0);
+#endif
+            if (bond_arrays & 1) {
+                compact_stiffness_corrections[bond] = stiffness_corrections[bond_id];
+            }
+            if (bond_arrays & 2) {
+                compact_bond_types[bond] = bond_types[bond_id];
+            }
+            if (bond_arrays & 4) {
+                compact_regimes[bond] = regimes[bond_id];
+            }
+            bond++;
+        }
+    }
+    // The remaining bonds are broken
+    for (; bond < last_bond; bond++) {
+        compact_nlist[bond] = BROKEN_BOND;
+        compact_positions[bond] = -1;
+        if (bond_arrays & 1) {
+            compact_stiffness_corrections[bond] = 0.00;
+        }
+        if (bond_arrays & 2) {
+            compact_bond_types[bond] = 0;
+        }
+        if (bond_arrays & 4) {
+            compact_regimes[bond] = 0;
+        }
+    }
+}
+
+
+__kernel void
+	bond_force_ensemble(
+    __global double const* u,
+    __global double* force,
+    __global double* body_force,
+    __global REFERENCE_TYPE const* r0,
+    __global double const* vols,
+	__global NEIGHBOUR_TYPE* nlist,
+    __global int const* family,
+    __global int* n_neigh,
+    __global double* damage,
+    __global CORRECTION_TYPE const* stiffness_corrections,
+    __local double* local_cache_x,
+    __local double* local_cache_y,
+    __local double* local_cache_z,
+    __global double const* bond_stiffness,
+    __global double const* critical_stretch,
+    int corrections
+	) {
+    /* Calculate the force due to bonds on each node of an ensemble of samples.
+     *
+     * The second dimension of the NDRange is the sample. The state of each
+     * sample (u, force, body_force and nlist) is stored one after another,
+     * whereas the geometry and boundary conditions are shared by all samples.
+     *
+     * u - An (nsamples, n, 3) array of the current displacements of the particles.
+     * force - An (nsamples, n, 3) array of the current forces on the particles.
+     * body_force - An (nsamples, n, 3) array of the current internal body forces of the particles.
+     * r0 - An (n,3) array of the coordinates of the nodes in the initial state,
+     *     or the reference bond geometry if BOND_GEOMETRY is defined.
+     * vols - the volumes of each of the nodes.
+     * nlist - An (nsamples, n, local_size) array containing the neighbour lists,
+     *     a value of -1 corresponds to a broken bond.
+     * family - An (n) array of the initial number of neighbours for each node.
+     * n_neigh - An (nsamples, n) array of the number of neighbours (particles
+     *     bound) for each node, which is updated with the bonds that remain
+     *     unbroken.
+     * damage - An (nsamples, n) array of the damage for each node, which is
+     *     updated with the bonds that remain unbroken.
+     * stiffness_corrections - An (n, local_size) array of bond stiffness correction factors shared
+     *     by the samples, or an (nsamples, n, local_size) array of the factors of each sample.
+     * local_cache_x - local (local_size) array to store the x components of the bond forces.
+     * local_cache_y - local (local_size) array to store the y components of the bond forces.
+     * local_cache_z - local (local_size) array to store the z components of the bond forces.
+     * bond_stiffness - An (nsamples) array of the bond stiffness of each sample.
+     * critical_stretch - An (nsamples) array of the critical stretch of each sample.
+     * corrections - 0 if stiffness corrections are not applied, 1 if they are
+     *     shared by the samples and 2 if each sample has its own. */
+    // local_id is the position of the work item in node_id_i's family
+	const int local_id = get_local_id(0) % FAMILY_SIZE;
+	// node_id_i is the node of the work item's family
+	const int node_id_i = get_global_id(0) / FAMILY_SIZE;
+    // sample is the realisation of the ensemble
+    const int sample = get_global_id(1);
+    // Offset of the degrees of freedom of the sample
+    const int dof_offset = STRIDE * sample * NNODES;
+
+    // The force of the bonds of the work item on node_id_i
+    double3 bond_force = (double3)(0.00, 0.00, 0.00);
+    // The number of bonds of the work item which remain unbroken
+    int bonded = 0;
+    // Work items past the last node have no bonds
+    const int bonds = node_id_i < NNODES ? BONDS_PER_ITEM : 0;
+    for (int k = 0; k < bonds; k++) {
+        // global_id is the bond number within the sample
+        const int global_id = BOND_ID(node_id_i, local_id, k);
+        // bond_id is the bond number within the ensemble
+        const int bond_id = sample * NNODES * MAX_NEIGHBOURS + global_id;
+
+        // Access local node within node_id_i's horizon with corresponding node_id_j,
+        const int node_id_j = NEIGHBOUR(nlist, bond_id, node_id_i);
+
+        // If bond is not broken
+        if (node_id_j != -1) {
+            REFERENCE_BOND(r0, global_id, node_id_i, node_id_j);
+
+            const double3 xi_eta = LOAD_DOF(u + dof_offset, node_id_j)
+                - LOAD_DOF(u + dof_offset, node_id_i) + (double3)(xi_x, xi_y, xi_z);
+            const double xi_eta_x = xi_eta.x;
+            const double xi_eta_y = xi_eta.y;
+            const double xi_eta_z = xi_eta.z;
+
+            const double y = length(xi_eta);
+            const double s = (y -  xi)/ xi;
+
+            // Check for state of bonds here, and break it if necessary
+            if (s < critical_stretch[sample]) {
+                const double cx = xi_eta_x / y;
+                const double cy = xi_eta_y / y;
+                const double cz = xi_eta_z / y;
+
+                double f = s * bond_stiffness[sample] * vols[node_id_j];
+                if (corrections == 1) {
+                    f *= stiffness_corrections[global_id];
+                }
+                else if (corrections == 2) {
+                    f *= stiffness_corrections[bond_id];
+                }
+                // Copy bond forces into local memory
+                bond_force.x += f * cx;
+                bond_force.y += f * cy;
+                bond_force.z += f * cz;
+                bonded += 1;
+            }
+            else {
+                nlist[bond_id] = BROKEN_BOND;  // Break the bond
+            }
+        }
+    }
+
+    // Parallel reduction of the bond forces and unbroken bonds onto the node
+    const double4 node_bonds = reduce_bonds(
+        bond_force, bonded, local_cache_x, local_cache_y, local_cache_z);
+
+    if (!local_id && node_id_i < NNODES) {
+        //Get the reduced forces
+        double const force_x = node_bonds.x;
+        double const force_y = node_bonds.y;
+        double const force_z = node_bonds.z;
+        const int dof_i = dof_offset + STRIDE * node_id_i;
+        // Update body forces in each direction
+        body_force[dof_i + 0] = force_x;
+        body_force[dof_i + 1] = force_y;
+        body_force[dof_i + 2] = force_z;
+        // Update forces in each direction, the force boundary conditions
+        // are applied by apply_force_boundary_conditions
+        force[dof_i + 0] = force_x;
+        force[dof_i + 1] = force_y;
+        force[dof_i + 2] = force_z;
+        // Update damage and n_neigh
+        const int node = sample * NNODES + node_id_i;
+        const int neighbours = node_bonds.w;
+        n_neigh[node] = neighbours;
+        damage[node] = 1.00 - (double) neighbours / (double) (family[node_id_i]);
+    }
+}
+
+
+__kernel void
+	apply_displacement_boundary_conditions(
+    __global double* u,
+    __global int const* bc_dofs,
+    __global double const* bc_values,
+    double bc_scale,
+    int ndofs
+	) {
+    /* Apply the displacement boundary conditions to the constrained degrees
+     * of freedom.
+     *
+     * u - An (n,3) array of the current displacements of the nodes.
+     * bc_dofs - An (m) array of the constrained degrees of freedom of u.
+     * bc_values - An (m) array of the boundary condition values of the
+     *     constrained degrees of freedom.
+     * bc_scale - The scalar value applied to the displacement BCs.
+     * ndofs - The length of the displacements of each sample.
+     *
+     * For an ensemble, the second dimension of the NDRange is the sample and
+     * u is an (nsamples, n, 3) array. */
+    const int i = get_global_id(0);
+    u[get_global_id(1) * ndofs + bc_dofs[i]] = bc_scale * bc_values[i];
+}
+
+
+__kernel void
+	apply_force_boundary_conditions(
+    __global double* force,
+    __global int const* fc_dofs,
+    __global double const* fc_values,
+    double fc_scale,
+    int ndofs
+	) {
+    /* Add the force boundary conditions to the forces of the loaded degrees
+     * of freedom.
+     *
+     * force - An (n,3) array of the current forces on the nodes.
+     * fc_dofs - An (m) array of the loaded degrees of freedom of force.
+     * fc_values - An (m) array of the force boundary condition values of the
+     *     loaded degrees of freedom.
+     * fc_scale - scale factor appied to the force bondary conditions.
+     * ndofs - The length of the forces of each sample.
+     *
+     * For an ensemble, the second dimension of the NDRange is the sample and
+     * force is an (nsamples, n, 3) array. */
+    const int i = get_global_id(0);
+    force[get_global_id(1) * ndofs + fc_dofs[i]] += fc_scale * fc_values[i];
+}
+
+
+__kernel void
+	residual(
+    __global double const* force,
+    __global double const* ud,
+    __global uchar const* free_dofs,
+    __global double* partial_sums,
+    __local double2* local_cache,
+    int ndofs
+	) {
+    /* Reduce the sums of squares of the forces and of the velocities of the
+     * unconstrained degrees of freedom of each work group.
+     *
+     * force - An (n,3) array of the current forces on the nodes.
+     * ud - An (n,3) array of the current velocities of the nodes.
+     * free_dofs - An (n,3) array which is 1 for the degrees of freedom
+     *     without a displacement boundary condition and 0 otherwise.
+     * partial_sums - A (ngroups,2) array of the sums of each work group.
+     * local_cache - A local (local_size) array to reduce the sums, a power
+     *     of two.
+     * ndofs - The number of degrees of freedom to reduce over. */
+    const int i = get_global_id(0);
+    const int local_id = get_local_id(0);
+    double2 sums = (double2)(0.0, 0.0);
+    if (i < ndofs && free_dofs[i]) {
+        sums = (double2)(force[i] * force[i], ud[i] * ud[i]);
+    }
+    local_cache[local_id] = sums;
+    for (int j = get_local_size(0) / 2; j > 0; j /= 2) {
+        barrier(CLK_LOCAL_MEM_FENCE);
+        if (local_id < j) {
+            local_cache[local_id] += local_cache[local_id + j];
+        }
+    }
+    if (!local_id) {
+        vstore2(local_cache[0], get_group_id(0), partial_sums);
+    }
+}
+
+
+__kernel void
+	reduce_partial_sums(
+    __global double* partial_sums,
+    __local double2* local_cache,
+    int ngroups
+	) {
+    /* Reduce the partial sums of the work groups of a reduction into the
+     * first row, with a single work group.
+     *
+     * partial_sums - A (ngroups,2) array of the sums of each work group.
+     * local_cache - A local (local_size) array to reduce the sums, a power
+     *     of two.
+     * ngroups - The number of work groups of the reduction. */
+    const int local_id = get_local_id(0);
+    double2 sums = (double2)(0.0, 0.0);
+    for (int i = local_id; i < ngroups; i += get_local_size(0)) {
+        sums += vload2(i, partial_sums);
+    }
+    local_cache[local_id] = sums;
+    for (int j = get_local_size(0) / 2; j > 0; j /= 2) {
+        barrier(CLK_LOCAL_MEM_FENCE);
+        if (local_id < j) {
+            local_cache[local_id] += local_cache[local_id + j];
+        }
+    }
+    if (!local_id) {
+        vstore2(local_cache[0], 0, partial_sums);
     }
 }
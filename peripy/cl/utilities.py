@@ -25,6 +25,25 @@ def double_fp_support(device):
     return device.get_info(cl.device_info.DOUBLE_FP_CONFIG) & DOUBLE_FP_SUPPORT
 
 
+def subgroup_support(device):
+    """
+    Test whether a device supports sub-group functions.
+
+    Sub-groups are supported by devices with the `cl_khr_subgroups`
+    extension and are core in OpenCL 2.1 and 2.2.
+
+    :arg device: The OpenCL device to test.
+    :type device: :class:`pyopencl._cl.Device`
+
+    :returns: `True` if the device supports sub-group functions, `False`
+        otherwise.
+    :rtype: `bool`
+    """
+    if "cl_khr_subgroups" in device.extensions.split():
+        return True
+    return device.version.split()[1] in ("2.1", "2.2")
+
+
 def get_context():
     """
     Find an appropriate OpenCL context.
@@ -44,6 +63,48 @@ def get_context():
     return None
 
 
+def get_contexts(ndevices=None):
+    """
+    Find an OpenCL context on each of several devices of the machine.
+
+    This function looks for the devices with support for double
+    floating-point precision, GPU devices first. If there are fewer than
+    `ndevices` such devices, a device which supports device fission is
+    partitioned into `ndevices` sub-devices with equal numbers of compute
+    units, e.g. to run one partition of a model on each group of cores of a
+    CPU.
+
+    :arg int ndevices: The number of devices. Default is None, which returns
+        a context on every suitable device.
+
+    :returns: A list of contexts with a single suitable device each, which
+        is empty if no suitable device is found.
+    :rtype: list(:class:`pyopencl._cl.Context`)
+    """
+    devices = []
+    for device_type in [cl.device_type.GPU, cl.device_type.ALL]:
+        for platform in cl.get_platforms():
+            for device in platform.get_devices(device_type):
+                if double_fp_support(device) and device not in devices:
+                    devices.append(device)
+    if ndevices is None:
+        ndevices = len(devices)
+    if len(devices) < ndevices:
+        for device in devices:
+            if (cl.device_partition_property.EQUALLY
+                    in device.partition_properties
+                    and device.partition_max_sub_devices >= ndevices):
+                devices = device.create_sub_devices([
+                    cl.device_partition_property.EQUALLY,
+                    device.max_compute_units // ndevices])
+                break
+        else:
+            raise ValueError("ndevices must be at most the number of "
+                             "suitable devices (expected at most {}, got "
+                             "{})".format(len(devices), ndevices))
+    return [cl.Context([device]) for device in devices[:ndevices]]
+
+
 def output_device_info(device_id):
     """Output the device info of the device."""
     sys.stdout.write("Device is ")
@@ -1,15 +1,26 @@
 #pragma OPENCL EXTENSION cl_khr_fp64 : enable
 
+/* The degrees of freedom of each sample of an ensemble. If NNODES is defined,
+ * they do not depend on the size of the launch, so that the kernel may be
+ * launched over a range of nodes with a global offset. */
+#ifdef VECTOR_LAYOUT
+#define STRIDE 4
+#else
+#define STRIDE 3
+#endif
+#ifdef NNODES
+#define SAMPLE_DOFS (STRIDE * NNODES)
+#else
+#define SAMPLE_DOFS ((int) get_global_size(0))
+#endif
+
 __kernel void
 	update_displacement(
         __global double const* force,
         __global double* u,
         __global double* ud,
         __global double* udd,
-        __global int const* bc_types,
-		__global double const* bc_values,
-        __global double const* densities,
-        double bc_scale,
+        __global double const* inverse_densities,
         double damping,
         double dt
 	){
@@ -20,17 +31,32 @@ __kernel void
      * u - An (n,3) array of the current displacements of each node.
      * ud - An (n,3) array of the current velocities of each node.
      * udd - An (n,3) array of the accelerations of each node.
-     * bc_types - An (n,3) array of the boundary condition types.
-     * bc_values - An (n,3) array of the boundary condition values applied to the nodes.
-     * densties - An (n,3) array of the density values of the nodes.
-     * bc_scale - The scalar value applied to the displacement BCs.
+     * inverse_densities - An (n,) array of the reciprocal of the density
+     *     of each node.
      * damping - The dynamic relaxation damping constant in [kg/(m^3 s)].
-     * dt - The time step in [s]. */
+     * dt - The time step in [s].
+     *
+     * If VECTOR_LAYOUT is defined, the state arrays are padded to (n,4).
+     *
+     * For an ensemble, the second dimension of the NDRange is the sample and
+     * force, u, ud and udd are (nsamples, n, 3) arrays. */
 	const int i = get_global_id(0);
+    // k is the degree of freedom of the sample
+    const int k = get_global_id(1) * SAMPLE_DOFS + i;
+#ifdef VECTOR_LAYOUT
+    // The state arrays are padded to four components per node
+    if (i % 4 == 3) {
+        return;
+    }
+    // n is the node of the degree of freedom
+    const int n = i / 4;
+#else
+    const int n = i / 3;
+#endif
 
-    double const ud1 = ud[i] + (dt / 2) * udd[i]; // Half-step velocity
-    double const udd1 = (force[i] - damping * ud1) / densities[i];
-    ud[i] = ud1 + (dt / 2) * udd1; // Full-step velocity
-    udd[i] = udd1;
-    u[i] = (bc_types[i] == 0 ? (u[i] + dt * (ud[i] + (dt / 2) * udd1)) : (bc_scale * bc_values[i]));
+    double const ud1 = ud[k] + (dt / 2) * udd[k]; // Half-step velocity
+    double const udd1 = (force[k] - damping * ud1) * inverse_densities[n];
+    ud[k] = ud1 + (dt / 2) * udd1; // Full-step velocity
+    udd[k] = udd1;
+    u[k] += dt * (ud[k] + (dt / 2) * udd1);
 }
@@ -0,0 +1,541 @@
+"""Decompose a model into partitions integrated on several devices."""
+from .cl import get_contexts
+from .integrators import Euler, EulerCromer, Integrator
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pyopencl as cl
+
+
+def recursive_coordinate_bisection(coords, nparts):
+    """
+    Partition the nodes of a model by recursive coordinate bisection.
+
+    The nodes are split in two along the axis of their largest extent, in
+    proportion to the number of partitions on each side, and each half is
+    split again until there are `nparts` partitions. The partitions are
+    compact and have equal numbers of nodes, to within one node, so that
+    few bonds cross between partitions.
+
+    :arg coords: The (nnodes, 3) coordinates of the nodes.
+    :type coords: :class:`numpy.ndarray`
+    :arg int nparts: The number of partitions.
+
+    :returns: The (nnodes,) partition of each node.
+    :rtype: :class:`numpy.ndarray`
+    """
+    nnodes = np.shape(coords)[0]
+    if int(nparts) != nparts or nparts < 1 or nparts > nnodes:
+        raise ValueError("nparts must be a positive integer of at most the "
+                         "number of nodes (expected at most {}, got "
+                         "{})".format(nnodes, nparts))
+    parts = np.empty(nnodes, dtype=np.intc)
+
+    def bisect(nodes, first, nparts):
+        if nparts == 1:
+            parts[nodes] = first
+            return
+        axis = np.argmax(np.ptp(coords[nodes], axis=0))
+        nleft = nparts // 2
+        split = len(nodes) * nleft // nparts
+        order = np.argsort(coords[nodes, axis], kind="stable")
+        bisect(nodes[order[:split]], first, nleft)
+        bisect(nodes[order[split:]], first + nleft, nparts - nleft)
+
+    bisect(np.arange(nnodes), 0, int(nparts))
+    return parts
+
+
+class Partition(object):
+    """
+    The owned and ghost nodes of one partition of a model.
+
+    The nodes of the partition are numbered locally, with the owned nodes
+    first and the ghost nodes, the neighbours of the owned nodes which are
+    owned by other partitions, last. The owned nodes which are the ghost
+    nodes of other partitions, the boundary nodes, are numbered before the
+    interior nodes, so that the displacements exchanged each time-step are
+    contiguous on the device.
+    """
+
+    def __init__(self, parts, nlist, part):
+        """
+        Create a :class:`Partition` object.
+
+        :arg parts: The (nnodes,) partition of each node.
+        :type parts: :class:`numpy.ndarray`
+        :arg nlist: The (nnodes, max_neighbours) neighbour list of the
+            model, in which every bond is listed by both of its nodes.
+        :type nlist: :class:`numpy.ndarray`
+        :arg int part: The partition.
+
+        :returns: A :class:`Partition` object
+        """
+        owned = np.flatnonzero(parts == part)
+        neighbours = nlist[owned]
+        remote = (neighbours != -1) & (parts[neighbours] != part)
+        boundary = np.any(remote, axis=1)
+        ghosts = np.unique(neighbours[remote])
+
+        #: The global number of each local node
+        self.nodes = np.concatenate(
+            [owned[boundary], owned[~boundary], ghosts]).astype(np.intc)
+        self.nowned = len(owned)
+        self.nboundary = int(np.sum(boundary))
+        self.nnodes = len(self.nodes)
+        #: The global number of each ghost node
+        self.ghosts = self.nodes[self.nowned:]
+        #: The local number of each node of the model, -1 if the node is not
+        #: in the partition
+        self.local = np.full(np.shape(nlist)[0], -1, dtype=np.intc)
+        self.local[self.nodes] = np.arange(self.nnodes, dtype=np.intc)
+
+    def rows(self, array, owned=False):
+        """
+        Return the rows of the local nodes of an array of the model.
+
+        :arg array: The (nnodes, ...) array of the model.
+        :type array: :class:`numpy.ndarray`
+        :arg bool owned: Whether the rows of the ghost nodes are zeroed, for
+            the arrays of bonds and boundary conditions which only the owner
+            of a node applies. Default is False.
+
+        :returns: The (nnodes, ...) array of the partition.
+        :rtype: :class:`numpy.ndarray`
+        """
+        rows = np.array(array[self.nodes])
+        if owned:
+            rows[self.nowned:] = 0
+        return rows
+
+    def neighbours(self, nlist):
+        """
+        Return the neighbour list of the partition.
+
+        :arg nlist: The (nnodes, max_neighbours) neighbour list of the model.
+        :type nlist: :class:`numpy.ndarray`
+
+        :returns: The neighbour list of the owned nodes in the local
+            numbering. The ghost nodes have no bonds.
+        :rtype: :class:`numpy.ndarray`
+        """
+        rows = self.rows(nlist)
+        local = np.where(rows == -1, -1, self.local[rows]).astype(np.intc)
+        local[self.nowned:] = -1
+        return local
+
+
+def _check_integrator(integrator):
+    """Raise an exception if integrator is not an OpenCL integrator."""
+    if (not issubclass(integrator, Integrator)
+            or issubclass(integrator, (Euler, EulerCromer))):
+        raise ValueError("integrator must be an OpenCL integrator "
+                         "(got {})".format(integrator))
+
+
+class DecomposedCL(Integrator):
+    """
+    Integrate a model on several OpenCL devices of the same machine.
+
+    The nodes are partitioned by :func:`recursive_coordinate_bisection`, and
+    each partition is integrated by its own OpenCL integrator on one of the
+    devices. Each integrator calculates the bond forces and updates the
+    displacements of its owned nodes, and reads the displacements of the
+    ghost nodes, its neighbours in other partitions, from a halo which is
+    exchanged between the devices every time-step. The devices step
+    concurrently. Each device integrates its boundary nodes, the ghost nodes
+    of other partitions, first, and copies their displacements to the halo
+    with a second command queue while it integrates its interior nodes.
+    Integrators which cannot split a time-step, such as
+    :class:`peripy.integrators.AdaptiveDynamicRelaxationCL`, copy the
+    displacements after the whole step.
+
+    Ensembles are not supported.
+    """
+
+    def __init__(self, integrator, *args, contexts=None, **kwargs):
+        """
+        Create a :class:`DecomposedCL` integrator object.
+
+        :arg integrator: The OpenCL integrator of each partition, e.g.
+            :class:`peripy.integrators.EulerCromerCL`.
+        :type integrator: type
+        :arg args: The arguments of the integrator, e.g. `damping` and `dt`.
+        :arg contexts: The context of each partition, which may share
+            devices. Default is None, which uses a context on each device of
+            the machine, as returned by :func:`peripy.cl.get_contexts`.
+        :type contexts: list(:class:`pyopencl._cl.Context`) or NoneType
+        :arg kwargs: The keyword arguments of the integrator, e.g.
+            `bond_geometry`, which are applied to every partition.
+
+        :returns: A :class:`DecomposedCL` object
+        """
+        _check_integrator(integrator)
+        if contexts is None:
+            contexts = get_contexts()
+        if not contexts:
+            raise ValueError("contexts must contain at least one context "
+                             "(got {})".format(contexts))
+        self.integrators = [
+            integrator(*args, context=context, **kwargs)
+            for context in contexts]
+        self.nparts = len(self.integrators)
+        # The partitions integrated by this process
+        self.local_parts = list(range(self.nparts))
+        self.dt = self.integrators[0].dt
+        self.context = self.integrators[0].context
+        self.bond_events = self.integrators[0].bond_events
+        self.partitions = None
+        # Dimensions of the model, set by plan_memory
+        self._memory_args = None
+        self._executor = ThreadPoolExecutor(max_workers=self.nparts)
+
+    @property
+    def step(self):
+        """The number of the last time-step of the simulation."""
+        return self.integrators[0].step
+
+    @step.setter
+    def step(self, step):
+        for integrator in self.integrators:
+            integrator.step = step
+
+    def __call__(self, displacement_bc_magnitude, force_bc_magnitude):
+        """
+        Conduct one iteration of the integrator.
+
+        :arg float displacement_bc_magnitude: the magnitude applied to the
+             displacement boundary conditions for the current time-step.
+        :arg float force_bc_magnitude: the magnitude applied to the force
+            boundary conditions for the current time-step.
+        """
+        list(self._executor.map(
+            lambda part: self._step(
+                part, displacement_bc_magnitude, force_bc_magnitude),
+            range(self.nparts)))
+        # The halo is complete once every partition has stepped
+        list(self._executor.map(
+            lambda part: self._write_ghosts(
+                part, self._halo[self.partitions[part].ghosts]),
+            range(self.nparts)))
+
+    def _step(self, part, displacement_bc_magnitude, force_bc_magnitude):
+        """
+        Conduct one iteration of the integrator of a partition.
+
+        The displacements of the boundary nodes are copied to the halo while
+        the interior nodes are integrated.
+
+        :arg int part: The partition.
+        :arg float displacement_bc_magnitude: the magnitude applied to the
+             displacement boundary conditions for the current time-step.
+        :arg float force_bc_magnitude: the magnitude applied to the force
+            boundary conditions for the current time-step.
+        """
+        partition = self.partitions[part]
+        split = self._step_boundary(
+            part, displacement_bc_magnitude, force_bc_magnitude)
+        if not partition.nboundary:
+            return
+        boundary, event = self._read_boundary(part)
+        self._step_interior(
+            part, split, displacement_bc_magnitude, force_bc_magnitude)
+        event.wait()
+        # The partitions write disjoint rows of the halo
+        self._halo[partition.nodes[:partition.nboundary]] = boundary
+
+    def _split(self, part):
+        """
+        Return the node at which the time-step of a partition is split.
+
+        The time-step is split at the first work group of the bond_force
+        kernel after the boundary nodes, which are numbered first.
+
+        :arg int part: The index of the partition in :attr:`partitions`.
+
+        :returns: The node, or None if the partition has no boundary nodes
+            or its integrator cannot split a time-step.
+        :rtype: int or NoneType
+        """
+        integrator = self.integrators[part]
+        nboundary = self.partitions[part].nboundary
+        if not nboundary or not integrator._split_steps:
+            return None
+        nodes_per_group = integrator.work_group_layout[0]
+        return min(-(-nboundary // nodes_per_group) * nodes_per_group,
+                   integrator.nnodes)
+
+    def _step_boundary(
+            self, part, displacement_bc_magnitude, force_bc_magnitude):
+        """
+        Integrate the boundary nodes of a partition.
+
+        The time-step is completed by :meth:`DecomposedCL._step_interior`.
+        If the time-step is not split, every node is integrated.
+
+        :arg int part: The index of the partition in :attr:`partitions`.
+        :arg float displacement_bc_magnitude: the magnitude applied to the
+             displacement boundary conditions for the current time-step.
+        :arg float force_bc_magnitude: the magnitude applied to the force
+            boundary conditions for the current time-step.
+
+        :returns: The node at which the time-step is split, see
+            :meth:`DecomposedCL._split`.
+        :rtype: int or NoneType
+        """
+        integrator = self.integrators[part]
+        split = self._split(part)
+        if split is None:
+            integrator(displacement_bc_magnitude, force_bc_magnitude)
+        else:
+            integrator(displacement_bc_magnitude, force_bc_magnitude,
+                       nodes=(0, split))
+        return split
+
+    def _step_interior(
+            self, part, split, displacement_bc_magnitude, force_bc_magnitude):
+        """
+        Integrate the interior nodes of a partition.
+
+        :arg int part: The index of the partition in :attr:`partitions`.
+        :arg split: The node at which the time-step is split, as returned by
+            :meth:`DecomposedCL._step_boundary`.
+        :type split: int or NoneType
+        :arg float displacement_bc_magnitude: the magnitude applied to the
+             displacement boundary conditions for the current time-step.
+        :arg float force_bc_magnitude: the magnitude applied to the force
+            boundary conditions for the current time-step.
+        """
+        integrator = self.integrators[part]
+        if split is not None and split < integrator.nnodes:
+            integrator(displacement_bc_magnitude, force_bc_magnitude,
+                       nodes=(split, integrator.nnodes))
+
+    def _read_boundary(self, part):
+        """
+        Start to copy the displacements of the boundary nodes to host.
+
+        The copy is enqueued on a second command queue of the device of the
+        partition, so that it overlaps with the kernels of the interior
+        nodes, which do not write the boundary nodes.
+
+        :arg int part: The index of the partition in :attr:`partitions`.
+
+        :returns: The (nboundary, degrees_freedom) displacements, which are
+            copied once the event of the copy is complete, and the event.
+        :rtype: tuple(:class:`numpy.ndarray`, :class:`pyopencl.Event`)
+        """
+        integrator = self.integrators[part]
+        boundary = np.empty(
+            (self.partitions[part].nboundary, integrator.stride),
+            dtype=np.float64)
+        event = cl.enqueue_copy(
+            self._queues[part], boundary, integrator.u_d, is_blocking=False)
+        return boundary[:, :self.degrees_freedom], event
+
+    def _write_ghosts(self, part, ghosts):
+        """
+        Copy the displacements of the ghost nodes of a partition to device.
+
+        :arg int part: The index of the partition in :attr:`partitions`.
+        :arg ghosts: The (nghosts, degrees_freedom) displacements.
+        :type ghosts: :class:`numpy.ndarray`
+        """
+        if not len(ghosts):
+            return
+        integrator = self.integrators[part]
+        ghosts = integrator._pad(ghosts)
+        cl.enqueue_copy(
+            integrator.queue, integrator.u_d, ghosts,
+            dst_offset=self.partitions[part].nowned * ghosts[0].nbytes)
+
+    def _build_special(self):
+        """Build OpenCL kernels special to the integrator of a partition."""
+        # They are built by the integrator of each partition
+
+    def _create_special_buffers(self):
+        """Create buffers special to the integrator of a partition."""
+        # They are created by the integrator of each partition
+
+    def plan_memory(
+            self, nnodes, degrees_freedom, max_neighbours, nbond_types,
+            nregimes, nlist, stiffness_corrections=False, bond_types=None,
+            densities=False):
+        """
+        Keep the dimensions of the model to plan the memory of each device.
+
+        The nodes are not partitioned until :meth:`DecomposedCL.build`, so
+        the memory of each partition is planned there, as by
+        :meth:`peripy.integrators.Integrator.plan_memory`. The arguments are
+        the same.
+
+        :returns: None
+        :rtype: NoneType
+        """
+        self._memory_args = {
+            "degrees_freedom": degrees_freedom,
+            "max_neighbours": max_neighbours, "nbond_types": nbond_types,
+            "nregimes": nregimes, "nlist": nlist,
+            "stiffness_corrections": stiffness_corrections,
+            "bond_types": bond_types, "densities": densities}
+
+    def build(
+            self, nnodes, degrees_freedom, max_neighbours, coords, volume,
+            family, bc_types, bc_values, force_bc_types, force_bc_values,
+            stiffness_corrections, bond_types, densities):
+        """
+        Partition the model and build the integrator of each partition.
+
+        The partitions are found from the neighbour list of the model, which
+        is given to :meth:`DecomposedCL.plan_memory`.
+        """
+        if self._memory_args is None:
+            raise ValueError("plan_memory must be called before build "
+                             "(got {})".format(self._memory_args))
+        memory_args = dict(self._memory_args)
+        nlist = memory_args.pop("nlist")
+        self.nnodes = nnodes
+        self.degrees_freedom = degrees_freedom
+        self.max_neighbours = max_neighbours
+        parts = self._parts(coords)
+        self.partitions = [
+            Partition(parts, nlist, part) for part in self.local_parts]
+
+        for integrator, partition in zip(self.integrators, self.partitions):
+            integrator.plan_memory(
+                partition.nnodes, nlist=partition.neighbours(nlist),
+                **memory_args)
+            integrator.build(
+                partition.nnodes, degrees_freedom, max_neighbours,
+                partition.rows(coords), partition.rows(volume),
+                partition.rows(family), partition.rows(bc_types, True),
+                partition.rows(bc_values, True),
+                partition.rows(force_bc_types, True),
+                partition.rows(force_bc_values, True),
+                None if stiffness_corrections is None else partition.rows(
+                    stiffness_corrections, True),
+                None if bond_types is None else partition.rows(
+                    bond_types, True),
+                None if densities is None else partition.rows(densities))
+        # The command queues of the copies of the boundary nodes
+        self._queues = [
+            cl.CommandQueue(integrator.context, integrator.queue.device)
+            for integrator in self.integrators]
+        self._build_exchange(parts, nlist)
+
+    def _parts(self, coords):
+        """
+        Partition the nodes of the model.
+
+        :arg coords: The (nnodes, 3) coordinates of the nodes of the model.
+        :type coords: :class:`numpy.ndarray`
+
+        :returns: The (nnodes,) partition of each node, as returned by
+            :func:`recursive_coordinate_bisection`.
+        :rtype: :class:`numpy.ndarray`
+        """
+        return recursive_coordinate_bisection(coords, self.nparts)
+
+    def _build_exchange(self, parts, nlist):
+        """
+        Create the containers of the displacements exchanged each time-step.
+
+        :arg parts: The (nnodes,) partition of each node.
+        :type parts: :class:`numpy.ndarray`
+        :arg nlist: The neighbour list of the model.
+        :type nlist: :class:`numpy.ndarray`
+        """
+        # The displacements of the boundary nodes of every partition
+        self._halo = np.zeros(
+            (self.nnodes, self.degrees_freedom), dtype=np.float64)
+
+    def create_buffers(
+            self, nlist, n_neigh, bond_stiffness, critical_stretch, plus_cs, u,
+            ud, udd, force, body_force, damage, regimes, nregimes,
+            nbond_types, stiffness_corrections=None):
+        """
+        Initialise the OpenCL buffers of each partition.
+
+        The arguments are those of
+        :meth:`peripy.integrators.Integrator.create_buffers`, for the whole
+        model.
+        """
+        for integrator, partition in zip(self.integrators, self.partitions):
+            integrator.create_buffers(
+                partition.neighbours(nlist), partition.rows(n_neigh, True),
+                bond_stiffness, critical_stretch, plus_cs,
+                partition.rows(u), partition.rows(ud), partition.rows(udd),
+                partition.rows(force), partition.rows(body_force),
+                partition.rows(damage), partition.rows(regimes, True),
+                nregimes, nbond_types,
+                None if stiffness_corrections is None else partition.rows(
+                    stiffness_corrections, True))
+
+    def create_ensemble_buffers(self, *args, **kwargs):
+        """Raise an exception, ensembles are not supported."""
+        raise ValueError("ensembles are not supported by this integrator "
+                         "(got {})".format(type(self)))
+
+    def write(self, u, ud, udd, force, body_force, damage, nlist, n_neigh):
+        """
+        Copy the state variables of the owned nodes to host memory.
+
+        The neighbour lists are returned in the global numbering of the
+        nodes.
+        """
+        for integrator, partition in zip(self.integrators, self.partitions):
+            shape = (partition.nnodes, self.degrees_freedom)
+            (local_u, local_ud, local_udd, local_force, local_body_force,
+             local_damage, local_nlist, local_n_neigh) = integrator.write(
+                 np.empty(shape), np.empty(shape), np.empty(shape),
+                 np.empty(shape), np.empty(shape),
+                 np.empty(partition.nnodes),
+                 np.empty((partition.nnodes, self.max_neighbours),
+                          dtype=np.intc),
+                 np.empty(partition.nnodes, dtype=np.intc))
+            owned = partition.nodes[:partition.nowned]
+            for array, local in [
+                    (u, local_u), (ud, local_ud), (udd, local_udd),
+                    (force, local_force), (body_force, local_body_force),
+                    (damage, local_damage), (n_neigh, local_n_neigh)]:
+                array[owned] = local[:partition.nowned]
+            local_nlist = local_nlist[:partition.nowned]
+            nlist[owned] = np.where(
+                local_nlist == -1, -1, partition.nodes[local_nlist])
+        return (u, ud, udd, force, body_force, damage, nlist, n_neigh)
+
+    def _residual_sums(self, nnodes=None):
+        """
+        Reduce the sums of squares of the forces and velocities.
+
+        The sums of each partition are over its owned nodes.
+
+        :returns: The (2,) sums of squares of the forces and of the
+            velocities of the degrees of freedom without a displacement
+            boundary condition.
+        :rtype: :class:`numpy.ndarray`
+        """
+        return sum(
+            integrator._residual_sums(partition.nowned)
+            for integrator, partition in zip(
+                self.integrators, self.partitions))
+
+    def read_bond_events(self):
+        """
+        Copy the bonds broken since the last read from each device.
+
+        :returns: The events of every partition, as returned by
+            :meth:`peripy.integrators.Integrator.read_bond_events`, in the
+            global numbering of the nodes and in the order of the steps at
+            which the bonds broke.
+        :rtype: tuple(:class:`numpy.ndarray`, :class:`numpy.ndarray`,
+            :class:`numpy.ndarray`)
+        """
+        events = [integrator.read_bond_events()
+                  for integrator in self.integrators]
+        nodes = np.concatenate([
+            partition.nodes[bonds] for partition, (bonds, _, _) in zip(
+                self.partitions, events)]).reshape(-1, 2)
+        steps = np.concatenate([event[1] for event in events])
+        stretches = np.concatenate([event[2] for event in events])
+        order = np.argsort(steps, kind="stable")
+        return nodes[order], steps[order], stretches[order]
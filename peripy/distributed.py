@@ -0,0 +1,272 @@
+"""Distribute a model over the processes of an MPI communicator."""
+from .cl import get_contexts
+from .decomposition import DecomposedCL, recursive_coordinate_bisection
+from .integrators import ContextError
+import numpy as np
+import sklearn.neighbors as neighbors
+try:
+    from mpi4py import MPI
+except ImportError:
+    MPI = None
+
+
+class DistributedCL(DecomposedCL):
+    """
+    Integrate a model on the processes of an MPI communicator.
+
+    Each process, or rank, builds and integrates one partition of the model,
+    as found by :func:`peripy.decomposition.recursive_coordinate_bisection`
+    of the coordinates of the mesh, with its own OpenCL integrator. The
+    nodes are partitioned by :meth:`DistributedCL.partition` before the
+    :class:`peripy.model.Model` builds them, and the model of a rank has
+    only the nodes it owns and the nodes within the horizon of them, or
+    twice the horizon with surface corrections. The neighbour list, the
+    stiffness corrections and the bond types, and so the host and device
+    memory of a model, are divided between the ranks. Only the mesh is read
+    by every rank.
+
+    The nodes of the model of a rank are numbered locally, in the global
+    order. :attr:`peripy.model.Model.nodes` is the global number of each
+    node and :attr:`peripy.model.Model.owned` is whether the rank owns it.
+    The arrays given to and returned by :meth:`peripy.model.Model.simulate`
+    are those of the nodes of the model of the rank, of which only the rows
+    of the owned nodes are integrated, and the neighbour lists are in the
+    local numbering. The histories of the
+    tips and of the model are summed over the ranks, so that every rank
+    returns the same data. When the state is written, the owned nodes of
+    every rank are gathered to rank 0 only, which writes the mesh files.
+    The broken bonds are gathered to rank 0 in the global numbering, and the
+    other ranks return their own. The `family`, `connectivity`,
+    `stiffness_corrections` and `bond_types` arguments of the model are not
+    supported, and only the volume is written to its `write_path`.
+
+    The displacements of the boundary nodes are exchanged with the ranks of
+    the neighbouring partitions by non-blocking point-to-point messages
+    every time-step. The receives are posted before the step, so that the
+    messages of faster ranks arrive while a rank is computing. The boundary
+    nodes are integrated first, so that their displacements are sent while
+    the interior nodes are integrated.
+
+    A script that simulates a model with a :class:`DistributedCL`
+    integrator is run on several processes by e.g.
+    ``mpirun -n 4 python script.py``. It requires mpi4py.
+
+    Ensembles are not supported.
+    """
+
+    def __init__(self, integrator, *args, comm=None, context=None, **kwargs):
+        """
+        Create a :class:`DistributedCL` integrator object.
+
+        :arg integrator: The OpenCL integrator of the partition of this rank,
+            e.g. :class:`peripy.integrators.EulerCromerCL`.
+        :type integrator: type
+        :arg args: The arguments of the integrator, e.g. `damping` and `dt`.
+        :arg comm: The communicator of the ranks. Default is None, which is
+            `MPI.COMM_WORLD`.
+        :type comm: :class:`mpi4py.MPI.Comm` or NoneType
+        :arg context: The context of this rank. Default is None, which
+            spreads the ranks on each machine over its devices, as returned
+            by :func:`peripy.cl.get_contexts`.
+        :type context: :class:`pyopencl._cl.Context` or NoneType
+        :arg kwargs: The keyword arguments of the integrator, e.g.
+            `bond_geometry`.
+
+        :returns: A :class:`DistributedCL` object
+        """
+        if MPI is None:
+            raise ImportError("mpi4py is required by DistributedCL")
+        if comm is None:
+            comm = MPI.COMM_WORLD
+        if context is None:
+            contexts = get_contexts()
+            if not contexts:
+                raise ContextError
+            local_rank = comm.Split_type(MPI.COMM_TYPE_SHARED).Get_rank()
+            context = contexts[local_rank % len(contexts)]
+        super().__init__(integrator, *args, contexts=[context], **kwargs)
+        self.comm = comm
+        self.rank = comm.Get_rank()
+        self.nparts = comm.Get_size()
+        self.local_parts = [self.rank]
+        self.root = self.rank == 0
+        # The partition of the model, set by partition
+        self._parts_of_nodes = None
+
+    def __call__(self, displacement_bc_magnitude, force_bc_magnitude):
+        """
+        Conduct one iteration of the integrator.
+
+        :arg float displacement_bc_magnitude: the magnitude applied to the
+             displacement boundary conditions for the current time-step.
+        :arg float force_bc_magnitude: the magnitude applied to the force
+            boundary conditions for the current time-step.
+        """
+        requests = [
+            self.comm.Irecv(buffer, source=rank)
+            for (rank, _), buffer in zip(self._receives, self._received)]
+        split = self._step_boundary(
+            0, displacement_bc_magnitude, force_bc_magnitude)
+        if self._sends:
+            boundary, event = self._read_boundary(0)
+            event.wait()
+            sent = [np.ascontiguousarray(boundary[rows])
+                    for _, rows in self._sends]
+            requests += [
+                self.comm.Isend(buffer, dest=rank)
+                for (rank, _), buffer in zip(self._sends, sent)]
+        self._step_interior(
+            0, split, displacement_bc_magnitude, force_bc_magnitude)
+        MPI.Request.Waitall(requests)
+        for (_, rows), buffer in zip(self._receives, self._received):
+            self._ghosts[rows] = buffer
+        self._write_ghosts(0, self._ghosts)
+
+    def partition(self, coords, radius):
+        """
+        Return the nodes of the model which are built by this rank.
+
+        The nodes are partitioned by
+        :func:`peripy.decomposition.recursive_coordinate_bisection` of their
+        coordinates, and a rank builds the nodes of its partition and the
+        nodes within `radius` of them.
+
+        :arg coords: The (nnodes, 3) coordinates of every node of the model.
+        :type coords: :class:`numpy.ndarray`
+        :arg float radius: The distance from the owned nodes within which
+            nodes are built.
+
+        :returns: The global number of each node built by this rank, in
+            the global order, and whether this rank owns each of them.
+        :rtype: tuple(:class:`numpy.ndarray`, :class:`numpy.ndarray`)
+        """
+        parts = recursive_coordinate_bisection(coords, self.nparts)
+        tree = neighbors.KDTree(coords, leaf_size=160)
+        # The owned nodes are within the radius of themselves
+        self._nodes = np.unique(np.concatenate(tree.query_radius(
+            coords[parts == self.rank], r=radius))).astype(np.intc)
+        self._parts_of_nodes = parts[self._nodes]
+        self._owned = self._parts_of_nodes == self.rank
+        if self.root:
+            # The owned nodes of every rank, in the order they are gathered
+            self._order = np.argsort(parts, kind="stable")
+            self._counts = np.bincount(parts, minlength=self.nparts)
+        return self._nodes, self._owned
+
+    def _parts(self, coords):
+        """
+        Return the partition of each node of the model of this rank.
+
+        :arg coords: The (nnodes, 3) coordinates of the nodes of the model
+            of this rank.
+        :type coords: :class:`numpy.ndarray`
+
+        :returns: The (nnodes,) partition of each node, as found by
+            :meth:`DistributedCL.partition`.
+        :rtype: :class:`numpy.ndarray`
+        """
+        if self._parts_of_nodes is None:
+            raise ValueError("partition must be called before build "
+                             "(got {})".format(self._parts_of_nodes))
+        return self._parts_of_nodes
+
+    def _build_exchange(self, parts, nlist):
+        """
+        Create the lists of the nodes exchanged with the other ranks.
+
+        Both lists of a pair of ranks are in the global order of the nodes,
+        as the nodes of the model of every rank are, so that the messages
+        need no indices.
+
+        :arg parts: The (nnodes,) partition of each node of the model of
+            this rank.
+        :type parts: :class:`numpy.ndarray`
+        :arg nlist: The neighbour list of the model of this rank.
+        :type nlist: :class:`numpy.ndarray`
+        """
+        partition = self.partitions[0]
+        owners = parts[partition.ghosts]
+        boundary = nlist[partition.nodes[:partition.nboundary]]
+        # The ranks and rows of the ghost nodes received from each rank, and
+        # of the boundary nodes sent to each rank, which are the same ranks
+        self._receives = []
+        self._sends = []
+        for rank in np.unique(owners):
+            self._receives.append((int(rank), np.flatnonzero(owners == rank)))
+            self._sends.append((int(rank), np.flatnonzero(np.any(
+                (boundary != -1) & (parts[boundary] == rank), axis=1))))
+        self._received = [
+            np.empty((len(rows), self.degrees_freedom), dtype=np.float64)
+            for _, rows in self._receives]
+        self._ghosts = np.empty(
+            (len(partition.ghosts), self.degrees_freedom), dtype=np.float64)
+
+    def allgather(self, value):
+        """
+        Gather a value from every rank.
+
+        :arg value: The value of this rank.
+
+        :returns: The value of each rank.
+        :rtype: list
+        """
+        return self.comm.allgather(value)
+
+    def gather(self, array):
+        """
+        Gather the rows of the owned nodes of an array to rank 0.
+
+        :arg array: The (nnodes, ...) array of the nodes of the model of
+            this rank.
+        :type array: :class:`numpy.ndarray`
+
+        :returns: The array of every node of the model, in the global
+            numbering of the nodes, on rank 0 and None on the other ranks.
+        :rtype: :class:`numpy.ndarray` or NoneType
+        """
+        rows = np.ascontiguousarray(array[self._owned])
+        if not self.root:
+            self.comm.Gatherv(rows, None, root=0)
+            return None
+        shape = (len(self._order),) + np.shape(array)[1:]
+        gathered = np.empty(shape, dtype=rows.dtype)
+        size = int(np.prod(shape[1:], dtype=int))
+        self.comm.Gatherv(rows, [gathered, self._counts * size], root=0)
+        nodes = np.empty_like(gathered)
+        nodes[self._order] = gathered
+        return nodes
+
+    def _residual_sums(self, nnodes=None):
+        """
+        Reduce the sums of squares of the forces and velocities of every rank.
+
+        :returns: The (2,) sums of squares of the forces and of the
+            velocities of the degrees of freedom without a displacement
+            boundary condition.
+        :rtype: :class:`numpy.ndarray`
+        """
+        sums = np.empty(2, dtype=np.float64)
+        self.comm.Allreduce(super()._residual_sums(), sums)
+        return sums
+
+    def read_bond_events(self):
+        """
+        Copy the bonds broken since the last read from every rank to rank 0.
+
+        :returns: The events, as returned by
+            :meth:`peripy.integrators.Integrator.read_bond_events`, in the
+            global numbering of the nodes and in the order of the steps at
+            which the bonds broke. Rank 0 returns the events of every rank
+            and the other ranks return their own.
+        :rtype: tuple(:class:`numpy.ndarray`, :class:`numpy.ndarray`,
+            :class:`numpy.ndarray`)
+        """
+        nodes, steps, stretches = super().read_bond_events()
+        events = self.comm.gather(
+            (self._nodes[nodes], steps, stretches), root=0)
+        if not self.root:
+            return self._nodes[nodes], steps, stretches
+        nodes, steps, stretches = (
+            np.concatenate(arrays) for arrays in zip(*events))
+        order = np.argsort(steps, kind="stable")
+        return nodes[order], steps[order], stretches[order]
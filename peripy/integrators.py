@@ -1,11 +1,41 @@
 """Integrators."""
 from abc import ABC, abstractmethod
-from .cl import double_fp_support, get_context, output_device_info
+from .cl import (double_fp_support, get_context, output_device_info,
+                 subgroup_support)
 from pyopencl import mem_flags as mf
-from .peridynamics import damage, bond_force, update_displacement, break_bonds
+from .memory import DeviceMemoryError, fits, footprint
+from .tuning import TuningDatabase
+from .peridynamics import (
+    damage, bond_force, update_displacement, break_bonds, euler_step,
+    get_num_threads, bond_force4, update_displacement_euler_cromer,
+    update_displacement_velocity_verlet)
+import itertools
+import multiprocessing
+from multiprocessing import shared_memory
+import os
 import pyopencl as cl
 import pathlib
 import numpy as np
+import threading
+import time
+import warnings
+import weakref
+
+
+#: The number of work items up to which small families are packed into one
+#: work group of the bond_force and damage kernels.
+WORK_GROUP_SIZE = 128
+
+#: The number of time-steps timed for each configuration by the autotuner.
+TUNING_STEPS = 10
+
+#: The number of work items of each work group of the reductions over the
+#: degrees of freedom, at most the maximum work group size of the device.
+REDUCTION_SIZE = 256
+
+#: The value of a broken bond in neighbour lists of offsets, which are used
+#: by the `compact_metadata` argument.
+BROKEN_OFFSET = np.iinfo(np.int16).min
 
 
 class Integrator(ABC):
@@ -21,8 +51,21 @@ class Integrator(ABC):
     creates the OpenCL buffers which are special to the integrator.
     """
 
+    #: Whether this process writes the files of a model, which is False on
+    #: all but one of the processes of a distributed simulation
+    root = True
+
+    #: Whether a time-step can be split into consecutive ranges of nodes,
+    #: with the `nodes` argument of the call method, which
+    #: :class:`peripy.decomposition.DecomposedCL` uses to integrate the
+    #: boundary nodes of a partition first
+    _split_steps = True
+
     @abstractmethod
-    def __init__(self, dt, context=None):
+    def __init__(self, dt, context=None, bond_geometry=None,
+                 vector_layout=False, reduction=None, nodes_per_group=None,
+                 bonds_per_item=None, autotune=False, tuning_database=None,
+                 bond_events=None, compaction=None, compact_metadata=None):
         """
         Create an :class:`Integrator` object.
 
@@ -32,10 +75,114 @@ class Integrator(ABC):
         :arg context: Optional argument for the user to provide a context with
             a single suitable device, default is None.
         :type context: :class:`pyopencl._cl.Context` or NoneType
+        :arg str bond_geometry: Optional argument to precompute the reference
+            vector and length of each bond, which the bond_force kernels then
+            read sequentially instead of calculating them from the initial
+            coordinates of the nodes every time-step. "double" stores them in
+            double precision, "float" stores the vectors in single precision
+            to halve the memory traffic, at the cost of rounding the reference
+            geometry. Which is faster depends on the device. Default is None,
+            which calculates the reference geometry in the kernels.
+        :arg bool vector_layout: Optional argument to store the coordinates,
+            displacements, velocities, accelerations and forces on the device
+            padded to four components per node, so that the kernels read each
+            node with one aligned double4 load. The arrays are converted when
+            they are copied to and from the device. Default is False.
+        :arg str reduction: Optional argument to choose how the kernels
+            reduce the bond forces and the bond counts of each node. "tree"
+            reduces each force component in its own local cache, "vector"
+            reduces the components together in a single double4 local cache
+            with fewer barriers and "subgroup" reduces each sub-group with
+            sub-group functions before reducing the partial sums in local
+            memory. Default is None, which uses "subgroup" if the device
+            supports it and "vector" otherwise.
+        :arg int nodes_per_group: Optional argument to pack the families of
+            several nodes into each work group of the bond_force and damage
+            kernels, which are reduced as separate segments, a power of two.
+            Default is None, which packs small families into work groups of
+            up to :const:`WORK_GROUP_SIZE` work items.
+        :arg int bonds_per_item: Optional argument to calculate several bonds
+            of a family in each work item, which is a power of two. Default is
+            None, which only does so for families that are larger than the
+            device allows in one work group.
+        :arg bool autotune: Optional argument to choose the reduction, the
+            layout of the state arrays, whether to precompute the bond
+            geometry in double precision and whether to pack small families
+            by timing each configuration on the first simulation of a model,
+            in place of the `reduction`, `vector_layout`, `bond_geometry` and
+            `nodes_per_group` arguments. The fastest configuration is stored
+            in the tuning database and reused by subsequent runs. Default is
+            False.
+        :arg tuning_database: Optional argument to provide the tuning
+            database used by `autotune`. Default is None, which uses a
+            :class:`peripy.tuning.TuningDatabase` at the default path.
+        :type tuning_database: :class:`peripy.tuning.TuningDatabase` or
+            NoneType
+        :arg int bond_events: Optional argument to log the bonds broken by
+            the bond_force kernels in a ring buffer of `bond_events` events
+            on the device, which are read incrementally by
+            :meth:`Integrator.read_bond_events`. Default is None, which does
+            not log broken bonds.
+        :arg int compaction: Optional argument to compact the bond arrays
+            every `compaction` time-steps, which packs the unbroken bonds of
+            each node to the front of narrower bond arrays whenever the node
+            with the most unbroken bonds fits in half of the width, so that
+            fewer work items are launched for heavily damaged models.
+            Ensembles are not compacted. Default is None, which does not
+            compact the bond arrays.
+        :arg str compact_metadata: Optional argument to store the bond
+            metadata on the device in smaller types to reduce its memory
+            footprint. "int" stores the bond types and the regimes in the
+            smallest unsigned integer type that fits them, and the neighbour
+            lists as 16-bit offsets of each neighbour from its node, which
+            requires the neighbours of every node to be within 32767 nodes of
+            it, e.g. after the nodes are reordered. "float" also stores the
+            stiffness corrections in single precision, at the cost of
+            rounding them. Default is None, which stores the neighbour lists,
+            bond types and regimes as ints and the stiffness corrections as
+            doubles.
 
         :returns: A :class:`Integrator` object
         """
+        if bond_geometry not in (None, "double", "float"):
+            raise ValueError("bond_geometry must be None, 'double' or 'float' "
+                             "(got {})".format(bond_geometry))
+        if compact_metadata not in (None, "int", "float"):
+            raise ValueError("compact_metadata must be None, 'int' or 'float' "
+                             "(got {})".format(compact_metadata))
+        if reduction not in (None, "tree", "vector", "subgroup"):
+            raise ValueError("reduction must be None, 'tree', 'vector' or "
+                             "'subgroup' (got {})".format(reduction))
+        for name, value in [("nodes_per_group", nodes_per_group),
+                            ("bonds_per_item", bonds_per_item)]:
+            if value is not None and (
+                    int(value) != value or value < 1
+                    or int(value) & (int(value) - 1)):
+                raise ValueError("{} must be None or a power of two "
+                                 "(got {})".format(name, value))
+        for name, value in [("bond_events", bond_events),
+                            ("compaction", compaction)]:
+            if value is not None and (int(value) != value or value < 1):
+                raise ValueError("{} must be None or a positive integer "
+                                 "(got {})".format(name, value))
+        if reduction == "subgroup" and nodes_per_group not in (None, 1):
+            raise ValueError("nodes_per_group is not supported by the "
+                             "'subgroup' reduction (got {})".format(
+                                 nodes_per_group))
         self.dt = dt
+        self.bond_geometry = bond_geometry
+        self.vector_layout = vector_layout
+        self.nodes_per_group = nodes_per_group
+        self.bonds_per_item = bonds_per_item
+        self.autotune = autotune
+        self.bond_events = bond_events
+        self.compaction = compaction
+        self.compact_metadata = compact_metadata
+        # Dimensions of the model, set by plan_memory
+        self._memory_args = None
+        if autotune and tuning_database is None:
+            tuning_database = TuningDatabase()
+        self.tuning_database = tuning_database
 
         # Get an OpenCL context if none was provided
         if context is None:
@@ -55,6 +202,18 @@ class Integrator(ABC):
         # Print out device info
         output_device_info(self.context.devices[0])
 
+        # Choose the work group reduction supported by the device
+        if reduction is None:
+            if subgroup_support(self.context.devices[0]):
+                reduction = "subgroup"
+            else:
+                reduction = "vector"
+        elif (reduction == "subgroup"
+              and not subgroup_support(self.context.devices[0])):
+            raise ValueError("reduction 'subgroup' is not supported by "
+                             "device 0 of context")
+        self.reduction = reduction
+
         self.queue = cl.CommandQueue(self.context)
 
     @abstractmethod
@@ -81,6 +240,93 @@ class Integrator(ABC):
         This method should be implemented in every concrete integrator.
         """
 
+    def plan_memory(
+            self, nnodes, degrees_freedom, max_neighbours, nbond_types,
+            nregimes, nlist, stiffness_corrections=False, bond_types=None,
+            densities=False):
+        """
+        Choose a layout of the buffers that fits in the memory of the device.
+
+        The device memory of every buffer is calculated by
+        :func:`peripy.memory.footprint` before the integrator is built, so
+        that a model which does not fit fails before the rest of the model is
+        constructed. If the buffers do not fit in the global memory of the
+        device, or one is larger than the largest allocation of the device,
+        the options are changed in turn, with a warning, until they do: the
+        state arrays are not padded, the reference bond geometry is
+        calculated by the kernels, the bond metadata is stored in compact
+        types if the neighbours of every node are within 16-bit offsets of
+        it, and the stiffness corrections are stored in single precision.
+
+        :arg int nnodes: The number of nodes.
+        :arg int degrees_freedom: The number of degrees of freedom of each
+            node.
+        :arg int max_neighbours: The width of the bond arrays.
+        :arg int nbond_types: The number of bond types.
+        :arg int nregimes: The number of regimes of the damage model.
+        :arg nlist: The neighbour list of the model.
+        :type nlist: :class:`numpy.ndarray`
+        :arg bool stiffness_corrections: Whether the model has stiffness
+            corrections. Default is False.
+        :arg bool bond_types: Whether the model has a bond type array.
+            Default is None, which is True if there is more than one bond
+            type or regime.
+        :arg bool densities: Whether the model has densities. Default is
+            False.
+
+        :raises DeviceMemoryError: If the buffers do not fit in the memory of
+            the device in any layout.
+
+        :returns: The number of bytes of each buffer in the chosen layout.
+        :rtype: dict
+        """
+        device = self.context.devices[0]
+        self._memory_args = {
+            "nnodes": nnodes, "max_neighbours": max_neighbours,
+            "nbond_types": nbond_types, "nregimes": nregimes,
+            "degrees_freedom": degrees_freedom,
+            "stiffness_corrections": stiffness_corrections,
+            "bond_types": bond_types, "densities": densities}
+        changes = [("vector_layout", False), ("bond_geometry", None)]
+        nodes = np.arange(nnodes)[:, np.newaxis]
+        offsets = np.where(nlist == -1, 0, nlist - nodes)
+        if np.max(np.abs(offsets)) <= np.iinfo(np.int16).max:
+            changes += [("compact_metadata", "int"),
+                        ("compact_metadata", "float")]
+
+        buffers = self._footprint()
+        for name, value in changes:
+            if fits(buffers, device):
+                break
+            if (getattr(self, name) == value
+                    or (value == "int" and self.compact_metadata == "float")):
+                continue
+            warnings.warn(
+                "The buffers of the simulation do not fit in the memory of "
+                "the device ({} bytes), {} is set to {}".format(
+                    sum(buffers.values()), name, repr(value)))
+            setattr(self, name, value)
+            buffers = self._footprint()
+        if not fits(buffers, device):
+            raise DeviceMemoryError(buffers, device)
+        return buffers
+
+    def _footprint(self, **options):
+        """
+        Return the device memory of each buffer of a simulation.
+
+        :arg options: The options of the integrator which override its
+            attributes, e.g. a configuration of the autotuner.
+
+        :returns: The number of bytes of each buffer.
+        :rtype: dict
+        """
+        kwargs = dict(self._memory_args)
+        for name in ["bond_geometry", "vector_layout", "compact_metadata",
+                     "bond_events", "compaction"]:
+            kwargs[name] = options.get(name, getattr(self, name))
+        return footprint(**kwargs)
+
     def build(
             self, nnodes, degrees_freedom, max_neighbours, coords, volume,
             family, bc_types, bc_values, force_bc_types, force_bc_values,
@@ -92,25 +338,83 @@ class Integrator(ABC):
         buffers which are independent of
         :meth:`peripy.model.Model.simulate` parameters.
         """
+        # Kept to rebuild the programs in each configuration of the autotuner
+        self._build_args = (
+            nnodes, degrees_freedom, max_neighbours, coords, volume, family,
+            bc_types, bc_values, force_bc_types, force_bc_values,
+            stiffness_corrections, bond_types, densities)
+        self._tuned = not self.autotune
         self.nnodes = nnodes
         self.degrees_freedom = degrees_freedom
         self.max_neighbours = max_neighbours
         self.densities = densities
+        # Pool of buffers reused by each call of create_buffers
+        self._buffers = {}
+        # Number of samples simulated by each kernel launch
+        self.nsamples = 1
+        self.ensemble = False
 
         kernel_source = open(
             pathlib.Path(__file__).parent.absolute() /
             "cl/peridynamics.cl").read()
 
+        # Precomputed reference bond geometry
+        self.build_options = []
+        if self.bond_geometry is not None:
+            self.build_options.append("-D BOND_GEOMETRY")
+            if self.bond_geometry == "float":
+                self.build_options.append("-D BOND_GEOMETRY_FLOAT")
+        self.coords = coords
+        self._geometry_nlist = None
+        # Types of the bond metadata on the device
+        self._metadata_types(bond_types)
+        # Layout of the state arrays on the device, the number of doubles per
+        # node
+        if self.vector_layout:
+            self.build_options.append("-D VECTOR_LAYOUT")
+            self.stride = 4
+        else:
+            self.stride = degrees_freedom
+        # Reduction of the bond forces and bond counts of each work group
+        if self.reduction == "vector":
+            self.build_options.append("-D VECTOR_REDUCTION")
+        elif self.reduction == "subgroup":
+            self.build_options.append("-D SUBGROUP_REDUCTION")
+        # Layout of the work groups of the bond_force and damage kernels
+        nodes_per_group, bonds_per_item = self._work_groups(
+            nnodes, max_neighbours)
+        if nodes_per_group > 1:
+            self.build_options.append(
+                "-D NODES_PER_GROUP={}".format(nodes_per_group))
+        # The last work group may be partly past the last node, and the
+        # kernels may be launched over a range of nodes
+        self.build_options.append("-D NNODES={}".format(nnodes))
+        if bonds_per_item > 1:
+            self.build_options.append(
+                "-D BONDS_PER_ITEM={}".format(bonds_per_item))
+        self.work_group_layout = (nodes_per_group, bonds_per_item)
+
         # Build kernels
         self.program = cl.Program(
-            self.context, kernel_source).build()
+            self.context, kernel_source).build(options=self.build_options)
+
+        # Whether the model has stiffness corrections and bond types
+        self.shared_corrections = stiffness_corrections is not None
+        self.has_bond_types = bond_types is not None
+
+        if stiffness_corrections is not None:
+            stiffness_corrections = stiffness_corrections.astype(
+                self.correction_dtype)
+        if bond_types is not None:
+            bond_types = bond_types.astype(self.bond_type_dtype)
 
         # Build bond_force program
         if (stiffness_corrections is None) and (bond_types is None):
             self.bond_force_kernel = self.program.bond_force1
             # Placeholder buffers
-            stiffness_corrections = np.array([0], dtype=np.float64)
-            bond_types = np.array([0], dtype=np.intc)
+            stiffness_corrections = np.array(
+                [0], dtype=self.correction_dtype)
+            bond_types = np.array([0], dtype=self.bond_type_dtype)
             self.stiffness_corrections_d = cl.Buffer(
                 self.context, mf.READ_ONLY | mf.COPY_HOST_PTR,
                 hostbuf=stiffness_corrections)
@@ -123,7 +427,7 @@ class Integrator(ABC):
                 self.context, mf.READ_ONLY | mf.COPY_HOST_PTR,
                 hostbuf=stiffness_corrections)
             # Placeholder buffers
-            bond_types = np.array([0], dtype=np.intc)
+            bond_types = np.array([0], dtype=self.bond_type_dtype)
             self.bond_types_d = cl.Buffer(
                 self.context, mf.READ_ONLY | mf.COPY_HOST_PTR,
                 hostbuf=bond_types)
@@ -133,7 +437,8 @@ class Integrator(ABC):
                 self.context, mf.READ_ONLY | mf.COPY_HOST_PTR,
                 hostbuf=bond_types)
             # Placeholder buffers
-            stiffness_corrections = np.array([0], dtype=np.float64)
+            stiffness_corrections = np.array(
+                [0], dtype=self.correction_dtype)
             self.stiffness_corrections_d = cl.Buffer(
                 self.context, mf.READ_ONLY | mf.COPY_HOST_PTR,
                 hostbuf=stiffness_corrections)
@@ -147,42 +452,86 @@ class Integrator(ABC):
                 self.context, mf.READ_ONLY | mf.COPY_HOST_PTR,
                 hostbuf=bond_types)
 
+        # Restored when a simulation does not override the corrections
+        self.model_bond_force_kernel = self.bond_force_kernel
+        self.model_stiffness_corrections_d = self.stiffness_corrections_d
+        # Restored when the bond arrays of a simulation have been compacted
+        self.model_bond_types_d = self.bond_types_d
+        # Used when a simulation does override the corrections
+        if self.shared_corrections:
+            self.corrections_bond_force_kernel = self.bond_force_kernel
+        elif self.has_bond_types:
+            self.corrections_bond_force_kernel = self.program.bond_force4
+        else:
+            self.corrections_bond_force_kernel = self.program.bond_force2
+
         self.damage_kernel = self.program.damage
+        self.displacement_bc_kernel = (
+            self.program.apply_displacement_boundary_conditions)
+        self.force_bc_kernel = self.program.apply_force_boundary_conditions
+        self.bond_force_ensemble_kernel = self.program.bond_force_ensemble
+        self.compact_bonds_kernel = self.program.compact_bonds
 
         # Create OpenCL buffers that are independent of
         # :class: Model.simulation parameters
-        # Local memory containers for bond forces
-        self.local_mem_x = cl.LocalMemory(
-            np.dtype(np.float64).itemsize * self.max_neighbours)
-        self.local_mem_y = cl.LocalMemory(
-            np.dtype(np.float64).itemsize * self.max_neighbours)
-        self.local_mem_z = cl.LocalMemory(
-            np.dtype(np.float64).itemsize * self.max_neighbours)
-        # Local memory container for damage
-        self.local_mem = cl.LocalMemory(
-            np.dtype(np.float64).itemsize * self.max_neighbours)
+        # Local memory containers for the bond arrays at their full width
+        self._set_width(max_neighbours)
         # Read only
-        self.r0_d = cl.Buffer(
+        self.coords_d = cl.Buffer(
             self.context, mf.READ_ONLY | mf.COPY_HOST_PTR,
-            hostbuf=coords)
+            hostbuf=self._pad(coords))
+        self.r0_d = self.coords_d
         self.vols_d = cl.Buffer(
             self.context, mf.READ_ONLY | mf.COPY_HOST_PTR,
             hostbuf=volume)
         self.family_d = cl.Buffer(
             self.context, mf.READ_ONLY | mf.COPY_HOST_PTR,
             hostbuf=family)
-        self.bc_types_d = cl.Buffer(
-            self.context, mf.READ_ONLY | mf.COPY_HOST_PTR,
-            hostbuf=bc_types)
-        self.bc_values_d = cl.Buffer(
-            self.context, mf.READ_ONLY | mf.COPY_HOST_PTR,
-            hostbuf=bc_values)
-        self.force_bc_types_d = cl.Buffer(
-            self.context, mf.READ_ONLY | mf.COPY_HOST_PTR,
-            hostbuf=force_bc_types)
-        self.force_bc_values_d = cl.Buffer(
-            self.context, mf.READ_ONLY | mf.COPY_HOST_PTR,
-            hostbuf=force_bc_values)
+        # Lists of the constrained and loaded degrees of freedom
+        (self.nbcs, self.bc_dofs_d,
+         self.bc_values_d) = self._boundary_conditions(bc_types, bc_values)
+        (self.nforce_bcs, self.force_bc_dofs_d,
+         self.force_bc_values_d) = self._boundary_conditions(
+             force_bc_types, force_bc_values)
+        # The position in the lists of the first degree of freedom of each
+        # node, so that the boundary conditions of a range of nodes are
+        # applied
+        self.bc_offsets = np.concatenate(
+            [[0], np.cumsum(np.count_nonzero(bc_types, axis=1))])
+        self.force_bc_offsets = np.concatenate(
+            [[0], np.cumsum(np.count_nonzero(force_bc_types, axis=1))])
+        # The displacements at the start of a split time-step, which are
+        # allocated by the first split time-step
+        self.start_u_d = None
+        # The degrees of freedom without a displacement boundary condition,
+        # in the layout of the state arrays
+        free_dofs = np.zeros((nnodes, self.stride), dtype=np.uint8)
+        free_dofs[:, :degrees_freedom] = bc_types == 0
+        self.free_dofs_d = cl.Buffer(
+            self.context, mf.READ_ONLY | mf.COPY_HOST_PTR, hostbuf=free_dofs)
+        # Work groups of the reductions over the degrees of freedom, and
+        # their partial sums
+        self.reduction_size = min(
+            REDUCTION_SIZE,
+            1 << (self.context.devices[0].max_work_group_size.bit_length()
+                  - 1))
+        self.ngroups = -(-self.stride * nnodes // self.reduction_size)
+        self.reduction_mem = cl.LocalMemory(
+            2 * np.dtype(np.float64).itemsize * self.reduction_size)
+        self.partial_sums_d = cl.Buffer(
+            self.context, mf.READ_WRITE,
+            2 * np.dtype(np.float64).itemsize * self.ngroups)
+        self.residual_kernel = self.program.residual
+        self.reduce_partial_sums_kernel = self.program.reduce_partial_sums
+
+        # Ring buffer of the broken bonds, and the number of bonds logged
+        self.max_bond_events = np.intc(
+            0 if self.bond_events is None else self.bond_events)
+        self.bond_events_d = cl.Buffer(
+            self.context, mf.READ_WRITE,
+            4 * np.dtype(np.float64).itemsize * max(self.max_bond_events, 1))
+        self.nbond_events_d = cl.Buffer(
+            self.context, mf.READ_WRITE, np.dtype(np.uintc).itemsize)
 
         # Build programs that are special to the chosen integrator
         self._build_special()
@@ -190,115 +539,951 @@ class Integrator(ABC):
     def create_buffers(
             self, nlist, n_neigh, bond_stiffness, critical_stretch, plus_cs, u,
             ud, udd, force, body_force, damage, regimes, nregimes,
-            nbond_types):
+            nbond_types, stiffness_corrections=None):
         """
         Initialise the OpenCL buffers.
 
         Initialises only the buffers which are dependent on
-        :meth:`peripy.model.Model.simulate` parameters.
+        :meth:`peripy.model.Model.simulate` parameters. The device buffers
+        are kept in a pool between calls, so that repeated simulations of the
+        same model only copy the changed arrays to the device rather than
+        allocating new buffers each time.
+
+        If `stiffness_corrections` is not None, the (nnodes, max_neighbours)
+        stiffness corrections (e.g. a random field) are applied in place of
+        those of the model for this simulation.
         """
+        if not self._tuned:
+            self._autotune(
+                self.create_buffers, nlist, n_neigh, bond_stiffness,
+                critical_stretch, plus_cs, u, ud, udd, force, body_force,
+                damage, regimes, nregimes, nbond_types,
+                stiffness_corrections=stiffness_corrections)
+
+        self.nsamples = 1
+        self.ensemble = False
+
+        if stiffness_corrections is None:
+            self.bond_force_kernel = self.model_bond_force_kernel
+            self.stiffness_corrections_d = self.model_stiffness_corrections_d
+        else:
+            # Switch to the kernel that applies stiffness corrections
+            self.bond_force_kernel = self.corrections_bond_force_kernel
+            self.stiffness_corrections_d = self._upload(
+                "stiffness_corrections",
+                stiffness_corrections.astype(self.correction_dtype),
+                mf.READ_ONLY)
+
+        if nregimes > np.iinfo(self.regime_dtype).max:
+            raise ValueError("compact_metadata supports at most {} regimes "
+                             "(got {})".format(
+                                 np.iinfo(self.regime_dtype).max, nregimes))
         if (nbond_types == 1) and (nregimes == 1):
             self.bond_stiffness_d = np.float64(bond_stiffness)
             self.critical_stretch_d = np.float64(critical_stretch)
             # Placeholder buffers
             plus_cs = np.array([0], dtype=np.float64)
-            regimes = np.array([0], dtype=np.intc)
-            self.plus_cs_d = cl.Buffer(
-                self.context, mf.READ_WRITE | mf.COPY_HOST_PTR,
-                hostbuf=plus_cs)
-            self.regimes_d = cl.Buffer(
-                self.context, mf.READ_WRITE | mf.COPY_HOST_PTR,
-                hostbuf=regimes)
+            regimes = np.array([0], dtype=self.regime_dtype)
+            self.plus_cs_d = self._upload("plus_cs", plus_cs)
+            self.regimes_d = self._upload("regimes", regimes)
         else:
-            self.bond_stiffness_d = cl.Buffer(
-                self.context, mf.READ_ONLY | mf.COPY_HOST_PTR,
-                hostbuf=bond_stiffness)
-            self.critical_stretch_d = cl.Buffer(
-                self.context, mf.READ_ONLY | mf.COPY_HOST_PTR,
-                hostbuf=critical_stretch)
-            self.plus_cs_d = cl.Buffer(
-                self.context, mf.READ_WRITE | mf.COPY_HOST_PTR,
-                hostbuf=plus_cs)
-            self.regimes_d = cl.Buffer(
-                self.context, mf.READ_WRITE | mf.COPY_HOST_PTR,
-                hostbuf=regimes)
+            self.bond_stiffness_d = self._upload(
+                "bond_stiffness", bond_stiffness, mf.READ_ONLY)
+            self.critical_stretch_d = self._upload(
+                "critical_stretch", critical_stretch, mf.READ_ONLY)
+            self.plus_cs_d = self._upload("plus_cs", plus_cs)
+            self.regimes_d = self._upload(
+                "regimes", regimes.astype(self.regime_dtype))
 
         self.nregimes = np.intc(nregimes)
         self.nbond_types = np.intc(nbond_types)
 
+        # The bond arrays which are compacted, stiffness corrections, bond
+        # types and regimes, and restore their full width
+        self.bond_arrays = np.intc(
+            (stiffness_corrections is not None or self.shared_corrections)
+            + 2 * self.has_bond_types
+            + 4 * ((nbond_types, nregimes) != (1, 1)))
+        self.bond_types_d = self.model_bond_types_d
+        self._set_width(self.max_neighbours)
+
         # Create OpenCL buffers that are dependent on
         # :meth:`peripy.model.Model.simulate` parameters.
         # Read and write
-        self.force_d = cl.Buffer(
-            self.context, mf.READ_WRITE, force.nbytes)
-        self.nlist_d = cl.Buffer(
-            self.context, mf.READ_WRITE | mf.COPY_HOST_PTR,
-            hostbuf=nlist)
-        self.u_d = cl.Buffer(
-            self.context, mf.READ_WRITE | mf.COPY_HOST_PTR,
-            hostbuf=u)
-        self.ud_d = cl.Buffer(
-            self.context, mf.READ_WRITE | mf.COPY_HOST_PTR,
-            hostbuf=ud)
-        self.udd_d = cl.Buffer(
-            self.context, mf.READ_WRITE | mf.COPY_HOST_PTR,
-            hostbuf=udd)
+        self.force_d = self._buffer("force", self._pad(force))
+        self.nlist_d = self._upload("nlist", self._neighbours(nlist))
+        self.r0_d = self._reference_geometry(nlist)
+        self.u_d = self._upload("u", self._pad(u))
+        self.ud_d = self._upload("ud", self._pad(ud))
+        self.udd_d = self._upload("udd", self._pad(udd))
         # Write only
-        self.damage_d = cl.Buffer(
-            self.context, mf.WRITE_ONLY, damage.nbytes)
-        self.body_force_d = cl.Buffer(
-            self.context, mf.WRITE_ONLY, body_force.nbytes)
-        self.n_neigh_d = cl.Buffer(
-            self.context, mf.WRITE_ONLY, n_neigh.nbytes)
+        self.damage_d = self._buffer("damage", damage, mf.WRITE_ONLY)
+        self.body_force_d = self._buffer(
+            "body_force", self._pad(body_force), mf.WRITE_ONLY)
+        self.n_neigh_d = self._buffer("n_neigh", n_neigh, mf.WRITE_ONLY)
+        # The bond_force kernels keep the damage current after each step
+        self._damage(self.nlist_d, self.family_d, self.n_neigh_d,
+                     self.damage_d, self.local_mem)
+        # Clear the log of broken bonds
+        cl.enqueue_copy(
+            self.queue, self.nbond_events_d, np.zeros(1, dtype=np.uintc))
+        self.nbond_events_read = 0
+        self.step = 0
 
         self._create_special_buffers()
 
+    def create_ensemble_buffers(
+            self, nlist, n_neigh, bond_stiffness, critical_stretch,
+            stiffness_corrections, u, ud, udd, force, body_force, damage):
+        """
+        Initialise the OpenCL buffers of an ensemble of samples.
+
+        The state arrays have a leading axis of length `nsamples`, and every
+        sample is integrated by the same kernel launches. Subsequent calls of
+        the integrator advance all of the samples by one time-step. Only the
+        bond based prototype microelastic brittle (PMB) model is supported.
+
+        :arg nlist: The (nsamples, nnodes, max_neighbours) neighbour lists.
+        :type nlist: :class:`numpy.ndarray`
+        :arg n_neigh: The (nsamples, nnodes) number of neighbours.
+        :type n_neigh: :class:`numpy.ndarray`
+        :arg bond_stiffness: The (nsamples,) bond stiffness of each sample.
+        :type bond_stiffness: :class:`numpy.ndarray`
+        :arg critical_stretch: The (nsamples,) critical stretch of each
+            sample.
+        :type critical_stretch: :class:`numpy.ndarray`
+        :arg stiffness_corrections: The (nsamples, nnodes, max_neighbours)
+            stiffness correction factors of each sample, or None if the
+            samples share the stiffness corrections of the model.
+        :type stiffness_corrections: :class:`numpy.ndarray` or NoneType
+        """
+        if self.bond_events is not None:
+            raise ValueError("bond_events is not supported by ensembles "
+                             "(got {})".format(self.bond_events))
+        if not self._tuned:
+            self._autotune(
+                self.create_ensemble_buffers, nlist, n_neigh, bond_stiffness,
+                critical_stretch, stiffness_corrections, u, ud, udd, force,
+                body_force, damage)
+
+        self.nsamples = np.shape(bond_stiffness)[0]
+        self.ensemble = True
+
+        self.bond_stiffness_d = self._upload(
+            "ensemble_bond_stiffness", bond_stiffness, mf.READ_ONLY)
+        self.critical_stretch_d = self._upload(
+            "ensemble_critical_stretch", critical_stretch, mf.READ_ONLY)
+        if stiffness_corrections is not None:
+            self.ensemble_corrections = np.intc(2)
+            self.ensemble_corrections_d = self._upload(
+                "ensemble_stiffness_corrections",
+                stiffness_corrections.astype(self.correction_dtype),
+                mf.READ_ONLY)
+        else:
+            self.ensemble_corrections = np.intc(
+                1 if self.shared_corrections else 0)
+            self.ensemble_corrections_d = self.model_stiffness_corrections_d
+        # Placeholder buffers
+        plus_cs = np.array([0], dtype=np.float64)
+        regimes = np.array([0], dtype=self.regime_dtype)
+        self.plus_cs_d = self._upload("plus_cs", plus_cs)
+        self.regimes_d = self._upload("regimes", regimes)
+        self.nregimes = np.intc(1)
+        self.nbond_types = np.intc(1)
+        self.bond_types_d = self.model_bond_types_d
+        self._set_width(self.max_neighbours)
+
+        # Read and write
+        self.force_d = self._buffer("ensemble_force", self._pad(force))
+        self.nlist_d = self._upload(
+            "ensemble_nlist", self._neighbours(nlist))
+        self.r0_d = self._reference_geometry(nlist)
+        self.u_d = self._upload("ensemble_u", self._pad(u))
+        self.ud_d = self._upload("ensemble_ud", self._pad(ud))
+        self.udd_d = self._upload("ensemble_udd", self._pad(udd))
+        # Write only
+        self.damage_d = self._buffer(
+            "ensemble_damage", damage, mf.WRITE_ONLY)
+        self.body_force_d = self._buffer(
+            "ensemble_body_force", self._pad(body_force), mf.WRITE_ONLY)
+        self.n_neigh_d = self._buffer(
+            "ensemble_n_neigh", n_neigh, mf.WRITE_ONLY)
+        # The bond_force kernels keep the damage current after each step
+        self._damage(self.nlist_d, self.family_d, self.n_neigh_d,
+                     self.damage_d, self.local_mem)
+
+        self._create_special_buffers()
+
+    def _pad(self, array):
+        """
+        Convert a host state array to the layout of the device.
+
+        :arg array: The (..., nnodes, 3) host array.
+        :type array: :class:`numpy.ndarray`
+
+        :returns: The array, padded to (..., nnodes, 4) if `vector_layout` is
+            True.
+        :rtype: :class:`numpy.ndarray`
+        """
+        if not self.vector_layout:
+            return array
+        padded = np.zeros(np.shape(array)[:-1] + (4,), dtype=array.dtype)
+        padded[..., :3] = array
+        return padded
+
+    def _read(self, array, buffer):
+        """
+        Copy a device state buffer into a host array.
+
+        :arg array: The (..., nnodes, 3) host array.
+        :type array: :class:`numpy.ndarray`
+        :arg buffer: The device buffer, in the layout of the device.
+        :type buffer: :class:`pyopencl.Buffer`
+        """
+        if not self.vector_layout:
+            cl.enqueue_copy(self.queue, array, buffer)
+            return
+        padded = self._pad(array)
+        cl.enqueue_copy(self.queue, padded, buffer)
+        array[...] = padded[..., :3]
+
+    def _reference_geometry(self, nlist):
+        """
+        Get the device buffer of the reference geometry of the bonds.
+
+        If `bond_geometry` is None this is the buffer of the initial
+        coordinates. Otherwise, the (nnodes, max_neighbours, 4) reference
+        vectors and lengths of the bonds are calculated the first time, and
+        only calculated again if `nlist` has a bond that was not in the
+        neighbour list that they were calculated from, since bonds are broken
+        in place.
+
+        :arg nlist: The neighbour list, or the neighbour lists of an ensemble.
+        :type nlist: :class:`numpy.ndarray`
+
+        :returns: The device buffer.
+        :rtype: :class:`pyopencl.Buffer`
+        """
+        if self.bond_geometry is None:
+            return self.coords_d
+        nlist = np.reshape(nlist, (-1, self.nnodes, self.max_neighbours))
+        if (self._geometry_nlist is not None and np.all(
+                (nlist == -1) | (nlist == self._geometry_nlist))):
+            return self._geometry_d
+
+        # The unbroken bonds of every sample
+        reference = np.max(nlist, axis=0)
+        if not np.all((nlist == -1) | (nlist == reference)):
+            raise ValueError("the neighbour lists of the samples must be "
+                             "the same, apart from broken bonds")
+        nodes = np.arange(self.nnodes)[:, np.newaxis]
+        neighbours = np.where(reference == -1, nodes, reference)
+        geometry = np.zeros(
+            (self.nnodes, self.max_neighbours, 4), dtype=np.float64)
+        geometry[..., :3] = self.coords[neighbours] - self.coords[nodes]
+        geometry[..., 3] = np.linalg.norm(geometry[..., :3], axis=2)
+        if self.bond_geometry == "float":
+            geometry = geometry.astype(np.float32)
+        self._geometry_d = self._upload(
+            "bond_geometry", geometry, mf.READ_ONLY)
+        self._geometry_nlist = reference
+        return self._geometry_d
+
+    def _metadata_types(self, bond_types):
+        """
+        Choose the types of the bond metadata on the device.
+
+        Sets the dtypes of the neighbour lists, the bond types, the regimes
+        and the stiffness corrections, and adds the options which define
+        their types in the kernels.
+
+        :arg bond_types: The bond types of the model, or None if the model
+            has one bond type.
+        :type bond_types: :class:`numpy.ndarray` or NoneType
+        """
+        self.neighbour_dtype = np.intc
+        self.bond_type_dtype = np.intc
+        self.regime_dtype = np.intc
+        self.correction_dtype = np.float64
+        if self.compact_metadata is None:
+            return
+        types = {np.uint8: "uchar", np.uint16: "ushort", np.uint32: "uint"}
+        self.neighbour_dtype = np.int16
+        self.bond_type_dtype = np.min_scalar_type(
+            0 if bond_types is None else int(np.max(bond_types))).type
+        # The number of regimes is checked by create_buffers, the regime of a
+        # broken bond is nregimes
+        self.regime_dtype = np.uint8
+        self.build_options.append("-D NEIGHBOUR_OFFSETS")
+        self.build_options.append(
+            "-D BOND_TYPE={}".format(types[self.bond_type_dtype]))
+        self.build_options.append(
+            "-D REGIME_TYPE={}".format(types[self.regime_dtype]))
+        if self.compact_metadata == "float":
+            self.correction_dtype = np.float32
+            self.build_options.append("-D CORRECTION_TYPE=float")
+
+    def _neighbours(self, nlist):
+        """
+        Convert neighbour lists to the type of the device.
+
+        :arg nlist: The (..., nnodes, max_neighbours) neighbour lists, a value
+            of -1 denotes a broken bond.
+        :type nlist: :class:`numpy.ndarray`
+
+        :returns: The neighbour lists, as the offsets of each neighbour from
+            its node if `compact_metadata` is not None.
+        :rtype: :class:`numpy.ndarray`
+        """
+        if self.neighbour_dtype == np.intc:
+            return nlist
+        nodes = np.arange(self.nnodes)[:, np.newaxis]
+        offsets = np.where(nlist == -1, 0, nlist - nodes)
+        limit = np.iinfo(self.neighbour_dtype).max
+        if np.any(np.abs(offsets) > limit):
+            raise ValueError(
+                "compact_metadata requires the neighbours of each node to be "
+                "within {} nodes of it, reorder the nodes (got {})".format(
+                    limit, int(np.max(np.abs(offsets)))))
+        return np.where(
+            nlist == -1, BROKEN_OFFSET, offsets).astype(self.neighbour_dtype)
+
+    def _read_neighbours(self, shape):
+        """
+        Copy the neighbour lists from device memory.
+
+        :arg shape: The shape of the neighbour lists on the device.
+        :type shape: tuple
+
+        :returns: The neighbour lists, a value of -1 denotes a broken bond.
+        :rtype: :class:`numpy.ndarray`
+        """
+        nlist = np.empty(shape, dtype=self.neighbour_dtype)
+        cl.enqueue_copy(self.queue, nlist, self.nlist_d)
+        if self.neighbour_dtype == np.intc:
+            return nlist
+        nodes = np.arange(self.nnodes, dtype=np.intc)[:, np.newaxis]
+        return np.where(nlist == BROKEN_OFFSET, -1, nodes + nlist).astype(
+            np.intc)
+
+    def _buffer(self, name, array, flags=mf.READ_WRITE):
+        """
+        Get a device buffer from the buffer pool.
+
+        A buffer is only allocated if there is no buffer in the pool with
+        the same name, shape and dtype as `array`, otherwise the pooled
+        buffer is returned. The contents of the buffer are not set.
+
+        :arg str name: The name of the buffer.
+        :arg array: The host array that the buffer mirrors.
+        :type array: :class:`numpy.ndarray`
+        :arg flags: The memory flags used if a buffer is allocated.
+        :type flags: :class:`pyopencl.mem_flags`
+
+        :returns: The device buffer.
+        :rtype: :class:`pyopencl.Buffer`
+        """
+        key = (np.shape(array), np.dtype(array.dtype))
+        pooled = self._buffers.get(name)
+        if pooled is None or pooled[0] != key:
+            pooled = (key, cl.Buffer(self.context, flags, array.nbytes))
+            self._buffers[name] = pooled
+        return pooled[1]
+
+    def _upload(self, name, array, flags=mf.READ_WRITE):
+        """
+        Copy a host array into its pooled device buffer.
+
+        Arrays that are all zeros are reset on the device with a fill
+        rather than being transferred from the host.
+
+        :arg str name: The name of the buffer.
+        :arg array: The host array to copy to the device.
+        :type array: :class:`numpy.ndarray`
+        :arg flags: The memory flags used if a buffer is allocated.
+        :type flags: :class:`pyopencl.mem_flags`
+
+        :returns: The device buffer.
+        :rtype: :class:`pyopencl.Buffer`
+        """
+        buffer = self._buffer(name, array, flags)
+        if array.any():
+            cl.enqueue_copy(self.queue, buffer, np.ascontiguousarray(array))
+        else:
+            cl.enqueue_fill_buffer(
+                self.queue, buffer, np.uint8(0), 0, array.nbytes)
+        return buffer
+
+    def _work_groups(self, nnodes, max_neighbours):
+        """
+        Choose the layout of the work groups of the bond_force kernels.
+
+        Families larger than the device allows in one work group are split
+        between the bonds calculated by each work item, and small families are
+        packed into work groups of up to :const:`WORK_GROUP_SIZE` work items.
+        The layout can be set by the `nodes_per_group` and `bonds_per_item`
+        arguments instead.
+
+        :arg int nnodes: The number of nodes.
+        :arg int max_neighbours: The maximum number of neighbours of a node,
+            a power of two.
+
+        :returns: A tuple of the number of nodes per work group and the
+            number of bonds per work item.
+        :rtype: tuple(int, int)
+        """
+        device = self.context.devices[0]
+        # Bytes of local memory used by each work item
+        item_size = np.dtype(np.float64).itemsize * (
+            3 if self.reduction == "tree" else 4)
+        max_size = min(device.max_work_group_size,
+                       device.local_mem_size // item_size)
+
+        bonds_per_item = self.bonds_per_item
+        if bonds_per_item is None:
+            bonds_per_item = 1
+            while max_neighbours // bonds_per_item > max_size:
+                bonds_per_item *= 2
+        elif bonds_per_item > max_neighbours:
+            raise ValueError("bonds_per_item must not be greater than "
+                             "max_neighbours (expected at most {}, got {})"
+                             .format(max_neighbours, bonds_per_item))
+        family_size = max_neighbours // bonds_per_item
+
+        nodes_per_group = self.nodes_per_group
+        if nodes_per_group is None:
+            nodes_per_group = 1
+            if self.reduction != "subgroup":
+                while (2 * nodes_per_group * family_size
+                       <= min(WORK_GROUP_SIZE, max_size)
+                       and 2 * nodes_per_group <= nnodes):
+                    nodes_per_group *= 2
+        return nodes_per_group, bonds_per_item
+
+    def _candidates(self):
+        """
+        Return the configurations tried by the autotuner.
+
+        The bond geometry is only precomputed in double precision, so that
+        the autotuner never changes the results beyond round-off, small
+        families are only packed if they are smaller than
+        :const:`WORK_GROUP_SIZE` and, if :meth:`Integrator.plan_memory` has
+        been called, only the configurations that fit in the memory of the
+        device are tried.
+
+        :returns: A list of the configurations, dictionaries of the
+            attributes of the integrator.
+        :rtype: list(dict)
+        """
+        reductions = ["tree", "vector"]
+        if subgroup_support(self.context.devices[0]):
+            reductions.append("subgroup")
+        packings = [1]
+        if 2 * self.max_neighbours <= WORK_GROUP_SIZE:
+            packings.append(None)
+        candidates = []
+        for reduction, vector_layout, bond_geometry, nodes_per_group in (
+                itertools.product(
+                    reductions, [False, True], [None, "double"], packings)):
+            if reduction == "subgroup" and nodes_per_group is None:
+                continue
+            candidates.append({
+                "reduction": reduction, "vector_layout": vector_layout,
+                "bond_geometry": bond_geometry,
+                "nodes_per_group": nodes_per_group})
+        if self._memory_args is not None:
+            # Only the configurations that fit in the memory of the device
+            device = self.context.devices[0]
+            candidates = [
+                candidate for candidate in candidates
+                if fits(self._footprint(**candidate), device)]
+        return candidates
+
+    def _configure(self, config):
+        """Rebuild the programs in a configuration of the autotuner."""
+        for name, value in config.items():
+            setattr(self, name, value)
+        tuned = self._tuned
+        self.build(*self._build_args)
+        self._tuned = tuned
+
+    def _autotune(self, create_buffers, *args, **kwargs):
+        """
+        Configure the integrator with the fastest configuration.
+
+        The configuration is read from the tuning database if the problem has
+        been tuned on the device before. Otherwise, the integrator is built in
+        each of the candidate configurations and :const:`TUNING_STEPS`
+        time-steps are timed with the buffers of the simulation, and the
+        fastest configuration is stored in the database.
+
+        :arg create_buffers: The method which creates the buffers of the
+            simulation.
+        :type create_buffers: callable
+        :arg args: The arguments of `create_buffers`.
+        :arg kwargs: The keyword arguments of `create_buffers`.
+        """
+        self._tuned = True
+        device = self.context.devices[0]
+        signature = (
+            "{}(nnodes={}, degrees_freedom={}, max_neighbours={}, "
+            "kernel={}, ensemble={})".format(
+                type(self).__name__, self.nnodes, self.degrees_freedom,
+                self.max_neighbours,
+                self.model_bond_force_kernel.function_name,
+                create_buffers == self.create_ensemble_buffers))
+        config = self.tuning_database.get(device, signature)
+        if config is None:
+            timings = []
+            for candidate in self._candidates():
+                self._configure(candidate)
+                create_buffers(*args, **kwargs)
+                # The first step includes the launch overheads
+                self(displacement_bc_magnitude=0.0, force_bc_magnitude=0.0)
+                start = time.perf_counter()
+                for step in range(TUNING_STEPS):
+                    self(displacement_bc_magnitude=0.0,
+                         force_bc_magnitude=0.0)
+                self.queue.finish()
+                timings.append((time.perf_counter() - start, candidate))
+            config = min(timings, key=lambda timing: timing[0])[1]
+            self.tuning_database.set(device, signature, config)
+        self._configure(config)
+
+    def _boundary_conditions(self, bc_types, bc_values):
+        """
+        Copy the boundary conditions to the device as a list.
+
+        Only the degrees of freedom with a boundary condition are stored,
+        so that the boundary conditions are applied by a launch over those
+        degrees of freedom rather than read by every work item.
+
+        :arg bc_types: The (nnodes, 3) boundary condition types, a value of 0
+            denotes a degree of freedom without a boundary condition.
+        :type bc_types: :class:`numpy.ndarray`
+        :arg bc_values: The (nnodes, 3) boundary condition values.
+        :type bc_values: :class:`numpy.ndarray`
+
+        :returns: A tuple of the number of degrees of freedom with a boundary
+            condition, and the device buffers of those degrees of freedom, in
+            the layout of the state arrays on the device, and of their
+            values.
+        :rtype: tuple(:class:`numpy.intc`, :class:`pyopencl.Buffer`,
+            :class:`pyopencl.Buffer`)
+        """
+        nodes, components = np.nonzero(bc_types)
+        dofs = (self.stride * nodes + components).astype(np.intc)
+        values = np.asarray(
+            bc_values, dtype=np.float64)[nodes, components]
+        if not len(dofs):
+            # Placeholder buffers
+            dofs = np.zeros(1, dtype=np.intc)
+            values = np.zeros(1, dtype=np.float64)
+        return (np.intc(len(nodes)),
+                cl.Buffer(self.context, mf.READ_ONLY | mf.COPY_HOST_PTR,
+                          hostbuf=dofs),
+                cl.Buffer(self.context, mf.READ_ONLY | mf.COPY_HOST_PTR,
+                          hostbuf=values))
+
+    def _displacement_boundary_conditions(
+            self, u_d, displacement_bc_magnitude, nodes=None):
+        """Apply the displacement boundary conditions of a range of nodes."""
+        first, last = (0, self.nbcs) if nodes is None else (
+            self.bc_offsets[list(nodes)])
+        if first == last:
+            return
+        # Call kernel
+        self.displacement_bc_kernel(
+            self.queue, (last - first, self.nsamples), None, u_d,
+            self.bc_dofs_d, self.bc_values_d,
+            np.float64(displacement_bc_magnitude),
+            np.intc(self.stride * self.nnodes), global_offset=(first, 0))
+        self.queue.finish()
+
+    def _force_boundary_conditions(
+            self, force_d, force_bc_magnitude, nodes=None):
+        """Apply the force boundary conditions of a range of nodes."""
+        first, last = (0, self.nforce_bcs) if nodes is None else (
+            self.force_bc_offsets[list(nodes)])
+        if first == last:
+            return
+        # Call kernel
+        self.force_bc_kernel(
+            self.queue, (last - first, self.nsamples), None, force_d,
+            self.force_bc_dofs_d, self.force_bc_values_d,
+            np.float64(force_bc_magnitude),
+            np.intc(self.stride * self.nnodes), global_offset=(first, 0))
+        self.queue.finish()
+
+    def _node_work_items(self, nodes=None):
+        """
+        Return the work items of the bond_force kernel of a range of nodes.
+
+        :arg nodes: The (first, last) range of nodes, where first is a
+            multiple of the nodes of each work group, or None for every
+            node. Default is None.
+        :type nodes: tuple(int, int) or NoneType
+
+        :returns: The global size and the global offset of the kernel.
+        :rtype: tuple(int, int)
+        """
+        if nodes is None:
+            return self.global_size, 0
+        nodes_per_group = self.work_group_layout[0]
+        first, last = nodes
+        return (self.local_size * (-(-(last - first) // nodes_per_group)),
+                self.local_size * (first // nodes_per_group))
+
+    def _dofs(self, nodes=None):
+        """
+        Return the degrees of freedom of a range of nodes.
+
+        :arg nodes: The (first, last) range of nodes, or None for every node.
+            Default is None.
+        :type nodes: tuple(int, int) or NoneType
+
+        :returns: The number of degrees of freedom, in the layout of the
+            state arrays on the device, and the first of them.
+        :rtype: tuple(int, int)
+        """
+        first, last = (0, self.nnodes) if nodes is None else nodes
+        return self.stride * (last - first), self.stride * first
+
+    def _set_width(self, width):
+        """
+        Size the bond_force and damage kernels to the width of the bond arrays.
+
+        :arg int width: The width of the bond arrays on the device, the number
+            of bonds of each node, a power of two.
+        """
+        nodes_per_group, bonds_per_item = self.work_group_layout
+        self.width = width
+        self.local_size = nodes_per_group * width // bonds_per_item
+        self.global_size = self.local_size * (
+            -(-self.nnodes // nodes_per_group))
+        # Local memory containers for bond forces
+        if self.reduction == "tree":
+            self.local_mem_x = cl.LocalMemory(
+                np.dtype(np.float64).itemsize * self.local_size)
+            self.local_mem_y = cl.LocalMemory(
+                np.dtype(np.float64).itemsize * self.local_size)
+            self.local_mem_z = cl.LocalMemory(
+                np.dtype(np.float64).itemsize * self.local_size)
+        else:
+            # A single double4 cache, the y and z caches are unused
+            self.local_mem_x = cl.LocalMemory(
+                4 * np.dtype(np.float64).itemsize * self.local_size)
+            self.local_mem_y = cl.LocalMemory(np.dtype(np.float64).itemsize)
+            self.local_mem_z = cl.LocalMemory(np.dtype(np.float64).itemsize)
+        # Local memory container for damage
+        self.local_mem = cl.LocalMemory(
+            np.dtype(np.float64).itemsize * self.local_size)
+
+    def _compact(self):
+        """
+        Pack the unbroken bonds of each node into narrower bond arrays.
+
+        The width of the bond arrays is reduced to the smallest power of two
+        that fits the node with the most unbroken bonds, if that is smaller
+        than the current width. The neighbour lists, the reference bond
+        geometry, the stiffness corrections, the bond types and the regimes
+        are compacted together, as well as the positions of the bonds in the
+        full width neighbour lists, which :meth:`Integrator.write` uses to
+        return the neighbour lists in their original layout.
+        """
+        queue = self.queue
+        n_neigh = np.empty(self.nnodes, dtype=np.intc)
+        cl.enqueue_copy(queue, n_neigh, self.n_neigh_d)
+        width = max(1 << (max(int(np.max(n_neigh)), 1) - 1).bit_length(),
+                    self.work_group_layout[1])
+        if width >= self.width:
+            return
+
+        shape = (self.nnodes, width)
+        bond_arrays = self.bond_arrays
+        compact_nlist_d = self._buffer(
+            "compact_nlist", np.empty(shape, dtype=self.neighbour_dtype))
+        compact_positions_d = self._buffer(
+            "compact_positions", np.empty(shape, dtype=np.intc))
+        if self.width == self.max_neighbours:
+            # The bonds are in their original positions
+            positions_d = compact_positions_d
+        else:
+            positions_d = self.positions_d
+            bond_arrays |= 8
+        compact_r0_d = self.r0_d
+        if self.bond_geometry is not None:
+            geometry_dtype = (
+                np.float32 if self.bond_geometry == "float" else np.float64)
+            compact_r0_d = self._buffer(
+                "compact_bond_geometry",
+                np.empty(shape + (4,), dtype=geometry_dtype), mf.READ_ONLY)
+        compact_stiffness_corrections_d = self.stiffness_corrections_d
+        if bond_arrays & 1:
+            compact_stiffness_corrections_d = self._buffer(
+                "compact_stiffness_corrections",
+                np.empty(shape, dtype=self.correction_dtype), mf.READ_ONLY)
+        compact_bond_types_d = self.bond_types_d
+        if bond_arrays & 2:
+            compact_bond_types_d = self._buffer(
+                "compact_bond_types",
+                np.empty(shape, dtype=self.bond_type_dtype), mf.READ_ONLY)
+        compact_regimes_d = self.regimes_d
+        if bond_arrays & 4:
+            compact_regimes_d = self._buffer(
+                "compact_regimes", np.empty(shape, dtype=self.regime_dtype))
+
+        # Call kernel
+        self.compact_bonds_kernel(
+            queue, (self.nnodes,), None, self.nlist_d, compact_nlist_d,
+            positions_d, compact_positions_d, self.r0_d, compact_r0_d,
+            self.stiffness_corrections_d, compact_stiffness_corrections_d,
+            self.bond_types_d, compact_bond_types_d, self.regimes_d,
+            compact_regimes_d, np.intc(self.width), np.intc(width),
+            np.intc(bond_arrays))
+        queue.finish()
+
+        self.nlist_d = compact_nlist_d
+        self.positions_d = compact_positions_d
+        self.r0_d = compact_r0_d
+        self.stiffness_corrections_d = compact_stiffness_corrections_d
+        self.bond_types_d = compact_bond_types_d
+        self.regimes_d = compact_regimes_d
+        self._set_width(width)
+
     def _damage(self, nlist_d, family_d, n_neigh_d, damage_d, local_mem):
         """Calculate bond damage."""
         queue = self.queue
         # Call kernel
         self.damage_kernel(
-            queue, (self.nnodes * self.max_neighbours,),
-            (self.max_neighbours,), nlist_d, family_d, n_neigh_d, damage_d,
+            queue, (self.global_size, self.nsamples),
+            (self.local_size, 1), nlist_d, family_d, n_neigh_d, damage_d,
             local_mem)
         queue.finish()
 
     def _bond_force(
             self, u_d, force_d, body_force_d, r0_d, vols_d, nlist_d,
-            force_bc_types_d, force_bc_values_d, stiffness_corrections_d,
+            family_d, n_neigh_d, damage_d, stiffness_corrections_d,
             bond_types_d, regimes_d, plus_cs_d, local_mem_x, local_mem_y,
             local_mem_z, bond_stiffness_d, critical_stretch_d,
-            force_bc_magnitude, nregimes):
-        """Calculate the force due to bonds acting on each node."""
+            force_bc_magnitude, nregimes, nodes=None):
+        """
+        Calculate the force due to bonds acting on each node.
+
+        The number of neighbours and the damage of each node are updated with
+        the bonds that remain unbroken, and the force boundary conditions are
+        added to the forces.
+
+        A time-step may be split into consecutive ranges of `nodes`, which
+        start at a multiple of the nodes of each work group, see
+        :meth:`Integrator._node_work_items`. The displacements are copied at
+        the start of the time-step, by the range of the first node, and the
+        forces of every range are calculated from the copy, as the earlier
+        ranges update their displacements before the later ranges calculate
+        their forces. The step number is incremented by the range of the
+        first node, and the bond arrays are compacted after the range of the
+        last node.
+        """
         queue = self.queue
+        if self.ensemble:
+            # Samples have their own bond stiffness and critical stretch
+            self.bond_force_ensemble_kernel(
+                queue, (self.global_size, self.nsamples),
+                (self.local_size, 1), u_d, force_d, body_force_d, r0_d,
+                vols_d, nlist_d, family_d, n_neigh_d, damage_d,
+                self.ensemble_corrections_d, local_mem_x, local_mem_y,
+                local_mem_z, bond_stiffness_d, critical_stretch_d,
+                self.ensemble_corrections)
+            queue.finish()
+            self._force_boundary_conditions(force_d, force_bc_magnitude)
+            return
+        if nodes is None or not nodes[0]:
+            self.step += 1
+        if nodes is not None:
+            if self.start_u_d is None:
+                self.start_u_d = cl.Buffer(
+                    self.context, mf.READ_WRITE, u_d.size)
+            if not nodes[0]:
+                cl.enqueue_copy(queue, self.start_u_d, u_d)
+            u_d = self.start_u_d
+        global_size, global_offset = self._node_work_items(nodes)
         # Call kernel
         self.bond_force_kernel(
-                queue, (self.nnodes * self.max_neighbours,),
-                (self.max_neighbours,), u_d, force_d, body_force_d, r0_d,
-                vols_d, nlist_d, force_bc_types_d, force_bc_values_d,
+                queue, (global_size,),
+                (self.local_size,), u_d, force_d, body_force_d, r0_d,
+                vols_d, nlist_d, family_d, n_neigh_d, damage_d,
                 stiffness_corrections_d, bond_types_d, regimes_d, plus_cs_d,
                 local_mem_x, local_mem_y, local_mem_z, bond_stiffness_d,
-                critical_stretch_d, np.float64(force_bc_magnitude),
-                np.intc(nregimes))
+                critical_stretch_d, np.intc(nregimes), self.bond_events_d,
+                self.nbond_events_d, self.max_bond_events, np.intc(self.step),
+                global_offset=(global_offset,))
         queue.finish()
+        self._force_boundary_conditions(force_d, force_bc_magnitude, nodes)
+        if (self.compaction and not self.step % self.compaction
+                and (nodes is None or nodes[1] == self.nnodes)):
+            self._compact()
 
     def write(self, u, ud, udd, force, body_force, damage, nlist, n_neigh):
-        """Copy the state variables from device memory to host memory."""
-        queue = self.queue
-        # Calculate the damage
-        self._damage(self.nlist_d, self.family_d, self.n_neigh_d,
-                     self.damage_d, self.local_mem)
+        """
+        Copy the state variables from device memory to host memory.
 
+        For an ensemble, the host arrays have a leading axis of length
+        `nsamples`.
+        """
+        queue = self.queue
+        # The damage is updated by the bond_force kernels
         cl.enqueue_copy(queue, damage, self.damage_d)
-        cl.enqueue_copy(queue, u, self.u_d)
-        cl.enqueue_copy(queue, ud, self.ud_d)
-        cl.enqueue_copy(queue, udd, self.udd_d)
-        cl.enqueue_copy(queue, force, self.force_d)
-        cl.enqueue_copy(queue, body_force, self.body_force_d)
-        cl.enqueue_copy(queue, nlist, self.nlist_d)
+        self._read(u, self.u_d)
+        self._read(ud, self.ud_d)
+        self._read(udd, self.udd_d)
+        self._read(force, self.force_d)
+        self._read(body_force, self.body_force_d)
+        if self.width == self.max_neighbours:
+            nlist[...] = self._read_neighbours(np.shape(nlist))
+        else:
+            # Return the unbroken bonds to their positions before compaction
+            compact_nlist = self._read_neighbours((self.nnodes, self.width))
+            positions = np.empty_like(compact_nlist)
+            cl.enqueue_copy(queue, positions, self.positions_d)
+            nodes, bonds = np.nonzero(compact_nlist != -1)
+            nlist[...] = -1
+            nlist[nodes, positions[nodes, bonds]] = compact_nlist[nodes, bonds]
         cl.enqueue_copy(queue, n_neigh, self.n_neigh_d)
         return (u, ud, udd, force, body_force, damage, nlist, n_neigh)
 
+    def residual(self):
+        """
+        Return the norms of the residual forces and of the velocities.
+
+        The norms are over the degrees of freedom without a displacement
+        boundary condition, so that the forces are the residual of the
+        equilibrium of the model. They are reduced on the device, so that
+        only the two norms are copied to the host.
+
+        :returns: A tuple of the norm of the forces and the norm of the
+            velocities.
+        :rtype: tuple(float, float)
+        """
+        sums = self._residual_sums()
+        return float(np.sqrt(sums[0])), float(np.sqrt(sums[1]))
+
+    def _residual_sums(self, nnodes=None):
+        """
+        Reduce the sums of squares of the forces and velocities.
+
+        :arg int nnodes: The number of nodes, from the first, to reduce over.
+            Default is None, which reduces over every node.
+
+        :returns: The (2,) sums of squares of the forces and of the
+            velocities of the degrees of freedom without a displacement
+            boundary condition.
+        :rtype: :class:`numpy.ndarray`
+        """
+        if nnodes is None:
+            nnodes = self.nnodes
+        queue = self.queue
+        # Call kernels
+        self.residual_kernel(
+            queue, (self.ngroups * self.reduction_size,),
+            (self.reduction_size,), self.force_d, self.ud_d,
+            self.free_dofs_d, self.partial_sums_d, self.reduction_mem,
+            np.intc(self.stride * nnodes))
+        self.reduce_partial_sums_kernel(
+            queue, (self.reduction_size,), (self.reduction_size,),
+            self.partial_sums_d, self.reduction_mem, np.intc(self.ngroups))
+        sums = np.empty(2, dtype=np.float64)
+        cl.enqueue_copy(queue, sums, self.partial_sums_d)
+        return sums
+
+    def read_bond_events(self):
+        """
+        Copy the bonds broken since the last read from device memory.
+
+        Only the events logged since the previous call are copied, so that
+        crack growth can be followed during a simulation without copying the
+        neighbour lists. Each bond is logged by both of its nodes. If more
+        bonds have broken than fit in the log, the oldest are lost and a
+        warning is issued.
+
+        :returns: A tuple of the (nevents, 2) nodes of each broken bond, the
+            (nevents,) step at which each bond broke and the (nevents,)
+            stretch of each bond when it broke, in the order they were logged.
+        :rtype: tuple(:class:`numpy.ndarray`, :class:`numpy.ndarray`,
+            :class:`numpy.ndarray`)
+        """
+        if self.bond_events is None:
+            raise ValueError("bond_events must be set to read the broken "
+                             "bonds (got None)")
+        nbond_events = np.empty(1, dtype=np.uintc)
+        cl.enqueue_copy(self.queue, nbond_events, self.nbond_events_d)
+        first = self.nbond_events_read
+        last = int(nbond_events[0])
+        if last - first > self.bond_events:
+            warnings.warn("{} broken bonds were overwritten in the log of "
+                          "broken bonds".format(
+                              last - first - self.bond_events))
+            first = last - self.bond_events
+        events = np.empty((last - first, 4), dtype=np.float64)
+        # The events are contiguous unless they wrap around the ring buffer
+        start = first % self.bond_events
+        nhead = min(last - first, self.bond_events - start)
+        if nhead:
+            cl.enqueue_copy(self.queue, events[:nhead], self.bond_events_d,
+                            device_offset=start * events.itemsize * 4)
+        if nhead < last - first:
+            cl.enqueue_copy(self.queue, events[nhead:], self.bond_events_d)
+        self.nbond_events_read = last
+        return (events[:, :2].astype(np.intc), events[:, 2].astype(np.intc),
+                events[:, 3])
+
+    def partition(self, coords, radius):
+        """
+        Return the nodes of the model which are built by this process.
+
+        An integrator of one process builds the whole model. A distributed
+        integrator builds the nodes it owns, and the nodes within `radius`
+        of them, so that a :class:`peripy.model.Model` never holds the
+        bonds of the whole model.
+
+        :arg coords: The (nnodes, 3) coordinates of every node of the model.
+        :type coords: :class:`numpy.ndarray`
+        :arg float radius: The distance from the owned nodes within which
+            nodes are built.
+
+        :returns: None, or the global number of each node built by this
+            process, in the global order, and whether this process owns each
+            of them.
+        :rtype: NoneType or tuple(:class:`numpy.ndarray`,
+            :class:`numpy.ndarray`)
+        """
+        return None
+
+    def allgather(self, value):
+        """
+        Gather a value from every process.
+
+        :arg value: The value of this process.
+
+        :returns: The value of each process.
+        :rtype: list
+        """
+        return [value]
+
+    def gather(self, array):
+        """
+        Gather the rows of the owned nodes of an array to the root process.
+
+        :arg array: The (nnodes, ...) array of the nodes of the model of
+            this process.
+        :type array: :class:`numpy.ndarray`
+
+        :returns: The array of every node of the model, in the global
+            numbering of the nodes, on the root process and None on the
+            other processes.
+        :rtype: :class:`numpy.ndarray` or NoneType
+        """
+        return array
+
 
 class Euler(Integrator):
     r"""
@@ -315,17 +1500,26 @@ class Euler(Integrator):
     the force density at time :math:`t`, :math:`\delta t` is the time step.
     """
 
-    def __init__(self, dt):
+    def __init__(self, dt, num_threads=None):
         """
         Create an :class:`Euler` integrator object.
 
         :arg float dt: The length of time (in seconds [s]) of one time-step.
+        :arg int num_threads: The number of OpenMP threads used by the
+            integrator. If None, the OpenMP default is used, which may be set
+            with the OMP_NUM_THREADS environment variable. Default None.
 
         :returns: An :class:`Euler` object
         """
+        if num_threads is not None and num_threads < 1:
+            raise ValueError("num_threads must be a positive int "
+                             "(got {})".format(num_threads))
         self.dt = dt
+        self.num_threads = num_threads
         # Not an OpenCL integrator
         self.context = None
+        # Broken bonds are not logged
+        self.bond_events = None
 
     def __call__(self, displacement_bc_magnitude, force_bc_magnitude):
         """
@@ -336,22 +1530,19 @@ class Euler(Integrator):
         :arg float force_bc_magnitude: the magnitude applied to the force
             boundary conditions for the current time-step.
         """
-        # Update neighbour list
-        self._break_bonds(
-            self.u, self.nlist, self.n_neigh)
-
-        # Calculate the force due to bonds on each node
-        self.force = self._bond_force(
-            force_bc_magnitude, self.u, self.nlist, self.n_neigh)
-
-        # Conduct one integration step
-        self._update_displacement(
-            self.u, self.force, displacement_bc_magnitude)
+        # Update neighbour list, calculate the force due to bonds on each
+        # node and conduct one integration step in a single pass
+        euler_step(
+            self.u, self.coords, self.nlist, self.n_neigh, self.volume,
+            self.bond_stiffness, self.critical_stretch, self.force_bc_values,
+            self.force_bc_types, force_bc_magnitude, self.bc_values,
+            self.bc_types, displacement_bc_magnitude, self.dt, self.force,
+            self._local_force)
 
     def create_buffers(
             self, nlist, n_neigh, bond_stiffness, critical_stretch, plus_cs,
             u, ud, udd, force, body_force, damage, regimes, nregimes,
-            nbond_types):
+            nbond_types, stiffness_corrections=None):
         """
         Initiate arrays that are dependent on simulation parameters.
 
@@ -369,6 +1560,12 @@ class Euler(Integrator):
             raise ValueError("n-material composite models are not supported by"
                              " this integrator. Please supply just one "
                              "material type and bond_stiffness.")
+        if stiffness_corrections is not None:
+            raise ValueError("stiffness_corrections are not supported by this "
+                             "integrator (expected {}, got {}), please use "
+                             "EulerCL instead".format(
+                                 type(None),
+                                 type(stiffness_corrections)))
         self.nlist = nlist
         self.n_neigh = n_neigh
         self.bond_stiffness = bond_stiffness
@@ -376,8 +1573,13 @@ class Euler(Integrator):
         self.u = u
         self.ud = ud
         self.udd = udd
-        self.force = force
         self.body_force = body_force
+        # Work arrays, allocated once per simulation so that the integration
+        # steps do not allocate
+        self.force = np.zeros((self.nnodes, 3), dtype=np.float64)
+        self._local_force = np.zeros(
+            (get_num_threads(self.num_threads), self.nnodes, 3),
+            dtype=np.float64)
 
     def build(
             self, nnodes, degrees_freedom, max_neighbours, coords, volume,
@@ -422,6 +1624,9 @@ class Euler(Integrator):
                                  type(None),
                                  type(densities)))
 
+    def plan_memory(self, *args, **kwargs):
+        """Do nothing, the cython integrators do not use device memory."""
+
     def _create_special_buffers(self):
         """Create buffers programs that are special to the Euler integrator."""
         # There are none
@@ -430,27 +1635,13 @@ class Euler(Integrator):
         """Build programs that are special to the Euler integrator."""
         # There are none
 
-    def _update_displacement(self, u, force, displacement_bc_magnitude):
-        update_displacement(
-            u, self.bc_values, self.bc_types, force, displacement_bc_magnitude,
-            self.dt)
-
-    def _break_bonds(self, u, nlist, n_neigh):
-        """Break bonds which have exceeded the critical strain."""
-        break_bonds(self.coords+u, self.coords, nlist, n_neigh,
-                    self.critical_stretch)
-
     def _damage(self, n_neigh):
         """Calculate bond damage."""
         return damage(n_neigh, self.family)
 
-    def _bond_force(self, force_bc_magnitude, u, nlist, n_neigh):
-        """Calculate the force due to bonds acting on each node."""
-        force = bond_force(
-            self.coords+u, self.coords, nlist, n_neigh,
-            self.volume, self.bond_stiffness, self.force_bc_values,
-            self.force_bc_types, force_bc_magnitude)
-        return force
+    def _residual_sums(self, nnodes=None):
+        """Reduce the sums of squares of the forces and velocities."""
+        return _residual_sums(self.force, self.ud, self.bc_types, nnodes)
 
     def write(self, damage, u, ud, udd, force, body_force, nlist, n_neigh):
         """Return the state variable arrays."""
@@ -481,7 +1672,8 @@ class EulerCL(Integrator):
         """
         super().__init__(*args, **kwargs)
 
-    def __call__(self, displacement_bc_magnitude, force_bc_magnitude):
+    def __call__(self, displacement_bc_magnitude, force_bc_magnitude,
+                 nodes=None):
         """
         Conduct one iteration of the integrator.
 
@@ -489,18 +1681,22 @@ class EulerCL(Integrator):
              displacement boundary conditions for the current time-step.
         :arg float force_bc_magnitude: the magnitude applied to the force
             boundary conditions for the current time-step.
+        :arg nodes: The (first, last) range of nodes integrated, for a
+            time-step split into consecutive ranges, see
+            :meth:`Integrator._bond_force`. Default is None, which integrates
+            every node.
+        :type nodes: tuple(int, int) or NoneType
         """
         self._bond_force(
             self.u_d, self.force_d, self.body_force_d, self.r0_d, self.vols_d,
-            self.nlist_d, self.force_bc_types_d, self.force_bc_values_d,
+            self.nlist_d, self.family_d, self.n_neigh_d, self.damage_d,
             self.stiffness_corrections_d, self.bond_types_d, self.regimes_d,
             self.plus_cs_d, self.local_mem_x, self.local_mem_y,
             self.local_mem_z, self.bond_stiffness_d, self.critical_stretch_d,
-            force_bc_magnitude, self.nregimes)
+            force_bc_magnitude, self.nregimes, nodes)
 
         self._update_displacement(
-            self.force_d, self.u_d, self.bc_types_d, self.bc_values_d,
-            displacement_bc_magnitude, self.dt)
+            self.force_d, self.u_d, displacement_bc_magnitude, self.dt, nodes)
 
     def _build_special(self):
         """Build OpenCL kernels special to the Euler integrator."""
@@ -520,7 +1716,7 @@ class EulerCL(Integrator):
 
         # Build kernels
         self.euler = cl.Program(
-            self.context, kernel_source).build()
+            self.context, kernel_source).build(options=self.build_options)
         self.update_displacement_kernel = self.euler.update_displacement
 
     def _create_special_buffers(self):
@@ -528,16 +1724,17 @@ class EulerCL(Integrator):
         # There are none
 
     def _update_displacement(
-            self, force_d, u_d, bc_types_d, bc_values_d,
-            displacement_bc_magnitude, dt):
+            self, force_d, u_d, displacement_bc_magnitude, dt, nodes=None):
         """Update displacements."""
         queue = self.queue
+        ndofs, first = self._dofs(nodes)
         # Call kernel
         self.update_displacement_kernel(
-                self.queue, (self.degrees_freedom * self.nnodes,), None,
-                force_d, u_d, bc_types_d, bc_values_d,
-                np.float64(displacement_bc_magnitude), np.float64(dt))
+                self.queue, (ndofs, self.nsamples), None,
+                force_d, u_d, np.float64(dt), global_offset=(first, 0))
         queue.finish()
+        self._displacement_boundary_conditions(
+            u_d, displacement_bc_magnitude, nodes)
         return u_d
 
 
@@ -583,7 +1780,8 @@ class EulerCromerCL(Integrator):
         super().__init__(*args, **kwargs)
         self.damping = damping
 
-    def __call__(self, displacement_bc_magnitude, force_bc_magnitude):
+    def __call__(self, displacement_bc_magnitude, force_bc_magnitude,
+                 nodes=None):
         """
         Conduct one iteration of the integrator.
 
@@ -591,19 +1789,24 @@ class EulerCromerCL(Integrator):
              displacement boundary conditions for the current time-step.
         :arg float force_bc_magnitude: the magnitude applied to the force
             boundary conditions for the current time-step.
+        :arg nodes: The (first, last) range of nodes integrated, for a
+            time-step split into consecutive ranges, see
+            :meth:`Integrator._bond_force`. Default is None, which integrates
+            every node.
+        :type nodes: tuple(int, int) or NoneType
         """
         self._bond_force(
             self.u_d, self.force_d, self.body_force_d, self.r0_d, self.vols_d,
-            self.nlist_d, self.force_bc_types_d, self.force_bc_values_d,
+            self.nlist_d, self.family_d, self.n_neigh_d, self.damage_d,
             self.stiffness_corrections_d, self.bond_types_d, self.regimes_d,
             self.plus_cs_d, self.local_mem_x, self.local_mem_y,
             self.local_mem_z, self.bond_stiffness_d, self.critical_stretch_d,
-            force_bc_magnitude, self.nregimes)
+            force_bc_magnitude, self.nregimes, nodes)
 
         self._update_displacement(
-            self.force_d, self.u_d, self.ud_d, self.udd_d, self.bc_types_d,
-            self.bc_values_d, self.densities_d, displacement_bc_magnitude,
-            self.damping, self.dt)
+            self.force_d, self.u_d, self.ud_d, self.udd_d,
+            self.inverse_densities_d, displacement_bc_magnitude, self.damping,
+            self.dt, nodes)
 
     def _build_special(self):
         """Build OpenCL kernels special to the Euler integrator."""
@@ -615,9 +1818,10 @@ class EulerCromerCL(Integrator):
                 "supplied to :class:Model, alternatively, use a static "
                 " integrator, such as EulerCL.".format(type(self.densities)))
         else:
-            self.densities_d = cl.Buffer(
+            # The update kernel multiplies by the reciprocal of the density
+            self.inverse_densities_d = cl.Buffer(
                 self.context, mf.READ_ONLY | mf.COPY_HOST_PTR,
-                hostbuf=self.densities)
+                hostbuf=1.0 / self.densities)
 
         kernel_source = open(
             pathlib.Path(__file__).parent.absolute() /
@@ -625,7 +1829,7 @@ class EulerCromerCL(Integrator):
 
         # Build kernels
         self.euler_cromer = cl.Program(
-            self.context, kernel_source).build()
+            self.context, kernel_source).build(options=self.build_options)
         self.update_displacement_kernel = self.euler_cromer.update_displacement
 
     def _create_special_buffers(self):
@@ -633,18 +1837,20 @@ class EulerCromerCL(Integrator):
         # There are none
 
     def _update_displacement(
-            self, force_d, u_d, ud_d, udd_d, bc_types_d, bc_values_d,
-            densities_d, displacement_bc_magnitude, damping, dt):
+            self, force_d, u_d, ud_d, udd_d, inverse_densities_d,
+            displacement_bc_magnitude, damping, dt, nodes=None):
         """Update displacements."""
         queue = self.queue
+        ndofs, first = self._dofs(nodes)
         # Call kernel
         self.update_displacement_kernel(
-                self.queue, (self.degrees_freedom * self.nnodes,), None,
-                force_d, u_d, ud_d, udd_d, bc_types_d, bc_values_d,
-                densities_d, np.float64(displacement_bc_magnitude),
-                np.float64(damping), np.float64(dt)
-                )
+                self.queue, (ndofs, self.nsamples), None,
+                force_d, u_d, ud_d, udd_d, inverse_densities_d,
+                np.float64(damping), np.float64(dt),
+                global_offset=(first, 0))
         queue.finish()
+        self._displacement_boundary_conditions(
+            u_d, displacement_bc_magnitude, nodes)
         return u_d
 
 
@@ -697,7 +1903,8 @@ class VelocityVerletCL(Integrator):
         super().__init__(*args, **kwargs)
         self.damping = damping
 
-    def __call__(self, displacement_bc_magnitude, force_bc_magnitude):
+    def __call__(self, displacement_bc_magnitude, force_bc_magnitude,
+                 nodes=None):
         """
         Conduct one iteration of the integrator.
 
@@ -705,19 +1912,24 @@ class VelocityVerletCL(Integrator):
              displacement boundary conditions for the current time-step.
         :arg float force_bc_magnitude: the magnitude applied to the force
             boundary conditions for the current time-step.
+        :arg nodes: The (first, last) range of nodes integrated, for a
+            time-step split into consecutive ranges, see
+            :meth:`Integrator._bond_force`. Default is None, which integrates
+            every node.
+        :type nodes: tuple(int, int) or NoneType
         """
         self._bond_force(
             self.u_d, self.force_d, self.body_force_d, self.r0_d, self.vols_d,
-            self.nlist_d, self.force_bc_types_d, self.force_bc_values_d,
+            self.nlist_d, self.family_d, self.n_neigh_d, self.damage_d,
             self.stiffness_corrections_d, self.bond_types_d, self.regimes_d,
             self.plus_cs_d, self.local_mem_x, self.local_mem_y,
             self.local_mem_z, self.bond_stiffness_d, self.critical_stretch_d,
-            force_bc_magnitude, self.nregimes)
+            force_bc_magnitude, self.nregimes, nodes)
 
         self._update_displacement(
-            self.force_d, self.u_d, self.ud_d, self.udd_d, self.bc_types_d,
-            self.bc_values_d, self.densities_d, displacement_bc_magnitude,
-            self.damping, self.dt)
+            self.force_d, self.u_d, self.ud_d, self.udd_d,
+            self.inverse_densities_d, displacement_bc_magnitude, self.damping,
+            self.dt, nodes)
 
     def _build_special(self):
         """Build OpenCL kernels special to the Euler integrator."""
@@ -729,9 +1941,10 @@ class VelocityVerletCL(Integrator):
                 "supplied to :class:Model, alternatively, use a static "
                 " integrator, such as EulerCL.".format(type(self.densities)))
         else:
-            self.densities_d = cl.Buffer(
+            # The update kernel multiplies by the reciprocal of the density
+            self.inverse_densities_d = cl.Buffer(
                 self.context, mf.READ_ONLY | mf.COPY_HOST_PTR,
-                hostbuf=self.densities)
+                hostbuf=1.0 / self.densities)
 
         kernel_source = open(
             pathlib.Path(__file__).parent.absolute() /
@@ -739,7 +1952,7 @@ class VelocityVerletCL(Integrator):
 
         # Build kernels
         self.euler_cromer = cl.Program(
-            self.context, kernel_source).build()
+            self.context, kernel_source).build(options=self.build_options)
         self.update_displacement_kernel = self.euler_cromer.update_displacement
         self.partial_update_displacement_kernel = (
             self.euler_cromer.update_displacement)
@@ -749,20 +1962,833 @@ class VelocityVerletCL(Integrator):
         # There are none
 
     def _update_displacement(
-            self, force_d, u_d, ud_d, udd_d, bc_types_d, bc_values_d,
-            densities_d, displacement_bc_magnitude, damping, dt):
+            self, force_d, u_d, ud_d, udd_d, inverse_densities_d,
+            displacement_bc_magnitude, damping, dt, nodes=None):
+        """Update displacements."""
+        queue = self.queue
+        ndofs, first = self._dofs(nodes)
+        # Call kernel
+        self.update_displacement_kernel(
+                self.queue, (ndofs, self.nsamples), None,
+                force_d, u_d, ud_d, udd_d, inverse_densities_d,
+                np.float64(damping), np.float64(dt),
+                global_offset=(first, 0))
+        queue.finish()
+        self._displacement_boundary_conditions(
+            u_d, displacement_bc_magnitude, nodes)
+        return u_d
+
+
+class AdaptiveDynamicRelaxationCL(Integrator):
+    r"""
+    Adaptive dynamic relaxation integrator for OpenCL.
+
+    Adaptive dynamic relaxation (ADR) finds the quasi-static solution of each
+    load increment by integrating a fictitiously damped system with a
+    central difference scheme, whose masses and damping are chosen for fast
+    convergence rather than for physical inertia. The integration is given
+    by,
+
+    .. math::
+        \dot{u}(t + \frac{\delta t}{2}) = \frac{(2 - c \delta t)
+            \dot{u}(t - \frac{\delta t}{2}) + 2 \delta t \Lambda^{-1} f(t)}
+            {2 + c \delta t},
+    .. math::
+        u(t + \delta t) = u(t) + \delta t \dot{u}(t + \frac{\delta t}{2}),
+
+    where :math:`u(t)` is the displacement at time :math:`t`,
+    :math:`\dot{u}(t)` is the velocity at time :math:`t`, :math:`f(t)` is the
+    force density at time :math:`t` and :math:`\delta t` is the time step.
+    The diagonal fictitious mass of each node,
+
+    .. math::
+        \lambda_i = \frac{\delta t^2}{4} \sum_j \frac{c_{ij} V_j}{|\xi_{ij}|},
+
+    bounds the stiffness of its bonds, so that the scheme is stable for any
+    :math:`\delta t`, where :math:`c_{ij}` is the (corrected) bond stiffness,
+    :math:`V_j` the volume of the neighbour and :math:`\xi_{ij}` the bond.
+    The damping coefficient :math:`c` is updated every time-step from the
+    Rayleigh quotient of the local diagonal stiffness,
+
+    .. math::
+        c = 2 \sqrt{\frac{u^T K u}{u^T u}}, \quad K_{ii} = -\frac{
+            \lambda_i^{-1} (f_i(t) - f_i(t - \delta t))}
+            {\delta t \dot{u}_i(t - \frac{\delta t}{2})},
+
+    which is reduced on the device, so that the system is close to
+    critically damped in its lowest mode throughout the simulation. The
+    damping is zero if the quotient is not positive, and at most
+    :math:`2 / \delta t`.
+
+    The densities of the model, if any, are not used. Ensembles are not
+    supported.
+    """
+
+    # The damping coefficient of a time-step is reduced over every node
+    _split_steps = False
+
+    def __init__(self, dt=1.0, **kwargs):
+        """
+        Create an :class:`AdaptiveDynamicRelaxationCL` integrator object.
+
+        :arg float dt: The fictitious time step. Default is 1.0.
+        :arg kwargs: The keyword arguments of :class:`Integrator`, e.g.
+            `context`.
+
+        :returns: An :class:`AdaptiveDynamicRelaxationCL` object
+        """
+        super().__init__(dt, **kwargs)
+
+    def __call__(self, displacement_bc_magnitude, force_bc_magnitude):
+        """
+        Conduct one iteration of the integrator.
+
+        :arg float displacement_bc_magnitude: the magnitude applied to the
+             displacement boundary conditions for the current time-step.
+        :arg float force_bc_magnitude: the magnitude applied to the force
+            boundary conditions for the current time-step.
+        """
+        self._bond_force(
+            self.u_d, self.force_d, self.body_force_d, self.r0_d, self.vols_d,
+            self.nlist_d, self.family_d, self.n_neigh_d, self.damage_d,
+            self.stiffness_corrections_d, self.bond_types_d, self.regimes_d,
+            self.plus_cs_d, self.local_mem_x, self.local_mem_y,
+            self.local_mem_z, self.bond_stiffness_d, self.critical_stretch_d,
+            force_bc_magnitude, self.nregimes)
+
+        self._damping_coefficient(
+            self.force_d, self.u_d, self.ud_d, self.udd_d,
+            self.inverse_masses_d, self.dt)
+
+        self._update_displacement(
+            self.force_d, self.u_d, self.ud_d, self.udd_d,
+            self.inverse_masses_d, displacement_bc_magnitude, self.dt)
+
+    def _build_special(self):
+        """Build OpenCL kernels special to the ADR integrator."""
+        kernel_source = open(
+            pathlib.Path(__file__).parent.absolute() /
+            "cl/adaptive_dynamic_relaxation.cl").read()
+
+        # Build kernels
+        self.adaptive_dynamic_relaxation = cl.Program(
+            self.context, kernel_source).build(options=self.build_options)
+        self.damping_partial_sums_kernel = (
+            self.adaptive_dynamic_relaxation.damping_partial_sums)
+        self.damping_coefficient_kernel = (
+            self.adaptive_dynamic_relaxation.damping_coefficient)
+        self.update_displacement_kernel = (
+            self.adaptive_dynamic_relaxation.update_displacement)
+
+        # The damping coefficient, the Rayleigh quotient is reduced in the
+        # partial sums of the reductions over the degrees of freedom
+        self.ndofs = self.stride * self.nnodes
+        self.damping_d = cl.Buffer(
+            self.context, mf.READ_WRITE, np.dtype(np.float64).itemsize)
+
+    def create_buffers(
+            self, nlist, n_neigh, bond_stiffness, critical_stretch, plus_cs, u,
+            ud, udd, force, body_force, damage, regimes, nregimes,
+            nbond_types, stiffness_corrections=None):
+        """
+        Initialise the OpenCL buffers.
+
+        The fictitious masses are calculated from the unbroken bonds of
+        `nlist` and the bond stiffness of the simulation, see
+        :meth:`Integrator.create_buffers`.
+        """
+        self.inverse_masses = self._inverse_masses(
+            nlist, bond_stiffness, nbond_types, stiffness_corrections)
+        super().create_buffers(
+            nlist, n_neigh, bond_stiffness, critical_stretch, plus_cs, u, ud,
+            udd, force, body_force, damage, regimes, nregimes, nbond_types,
+            stiffness_corrections=stiffness_corrections)
+
+    def create_ensemble_buffers(self, *args, **kwargs):
+        """Raise a ValueError, ensembles are not supported."""
+        raise ValueError("ensembles are not supported by "
+                         "AdaptiveDynamicRelaxationCL (got {})".format(
+                             type(self)))
+
+    def _create_special_buffers(self):
+        """Create buffers special to the ADR integrator."""
+        self.inverse_masses_d = self._upload(
+            "inverse_masses", self.inverse_masses, mf.READ_ONLY)
+        # The half-step velocities of the first step start from rest
+        self.first = True
+
+    def _inverse_masses(
+            self, nlist, bond_stiffness, nbond_types, stiffness_corrections):
+        """
+        Calculate the reciprocal of the fictitious mass of each node.
+
+        The stiffness of each bond is the largest magnitude of the bond
+        stiffness of its bond type over the regimes of the damage model.
+        Nodes without bonds have no force, and are given an inverse mass of
+        zero.
+
+        :arg nlist: The neighbour list.
+        :type nlist: :class:`numpy.ndarray`
+        :arg bond_stiffness: The bond stiffness, see
+            :meth:`Integrator.create_buffers`.
+        :type bond_stiffness: :class:`numpy.ndarray` or float
+        :arg int nbond_types: The number of bond types.
+        :arg stiffness_corrections: The stiffness corrections of the
+            simulation, or None to use those of the model.
+        :type stiffness_corrections: :class:`numpy.ndarray` or NoneType
+
+        :returns: The (nnodes,) reciprocal of the mass of each node.
+        :rtype: :class:`numpy.ndarray`
+        """
+        coords, volume = self._build_args[3], self._build_args[4]
+        bond_types = self._build_args[11]
+        if stiffness_corrections is None:
+            stiffness_corrections = self._build_args[10]
+        nodes = np.arange(self.nnodes)[:, np.newaxis]
+        bonded = nlist != -1
+        neighbours = np.where(bonded, nlist, nodes)
+        # Unbonded neighbours are the node itself, at a length of one
+        lengths = np.linalg.norm(coords[neighbours] - coords[nodes], axis=-1)
+        lengths[~bonded] = 1.0
+        stiffness = np.max(np.abs(np.reshape(
+            bond_stiffness, (nbond_types, -1))), axis=1)
+        if bond_types is not None:
+            stiffness = stiffness[bond_types]
+        else:
+            stiffness = stiffness[0]
+        bonds = np.where(bonded, stiffness * volume[neighbours] / lengths, 0.0)
+        if stiffness_corrections is not None:
+            bonds *= stiffness_corrections
+        masses = self.dt**2 / 4 * np.sum(bonds, axis=1)
+        inverse_masses = np.zeros(self.nnodes, dtype=np.float64)
+        np.divide(1.0, masses, out=inverse_masses, where=masses > 0)
+        return inverse_masses
+
+    def _damping_coefficient(
+            self, force_d, u_d, ud_d, udd_d, inverse_masses_d, dt):
+        """Update the damping coefficient from the Rayleigh quotient."""
+        queue = self.queue
+        # Call kernels
+        self.damping_partial_sums_kernel(
+            queue, (self.ngroups * self.reduction_size,),
+            (self.reduction_size,), force_d, u_d, ud_d, udd_d,
+            inverse_masses_d, self.partial_sums_d, self.reduction_mem,
+            np.intc(self.ndofs), np.float64(dt))
+        self.damping_coefficient_kernel(
+            queue, (self.reduction_size,), (self.reduction_size,),
+            self.partial_sums_d, self.damping_d, self.reduction_mem,
+            np.intc(self.ngroups), np.float64(dt))
+        queue.finish()
+
+    def _update_displacement(
+            self, force_d, u_d, ud_d, udd_d, inverse_masses_d,
+            displacement_bc_magnitude, dt):
         """Update displacements."""
         queue = self.queue
         # Call kernel
         self.update_displacement_kernel(
-                self.queue, (self.degrees_freedom * self.nnodes,), None,
-                force_d, u_d, ud_d, udd_d, bc_types_d, bc_values_d,
-                densities_d, np.float64(displacement_bc_magnitude),
-                np.float64(damping), np.float64(dt)
-                )
+                queue, (self.ndofs,), None, force_d, u_d, ud_d, udd_d,
+                inverse_masses_d, self.damping_d, np.float64(dt),
+                np.intc(self.first))
         queue.finish()
+        self.first = False
+        self._displacement_boundary_conditions(u_d, displacement_bc_magnitude)
+        # The constrained degrees of freedom are at rest, so that they are
+        # not included in the Rayleigh quotient
+        self._displacement_boundary_conditions(ud_d, 0.0)
         return u_d
 
+    def read_damping(self):
+        """
+        Copy the damping coefficient of the last time-step to the host.
+
+        :returns: The damping coefficient.
+        :rtype: float
+        """
+        damping = np.empty(1, dtype=np.float64)
+        cl.enqueue_copy(self.queue, damping, self.damping_d)
+        return float(damping[0])
+
+
+class EulerCromer(Integrator):
+    r"""
+    Euler Cromer integrator for cython.
+
+    C implementation of the Euler Cromer integrator generated using Cython.
+    Uses CPU only, parallelised with OpenMP. Unlike :class:`Euler`, it
+    supports the full feature set of the OpenCL integrators: n-linear damage
+    models, bond types, stiffness corrections and densities. The integration
+    is given by,
+
+    .. math::
+        \dot{u}(t + \delta t) = \dot{u}(t) + \delta t \ddot{u}(t),
+    .. math::
+        u(t + \delta t) = u(t) + \delta t \dot{u}(t + \delta t),
+
+    where :math:`u(t)` is the displacement at time :math:`t`,
+    :math:`\dot{u}(t)` is the velocity at time :math:`t`, :math:`\ddot{u}(t)`
+    is the acceleration at time :math:`t`, and :math:`\delta t` is the time
+    step. The acceleration is given by the equation of motion with a dynamic
+    relaxation damping term, as for :class:`EulerCromerCL`.
+
+    Broken bonds are marked with -1 in the neighbour list, as they are by the
+    OpenCL integrators, rather than removed.
+    """
+
+    def __init__(self, damping, dt, num_threads=None):
+        """
+        Create an :class:`EulerCromer` integrator object.
+
+        :arg float damping: The dynamic relaxation damping constant with units
+            [kg/(m^3 s)]
+        :arg float dt: The length of time (in seconds [s]) of one time-step.
+        :arg int num_threads: The number of OpenMP threads used by the
+            integrator. If None, the OpenMP default is used, which may be set
+            with the OMP_NUM_THREADS environment variable. Default None.
+
+        :returns: An :class:`EulerCromer` object
+        """
+        if num_threads is not None and num_threads < 1:
+            raise ValueError("num_threads must be a positive int "
+                             "(got {})".format(num_threads))
+        self.damping = damping
+        self.dt = dt
+        self.num_threads = num_threads
+        # Not an OpenCL integrator
+        self.context = None
+        # Broken bonds are not logged
+        self.bond_events = None
+
+    def __call__(self, displacement_bc_magnitude, force_bc_magnitude):
+        """
+        Conduct one iteration of the integrator.
+
+        :arg float displacement_bc_magnitude: the magnitude applied to the
+             displacement boundary conditions for the current time-step.
+        :arg float force_bc_magnitude: the magnitude applied to the force
+            boundary conditions for the current time-step.
+        """
+        # Break bonds and calculate the force due to bonds on each node
+        bond_force4(
+            self.u, self.force, self.body_force, self.coords, self.volume,
+            self.nlist, self.n_neigh, self.force_bc_types,
+            self.force_bc_values, self.stiffness_corrections, self.bond_types,
+            self.regimes, self.plus_cs, self.bond_stiffness,
+            self.critical_stretch, force_bc_magnitude, self.nregimes,
+            num_threads=self.num_threads)
+
+        # Conduct one integration step
+        self._update_displacement(
+            self.force, self.u, self.ud, self.udd, displacement_bc_magnitude)
+
+    def create_buffers(
+            self, nlist, n_neigh, bond_stiffness, critical_stretch, plus_cs,
+            u, ud, udd, force, body_force, damage, regimes, nregimes,
+            nbond_types, stiffness_corrections=None):
+        """
+        Initiate arrays that are dependent on simulation parameters.
+
+        Initiates arrays that are dependent on
+        :meth:`peripy.model.Model.simulate` parameters. Since
+        :class:`EulerCromer` uses cython in place of OpenCL, there are no
+        buffers to be created, just python objects that are used as arguments
+        of the cython functions.
+
+        If `stiffness_corrections` is not None, the (nnodes, max_neighbours)
+        stiffness corrections are applied in place of those of the model for
+        this simulation.
+        """
+        # Mark the slots past the end of each initial family as broken bonds
+        slots = np.arange(np.shape(nlist)[1])
+        self.nlist = np.where(
+            slots[np.newaxis, :] < self.family[:, np.newaxis], nlist,
+            -1).astype(np.intc)
+        self.n_neigh = n_neigh
+        # The damage model, indexed by bond_type * nregimes + regime
+        self.bond_stiffness = np.ravel(
+            np.asarray(bond_stiffness, dtype=np.float64))
+        self.critical_stretch = np.ravel(
+            np.asarray(critical_stretch, dtype=np.float64))
+        if plus_cs is None:
+            self.plus_cs = np.zeros_like(self.bond_stiffness)
+        else:
+            self.plus_cs = np.ravel(np.asarray(plus_cs, dtype=np.float64))
+        self.regimes = np.asarray(regimes, dtype=np.intc)
+        self.nregimes = np.intc(nregimes)
+        if stiffness_corrections is None:
+            self.stiffness_corrections = self.model_stiffness_corrections
+        else:
+            self.stiffness_corrections = np.asarray(
+                stiffness_corrections, dtype=np.float64)
+        self.u = u
+        self.ud = ud
+        self.udd = udd
+        self.force = force
+        self.body_force = body_force
+
+    def build(
+            self, nnodes, degrees_freedom, max_neighbours, coords, volume,
+            family, bc_types, bc_values, force_bc_types, force_bc_values,
+            stiffness_corrections, bond_types, densities):
+        """
+        Initiate integrator arrays.
+
+        Since :class:`EulerCromer` uses cython in place of OpenCL, there are
+        no OpenCL programs or buffers to be built/created. Instead, this
+        method instantiates the arrays and variables that are independent of
+        :meth:`peripy.model.Model.simulate` parameters as python
+        objects that are used as arguments of the cython functions.
+        """
+        self.nnodes = nnodes
+        self.degrees_freedom = degrees_freedom
+        self.max_neighbours = max_neighbours
+        self.coords = coords
+        self.family = family
+        self.volume = volume
+        self.bc_types = bc_types
+        self.bc_values = bc_values
+        self.force_bc_types = force_bc_types
+        self.force_bc_values = force_bc_values
+        self.model_stiffness_corrections = stiffness_corrections
+        self.bond_types = bond_types
+        if densities is None:
+            raise ValueError(
+                "densities must be supplied when using {} "
+                "integrator (got {}). This integrator is dynamic "
+                " and requires the density or is_density argument to be "
+                "supplied to :class:Model, alternatively, use a static "
+                " integrator, such as Euler.".format(
+                    type(self).__name__, type(densities)))
+        self.densities = densities
+
+    def plan_memory(self, *args, **kwargs):
+        """Do nothing, the cython integrators do not use device memory."""
+
+    def _create_special_buffers(self):
+        """Create buffers programs that are special to the integrator."""
+        # There are none
+
+    def _build_special(self):
+        """Build programs that are special to the integrator."""
+        # There are none
+
+    def _update_displacement(self, force, u, ud, udd,
+                             displacement_bc_magnitude):
+        """Update displacements."""
+        update_displacement_euler_cromer(
+            force, u, ud, udd, self.bc_types, self.bc_values, self.densities,
+            displacement_bc_magnitude, self.damping, self.dt,
+            num_threads=self.num_threads)
+
+    def _damage(self, n_neigh):
+        """Calculate bond damage."""
+        return damage(n_neigh, self.family)
+
+    def _residual_sums(self, nnodes=None):
+        """Reduce the sums of squares of the forces and velocities."""
+        return _residual_sums(self.force, self.ud, self.bc_types, nnodes)
+
+    def write(self, u, ud, udd, force, body_force, damage, nlist, n_neigh):
+        """Return the state variable arrays."""
+        damage = self._damage(self.n_neigh)
+        return (self.u, self.ud, self.udd, self.force, self.body_force,
+                damage, self.nlist, self.n_neigh)
+
+
+class VelocityVerlet(EulerCromer):
+    r"""
+    Velocity-Verlet integrator for cython.
+
+    C implementation of the Velocity-Verlet integrator generated using Cython.
+    Uses CPU only, parallelised with OpenMP, and supports the same features
+    as :class:`EulerCromer`. The integration is given by,
+
+    .. math::
+        \dot{u}(t + \frac{\delta t}{2}) = \dot{u}(t) +
+        \frac{\delta t}{2}\ddot{u}(t),
+    .. math::
+        u(t + \delta t) = u(t) + \delta t \dot{u}(t)
+                            + \frac{\delta t}{2} \ddot{u}(t),
+    .. math::
+        \dot{u}(t + \delta t) = \dot{u}(t + \frac{\delta t}{2})
+                            + \frac{\delta t}{2} \ddot{u}(t + \delta t),
+
+    where :math:`u(t)` is the displacement at time :math:`t`,
+    :math:`\dot{u}(t)` is the velocity at time :math:`t`, :math:`\ddot{u}(t)`
+    is the acceleration at time :math:`t` and :math:`\delta t` is the time
+    step. The acceleration is given by the equation of motion with a dynamic
+    relaxation damping term, as for :class:`VelocityVerletCL`.
+    """
+
+    def __init__(self, damping, dt, num_threads=None):
+        """
+        Create a :class:`VelocityVerlet` integrator object.
+
+        :arg float damping: The dynamic relaxation damping constant with units
+            [kg/(m^3 s)]
+        :arg float dt: The length of time (in seconds [s]) of one time-step.
+        :arg int num_threads: The number of OpenMP threads used by the
+            integrator. If None, the OpenMP default is used, which may be set
+            with the OMP_NUM_THREADS environment variable. Default None.
+
+        :returns: A :class:`VelocityVerlet` object
+        """
+        super().__init__(damping, dt, num_threads=num_threads)
+
+    def _update_displacement(self, force, u, ud, udd,
+                             displacement_bc_magnitude):
+        """Update displacements."""
+        update_displacement_velocity_verlet(
+            force, u, ud, udd, self.bc_types, self.bc_values, self.densities,
+            displacement_bc_magnitude, self.damping, self.dt,
+            num_threads=self.num_threads)
+
+
+class EulerShared(Integrator):
+    r"""
+    Euler integrator for several processes which share memory.
+
+    An alternative to the OpenMP threads of :class:`Euler` for where the
+    cython extensions cannot be built with OpenMP. The initial and current
+    coordinates, the displacements, the forces, the neighbour list and the
+    number of neighbours of each node are kept in
+    :mod:`multiprocessing.shared_memory` blocks. Each process of a pool of
+    worker processes breaks the bonds, calculates the forces and updates the
+    displacements of a range of nodes with
+    :func:`peripy.peridynamics.break_bonds`,
+    :func:`peripy.peridynamics.bond_force` and
+    :func:`peripy.peridynamics.update_displacement`, and the processes
+    synchronise at barriers each time-step. The ranges have equal numbers of
+    bonds. The integration is that of :class:`Euler`.
+
+    The worker processes are started when the integrator is built and are
+    stopped by :meth:`EulerShared.close`, or when the integrator is garbage
+    collected. If a worker process exits, or the worker processes do not
+    finish a time-step within the timeout, the worker processes are
+    terminated, the shared memory blocks are freed and a
+    :class:`RuntimeError` is raised.
+    """
+
+    def __init__(self, dt, processes=None, timeout=60.0):
+        """
+        Create an :class:`EulerShared` integrator object.
+
+        :arg float dt: The length of time (in seconds [s]) of one time-step.
+        :arg int processes: The number of worker processes. If None, the
+            number of CPUs is used. Default None.
+        :arg float timeout: The time (in seconds [s]) to wait for the worker
+            processes at each barrier of a time-step, after which they are
+            assumed to have failed. If None, the wait is not limited.
+            Default 60.0.
+
+        :returns: An :class:`EulerShared` object
+        """
+        if processes is None:
+            processes = os.cpu_count()
+        if int(processes) != processes or processes < 1:
+            raise ValueError("processes must be a positive int "
+                             "(got {})".format(processes))
+        if timeout is not None and not timeout > 0:
+            raise ValueError("timeout must be positive or None "
+                             "(got {})".format(timeout))
+        self.dt = dt
+        self.processes = int(processes)
+        self.timeout = timeout
+        # Not an OpenCL integrator
+        self.context = None
+        # Broken bonds are not logged
+        self.bond_events = None
+        self._close = None
+
+    def __call__(self, displacement_bc_magnitude, force_bc_magnitude):
+        """
+        Conduct one iteration of the integrator.
+
+        :arg float displacement_bc_magnitude: the magnitude applied to the
+             displacement boundary conditions for the current time-step.
+        :arg float force_bc_magnitude: the magnitude applied to the force
+            boundary conditions for the current time-step.
+        """
+        self._control[0] = displacement_bc_magnitude
+        self._control[1] = force_bc_magnitude
+        try:
+            self._start.wait(self.timeout)
+            self._end.wait(self.timeout)
+        except threading.BrokenBarrierError:
+            exitcodes = [worker.exitcode for worker in self._workers]
+            self.close()
+            if any(exitcode is not None for exitcode in exitcodes):
+                raise RuntimeError(
+                    "a worker process of EulerShared exited (got exit "
+                    "codes {})".format(exitcodes)) from None
+            raise RuntimeError(
+                "the worker processes of EulerShared did not finish the "
+                "time-step within the timeout (got {} s)".format(
+                    self.timeout)) from None
+
+    def create_buffers(
+            self, nlist, n_neigh, bond_stiffness, critical_stretch, plus_cs,
+            u, ud, udd, force, body_force, damage, regimes, nregimes,
+            nbond_types, stiffness_corrections=None):
+        """
+        Copy the arrays that are dependent on simulation parameters.
+
+        The neighbour list, the number of neighbours and the displacements
+        are copied to the shared memory blocks of the worker processes.
+        """
+        if nregimes != 1:
+            raise ValueError("n-linear damage model's are not supported by "
+                             "this integrator. Please supply just one "
+                             "bond_stiffness.")
+        if nbond_types != 1:
+            raise ValueError("n-material composite models are not supported by"
+                             " this integrator. Please supply just one "
+                             "material type and bond_stiffness.")
+        if stiffness_corrections is not None:
+            raise ValueError("stiffness_corrections are not supported by this "
+                             "integrator (expected {}, got {}), please use "
+                             "EulerCL instead".format(
+                                 type(None),
+                                 type(stiffness_corrections)))
+        self._arrays["nlist"][...] = nlist
+        self._arrays["n_neigh"][...] = n_neigh
+        self._arrays["u"][...] = u
+        self._arrays["r"][...] = self._arrays["r0"] + u
+        self._arrays["force"][...] = 0
+        self._control[2] = bond_stiffness
+        self._control[3] = critical_stretch
+        self.ud = ud
+        self.udd = udd
+        self.body_force = body_force
+
+    def build(
+            self, nnodes, degrees_freedom, max_neighbours, coords, volume,
+            family, bc_types, bc_values, force_bc_types, force_bc_values,
+            stiffness_corrections, bond_types, densities):
+        """
+        Create the shared memory blocks and start the worker processes.
+
+        The arguments which are not shared are copied to each worker process
+        when it is started.
+        """
+        if bond_types is not None:
+            raise ValueError("bond_types are not supported by this "
+                             "integrator (expected {}, got {}), please use "
+                             "EulerCL instead".format(
+                                 type(None),
+                                 type(bond_types)))
+        if stiffness_corrections is not None:
+            raise ValueError("stiffness_corrections are not supported by this "
+                             "integrator (expected {}, got {}), please use "
+                             "EulerCL instead".format(
+                                 type(None),
+                                 type(stiffness_corrections)))
+        if densities is not None:
+            raise ValueError("densities are not supported by this "
+                             "integrator (expected {}, got {}). This "
+                             " integrator neglects inertial effects. Do not "
+                             "supply a density or is_density argument or, "
+                             "alternatively, please use a dynamic integrator, "
+                             "such as EulerCromerCL.".format(
+                                 type(None),
+                                 type(densities)))
+        self.close()
+        self.nnodes = nnodes
+        self.family = family
+        self.bc_types = bc_types
+
+        shapes = {
+            "r0": ((nnodes, 3), np.float64),
+            "r": ((nnodes, 3), np.float64),
+            "u": ((nnodes, 3), np.float64),
+            "force": ((nnodes, 3), np.float64),
+            "nlist": ((nnodes, max_neighbours), np.intc),
+            "n_neigh": ((nnodes,), np.intc)
+            }
+        blocks = {}
+        self._arrays = {}
+        for name, (shape, dtype) in shapes.items():
+            blocks[name] = shared_memory.SharedMemory(
+                create=True,
+                size=max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1))
+            self._arrays[name] = np.ndarray(
+                shape, dtype=dtype, buffer=blocks[name].buf)
+        self._arrays["r0"][...] = coords
+
+        # The ranges of nodes of the processes have equal numbers of bonds
+        bonds = np.concatenate([[0], np.cumsum(family)])
+        bounds = np.searchsorted(
+            bonds, np.linspace(0, bonds[-1], self.processes + 1))
+        bounds[0], bounds[-1] = 0, nnodes
+
+        mp_context = multiprocessing.get_context("spawn")
+        # The magnitudes of the boundary conditions, the bond stiffness, the
+        # critical stretch and whether the workers stop
+        self._control = mp_context.Array("d", 5, lock=False)
+        self._start = mp_context.Barrier(self.processes + 1)
+        self._end = mp_context.Barrier(self.processes + 1)
+        # Kept, as the semaphores are freed when the barrier is collected
+        self._middle = mp_context.Barrier(self.processes)
+        workers = [
+            mp_context.Process(
+                target=_shared_worker, daemon=True, args=(
+                    {name: (block.name,) + shapes[name]
+                     for name, block in blocks.items()},
+                    bounds[process], bounds[process + 1], volume, bc_types,
+                    bc_values, force_bc_types, force_bc_values, self.dt,
+                    self._control, self._start, self._middle, self._end,
+                    self.timeout))
+            for process in range(self.processes)]
+        for worker in workers:
+            worker.start()
+        self._workers = workers
+        self._close = weakref.finalize(
+            self, _close_shared, workers, blocks, self._control,
+            (self._start, self._middle, self._end), self.timeout)
+
+    def close(self):
+        """Stop the worker processes and free the shared memory blocks."""
+        if self._close is not None:
+            self._close()
+            self._close = None
+
+    def plan_memory(self, *args, **kwargs):
+        """Do nothing, the cython integrators do not use device memory."""
+
+    def _create_special_buffers(self):
+        """Create buffers programs that are special to the integrator."""
+        # There are none
+
+    def _build_special(self):
+        """Build programs that are special to the integrator."""
+        # There are none
+
+    def _damage(self, n_neigh):
+        """Calculate bond damage."""
+        return damage(n_neigh, self.family)
+
+    def _residual_sums(self, nnodes=None):
+        """Reduce the sums of squares of the forces and velocities."""
+        return _residual_sums(
+            self._arrays["force"], self.ud, self.bc_types, nnodes)
+
+    def write(self, u, ud, udd, force, body_force, damage, nlist, n_neigh):
+        """
+        Return copies of the state variable arrays.
+
+        The arrays are copied out of the shared memory blocks, so that they
+        outlive the integrator.
+        """
+        n_neigh = self._arrays["n_neigh"].copy()
+        return (self._arrays["u"].copy(), self.ud, self.udd,
+                self._arrays["force"].copy(), self.body_force,
+                self._damage(n_neigh), self._arrays["nlist"].copy(),
+                n_neigh)
+
+
+def _residual_sums(force, ud, bc_types, nnodes=None):
+    """
+    Reduce the sums of squares of the forces and velocities on the host.
+
+    :arg force: The (nnodes, 3) forces.
+    :type force: :class:`numpy.ndarray`
+    :arg ud: The (nnodes, 3) velocities.
+    :type ud: :class:`numpy.ndarray`
+    :arg bc_types: The (nnodes, 3) displacement boundary condition types.
+    :type bc_types: :class:`numpy.ndarray`
+    :arg int nnodes: The number of nodes, from the first, to reduce over.
+        Default is None, which reduces over every node.
+
+    :returns: The (2,) sums of squares of the forces and of the velocities
+        of the degrees of freedom without a displacement boundary condition.
+    :rtype: :class:`numpy.ndarray`
+    """
+    free = bc_types[:nnodes] == 0
+    return np.array([np.sum(force[:nnodes][free]**2),
+                     np.sum(ud[:nnodes][free]**2)])
+
+
+def _shared_worker(blocks, first, last, volume, bc_types, bc_values,
+                   force_bc_types, force_bc_values, dt, control, start,
+                   middle, end, timeout):
+    """
+    Integrate a range of nodes of an :class:`EulerShared` integrator.
+
+    The worker stops when it is told to by the control array, or when a
+    barrier is broken, which is when another process has failed.
+
+    :arg dict blocks: The name, shape and dtype of each shared memory block.
+    :arg int first: The first node of the range.
+    :arg int last: The node after the last node of the range.
+    :arg control: The magnitudes of the boundary conditions, the bond
+        stiffness, the critical stretch and whether to stop.
+    :type control: :class:`multiprocessing.Array`
+    :arg start: The barrier at the start of each time-step.
+    :type start: :class:`multiprocessing.Barrier`
+    :arg middle: The barrier after the forces are calculated, so that no
+        displacement is updated while it is read by another process.
+    :type middle: :class:`multiprocessing.Barrier`
+    :arg end: The barrier at the end of each time-step.
+    :type end: :class:`multiprocessing.Barrier`
+    :arg float timeout: The time (in seconds [s]) to wait at the barriers
+        within a time-step, or None.
+    """
+    shared = {name: shared_memory.SharedMemory(name=block)
+              for name, (block, _, _) in blocks.items()}
+    arrays = {name: np.ndarray(shape, dtype=dtype, buffer=shared[name].buf)
+              for name, (_, shape, dtype) in blocks.items()}
+    r0, r, u, force, nlist, n_neigh = (arrays[name] for name in [
+        "r0", "r", "u", "force", "nlist", "n_neigh"])
+    try:
+        while True:
+            # The parent may wait for any time between time-steps
+            start.wait()
+            if control[4]:
+                break
+            break_bonds(r, r0, nlist, n_neigh, control[3], num_threads=1,
+                        first=first, last=last)
+            bond_force(r, r0, nlist, n_neigh, volume, control[2],
+                       force_bc_values, force_bc_types, control[1],
+                       num_threads=1, first=first, last=last, force=force)
+            middle.wait(timeout)
+            update_displacement(
+                u[first:last], bc_values[first:last], bc_types[first:last],
+                force[first:last], control[0], dt, num_threads=1)
+            r[first:last] = r0[first:last] + u[first:last]
+            end.wait(timeout)
+    except threading.BrokenBarrierError:
+        pass
+    del r0, r, u, force, nlist, n_neigh, arrays
+    for block in shared.values():
+        block.close()
+
+
+def _close_shared(workers, blocks, control, barriers, timeout):
+    """
+    Stop the workers of an :class:`EulerShared` integrator.
+
+    If a worker is no longer alive, or the workers do not reach the barrier
+    at the start of a time-step within the timeout, the barriers are aborted
+    and the workers are terminated instead.
+    """
+    stopped = all(worker.is_alive() for worker in workers)
+    if stopped:
+        control[4] = 1
+        try:
+            barriers[0].wait(timeout)
+        except threading.BrokenBarrierError:
+            stopped = False
+    if not stopped:
+        for barrier in barriers:
+            barrier.abort()
+        for worker in workers:
+            worker.terminate()
+    for worker in workers:
+        worker.join()
+    for block in blocks.values():
+        block.close()
+        block.unlink()
+
 
 class ContextError(Exception):
     """No suitable context was found by :func:`get_context`."""
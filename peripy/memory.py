@@ -0,0 +1,170 @@
+"""Plan the device memory of the buffers of the OpenCL integrators."""
+import numpy as np
+
+
+def footprint(nnodes, max_neighbours, nbond_types=1, nregimes=1,
+              degrees_freedom=3, stiffness_corrections=False,
+              bond_types=None, densities=False, nsamples=1, nbcs=None,
+              nforce_bcs=None, bond_geometry=None, vector_layout=False,
+              compact_metadata=None, bond_events=None, compaction=None):
+    """
+    Return the device memory of each buffer of a simulation.
+
+    The sizes are calculated from the dimensions of the model and the
+    options of the integrator, without building the integrator, in the
+    same way as :meth:`peripy.integrators.Integrator.build` and
+    :meth:`peripy.integrators.Integrator.create_buffers` allocate the
+    buffers. Local memory, the partial sums of the reductions over the
+    degrees of freedom and the stiffness corrections which may be supplied
+    to :meth:`peripy.model.Model.simulate` are not included.
+
+    :arg int nnodes: The number of nodes.
+    :arg int max_neighbours: The width of the bond arrays, a power of two.
+    :arg int nbond_types: The number of bond types. Default is 1.
+    :arg int nregimes: The number of regimes of the damage model. Default
+        is 1.
+    :arg int degrees_freedom: The number of degrees of freedom of each
+        node. Default is 3.
+    :arg bool stiffness_corrections: Whether the model has stiffness
+        corrections. Default is False.
+    :arg bool bond_types: Whether the model has a bond type array. Default
+        is None, which is True if there is more than one bond type or
+        regime, as for a model that calculates its bond types.
+    :arg bool densities: Whether the integrator uploads the densities of
+        the nodes, as the dynamic integrators do. Default is False.
+    :arg int nsamples: The number of samples of an ensemble. Default is 1.
+    :arg int nbcs: The number of degrees of freedom with a displacement
+        boundary condition. Default is None, which counts every degree of
+        freedom.
+    :arg int nforce_bcs: As `nbcs`, for the force boundary conditions.
+    :arg str bond_geometry: The `bond_geometry` option of the integrator.
+    :arg bool vector_layout: The `vector_layout` option of the integrator.
+    :arg str compact_metadata: The `compact_metadata` option of the
+        integrator.
+    :arg int bond_events: The `bond_events` option of the integrator.
+    :arg int compaction: The `compaction` option of the integrator. The
+        compacted bond arrays are counted at half of the full width, the
+        width of the first compaction.
+
+    :returns: A dictionary of the number of bytes of each buffer.
+    :rtype: dict
+    """
+    if bond_types is None:
+        bond_types = (nbond_types, nregimes) != (1, 1)
+    if nbcs is None:
+        nbcs = degrees_freedom * nnodes
+    if nforce_bcs is None:
+        nforce_bcs = degrees_freedom * nnodes
+    stride = 4 if vector_layout else degrees_freedom
+    double = np.dtype(np.float64).itemsize
+    integer = np.dtype(np.intc).itemsize
+    neighbour_size = integer
+    bond_type_size = integer
+    regime_size = integer
+    correction_size = double
+    if compact_metadata is not None:
+        neighbour_size = np.dtype(np.int16).itemsize
+        bond_type_size = np.min_scalar_type(nbond_types - 1).itemsize
+        regime_size = np.dtype(np.uint8).itemsize
+        if compact_metadata == "float":
+            correction_size = np.dtype(np.float32).itemsize
+    geometry_size = 4 * (
+        np.dtype(np.float32).itemsize if bond_geometry == "float"
+        else double)
+    nbonds = nnodes * max_neighbours
+    multiple_regimes = (nbond_types, nregimes) != (1, 1)
+
+    buffers = {
+        # Buffers of Integrator.build
+        "coords": nnodes * stride * double,
+        "volume": nnodes * double,
+        "family": nnodes * integer,
+        "stiffness_corrections": correction_size * (
+            nbonds if stiffness_corrections else 1),
+        "bond_types": bond_type_size * (nbonds if bond_types else 1),
+        "bc_dofs": max(nbcs, 1) * integer,
+        "bc_values": max(nbcs, 1) * double,
+        "force_bc_dofs": max(nforce_bcs, 1) * integer,
+        "force_bc_values": max(nforce_bcs, 1) * double,
+        "free_dofs": nnodes * stride * np.dtype(np.uint8).itemsize,
+        "bond_events": 4 * double * max(bond_events or 0, 1),
+        "nbond_events": np.dtype(np.uintc).itemsize,
+        # Buffers of Integrator.create_buffers
+        "plus_cs": double * (
+            nbond_types * nregimes if multiple_regimes else 1),
+        "regimes": regime_size * (nbonds if multiple_regimes else 1),
+        "nlist": nsamples * nbonds * neighbour_size,
+        "n_neigh": nsamples * nnodes * integer,
+        "damage": nsamples * nnodes * double,
+        }
+    for name in ["u", "ud", "udd", "force", "body_force"]:
+        buffers[name] = nsamples * nnodes * stride * double
+    if nsamples > 1:
+        buffers["bond_stiffness"] = nsamples * double
+        buffers["critical_stretch"] = nsamples * double
+    elif multiple_regimes:
+        buffers["bond_stiffness"] = nbond_types * nregimes * double
+        buffers["critical_stretch"] = nbond_types * nregimes * double
+    if densities:
+        buffers["inverse_densities"] = nnodes * double
+    if bond_geometry is not None:
+        buffers["bond_geometry"] = nbonds * geometry_size
+    if compaction is not None and nsamples == 1:
+        ncompact = nbonds // 2
+        buffers["compact_nlist"] = ncompact * neighbour_size
+        buffers["compact_positions"] = ncompact * integer
+        if bond_geometry is not None:
+            buffers["compact_bond_geometry"] = ncompact * geometry_size
+        if stiffness_corrections:
+            buffers["compact_stiffness_corrections"] = (
+                ncompact * correction_size)
+        if bond_types:
+            buffers["compact_bond_types"] = ncompact * bond_type_size
+        if multiple_regimes:
+            buffers["compact_regimes"] = ncompact * regime_size
+    return {name: int(size) for name, size in buffers.items()}
+
+
+def fits(buffers, device):
+    """
+    Return whether buffers fit in the memory of a device.
+
+    :arg dict buffers: The number of bytes of each buffer, as returned by
+        :func:`footprint`.
+    :arg device: The OpenCL device.
+    :type device: :class:`pyopencl._cl.Device`
+
+    :returns: True if the buffers fit in the global memory of the device
+        and none is larger than its largest allocation.
+    :rtype: bool
+    """
+    return (sum(buffers.values()) <= device.global_mem_size
+            and max(buffers.values()) <= device.max_mem_alloc_size)
+
+
+class DeviceMemoryError(Exception):
+    """The buffers of a simulation do not fit in the memory of the device."""
+
+    def __init__(self, buffers, device):
+        """
+        Construct the exception.
+
+        :arg dict buffers: The number of bytes of each buffer, as returned by
+            :func:`footprint`.
+        :arg device: The OpenCL device.
+        :type device: :class:`pyopencl._cl.Device`
+
+        :rtype: :class:`DeviceMemoryError`
+        """
+        breakdown = "\n".join(
+            "    {}: {} bytes".format(name, size) for name, size in sorted(
+                buffers.items(), key=lambda item: item[1], reverse=True))
+        message = (
+            "The buffers of the simulation do not fit in the memory of the "
+            "device, which has {} bytes of global memory and allocates at "
+            "most {} bytes per buffer (got {} bytes in total, and {} bytes "
+            "in the largest buffer):\n{}".format(
+                device.global_mem_size, device.max_mem_alloc_size,
+                sum(buffers.values()), max(buffers.values()), breakdown))
+
+        super().__init__(message)
@@ -7,6 +7,7 @@ from .correction import (set_volume_correction,
                          set_precise_surface_correction,
                          set_micromodulus_function)
 from collections import namedtuple
+import copy
 import numpy as np
 import pathlib
 from tqdm import trange
@@ -210,8 +211,9 @@ class Model(object):
             self.integrator = integrator
 
         # If no write path was provided, assign it as None so that model arrays
-        # are not written, otherwise, ensure write_path is a Path objects
-        if write_path is None:
+        # are not written, otherwise, ensure write_path is a Path objects.
+        # Only one of the processes of a distributed simulation writes them.
+        if write_path is None or not integrator.root:
             self.write_path = None
         else:
             self.write_path = pathlib.Path(write_path)
@@ -271,6 +273,54 @@ class Model(object):
         else:
             self.horizon = horizon
 
+        # A distributed integrator builds the nodes of this process only, so
+        # that the model arrays are of those nodes in a local numbering. The
+        # surface corrections of the bonds to the nodes within the horizon
+        # of the owned nodes need the families of those nodes too.
+        partition = integrator.partition(
+            self.coords,
+            self.horizon if surface_correction is None else 2 * self.horizon)
+        if partition is None:
+            #: The global number of each node of the model, or None if the
+            #: model has every node
+            self.nodes = None
+            #: Whether each node of the model is owned by this process
+            self.owned = np.ones(self.nnodes, dtype=bool)
+        else:
+            self.nodes, self.owned = partition
+            for name, argument in [
+                    ("family", family), ("connectivity", connectivity),
+                    ("stiffness_corrections", stiffness_corrections),
+                    ("bond_types", bond_types)]:
+                if argument is not None:
+                    raise ValueError(
+                        "{} is not supported by a distributed integrator, "
+                        "which builds it for the nodes of each process "
+                        "(expected {}, got {})".format(
+                            name, type(None), type(argument)))
+            if initial_crack is not None and not callable(initial_crack):
+                # Only the bonds between the nodes of this process are cut
+                local = np.full(self.nnodes, -1, dtype=np.intc)
+                local[self.nodes] = np.arange(len(self.nodes))
+                pairs = local[np.reshape(
+                    np.array(initial_crack, dtype=np.intc), (-1, 2))]
+                initial_crack = pairs[np.all(pairs != -1, axis=1)]
+            if (isinstance(density, np.ndarray)
+                    and np.shape(density) == (self.nnodes,)):
+                density = density[self.nodes]
+            # The root process writes the mesh of every node
+            if integrator.root:
+                self._mesh_coords = self.coords
+            else:
+                self._mesh_coords = None
+                self.mesh_connectivity = None
+                self.mesh_boundary = None
+            self.coords = self.coords[self.nodes]
+            self.volume = self.volume[self.nodes]
+            self.nnodes = len(self.nodes)
+            # The arrays of the bonds of one process are not written
+            self.write_path = None
+
         # Calculate the family (number of bonds in the initial configuration)
         # and connectivity for each node, if None is provided
         if family is None or connectivity is None:
@@ -421,6 +471,15 @@ class Model(object):
          self.nregimes) = self._set_damage_model(
              bond_stiffness, critical_stretch)
 
+        # Check that the simulation fits in the memory of the device before
+        # the bond types and boundary conditions are built
+        self.integrator.plan_memory(
+            self.nnodes, self.degrees_freedom, self.max_neighbours,
+            self.nbond_types, self.nregimes, self.initial_connectivity[0],
+            stiffness_corrections=self.stiffness_corrections is not None,
+            bond_types=(bond_types is not None) or None,
+            densities=(density is not None) or (is_density is not None))
+
         if bond_types is None:
             # Calculate bond types and write to file
             self.bond_types = self._set_bond_types(
@@ -525,7 +584,7 @@ class Model(object):
         """
         meshio.write_points_cells(
             filename,
-            points=self.coords,
+            points=self.coords if self.nodes is None else self._mesh_coords,
             cells=[
                 (self.mesh_elements.connectivity, self.mesh_connectivity),
                 (self.mesh_elements.boundary, self.mesh_boundary)
@@ -670,8 +729,8 @@ class Model(object):
             density, given a node coordinate as input.
         :type is_density: function
 
-        :returns: A (nnodes, degrees_freedom) array of nodal densities, or
-            None if no is_density function or density array is supplied.
+        :returns: A (nnodes,) array of nodal densities, or None if no
+            is_density function or density array is supplied.
         :rtype: :class:`numpy.ndarray` or None
         """
         if density is None:
@@ -692,9 +751,7 @@ class Model(object):
                     density[i] = is_density(self.coords[i])
                 if self.write_path is not None:
                     write_array(self.write_path, "density", density)
-                densities = np.transpose(
-                    np.tile(density, (self.degrees_freedom, 1))).astype(
-                        np.float64)
+                densities = density
         elif type(density) == np.ndarray:
             if np.shape(density) != (self.nnodes,):
                 raise ValueError("densty shape is wrong, and must be "
@@ -702,8 +759,7 @@ class Model(object):
                                      (self.nnodes,), np.shape(density)))
             warnings.warn(
                 "Reading density from argument.")
-            densities = np.transpose(
-                np.tile(density, (self.degrees_freedom, 1))).astype(np.float64)
+            densities = density.astype(np.float64)
         else:
             raise TypeError("density type is wrong, and must be an array of"
                             " shape (nnodes,) (expected {}, got {})".format(
@@ -772,13 +828,17 @@ class Model(object):
                     bond_types[i][neigh] = bond_type
             bond_types = bond_types.astype(np.intc)
             if self.write_path is not None:
-                write_array(self.write_path, "bond_types", bond_types)
+                # Written in the smallest type that fits the bond types
+                write_array(self.write_path, "bond_types", bond_types.astype(
+                    np.min_scalar_type(nbond_types - 1)))
         elif nregimes != 1:
             bond_types = np.zeros(
                 (self.nnodes, self.max_neighbours))
             bond_types = bond_types.astype(np.intc)
             if self.write_path is not None:
-                write_array(self.write_path, "bond_types", bond_types)
+                # Written in the smallest type that fits the bond types
+                write_array(self.write_path, "bond_types", bond_types.astype(
+                    np.min_scalar_type(nbond_types - 1)))
         else:
             bond_types = None
         return bond_types
@@ -931,7 +991,11 @@ class Model(object):
                 stiffness_corrections, nlist, n_neigh, self.volume,
                 family_volume_bulk)
         elif surface_correction == 0:
-            average_node_volume = np.float64(np.sum(self.volume) / self.nnodes)
+            # The average over the owned nodes of every process
+            volume, nnodes = sum(self.integrator.allgather(np.array([
+                np.sum(self.volume[self.owned]),
+                np.count_nonzero(self.owned)])))
+            average_node_volume = np.float64(volume / nnodes)
             set_imprecise_surface_correction(
                 stiffness_corrections, nlist, n_neigh, average_node_volume,
                 family_volume_bulk)
@@ -1167,18 +1231,16 @@ class Model(object):
             tip_types[str(tip)].append((i, j))
             return tip_types, ntips
 
-        bc_types = np.zeros(
-            (self.nnodes, self.degrees_freedom), dtype=np.intc)
-        bc_values = np.zeros(
-            (self.nnodes, self.degrees_freedom), dtype=np.float64)
-        force_bc_types = np.zeros(
-            (self.nnodes, self.degrees_freedom), dtype=np.intc)
-        force_bc_values = np.zeros(
-            (self.nnodes, self.degrees_freedom), dtype=np.float64)
+        # The constrained degrees of freedom are collected as lists of
+        # (node, direction, value) and scattered into the arrays at once
+        bc_entries = []
+        force_bc_entries = []
         tip_types = {}
         num_force_bc_nodes = 0
-        ntips = {'model': self.nnodes}
-        for i in range(self.nnodes):
+        ntips = {'model': int(np.count_nonzero(self.owned))}
+        # The boundary conditions and tips of the nodes owned by other
+        # processes are set by those processes
+        for i in np.flatnonzero(self.owned).tolist():
             bnd = is_displacement_boundary(self.coords[i][:])
             forces_bnd = is_force_boundary(self.coords[i][:])
             tip = is_tip(self.coords[i][:])
@@ -1189,14 +1251,12 @@ class Model(object):
                 tip_j = tip[j]
                 # Define boundary types and values
                 if bnd_j is not None:
-                    bc_types[i, j] = np.intc(1)
-                    bc_values[i, j] = np.float64(bnd_j)
+                    bc_entries.append((i, j, bnd_j))
                 # Define forces boundary types and values
                 if forces_bnd_j is not None:
                     is_force_node = 1
-                    force_bc_types[i, j] = np.intc(1)
-                    force_bc_values[i, j] = np.float64(
-                        forces_bnd_j / self.volume[i])
+                    force_bc_entries.append(
+                        (i, j, forces_bnd_j / self.volume[i]))
 
                 if tip_j is not None:
                     if type(tip_j) is tuple:
@@ -1208,6 +1268,26 @@ class Model(object):
                             tip_j, i, j, tip_types, ntips)
 
             num_force_bc_nodes += is_force_node
+
+        # The force boundary conditions and tips of every process
+        num_force_bc_nodes = sum(
+            self.integrator.allgather(num_force_bc_nodes))
+        ntips = self._sum_processes(ntips)
+
+        def scatter(entries):
+            """Return the dense types and values of the entries."""
+            types = np.zeros(
+                (self.nnodes, self.degrees_freedom), dtype=np.intc)
+            values = np.zeros(
+                (self.nnodes, self.degrees_freedom), dtype=np.float64)
+            if entries:
+                nodes, directions, magnitudes = zip(*entries)
+                types[nodes, directions] = 1
+                values[nodes, directions] = magnitudes
+            return types, values
+
+        bc_types, bc_values = scatter(bc_entries)
+        force_bc_types, force_bc_values = scatter(force_bc_entries)
         if num_force_bc_nodes != 0:
             force_bc_values = np.float64(
                 np.divide(force_bc_values, num_force_bc_nodes))
@@ -1219,10 +1299,28 @@ class Model(object):
                  regimes=None, critical_stretch=None, bond_stiffness=None,
                  displacement_bc_magnitudes=None, force_bc_magnitudes=None,
                  first_step=1, write=None,
-                 write_path=None):
+                 write_path=None, stiffness_corrections=None,
+                 tolerance=None, check=10):
         """
         Simulate the peridynamics model.
 
+        If a `tolerance` is given, the steps over which the boundary
+        condition magnitudes are constant are a load increment, which ends
+        when the model is in equilibrium. The norms of the forces and of the
+        velocities of the degrees of freedom without a displacement boundary
+        condition are calculated by
+        :meth:`peripy.integrators.Integrator.residual` after the second step
+        of each increment, the first step to calculate the forces of its
+        boundary conditions, and every `check` steps of it. The increment has
+        converged when both norms are at most `tolerance` times the largest
+        norms calculated in the increment. The remaining steps of a
+        converged increment are skipped, and the simulation stops if it is
+        the last increment. The state of the model is still written at the
+        skipped steps. Only piecewise constant magnitudes, e.g.
+        ``np.repeat(1e-4 * np.arange(1, 11), 100)``, benefit. Magnitudes
+        which change every step, such as a ramp, are increments of one step,
+        which are never checked.
+
         :arg int steps: The number of simulation steps to conduct.
         :arg u: The initial displacements for the simulation. If None the
             displacements will be initialised to zero. Default None.
@@ -1264,6 +1362,19 @@ class Model(object):
         :arg write_path: The path where the periodic mesh files should be
             written.
         :type write_path: path-like or str
+        :arg stiffness_corrections: An (nnodes, max_neighbours) array of bond
+            stiffness correction factors for this simulation, e.g. a sample
+            of a :class:`peripy.random_field.RandomField`, which multiply the
+            stiffness corrections of the model, if any. If None the stiffness
+            corrections of the model are used. Default None.
+        :type stiffness_corrections: :class:`numpy.ndarray`
+        :arg float tolerance: The relative tolerance of the norms of the
+            forces and velocities at which a load increment has converged.
+            Only increments of more than two steps are cut short, and a
+            warning is raised if there are none. If None, every step is
+            conducted. Default None.
+        :arg int check: The frequency, in number of steps, to check whether
+            a load increment has converged. Default 10.
 
         :returns: A tuple of the final displacements (`u`); damage,
             a tuple of the connectivity; the final node forces (`force`);
@@ -1273,6 +1384,13 @@ class Model(object):
             for each of the writes (read 'over time'), for each unique
             tip_type (read 'for each of the set of nodes the user has
             chosen to measure datum for, as defined by the `is_tip` function).
+            If the integrator logs broken bonds, the bonds broken up to the
+            last write are under 'bond_events' of the model data, as returned
+            by :meth:`peripy.integrators.Integrator.read_bond_events`.
+            If a `tolerance` is given, the first step of each load increment
+            and the number of steps conducted in it are under 'increments'
+            and 'iterations' of the model data, and if the simulation stops
+            early, the data of the writes after the last step are removed.
         :rtype: tuple(
             :class:`numpy.ndarray`, :class:`numpy.ndarray`,
             tuple(:class:`numpy.ndarray`, :class:`numpy.ndarray`),
@@ -1294,15 +1412,58 @@ class Model(object):
          write_path) = self._simulate_initialise(
              steps, first_step, write, regimes, u, ud,
              displacement_bc_magnitudes, force_bc_magnitudes, connectivity,
-             bond_stiffness, critical_stretch, write_path)
-
+             bond_stiffness, critical_stretch, write_path,
+             stiffness_corrections)
+
+        # Number the broken bonds logged by the integrator by the step
+        bond_events = []
+        if self.integrator.bond_events is not None:
+            self.integrator.step = first_step - 1
+
+        if tolerance is not None:
+            increments = self._increments(
+                steps, first_step, displacement_bc_magnitudes,
+                force_bc_magnitudes, tolerance, check)
+            iterations = np.zeros(len(increments), dtype=int)
+            increment = 0
+            converged = False
+            # The largest norms of the forces and velocities of the increment
+            norms = np.zeros(2)
+
+        last_step = first_step + steps - 1
         for step in trange(first_step, first_step+steps,
                            desc="Simulation Progress", unit="steps"):
 
-            # Call one integration step
-            self.integrator(
-                displacement_bc_magnitudes[step - 1],
-                force_bc_magnitudes[step - 1])
+            if tolerance is None:
+                # Call one integration step
+                self.integrator(
+                    displacement_bc_magnitudes[step - 1],
+                    force_bc_magnitudes[step - 1])
+            else:
+                if (increment + 1 < len(increments)
+                        and step == increments[increment + 1]):
+                    increment += 1
+                    converged = False
+                    norms[:] = 0
+                if not converged:
+                    # Skipped steps are not numbered
+                    if self.integrator.bond_events is not None:
+                        self.integrator.step = step - 1
+                    # Call one integration step
+                    self.integrator(
+                        displacement_bc_magnitudes[step - 1],
+                        force_bc_magnitudes[step - 1])
+                    iterations[increment] += 1
+                    # The forces of the first step are those of the previous
+                    # increment
+                    if (iterations[increment] == 2
+                            or not iterations[increment] % check):
+                        residual = np.array(self.integrator.residual())
+                        norms = np.maximum(norms, residual)
+                        converged = np.all(residual <= tolerance * norms)
+                        if converged and increment + 1 == len(increments):
+                            # The last increment has converged
+                            last_step = step
 
             if write:
                 if step % write == 0:
@@ -1316,7 +1477,15 @@ class Model(object):
                      n_neigh) = self.integrator.write(
                          u, ud, udd, body_force, force, damage, nlist, n_neigh)
 
-                    self.write_mesh(write_path/f"U_{step}.vtk", damage, u)
+                    # The root process writes the nodes of every process
+                    mesh_damage = self.integrator.gather(damage)
+                    mesh_u = self.integrator.gather(u)
+                    if self.integrator.root:
+                        self.write_mesh(
+                            write_path/f"U_{step}.vtk", mesh_damage, mesh_u)
+                    if self.integrator.bond_events is not None:
+                        bond_events.append(
+                            self.integrator.read_bond_events())
 
                     # Write index number
                     ii = step // write - (first_step - 1) // write - 1
@@ -1350,24 +1519,40 @@ class Model(object):
                             data[tip_type]['body_force'][ii] += (
                                 body_force[i, j] * self.volume[i])
 
-                    # Add to model data for the write index, ii
+                    # Add to model data for the write index, ii, the owned
+                    # nodes of every process are summed after the simulation
+                    owned = self.owned
+                    volume = self.volume[owned, np.newaxis]
                     data['model']['step'][ii] = step
-                    data['model']['displacement'][ii] = np.sum(u)
-                    data['model']['velocity'][ii] = np.sum(ud)
-                    data['model']['acceleration'][ii] = np.sum(udd)
+                    data['model']['displacement'][ii] = np.sum(u[owned])
+                    data['model']['velocity'][ii] = np.sum(ud[owned])
+                    data['model']['acceleration'][ii] = np.sum(udd[owned])
                     data['model']['force'][ii] = np.sum(
-                        force * self.volume[:, np.newaxis])
+                        force[owned] * volume)
                     data['model']['body_force'][ii] = np.sum(
-                        body_force * self.volume[:, np.newaxis])
+                        body_force[owned] * volume)
 
-                    damage_sum = np.sum(damage)
+                    damage_sum = np.sum(damage[owned])
                     data['model']['damage_sum'][ii] = damage_sum
-                    if damage_sum > 0.05*self.nnodes:
+                    nowned = np.count_nonzero(owned)
+                    if damage_sum > 0.05*nowned:
                         warnings.warn('Over 5% of bonds have broken!\
                                       peridynamics simulation continuing')
-                    elif damage_sum > 0.7*self.nnodes:
+                    elif damage_sum > 0.7*nowned:
                         warnings.warn('Over 7% of bonds have broken!\
                                       peridynamics simulation continuing')
+            if step == last_step:
+                break
+        if write and last_step < first_step + steps - 1:
+            # Remove the writes after the simulation stopped
+            nwritten = last_step // write - (first_step - 1) // write
+            for tip_type in data:
+                for name in data[tip_type]:
+                    data[tip_type][name] = data[tip_type][name][:nwritten]
+        data = self._sum_processes(data)
+        if bond_events:
+            data['model']['bond_events'] = tuple(
+                np.concatenate(events) for events in zip(*bond_events))
         for tip_type_str in data:
             # Average the nodal displacements, velocities and
             # accelerations
@@ -1376,6 +1561,10 @@ class Model(object):
                 data[tip_type_str]['displacement'] /= ntip
                 data[tip_type_str]['velocity'] /= ntip
                 data[tip_type_str]['acceleration'] /= ntip
+        if tolerance is not None:
+            data.setdefault('model', {})
+            data['model']['increments'] = increments
+            data['model']['iterations'] = iterations
         (u,
          ud,
          udd,
@@ -1388,10 +1577,175 @@ class Model(object):
 
         return (u, damage, (nlist, n_neigh), force, ud, data)
 
+    def simulate_ensemble(
+            self, steps, bond_stiffness, critical_stretch,
+            stiffness_corrections=None, u=None, ud=None,
+            displacement_bc_magnitudes=None, force_bc_magnitudes=None):
+        """
+        Simulate an ensemble of samples of the peridynamics model.
+
+        Each sample has its own bond stiffness, critical stretch and,
+        optionally, bond stiffness corrections (e.g. a random field), but
+        all of the samples share the geometry, initial connectivity and
+        boundary conditions of the model. All of the samples are integrated
+        by the same kernel launches, which is much faster than calling
+        :meth:`Model.simulate` once per sample for small problems. Only the
+        bond-based prototype microelastic brittle (PMB) model with an OpenCL
+        integrator is supported.
+
+        :arg int steps: The number of simulation steps to conduct.
+        :arg bond_stiffness: An (nsamples,) array of the bond stiffness of
+            each sample.
+        :type bond_stiffness: :class:`numpy.ndarray`
+        :arg critical_stretch: An (nsamples,) array of the critical stretch
+            of each sample.
+        :type critical_stretch: :class:`numpy.ndarray`
+        :arg stiffness_corrections: An (nsamples, nnodes, max_neighbours)
+            array of the bond stiffness correction factors of each sample,
+            which multiply the stiffness corrections of the model, if any.
+            If None the stiffness corrections of the model are used for each
+            sample. Default None.
+        :type stiffness_corrections: :class:`numpy.ndarray`
+        :arg u: The (nsamples, nnodes, 3) initial displacements. If None the
+            displacements will be initialised to zero. Default None.
+        :type u: :class:`numpy.ndarray`
+        :arg ud: The (nsamples, nnodes, 3) initial velocities. If None the
+            velocities will be initialised to zero. Default None.
+        :type ud: :class:`numpy.ndarray`
+        :arg displacement_bc_magnitudes: (steps, ) array of the magnitude
+            applied to the displacement boundary conditions over time.
+        :type displacement_bc_magnitudes: :class:`numpy.ndarray`
+        :arg force_bc_magnitudes: (steps, ) array of the magnitude applied to
+            the force boundary conditions over time.
+        :type force_bc_magnitudes: :class:`numpy.ndarray`
+
+        :returns: A tuple of the final displacements (`u`); damage, a tuple of
+            the connectivity; the final node forces (`force`) and the final
+            node velocities (`ud`), each with a leading axis of length
+            nsamples.
+        :rtype: tuple(
+            :class:`numpy.ndarray`, :class:`numpy.ndarray`,
+            tuple(:class:`numpy.ndarray`, :class:`numpy.ndarray`),
+            :class:`numpy.ndarray`, :class:`numpy.ndarray`)
+        """
+        if self.integrator.context is None:
+            raise ValueError(
+                "ensembles are not supported by this integrator (expected an "
+                "OpenCL integrator, got {}), please use EulerCL "
+                "instead".format(type(self.integrator)))
+        if (self.nbond_types != 1) or (self.nregimes != 1):
+            raise ValueError(
+                "ensembles only support the bond-based prototype microelastic "
+                "brittle (PMB) model (expected 1 bond type and 1 regime, got "
+                "{} and {})".format(self.nbond_types, self.nregimes))
+
+        bond_stiffness = np.asarray(bond_stiffness, dtype=np.float64)
+        critical_stretch = np.asarray(critical_stretch, dtype=np.float64)
+        if bond_stiffness.ndim != 1:
+            raise ValueError("bond_stiffness must be an (nsamples,) array "
+                             "(expected 1 dimension, got {})".format(
+                                 bond_stiffness.ndim))
+        nsamples = np.shape(bond_stiffness)[0]
+        if np.shape(critical_stretch) != (nsamples,):
+            raise ValueError("critical_stretch shape is wrong, and must be "
+                             "(nsamples,) (expected {}, got {})".format(
+                                 (nsamples,), np.shape(critical_stretch)))
+        shape = (nsamples, self.nnodes, self.max_neighbours)
+        if stiffness_corrections is not None:
+            if np.shape(stiffness_corrections) != shape:
+                raise ValueError(
+                    "stiffness_corrections shape is wrong, and must be "
+                    "(nsamples, nnodes, max_neighbours) (expected {}, got "
+                    "{})".format(shape, np.shape(stiffness_corrections)))
+            stiffness_corrections = np.asarray(
+                stiffness_corrections, dtype=np.float64)
+            if self.stiffness_corrections is not None:
+                stiffness_corrections = (
+                    stiffness_corrections * self.stiffness_corrections)
+
+        shape = (nsamples, self.nnodes, 3)
+        if u is None:
+            u = np.zeros(shape, dtype=np.float64)
+        elif np.shape(u) != shape:
+            raise ValueError("u shape is wrong, and must be (nsamples, nnodes,"
+                             " 3) (expected {}, got {})".format(
+                                 shape, np.shape(u)))
+        if ud is None:
+            ud = np.zeros(shape, dtype=np.float64)
+        elif np.shape(ud) != shape:
+            raise ValueError("ud shape is wrong, and must be (nsamples, "
+                             "nnodes, 3) (expected {}, got {})".format(
+                                 shape, np.shape(ud)))
+        u = np.array(u, dtype=np.float64)
+        ud = np.array(ud, dtype=np.float64)
+        udd = np.zeros(shape, dtype=np.float64)
+        force = np.zeros(shape, dtype=np.float64)
+        body_force = np.zeros(shape, dtype=np.float64)
+        damage = np.zeros((nsamples, self.nnodes), dtype=np.float64)
+        (displacement_bc_magnitudes,
+         force_bc_magnitudes) = self._set_bc_magnitudes(
+             steps, 1, displacement_bc_magnitudes, force_bc_magnitudes)
+
+        # Every sample starts from the initial connectivity
+        nlist, n_neigh = self.initial_connectivity
+        nlist = np.tile(nlist, (nsamples, 1, 1))
+        n_neigh = np.tile(n_neigh, (nsamples, 1))
+
+        self.integrator.create_ensemble_buffers(
+            nlist, n_neigh, bond_stiffness, critical_stretch,
+            stiffness_corrections, u, ud, udd, force, body_force, damage)
+
+        for step in trange(1, steps + 1,
+                           desc="Ensemble Progress", unit="steps"):
+            self.integrator(
+                displacement_bc_magnitudes[step - 1],
+                force_bc_magnitudes[step - 1])
+
+        (u,
+         ud,
+         udd,
+         force,
+         body_force,
+         damage,
+         nlist,
+         n_neigh) = self.integrator.write(
+             u, ud, udd, force, body_force, damage, nlist, n_neigh)
+
+        return (u, damage, (nlist, n_neigh), force, ud)
+
+    def _sum_processes(self, values):
+        """
+        Sum a dictionary of values over the processes of the integrator.
+
+        The values of a key which a process does not have are those of the
+        other processes. The steps of the writes of a simulation, which are
+        the same on every process, are not summed.
+
+        :arg dict values: The values of this process, which are numbers,
+            arrays or dictionaries of them.
+
+        :returns: The sums of the values.
+        :rtype: dict
+        """
+        def add(total, values):
+            for key, value in values.items():
+                if key not in total:
+                    total[key] = copy.deepcopy(value)
+                elif isinstance(value, dict):
+                    add(total[key], value)
+                elif key != 'step':
+                    total[key] = total[key] + value
+
+        total = {}
+        for process_values in self.integrator.allgather(values):
+            add(total, process_values)
+        return total
+
     def _simulate_initialise(
             self, steps, first_step, write, regimes, u, ud,
             displacement_bc_magnitudes, force_bc_magnitudes, connectivity,
-            bond_stiffness, critical_stretch, write_path):
+            bond_stiffness, critical_stretch, write_path,
+            stiffness_corrections=None):
         """
         Initialise simulation variables.
 
@@ -1432,6 +1786,9 @@ class Model(object):
         :arg write_path: The path where the periodic mesh files should be
             written.
         :type write_path: path-like or str
+        :arg stiffness_corrections: An (nnodes, max_neighbours) array of bond
+            stiffness correction factors for this simulation.
+        :type stiffness_corrections: :class:`numpy.ndarray`
 
         :returns: A tuple of initialised variables used for simulation.
         :type: tuple(:class:`numpy.ndarray`, :class:`numpy.ndarray`,
@@ -1451,41 +1808,10 @@ class Model(object):
         body_force = np.zeros((self.nnodes, 3), dtype=np.float64)
         damage = np.zeros(self.nnodes, dtype=np.float64)
         udd = np.zeros((self.nnodes, 3), dtype=np.float64)
-        # Create boundary condition magnitudes if None is provided
-        if displacement_bc_magnitudes is None:
-            displacement_bc_magnitudes = np.zeros(
-                first_step + steps - 1, dtype=np.float64)
-        elif type(displacement_bc_magnitudes) == np.ndarray:
-            if len(displacement_bc_magnitudes) < steps:
-                raise ValueError("displacement_bc_magnitudes length must be "
-                                 "equal to or greater than (first_step + steps"
-                                 " - 1), (expected {}, got {})".format(
-                                     first_step + steps - 1,
-                                     len(displacement_bc_magnitudes)))
-            displacement_bc_magnitudes = displacement_bc_magnitudes.astype(
-                np.float64)
-        else:
-            raise TypeError("displacement_bc_magnitudes type is wrong "
-                            "(expected {}, got {})".format(
-                                np.ndarray,
-                                type(displacement_bc_magnitudes)))
-        if force_bc_magnitudes is None:
-            force_bc_magnitudes = np.zeros(
-                first_step + steps - 1, dtype=np.float64)
-        elif type(force_bc_magnitudes) == np.ndarray:
-            if len(force_bc_magnitudes) < steps:
-                raise ValueError("force_bc_magnitudes length must be "
-                                 "equal to or greater than (first_step + steps"
-                                 " - 1), (expected {}, got {})".format(
-                                     first_step + steps - 1,
-                                     len(force_bc_magnitudes)))
-            force_bc_magnitudes = force_bc_magnitudes.astype(
-                np.float64)
-        else:
-            raise TypeError("force_bc_magnitudes type is wrong "
-                            "(expected {}, got {})".format(
-                                np.ndarray,
-                                type(force_bc_magnitudes)))
+        (displacement_bc_magnitudes,
+         force_bc_magnitudes) = self._set_bc_magnitudes(
+             steps, first_step, displacement_bc_magnitudes,
+             force_bc_magnitudes)
         # Use the initial connectivity (when the Model was constructed) if none
         # is provided
         if connectivity is None:
@@ -1545,6 +1871,20 @@ class Model(object):
                     "(expected {}, got {}).".format(
                         self.nbond_types, nbond_types))
 
+        if stiffness_corrections is not None:
+            if np.shape(stiffness_corrections) != (
+                    self.nnodes, self.max_neighbours):
+                raise ValueError("stiffness_corrections shape is wrong, "
+                                 "and must be (nnodes, max_neighbours) "
+                                 "(expected {}, got {})".format(
+                                     (self.nnodes, self.max_neighbours),
+                                     np.shape(stiffness_corrections)))
+            stiffness_corrections = np.asarray(
+                stiffness_corrections, dtype=np.float64)
+            if self.stiffness_corrections is not None:
+                stiffness_corrections = (
+                    stiffness_corrections * self.stiffness_corrections)
+
         # If no write path was provided use the current directory, otherwise
         # ensure write_path is a Path object.
         if write_path is None:
@@ -1572,12 +1912,114 @@ class Model(object):
         # Initialise the OpenCL buffers
         self.integrator.create_buffers(
             nlist, n_neigh, bond_stiffness, critical_stretch, plus_cs, u, ud,
-            udd, force, body_force, damage, regimes, nregimes, nbond_types)
+            udd, force, body_force, damage, regimes, nregimes, nbond_types,
+            stiffness_corrections)
 
         return (u, ud, udd, force, body_force, nlist, n_neigh,
                 displacement_bc_magnitudes, force_bc_magnitudes, damage, data,
                 nwrites, write_path)
 
+    def _set_bc_magnitudes(
+            self, steps, first_step, displacement_bc_magnitudes,
+            force_bc_magnitudes):
+        """
+        Initialise the boundary condition magnitudes of a simulation.
+
+        :arg int steps: The number of simulation steps to conduct.
+        :arg int first_step: The starting step number.
+        :arg displacement_bc_magnitudes: (steps, ) array of the magnitude
+            applied to the displacement boundary conditions over time.
+        :type displacement_bc_magnitudes: :class:`numpy.ndarray`
+        :arg force_bc_magnitudes: (steps, ) array of the magnitude applied to
+            the force boundary conditions over time.
+        :type force_bc_magnitudes: :class:`numpy.ndarray`
+
+        :returns: A tuple of the displacement and force boundary condition
+            magnitudes.
+        :rtype: tuple(:class:`numpy.ndarray`, :class:`numpy.ndarray`)
+        """
+        # Create boundary condition magnitudes if None is provided
+        if displacement_bc_magnitudes is None:
+            displacement_bc_magnitudes = np.zeros(
+                first_step + steps - 1, dtype=np.float64)
+        elif type(displacement_bc_magnitudes) == np.ndarray:
+            if len(displacement_bc_magnitudes) < steps:
+                raise ValueError("displacement_bc_magnitudes length must be "
+                                 "equal to or greater than (first_step + steps"
+                                 " - 1), (expected {}, got {})".format(
+                                     first_step + steps - 1,
+                                     len(displacement_bc_magnitudes)))
+            displacement_bc_magnitudes = displacement_bc_magnitudes.astype(
+                np.float64)
+        else:
+            raise TypeError("displacement_bc_magnitudes type is wrong "
+                            "(expected {}, got {})".format(
+                                np.ndarray,
+                                type(displacement_bc_magnitudes)))
+        if force_bc_magnitudes is None:
+            force_bc_magnitudes = np.zeros(
+                first_step + steps - 1, dtype=np.float64)
+        elif type(force_bc_magnitudes) == np.ndarray:
+            if len(force_bc_magnitudes) < steps:
+                raise ValueError("force_bc_magnitudes length must be "
+                                 "equal to or greater than (first_step + steps"
+                                 " - 1), (expected {}, got {})".format(
+                                     first_step + steps - 1,
+                                     len(force_bc_magnitudes)))
+            force_bc_magnitudes = force_bc_magnitudes.astype(
+                np.float64)
+        else:
+            raise TypeError("force_bc_magnitudes type is wrong "
+                            "(expected {}, got {})".format(
+                                np.ndarray,
+                                type(force_bc_magnitudes)))
+        return displacement_bc_magnitudes, force_bc_magnitudes
+
+    def _increments(self, steps, first_step, displacement_bc_magnitudes,
+                    force_bc_magnitudes, tolerance, check):
+        """
+        Find the load increments of a simulation.
+
+        :arg int steps: The number of simulation steps to conduct.
+        :arg int first_step: The starting step number.
+        :arg displacement_bc_magnitudes: The magnitudes of the displacement
+            boundary conditions, as returned by :meth:`_set_bc_magnitudes`.
+        :type displacement_bc_magnitudes: :class:`numpy.ndarray`
+        :arg force_bc_magnitudes: The magnitudes of the force boundary
+            conditions, as returned by :meth:`_set_bc_magnitudes`.
+        :type force_bc_magnitudes: :class:`numpy.ndarray`
+        :arg float tolerance: The relative tolerance of the increments.
+        :arg int check: The frequency, in number of steps, to check whether
+            an increment has converged.
+
+        :returns: The first step of each load increment, the steps over
+            which both boundary condition magnitudes are constant.
+        :rtype: :class:`numpy.ndarray`
+        """
+        if not tolerance > 0:
+            raise ValueError("tolerance must be None or a positive float "
+                             "(got {})".format(tolerance))
+        if int(check) != check or check < 1:
+            raise ValueError("check must be a positive integer "
+                             "(got {})".format(check))
+        magnitudes = np.stack([
+            displacement_bc_magnitudes[first_step - 1:first_step + steps - 1],
+            force_bc_magnitudes[first_step - 1:first_step + steps - 1]],
+            axis=1)
+        changes = np.any(magnitudes[1:] != magnitudes[:-1], axis=1)
+        increments = first_step + np.concatenate(
+            ([0], 1 + np.flatnonzero(changes)))
+        # An increment is first checked after its second step
+        length = np.max(np.diff(np.append(increments, first_step + steps)))
+        if length <= 2:
+            warnings.warn(
+                "tolerance has no effect, as no load increment is longer "
+                "than two steps (got increments of at most {} steps). The "
+                "boundary condition magnitudes must be piecewise constant, "
+                "e.g. np.repeat(magnitudes, steps_per_increment)".format(
+                    length))
+        return increments
+
 
 def initial_crack_helper(crack_function):
     """
@@ -0,0 +1,407 @@
+"""Monte Carlo simulation of ensembles of peridynamics models."""
+from .model import Model
+from .random_field import RandomField
+from .utilities import read_array
+import h5py
+import multiprocessing
+from multiprocessing import util
+import numpy as np
+import pathlib
+import pyopencl as cl
+from scipy.spatial import cKDTree
+import shutil
+import tempfile
+import time
+from tqdm import tqdm
+import warnings
+
+#: The model arrays shared by the workers through the HDF5 file
+_SHARED_ARRAYS = ("volume", "family", "nlist", "n_neigh",
+                  "stiffness_corrections", "bond_types")
+
+# The state of a worker process, set by :func:`_initialise_worker`
+_worker = {}
+
+
+class RunningStatistics(object):
+    """
+    Running mean and variance of a stream of samples.
+
+    The statistics are updated one sample at a time using Welford's
+    algorithm, so that the samples do not need to be held in memory.
+    """
+
+    def __init__(self):
+        """
+        Create a :class:`RunningStatistics` object.
+
+        :returns: A :class:`RunningStatistics` object
+        """
+        self.n = 0
+        self.mean = None
+        self._m2 = None
+
+    def update(self, sample):
+        """
+        Update the statistics with a sample.
+
+        :arg sample: The sample, all samples must have the same shape.
+        :type sample: :class:`numpy.ndarray` or float
+        """
+        sample = np.asarray(sample, dtype=np.float64)
+        self.n += 1
+        if self.mean is None:
+            self.mean = sample.copy()
+            self._m2 = np.zeros_like(self.mean)
+        else:
+            delta = sample - self.mean
+            self.mean += delta / self.n
+            self._m2 += delta * (sample - self.mean)
+
+    @property
+    def variance(self):
+        """
+        The (unbiased) sample variance.
+
+        :rtype: :class:`numpy.ndarray` or NoneType
+        """
+        if self.n < 2:
+            return None
+        return self._m2 / (self.n - 1)
+
+
+class MonteCarlo(object):
+    """
+    A Monte Carlo driver for uncertainty quantification of a model.
+
+    A :class:`MonteCarlo` object is a blueprint of a
+    :class:`peripy.model.Model`. The time expensive model arrays (volume,
+    family, connectivity, stiffness_corrections and bond_types) are
+    calculated once and written to a HDF5 file, from which each process of a
+    :mod:`multiprocessing` pool builds its own copy of the model, with its own
+    OpenCL context. The realisations are then shared between the processes,
+    and the results are streamed back and reduced into running statistics, so
+    that the samples are never all held in memory.
+    """
+
+    def __init__(self, mesh_file, integrator, sampler, write_path,
+                 integrator_kwargs=None, processes=None, devices=None,
+                 **model_kwargs):
+        """
+        Create a :class:`MonteCarlo` object.
+
+        :arg str mesh_file: Path of the mesh file defining the systems nodes
+            and connectivity.
+        :arg integrator: The integrator class to use, see
+            :mod:`peripy.integrators` for options.
+        :type integrator: type
+        :arg sampler: A function that returns a dict of keyword arguments of
+            :meth:`peripy.model.Model.simulate` (e.g. the critical_stretch
+            and bond_stiffness) of a realisation, given a
+            :class:`numpy.random.Generator` as input. The sampler must be
+            picklable, e.g. a module level function.
+        :type sampler: function
+        :arg write_path: The path of the HDF5 file in which the model arrays
+            are shared. If the file already contains the arrays they are
+            reused, otherwise they are calculated and written to the file.
+        :type write_path: path-like or str
+        :arg dict integrator_kwargs: The keyword arguments used to create the
+            integrator of each process, e.g. {'dt': 1e-3}.
+        :arg int processes: The number of processes of the pool. If None the
+            number returned by :func:`os.cpu_count` is used. Default None.
+        :arg devices: A list of (platform index, device index) tuples of the
+            OpenCL devices. The processes are assigned to the devices in turn,
+            each with its own context. If None each process uses the context
+            returned by :func:`peripy.cl.get_context`. Default None.
+        :type devices: list(tuple(int, int))
+        :arg model_kwargs: The remaining arguments of
+            :class:`peripy.model.Model`. These, and the integrator, must be
+            picklable, e.g. module level functions.
+
+        :returns: A :class:`MonteCarlo` object
+        """
+        self.mesh_file = mesh_file
+        self.integrator = integrator
+        self.sampler = sampler
+        self.write_path = pathlib.Path(write_path)
+        if integrator_kwargs is None:
+            integrator_kwargs = {}
+        self.integrator_kwargs = integrator_kwargs
+        self.processes = processes
+        self.devices = devices
+        self.model_kwargs = model_kwargs
+
+        if "write_path" in model_kwargs:
+            raise ValueError("write_path is the path of the shared model "
+                             "arrays, and must not be supplied as a model "
+                             "argument")
+
+        if not self._shared():
+            # Calculate the model arrays once and write them to file
+            Model(self.mesh_file, self.integrator(**self.integrator_kwargs),
+                  write_path=self.write_path, **self.model_kwargs)
+
+    def _shared(self):
+        """Return True if the model arrays have been written to file."""
+        if not self.write_path.exists():
+            return False
+        with h5py.File(self.write_path, 'r') as hf:
+            return "nlist" in hf
+
+    def run(self, nsamples, steps, seed=None, **simulate_kwargs):
+        """
+        Simulate realisations of the model and reduce the results.
+
+        :arg int nsamples: The number of realisations.
+        :arg int steps: The number of simulation steps of each realisation.
+        :arg seed: The seed of the random number generators. Each
+            realisation has an independent generator, spawned from `seed`, so
+            that the results do not depend on the number of processes.
+        :type seed: int or NoneType
+        :arg simulate_kwargs: The arguments of
+            :meth:`peripy.model.Model.simulate` shared by every realisation,
+            e.g. displacement_bc_magnitudes and write.
+
+        :returns: A dictionary of the :class:`RunningStatistics` of the
+            damage, and of each data series returned by
+            :meth:`peripy.model.Model.simulate`, keyed as in the data
+            dictionary.
+        :rtype: dict
+        """
+        seeds = np.random.SeedSequence(seed).spawn(nsamples)
+        statistics = {"damage": RunningStatistics()}
+
+        # OpenCL contexts do not survive a fork
+        mp_context = multiprocessing.get_context("spawn")
+        counter = mp_context.Value("i", 0)
+        initargs = (
+            self.mesh_file, self.integrator, self.integrator_kwargs,
+            self.model_kwargs, self.write_path, self.sampler, steps,
+            simulate_kwargs, self.devices, counter)
+        with mp_context.Pool(self.processes, _initialise_worker,
+                             initargs) as pool:
+            for damage, data in tqdm(
+                    pool.imap_unordered(_realise, seeds), total=nsamples,
+                    desc="Monte Carlo Progress", unit="samples"):
+                statistics["damage"].update(damage)
+                for key, series in data.items():
+                    statistics.setdefault(key, {})
+                    for quantity, value in series.items():
+                        statistics[key].setdefault(
+                            quantity, RunningStatistics()).update(value)
+            pool.close()
+            pool.join()
+
+        return statistics
+
+
+class MultilevelMonteCarlo(object):
+    r"""
+    A multilevel Monte Carlo (MLMC) estimator over a hierarchy of models.
+
+    The expected value of a quantity of interest :math:`P_L` of the finest
+    model is estimated by the telescoping sum,
+
+    .. math::
+        E[P_L] = E[P_0] + \sum_{l=1}^{L} E[P_l - P_{l-1}],
+
+    where each correction is estimated from pairs of coupled simulations of
+    the models of levels :math:`l` and :math:`l-1` [M. B. Giles, Multilevel
+    Monte Carlo methods, Acta Numerica 24 (2015) 259–328.]. The two
+    simulations of a pair are coupled by sharing the sampled parameters and,
+    optionally, a random field of stiffness corrections sampled on the finest
+    mesh and transferred to each level by nearest-neighbour interpolation.
+    Since the variance of the corrections decays as the levels are refined,
+    most of the samples are taken on the cheap coarse levels. The number of
+    samples on each level is chosen adaptively from the measured variances
+    and costs (wall-clock time) of the levels.
+    """
+
+    def __init__(self, models, steps, quantity, sampler=None,
+                 correlation_length=None, transform=np.exp,
+                 simulate_kwargs=None):
+        """
+        Create a :class:`MultilevelMonteCarlo` object.
+
+        :arg models: The hierarchy of models, ordered from the coarsest to the
+            finest mesh.
+        :type models: list(:class:`peripy.model.Model`)
+        :arg steps: The number of simulation steps of the models of each
+            level, or a single number of steps shared by the levels.
+        :type steps: list(int) or int
+        :arg quantity: A function that returns the float quantity of
+            interest, given the tuple returned by
+            :meth:`peripy.model.Model.simulate` as its arguments.
+        :type quantity: function
+        :arg sampler: A function that returns a dict of keyword arguments of
+            :meth:`peripy.model.Model.simulate` (e.g. critical_stretch and
+            bond_stiffness) of a realisation, given a
+            :class:`numpy.random.Generator` as input. If None the parameters
+            of the models are used. Default None.
+        :type sampler: function
+        :arg float correlation_length: The correlation length of a random
+            field of stiffness corrections, see
+            :class:`peripy.random_field.RandomField`. If None, no random field
+            is applied. Default None.
+        :arg transform: A function that maps the Gaussian random field on the
+            bonds to the stiffness corrections. Default :func:`numpy.exp`,
+            a log-normal field.
+        :type transform: function
+        :arg simulate_kwargs: The keyword arguments of
+            :meth:`peripy.model.Model.simulate` of each level, e.g.
+            displacement_bc_magnitudes, or a single dict shared by the levels.
+        :type simulate_kwargs: list(dict) or dict
+
+        :returns: A :class:`MultilevelMonteCarlo` object
+        """
+        self.models = list(models)
+        self.nlevels = len(self.models)
+        if np.ndim(steps) == 0:
+            steps = [steps] * self.nlevels
+        if simulate_kwargs is None:
+            simulate_kwargs = {}
+        if isinstance(simulate_kwargs, dict):
+            simulate_kwargs = [simulate_kwargs] * self.nlevels
+        if (len(steps) != self.nlevels
+                or len(simulate_kwargs) != self.nlevels):
+            raise ValueError("steps and simulate_kwargs must have a value "
+                             "for each level (expected {}, got {} and "
+                             "{})".format(self.nlevels, len(steps),
+                                          len(simulate_kwargs)))
+        self.steps = steps
+        self.simulate_kwargs = simulate_kwargs
+        self.quantity = quantity
+        self.sampler = sampler
+        self.transform = transform
+
+        if correlation_length is None:
+            self.fields = None
+        else:
+            # Fields are sampled on the finest mesh
+            self.fields = [RandomField(model, correlation_length)
+                           for model in self.models]
+            tree = cKDTree(self.models[-1].coords)
+            self._nearest = [tree.query(model.coords)[1]
+                             for model in self.models]
+
+        # Statistics of the corrections and the cost of each level
+        self.statistics = [RunningStatistics() for _ in range(self.nlevels)]
+        self.cost = np.zeros(self.nlevels)
+
+    def _simulate(self, level, parameters, field):
+        """Return the quantity of interest of a model of the hierarchy."""
+        kwargs = dict(self.simulate_kwargs[level])
+        kwargs.update(parameters)
+        if field is not None:
+            bond_field = self.fields[level].bonds(field[self._nearest[level]])
+            kwargs["stiffness_corrections"] = self.transform(bond_field)
+        return self.quantity(
+            *self.models[level].simulate(self.steps[level], **kwargs))
+
+    def _sample(self, level, seed):
+        """Sample a correction of a level and update its statistics."""
+        rng = np.random.default_rng(seed)
+        parameters = {} if self.sampler is None else self.sampler(rng)
+        field = None
+        if self.fields is not None:
+            field = self.fields[-1].sample(rng)
+
+        start = time.perf_counter()
+        correction = self._simulate(level, parameters, field)
+        if level > 0:
+            correction -= self._simulate(level - 1, parameters, field)
+        self.cost[level] += time.perf_counter() - start
+        self.statistics[level].update(correction)
+
+    def run(self, tolerance, initial_samples=10, seed=None):
+        r"""
+        Estimate the expected quantity of interest of the finest model.
+
+        Starting from `initial_samples` on each level, the optimal number of
+        samples of each level, such that the variance of the estimator is
+        :math:`\epsilon^2 / 2`, is calculated from the measured variances
+        and costs, and additional samples are taken until it is reached.
+
+        :arg float tolerance: The target root mean square error of the
+            estimator, :math:`\epsilon`.
+        :arg int initial_samples: The number of samples initially taken on
+            each level, which must be at least 2. Default 10.
+        :arg seed: The seed of the random number generators.
+        :type seed: int or NoneType
+
+        :returns: A tuple of the estimate and the number of samples taken on
+            each level.
+        :rtype: tuple(float, :class:`numpy.ndarray`)
+        """
+        if initial_samples < 2:
+            raise ValueError("initial_samples must be at least 2 to estimate "
+                             "the variance of each level (got {})".format(
+                                 initial_samples))
+        seeds = np.random.SeedSequence(seed).spawn(self.nlevels)
+        extra = np.full(self.nlevels, initial_samples)
+        while np.any(extra > 0):
+            for level in range(self.nlevels):
+                for level_seed in seeds[level].spawn(extra[level]):
+                    self._sample(level, level_seed)
+
+            nsamples = np.array([stats.n for stats in self.statistics])
+            variance = np.array(
+                [stats.variance for stats in self.statistics])
+            cost = self.cost / nsamples
+            optimal = np.ceil(
+                2 / tolerance**2 * np.sqrt(variance / cost)
+                * np.sum(np.sqrt(variance * cost))).astype(int)
+            extra = np.maximum(optimal - nsamples, 0)
+
+        estimate = sum(stats.mean for stats in self.statistics)
+        return float(estimate), nsamples
+
+
+def _initialise_worker(mesh_file, integrator, integrator_kwargs,
+                       model_kwargs, write_path, sampler, steps,
+                       simulate_kwargs, devices, counter):
+    """Build the model of a worker process from the shared arrays."""
+    with counter.get_lock():
+        index = counter.value
+        counter.value += 1
+    integrator_kwargs = dict(integrator_kwargs)
+    if devices is not None:
+        platform, device = devices[index % len(devices)]
+        device = cl.get_platforms()[platform].get_devices()[device]
+        integrator_kwargs["context"] = cl.Context([device])
+
+    model_kwargs = dict(model_kwargs)
+    # The initial crack is already applied to the shared connectivity
+    model_kwargs.pop("initial_crack", None)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        arrays = {name: read_array(write_path, name)
+                  for name in _SHARED_ARRAYS}
+        model = Model(
+            mesh_file, integrator(**integrator_kwargs),
+            volume=arrays["volume"], family=arrays["family"],
+            connectivity=(arrays["nlist"], arrays["n_neigh"]),
+            stiffness_corrections=arrays["stiffness_corrections"],
+            bond_types=arrays["bond_types"], **model_kwargs)
+
+    simulate_kwargs = dict(simulate_kwargs)
+    if simulate_kwargs.get("write") and "write_path" not in simulate_kwargs:
+        # Each worker writes its mesh files to a private directory
+        directory = tempfile.mkdtemp()
+        util.Finalize(None, shutil.rmtree, args=(directory,),
+                      exitpriority=0)
+        simulate_kwargs["write_path"] = directory
+
+    _worker.update(
+        model=model, sampler=sampler, steps=steps,
+        simulate_kwargs=simulate_kwargs)
+
+
+def _realise(seed):
+    """Simulate one realisation of the model in a worker process."""
+    rng = np.random.default_rng(seed)
+    kwargs = dict(_worker["simulate_kwargs"])
+    kwargs.update(_worker["sampler"](rng))
+    (_, damage, *_, data) = _worker["model"].simulate(
+        _worker["steps"], **kwargs)
+    return damage, data
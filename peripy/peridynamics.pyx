@@ -1,7 +1,49 @@
-from .spatial cimport ceuclid, cstrain, cstrain2
+from cython.parallel cimport prange, threadid
+from libc.math cimport fabs, sqrt
 import numpy as np
 
 
+cdef extern from *:
+    """
+    #ifdef _OPENMP
+    #include <omp.h>
+    #define PERIPY_OPENMP 1
+    #else
+    #define PERIPY_OPENMP 0
+    static int omp_get_max_threads(void) { return 1; }
+    #endif
+    """
+    # Whether the module was compiled with OpenMP, see setup.py
+    bint PERIPY_OPENMP
+    int omp_get_max_threads() nogil
+
+
+cdef int _num_threads(num_threads):
+    """Return the number of OpenMP threads to use."""
+    if num_threads is None:
+        return omp_get_max_threads()
+    if num_threads < 1:
+        raise ValueError("num_threads must be a positive int (got {})".format(
+            num_threads))
+    if not PERIPY_OPENMP:
+        return 1
+    return num_threads
+
+
+def get_num_threads(num_threads=None):
+    """
+    Return the number of OpenMP threads used by the functions of this module.
+
+    :arg int num_threads: The requested number of threads. If None the OpenMP
+        default is used. Default None.
+
+    :returns: The number of threads, which is 1 if the module was built
+        without OpenMP.
+    :rtype: int
+    """
+    return _num_threads(num_threads)
+
+
 def damage(int[:] n_neigh, int[:] family):
     """
     Calculate the damage for each node.
@@ -34,10 +76,20 @@ def damage(int[:] n_neigh, int[:] family):
 def bond_force(double[:, :] r, double[:, :] r0, int[:, :] nlist,
                int[:] n_neigh, double[:] volume, double bond_stiffness,
                double[:, :] force_bc_values, int[:, :] force_bc_types,
-               double force_bc_scale):
+               double force_bc_scale, num_threads=None, int first=0,
+               last=None, force=None):
     """
     Calculate the force due to bonds on each node.
 
+    The nodes are shared between OpenMP threads. Each thread accumulates the
+    forces, using Newton's third law, in its own force buffer, so that no
+    synchronisation between threads is needed, and the buffers are summed.
+
+    If a range of nodes is given, only the forces of those nodes are
+    calculated, so that several processes can calculate the forces of
+    disjoint ranges at once. Newton's third law is only used for the bonds
+    between two nodes of the range.
+
     :arg r: The current coordinates of each node.
     :type r: :class:`numpy.ndarray`
     :arg r0: The initial coordinates of each node.
@@ -55,56 +107,96 @@ def bond_force(double[:, :] r, double[:, :] r0, int[:, :] nlist,
     :type force_bc_types: :class:`numpy.ndarray`
     :arg double bc_scale: The scalar value applied to the
         force boundary conditions.
+    :arg int num_threads: The number of OpenMP threads. If None the OpenMP
+        default is used. Default None.
+    :arg int first: The first node of the range. Default 0.
+    :arg int last: The node after the last node of the range. Default None,
+        which is the number of nodes.
+    :arg force: An (n,3) array into which the forces of the range are
+        written. Default None, which allocates a new array.
+    :type force: :class:`numpy.ndarray`
+
+    :returns: The force due to bonds on each node of the range.
+    :rtype: :class:`numpy.ndarray`
     """
     cdef int nnodes = nlist.shape[0]
+    cdef int nthreads = _num_threads(num_threads)
+    cdef int end = nnodes if last is None else last
 
-    force = np.zeros((nnodes, 3), dtype=np.float64)
+    if force is None:
+        force = np.zeros((nnodes, 3), dtype=np.float64)
     cdef double[:, :] force_view = force
+    # Thread-private force buffers of the nodes of the range
+    cdef double[:, :, :] local_force = np.zeros((nthreads, end - first, 3),
+                                                dtype=np.float64)
 
-    cdef int i, j, dim, i_n_neigh, neigh
-    cdef double strain, l, force_norm, nu, partial_volume_i, partial_volume_j
-    cdef double[3] f
+    cdef int i, j, dim, neigh, thread
+    cdef double l, l0, force_norm, dx, dy, dz, f, total
+    cdef bint remote
 
-    for i in range(nnodes):
-        i_n_neigh = n_neigh[i]
-        for neigh in range(i_n_neigh):
+    for i in prange(first, end, nogil=True, schedule='guided',
+                    num_threads=nthreads):
+        thread = threadid()
+        for neigh in range(n_neigh[i]):
             j = nlist[i, neigh]
+            # The force on a node outside of the range is calculated by the
+            # range of that node
+            remote = (j < first) or (j >= end)
 
-            if i < j:
+            if i < j or remote:
                 # Calculate total force
-                l = ceuclid(r[i], r[j])
-                strain = cstrain2(l, r0[i], r0[j])
-                force_norm = strain * bond_stiffness
+                dx = r0[j, 0] - r0[i, 0]
+                dy = r0[j, 1] - r0[i, 1]
+                dz = r0[j, 2] - r0[i, 2]
+                l0 = sqrt(dx * dx + dy * dy + dz * dz)
+                dx = r[j, 0] - r[i, 0]
+                dy = r[j, 1] - r[i, 1]
+                dz = r[j, 2] - r[i, 2]
+                l = sqrt(dx * dx + dy * dy + dz * dz)
+                force_norm = (l - l0) / l0 * bond_stiffness
 
                 # Calculate component of force in each dimension
                 force_norm = force_norm / l
-                for dim in range(3):
-                    f[dim] = force_norm * (r[j, dim] - r[i, dim])
 
                 # Add force to particle i, using Newton's third law subtract
                 # force from j
                 # Scale the force by the partial volume of the child particle
                 for dim in range(3):
-                    force_view[i, dim] = (force_view[i, dim]
-                                          + f[dim] * volume[j])
-                    force_view[j, dim] = (force_view[j, dim]
-                                          - f[dim] * volume[i])
+                    f = force_norm * (r[j, dim] - r[i, dim])
+                    local_force[thread, i - first, dim] = (
+                        local_force[thread, i - first, dim] + f * volume[j])
+                    if not remote:
+                        local_force[thread, j - first, dim] = (
+                            local_force[thread, j - first, dim]
+                            - f * volume[i])
 
-        # Apply boundary conditions
+    # Sum the thread-private buffers and apply boundary conditions
+    for i in prange(first, end, nogil=True, schedule='static',
+                    num_threads=nthreads):
         for dim in range(3):
+            total = 0
+            for thread in range(nthreads):
+                total = total + local_force[thread, i - first, dim]
             if force_bc_types[i, dim] != 0:
-                force_view[i, dim] = force_view[i, dim] + (
-                    force_bc_scale * force_bc_values[i, dim])
+                total = total + force_bc_scale * force_bc_values[i, dim]
+            force_view[i, dim] = total
 
     return force
 
 
 def break_bonds(double[:, :] r, double[:, :]r0, int[:, :] nlist,
-                int[:] n_neigh, double critical_strain):
+                int[:] n_neigh, double critical_strain, num_threads=None,
+                int first=0, last=None):
     """
     Update the neighbour list and number of neighbours by breaking bonds which
     have exceeded the critical strain.
 
+    The nodes are shared between OpenMP threads. As the strain of a bond is
+    the same from both of its nodes, each node removes its broken bonds from
+    its own neighbour list only, so that no synchronisation between threads
+    is needed. For the same reason, several processes can break the bonds of
+    disjoint ranges of nodes at once.
+
     :arg r: The current coordinates of each node.
     :type r: :class:`numpy.ndarray`
     :arg r0: The initial coordinates of each node.
@@ -114,14 +206,22 @@ def break_bonds(double[:, :] r, double[:, :]r0, int[:, :] nlist,
     :arg n_neigh: The number of neighbours for each node.
     :type n_neigh: :class:`numpy.ndarray`
     :arg float critical_strain: The critical strain.
+    :arg int num_threads: The number of OpenMP threads. If None the OpenMP
+        default is used. Default None.
+    :arg int first: The first node of the range. Default 0.
+    :arg int last: The node after the last node of the range. Default None,
+        which is the number of nodes.
     """
     cdef int nnodes = nlist.shape[0]
+    cdef int nthreads = _num_threads(num_threads)
+    cdef int end = nnodes if last is None else last
 
     cdef int i, j, i_n_neigh, neigh
-    cdef int j_n_neigh, jneigh
+    cdef double l, l0, dx, dy, dz
 
     # Check neighbours for each node
-    for i in range(nnodes):
+    for i in prange(first, end, nogil=True, schedule='guided',
+                    num_threads=nthreads):
         # Get current number of neighbours
         i_n_neigh = n_neigh[i]
 
@@ -129,36 +229,33 @@ def break_bonds(double[:, :] r, double[:, :]r0, int[:, :] nlist,
         while neigh < i_n_neigh:
             j = nlist[i, neigh]
 
-            if i < j:
-                if abs(cstrain(r[i], r[j], r0[i], r0[j])) < critical_strain:
-                    # Move onto the next neighbour
-                    neigh += 1
-                else:
-                    # Remove this neighbour by replacing it with the last
-                    # neighbour on the list, then reducing the number of
-                    # neighbours by 1.
-                    # As neighbour `neigh` is now a new neighbour, we do not
-                    # advance the neighbour index
-                    nlist[i, neigh] = nlist[i, i_n_neigh-1]
-                    i_n_neigh -= 1
-
-                    # Remove from j
-                    j_n_neigh = n_neigh[j]
-                    for jneigh in range(j_n_neigh):
-                        if nlist[j, jneigh] == i:
-                            nlist[j, jneigh] = nlist[j, j_n_neigh-1]
-                            n_neigh[j] = n_neigh[j] - 1
-                            break
-            else:
+            dx = r0[j, 0] - r0[i, 0]
+            dy = r0[j, 1] - r0[i, 1]
+            dz = r0[j, 2] - r0[i, 2]
+            l0 = sqrt(dx * dx + dy * dy + dz * dz)
+            dx = r[j, 0] - r[i, 0]
+            dy = r[j, 1] - r[i, 1]
+            dz = r[j, 2] - r[i, 2]
+            l = sqrt(dx * dx + dy * dy + dz * dz)
+
+            if fabs((l - l0) / l0) < critical_strain:
                 # Move onto the next neighbour
-                neigh += 1
+                neigh = neigh + 1
+            else:
+                # Remove this neighbour by replacing it with the last
+                # neighbour on the list, then reducing the number of
+                # neighbours by 1.
+                # As neighbour `neigh` is now a new neighbour, we do not
+                # advance the neighbour index
+                nlist[i, neigh] = nlist[i, i_n_neigh-1]
+                i_n_neigh = i_n_neigh - 1
 
         n_neigh[i] = i_n_neigh
 
 
 def update_displacement(double[:, :] u, double[:, :] bc_values, 
                         int[:, :] bc_types, double[:, :] force, 
-                        double bc_scale, double dt):
+                        double bc_scale, double dt, num_threads=None):
     """
     Update the displacement of each node for each node using an Euler
     integrator.
@@ -175,11 +272,389 @@ def update_displacement(double[:, :] u, double[:, :] bc_values,
     :arg float bc_scale: The scalar value applied to the
         displacement boundary conditions.
     :arg float dt: The length of the timestep in seconds.
+    :arg int num_threads: The number of OpenMP threads. If None the OpenMP
+        default is used. Default None.
     """
     cdef int nnodes = u.shape[0]
-    for i in range(nnodes):
-            for dim in range(3):
-                if bc_types[i, dim] == 0:
-                    u[i, dim] = u[i, dim] + dt * force[i, dim]
-                else:
-                    u[i, dim] = bc_scale * bc_values[i, dim]
\ No newline at end of file
+    cdef int nthreads = _num_threads(num_threads)
+    cdef int i, dim
+    for i in prange(nnodes, nogil=True, schedule='static',
+                    num_threads=nthreads):
+        for dim in range(3):
+            if bc_types[i, dim] == 0:
+                u[i, dim] = u[i, dim] + dt * force[i, dim]
+            else:
+                u[i, dim] = bc_scale * bc_values[i, dim]
+
+
+def euler_step(double[:, :] u, double[:, :] r0, int[:, :] nlist,
+               int[:] n_neigh, double[:] volume, double bond_stiffness,
+               double critical_strain, double[:, :] force_bc_values,
+               int[:, :] force_bc_types, double force_bc_scale,
+               double[:, :] bc_values, int[:, :] bc_types, double bc_scale,
+               double dt, double[:, :] force, double[:, :, :] local_force):
+    """
+    Conduct one step of the Euler integrator.
+
+    Breaks the bonds which have exceeded the critical strain, calculates the
+    force due to the remaining bonds and updates the displacements, visiting
+    each bond once. Equivalent to calling :func:`break_bonds`,
+    :func:`bond_force` and :func:`update_displacement` in turn, but the bond
+    lengths are only calculated once and no arrays are allocated.
+
+    The nodes are shared between OpenMP threads. Each node removes its broken
+    bonds from its own neighbour list, which relies on the neighbour list
+    being symmetric, and each thread accumulates the forces, using Newton's
+    third law, in its own force buffer.
+
+    :arg u: The current displacements of each node, updated in place.
+    :type u: :class:`numpy.ndarray`
+    :arg r0: The initial coordinates of each node.
+    :type r0: :class:`numpy.ndarray`
+    :arg nlist: The neighbour list, updated in place.
+    :type nlist: :class:`numpy.ndarray`
+    :arg n_neigh: The number of neighbours for each node, updated in place.
+    :type n_neigh: :class:`numpy.ndarray`
+    :arg volume: The volume of each node.
+    :type volume: :class:`numpy.ndarray`
+    :arg float bond_stiffness: The bond stiffness.
+    :arg float critical_strain: The critical strain.
+    :arg force_bc_values: The force boundary condition values for each node.
+    :type force_bc_values: :class:`numpy.ndarray`
+    :arg force_bc_types: The force boundary condition types for each node.
+    :type force_bc_types: :class:`numpy.ndarray`
+    :arg float force_bc_scale: The scalar value applied to the
+        force boundary conditions.
+    :arg bc_values: An (n,3) array of the boundary condition values.
+    :type bc_values: :class:`numpy.ndarray`
+    :arg bc_types: An (n,3) array of the boundary condition types, where a
+        zero value represents an unconstrained node.
+    :type bc_types: :class:`numpy.ndarray`
+    :arg float bc_scale: The scalar value applied to the
+        displacement boundary conditions.
+    :arg float dt: The length of the timestep in seconds.
+    :arg force: An (n,3) array into which the force due to bonds on each node
+        is written.
+    :type force: :class:`numpy.ndarray`
+    :arg local_force: A (num_threads, n, 3) array of zeros, the thread-private
+        force buffers. The number of OpenMP threads is the length of the first
+        axis. The buffers are zero again on return.
+    :type local_force: :class:`numpy.ndarray`
+    """
+    cdef int nnodes = nlist.shape[0]
+    cdef int nthreads = local_force.shape[0]
+
+    cdef int i, j, dim, i_n_neigh, neigh, thread
+    cdef double l, l0, strain, force_norm, dx, dy, dz, f, total
+
+    # Break bonds and accumulate the force of the remaining bonds
+    for i in prange(nnodes, nogil=True, schedule='guided',
+                    num_threads=nthreads):
+        thread = threadid()
+        i_n_neigh = n_neigh[i]
+
+        neigh = 0
+        while neigh < i_n_neigh:
+            j = nlist[i, neigh]
+
+            dx = r0[j, 0] - r0[i, 0]
+            dy = r0[j, 1] - r0[i, 1]
+            dz = r0[j, 2] - r0[i, 2]
+            l0 = sqrt(dx * dx + dy * dy + dz * dz)
+            # The bond vector is the exact negative of the one from node j,
+            # so that both nodes find the same strain and break the bond
+            # together
+            dx = (r0[j, 0] + u[j, 0]) - (r0[i, 0] + u[i, 0])
+            dy = (r0[j, 1] + u[j, 1]) - (r0[i, 1] + u[i, 1])
+            dz = (r0[j, 2] + u[j, 2]) - (r0[i, 2] + u[i, 2])
+            l = sqrt(dx * dx + dy * dy + dz * dz)
+            strain = (l - l0) / l0
+
+            if fabs(strain) >= critical_strain:
+                # Remove this neighbour by replacing it with the last
+                # neighbour on the list, then reducing the number of
+                # neighbours by 1.
+                nlist[i, neigh] = nlist[i, i_n_neigh-1]
+                i_n_neigh = i_n_neigh - 1
+            else:
+                if i < j:
+                    # Add force to particle i, using Newton's third law
+                    # subtract force from j
+                    force_norm = strain * bond_stiffness / l
+                    f = force_norm * dx
+                    local_force[thread, i, 0] = (
+                        local_force[thread, i, 0] + f * volume[j])
+                    local_force[thread, j, 0] = (
+                        local_force[thread, j, 0] - f * volume[i])
+                    f = force_norm * dy
+                    local_force[thread, i, 1] = (
+                        local_force[thread, i, 1] + f * volume[j])
+                    local_force[thread, j, 1] = (
+                        local_force[thread, j, 1] - f * volume[i])
+                    f = force_norm * dz
+                    local_force[thread, i, 2] = (
+                        local_force[thread, i, 2] + f * volume[j])
+                    local_force[thread, j, 2] = (
+                        local_force[thread, j, 2] - f * volume[i])
+                neigh = neigh + 1
+
+        n_neigh[i] = i_n_neigh
+
+    # Sum and clear the thread-private buffers, apply boundary conditions and
+    # update the displacements
+    for i in prange(nnodes, nogil=True, schedule='static',
+                    num_threads=nthreads):
+        for dim in range(3):
+            total = 0
+            for thread in range(nthreads):
+                total = total + local_force[thread, i, dim]
+                local_force[thread, i, dim] = 0
+            if force_bc_types[i, dim] != 0:
+                total = total + force_bc_scale * force_bc_values[i, dim]
+            force[i, dim] = total
+            if bc_types[i, dim] == 0:
+                u[i, dim] = u[i, dim] + dt * total
+            else:
+                u[i, dim] = bc_scale * bc_values[i, dim]
+
+
+def bond_force4(double[:, :] u, double[:, :] force, double[:, :] body_force,
+                double[:, :] r0, double[:] volume, int[:, :] nlist,
+                int[:] n_neigh, int[:, :] force_bc_types,
+                double[:, :] force_bc_values,
+                double[:, :] stiffness_corrections, int[:, :] bond_types,
+                int[:, :] regimes, double[:] plus_cs,
+                double[:] bond_stiffness, double[:] critical_stretch,
+                double force_bc_scale, int nregimes, num_threads=None):
+    """
+    Calculate the force due to bonds on each node, and break bonds.
+
+    The counterpart of the bond_force4 OpenCL kernel, for n-linear damage
+    models, bond types and stiffness corrections. Broken bonds are marked
+    with -1 in the neighbour list rather than removed, so that the neighbour
+    list stays aligned with the stiffness corrections, bond types and regimes
+    of the bonds.
+
+    The nodes are shared between OpenMP threads. Each bond is visited from
+    both of its nodes and each thread only writes the force, neighbour list
+    and regimes of its own nodes, so that no synchronisation between threads
+    is needed.
+
+    :arg u: The current displacements of each node.
+    :type u: :class:`numpy.ndarray`
+    :arg force: An (n,3) array into which the force on each node is written.
+    :type force: :class:`numpy.ndarray`
+    :arg body_force: An (n,3) array into which the force due to bonds on each
+        node is written.
+    :type body_force: :class:`numpy.ndarray`
+    :arg r0: The initial coordinates of each node.
+    :type r0: :class:`numpy.ndarray`
+    :arg volume: The volume of each node.
+    :type volume: :class:`numpy.ndarray`
+    :arg nlist: The neighbour list, where a value of -1 is a broken bond.
+    :type nlist: :class:`numpy.ndarray`
+    :arg n_neigh: The number of neighbours for each node.
+    :type n_neigh: :class:`numpy.ndarray`
+    :arg force_bc_types: The force boundary condition types for each node.
+    :type force_bc_types: :class:`numpy.ndarray`
+    :arg force_bc_values: The force boundary condition values for each node.
+    :type force_bc_values: :class:`numpy.ndarray`
+    :arg stiffness_corrections: The stiffness correction factor of each bond,
+        or None.
+    :type stiffness_corrections: :class:`numpy.ndarray` or NoneType
+    :arg bond_types: The type of each bond, or None if there is one bond type.
+    :type bond_types: :class:`numpy.ndarray` or NoneType
+    :arg regimes: The current regime of each bond in the damage model.
+    :type regimes: :class:`numpy.ndarray`
+    :arg plus_cs: The (nbond_types * nregimes) 'c' in 'y=mx+c' of each
+        regime of the damage model.
+    :type plus_cs: :class:`numpy.ndarray`
+    :arg bond_stiffness: The (nbond_types * nregimes) bond stiffness of each
+        regime of the damage model.
+    :type bond_stiffness: :class:`numpy.ndarray`
+    :arg critical_stretch: The (nbond_types * nregimes) critical stretch of
+        each regime of the damage model.
+    :type critical_stretch: :class:`numpy.ndarray`
+    :arg float force_bc_scale: The scalar value applied to the
+        force boundary conditions.
+    :arg int nregimes: The number of regimes in the damage model.
+    :arg int num_threads: The number of OpenMP threads. If None the OpenMP
+        default is used. Default None.
+    """
+    cdef int nnodes = nlist.shape[0]
+    cdef int max_neighbours = nlist.shape[1]
+    cdef int nthreads = _num_threads(num_threads)
+    cdef bint has_corrections = stiffness_corrections is not None
+    cdef bint has_bond_types = bond_types is not None
+
+    cdef int i, j, dim, neigh, i_n_neigh, bond_type, regime, index
+    cdef double xi, y, s, f, dx, dy, dz, fx, fy, fz
+
+    for i in prange(nnodes, nogil=True, schedule='guided',
+                    num_threads=nthreads):
+        fx = 0
+        fy = 0
+        fz = 0
+        i_n_neigh = n_neigh[i]
+        for neigh in range(max_neighbours):
+            j = nlist[i, neigh]
+            # If bond is broken
+            if j == -1:
+                continue
+
+            # Find bond type, which chooses the damage model
+            bond_type = 0
+            if has_bond_types:
+                bond_type = bond_types[i, neigh]
+            regime = regimes[i, neigh]
+            index = bond_type * nregimes + regime
+
+            dx = r0[j, 0] - r0[i, 0]
+            dy = r0[j, 1] - r0[i, 1]
+            dz = r0[j, 2] - r0[i, 2]
+            xi = sqrt(dx * dx + dy * dy + dz * dz)
+            # The bond vector is the exact negative of the one from node j,
+            # so that both nodes find the same stretch and change regime
+            # together
+            dx = (r0[j, 0] + u[j, 0]) - (r0[i, 0] + u[i, 0])
+            dy = (r0[j, 1] + u[j, 1]) - (r0[i, 1] + u[i, 1])
+            dz = (r0[j, 2] + u[j, 2]) - (r0[i, 2] + u[i, 2])
+            y = sqrt(dx * dx + dy * dy + dz * dz)
+            s = (y - xi) / xi
+
+            # Check for state of bonds
+            if s < critical_stretch[index]:
+                # Check if the bond has entered the previous regime
+                if regime > 0:
+                    if s < critical_stretch[index - 1]:
+                        regime = regime - 1
+                        regimes[i, neigh] = regime
+            else:
+                # Bond enters the next regime
+                regime = regime + 1
+                regimes[i, neigh] = regime
+
+            # Break bond if necessary
+            if regime >= nregimes:
+                nlist[i, neigh] = -1
+                i_n_neigh = i_n_neigh - 1
+            else:
+                index = bond_type * nregimes + regime
+                f = s * bond_stiffness[index] + plus_cs[index]
+                if has_corrections:
+                    f = f * stiffness_corrections[i, neigh]
+                f = f * volume[j] / y
+                fx = fx + f * dx
+                fy = fy + f * dy
+                fz = fz + f * dz
+
+        n_neigh[i] = i_n_neigh
+        body_force[i, 0] = fx
+        body_force[i, 1] = fy
+        body_force[i, 2] = fz
+        for dim in range(3):
+            force[i, dim] = body_force[i, dim]
+            if force_bc_types[i, dim] != 0:
+                force[i, dim] = force[i, dim] + (
+                    force_bc_scale * force_bc_values[i, dim])
+
+
+def update_displacement_euler_cromer(
+        double[:, :] force, double[:, :] u, double[:, :] ud,
+        double[:, :] udd, int[:, :] bc_types, double[:, :] bc_values,
+        double[:] densities, double bc_scale, double damping, double dt,
+        num_threads=None):
+    """
+    Update the displacement and velocity of each node using an Euler Cromer
+    integrator.
+
+    :arg force: The force on each node.
+    :type force: :class:`numpy.ndarray`
+    :arg u: The current displacements of each node.
+    :type u: :class:`numpy.ndarray`
+    :arg ud: The current velocities of each node.
+    :type ud: :class:`numpy.ndarray`
+    :arg udd: The current accelerations of each node.
+    :type udd: :class:`numpy.ndarray`
+    :arg bc_types: An (n,3) array of the boundary condition types, where a
+        zero value represents an unconstrained node.
+    :type bc_types: :class:`numpy.ndarray`
+    :arg bc_values: An (n,3) array of the boundary condition values.
+    :type bc_values: :class:`numpy.ndarray`
+    :arg densities: An (n,) array of the density of each node.
+    :type densities: :class:`numpy.ndarray`
+    :arg float bc_scale: The scalar value applied to the
+        displacement boundary conditions.
+    :arg float damping: The dynamic relaxation damping constant in
+        [kg/(m^3 s)].
+    :arg float dt: The length of the timestep in seconds.
+    :arg int num_threads: The number of OpenMP threads. If None the OpenMP
+        default is used. Default None.
+    """
+    cdef int nnodes = u.shape[0]
+    cdef int nthreads = _num_threads(num_threads)
+    cdef int i, dim
+    cdef double uddi, inverse_density
+    for i in prange(nnodes, nogil=True, schedule='static',
+                    num_threads=nthreads):
+        inverse_density = 1.0 / densities[i]
+        for dim in range(3):
+            uddi = (force[i, dim] - damping * ud[i, dim]) * inverse_density
+            udd[i, dim] = uddi
+            ud[i, dim] = ud[i, dim] + uddi * dt
+            if bc_types[i, dim] == 0:
+                u[i, dim] = u[i, dim] + dt * ud[i, dim]
+            else:
+                u[i, dim] = bc_scale * bc_values[i, dim]
+
+
+def update_displacement_velocity_verlet(
+        double[:, :] force, double[:, :] u, double[:, :] ud,
+        double[:, :] udd, int[:, :] bc_types, double[:, :] bc_values,
+        double[:] densities, double bc_scale, double damping, double dt,
+        num_threads=None):
+    """
+    Update the displacement and velocity of each node using a velocity Verlet
+    integrator.
+
+    :arg force: The force on each node.
+    :type force: :class:`numpy.ndarray`
+    :arg u: The current displacements of each node.
+    :type u: :class:`numpy.ndarray`
+    :arg ud: The current velocities of each node.
+    :type ud: :class:`numpy.ndarray`
+    :arg udd: The current accelerations of each node.
+    :type udd: :class:`numpy.ndarray`
+    :arg bc_types: An (n,3) array of the boundary condition types, where a
+        zero value represents an unconstrained node.
+    :type bc_types: :class:`numpy.ndarray`
+    :arg bc_values: An (n,3) array of the boundary condition values.
+    :type bc_values: :class:`numpy.ndarray`
+    :arg densities: An (n,) array of the density of each node.
+    :type densities: :class:`numpy.ndarray`
+    :arg float bc_scale: The scalar value applied to the
+        displacement boundary conditions.
+    :arg float damping: The dynamic relaxation damping constant in
+        [kg/(m^3 s)].
+    :arg float dt: The length of the timestep in seconds.
+    :arg int num_threads: The number of OpenMP threads. If None the OpenMP
+        default is used. Default None.
+    """
+    cdef int nnodes = u.shape[0]
+    cdef int nthreads = _num_threads(num_threads)
+    cdef int i, dim
+    cdef double ud1, udd1, inverse_density
+    for i in prange(nnodes, nogil=True, schedule='static',
+                    num_threads=nthreads):
+        inverse_density = 1.0 / densities[i]
+        for dim in range(3):
+            # Half-step velocity
+            ud1 = ud[i, dim] + (dt / 2) * udd[i, dim]
+            udd1 = (force[i, dim] - damping * ud1) * inverse_density
+            # Full-step velocity
+            ud[i, dim] = ud1 + (dt / 2) * udd1
+            udd[i, dim] = udd1
+            if bc_types[i, dim] == 0:
+                u[i, dim] = u[i, dim] + dt * (ud[i, dim] + (dt / 2) * udd1)
+            else:
+                u[i, dim] = bc_scale * bc_values[i, dim]
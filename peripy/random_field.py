@@ -0,0 +1,159 @@
+"""Spatially correlated random fields on peridynamics models."""
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import splu
+from scipy.special import gamma
+
+
+class RandomField(object):
+    r"""
+    A Gaussian random field on the nodes of a :class:`peripy.model.Model`.
+
+    The field is a Gaussian Markov random field (GMRF) approximation of a
+    Matérn field, given by the solution of the stochastic partial
+    differential equation (SPDE) of Lindgren et al. [F. Lindgren, H. Rue and
+    J. Lindström, An explicit link between Gaussian fields and Gaussian Markov
+    random fields: the stochastic partial differential equation approach,
+    Journal of the Royal Statistical Society B 73 (2011) 423–498.],
+
+    .. math::
+        (\kappa^2 - \Delta) x = \mathcal{W},
+
+    where :math:`\mathcal{W}` is Gaussian white noise and the Matérn
+    smoothness is :math:`\nu = 2 - d / 2`. The Laplacian is discretised with
+    linear finite elements on the mesh of the model, or with finite
+    differences on the tensor grid of a transfinite model, and the mass
+    matrix is lumped onto the node volumes, so the system matrix is sparse.
+    It is factorised once, when the
+    :class:`RandomField` is created, after which each sample costs a single
+    sparse triangular solve.
+    """
+
+    def __init__(self, model, correlation_length):
+        """
+        Create a :class:`RandomField` object.
+
+        :arg model: The model on whose nodes the field is defined.
+        :type model: :class:`peripy.model.Model`
+        :arg float correlation_length: The correlation length of the field,
+            the distance at which the correlation is approximately 0.1. The
+            correlation length should be several times the mesh spacing.
+
+        :returns: A :class:`RandomField` object
+        """
+        if correlation_length <= 0:
+            raise ValueError("correlation_length must be positive "
+                             "(got {})".format(correlation_length))
+        self.nnodes = model.nnodes
+        self.max_neighbours = model.max_neighbours
+        self.correlation_length = correlation_length
+        nlist, n_neigh = model.initial_connectivity
+        # The initial neighbour lists are compact
+        self.mask = (np.arange(self.max_neighbours)[np.newaxis, :]
+                     < n_neigh[:, np.newaxis])
+        self.nlist = np.where(self.mask, nlist, 0)
+
+        dimensions = model.dimensions
+        nu = 2 - dimensions / 2
+        kappa = np.sqrt(8 * nu) / correlation_length
+        volume = model.volume
+        if hasattr(model, "mesh_connectivity"):
+            stiffness = self._fem_stiffness(
+                model.coords[:, :dimensions], model.mesh_connectivity)
+        else:
+            stiffness = self._grid_stiffness(volume, n_neigh, model.coords)
+        operator = sparse.diags(kappa**2 * volume) + stiffness
+
+        # The expensive factorisation is cached for all samples
+        self._solver = splu(operator.tocsc())
+        self._mass = np.sqrt(volume)
+        # Marginal variance of the Matérn field
+        self._scale = 1. / np.sqrt(
+            gamma(nu) / (gamma(nu + dimensions / 2)
+                         * (4 * np.pi)**(dimensions / 2)
+                         * kappa**(2 * nu)))
+
+    def _fem_stiffness(self, coords, cells):
+        """Return the linear finite element stiffness matrix of the mesh."""
+        dimensions = np.shape(coords)[1]
+        vertices = coords[cells]
+        # Edge vectors of each simplex
+        edges = vertices[:, 1:] - vertices[:, :1]
+        inverse = np.linalg.inv(edges)
+        # Gradients of the barycentric coordinates
+        gradients = np.concatenate(
+            (-np.sum(inverse, axis=2)[:, np.newaxis],
+             np.swapaxes(inverse, 1, 2)), axis=1)
+        factorial = 2 if dimensions == 2 else 6
+        measure = np.abs(np.linalg.det(edges)) / factorial
+        local = measure[:, np.newaxis, np.newaxis] * np.einsum(
+            'eid,ejd->eij', gradients, gradients)
+        rows = np.repeat(cells, dimensions + 1, axis=1)
+        columns = np.tile(cells, (1, dimensions + 1))
+        return sparse.coo_matrix(
+            (local.ravel(), (rows.ravel(), columns.ravel())),
+            shape=(self.nnodes, self.nnodes)).tocsc()
+
+    def _grid_stiffness(self, volume, n_neigh, coords):
+        """Return the finite difference stiffness matrix of the grid."""
+        rows = np.repeat(np.arange(self.nnodes), n_neigh)
+        columns = self.nlist[self.mask]
+        distance = np.linalg.norm(coords[columns] - coords[rows], axis=1)
+        spacing = distance.min()
+        # Only the nearest neighbours on the grid are in the stencil
+        nearest = distance < 1.01 * spacing
+        rows = rows[nearest]
+        columns = columns[nearest]
+        weights = np.sqrt(volume[rows] * volume[columns]) / spacing**2
+        stiffness = sparse.coo_matrix(
+            (-weights, (rows, columns)), shape=(self.nnodes, self.nnodes))
+        stiffness = stiffness.tocsc()
+        return stiffness - sparse.diags(
+            np.asarray(stiffness.sum(axis=1)).ravel())
+
+    def sample(self, rng=None, size=None):
+        """
+        Sample the field at the nodes.
+
+        The samples have zero mean and approximately unit variance, away from
+        the boundaries of the model where the variance is inflated.
+
+        :arg rng: The random number generator. If None a new
+            :class:`numpy.random.Generator` is used. Default None.
+        :type rng: :class:`numpy.random.Generator`
+        :arg int size: The number of samples. If None a single sample is
+            returned. Default None.
+
+        :returns: An (nnodes,) array of a sample of the field, or a (size,
+            nnodes) array of the samples.
+        :rtype: :class:`numpy.ndarray`
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+        nsamples = 1 if size is None else size
+        noise = rng.standard_normal((self.nnodes, nsamples))
+        field = self._solver.solve(self._mass[:, np.newaxis] * noise)
+        field = self._scale * field.T
+        return field[0] if size is None else field
+
+    def bonds(self, field):
+        """
+        Map a nodal field onto the bonds.
+
+        The value of a bond is the mean of the values of its two nodes, so
+        that the bond field is symmetric. The value of the padding at the end
+        of each neighbour list is zero.
+
+        :arg field: An (nnodes,) array of the nodal field, or a (size, nnodes)
+            array of samples of the nodal field.
+        :type field: :class:`numpy.ndarray`
+
+        :returns: An (nnodes, max_neighbours) array of the field on the bonds,
+            in the layout of :class:`peripy.model.Model` neighbour lists, or a
+            (size, nnodes, max_neighbours) array of samples.
+        :rtype: :class:`numpy.ndarray`
+        """
+        field = np.asarray(field, dtype=np.float64)
+        bond_field = 0.5 * (field[..., :, np.newaxis]
+                            + field[..., self.nlist])
+        return np.where(self.mask, bond_field, 0.0)
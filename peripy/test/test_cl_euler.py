@@ -31,6 +31,16 @@ def program(context):
     return cl.Program(context, kernel_source).build()
 
 
+@context_available
+@pytest.fixture(scope="module")
+def peridynamics_program(context):
+    """Create a program object for the boundary condition kernels."""
+    kernel_source = open(
+            pathlib.Path(__file__).parent.absolute() /
+            "../cl/peridynamics.cl").read()
+    return cl.Program(context, kernel_source).build()
+
+
 class TestUpdateDisplacement:
     """Test the displacement update."""
 
@@ -40,19 +50,10 @@ class TestUpdateDisplacement:
         u = np.zeros(3)
         nnodes = 1
         force = np.array([1.0, 2.0, 3.0], dtype=np.float64)
-        bc_types = np.array([0, 0, 0], dtype=np.intc)
-        bc_values = np.array([0, 0, 0], dtype=np.float64)
-        displacement_bc_scale = 0
         dt = 1
 
         # Set buffers
         # Read only
-        bc_types_d = cl.Buffer(
-            context, mf.READ_ONLY | mf.COPY_HOST_PTR,
-            hostbuf=bc_types)
-        bc_values_d = cl.Buffer(
-            context, mf.READ_ONLY | mf.COPY_HOST_PTR,
-            hostbuf=bc_values)
         force_d = cl.Buffer(
             context, mf.READ_ONLY | mf.COPY_HOST_PTR,
             hostbuf=force)
@@ -66,8 +67,7 @@ class TestUpdateDisplacement:
 
         update_displacement_kernel(
             queue, (3 * nnodes,), None,
-            force_d, u_d, bc_types_d, bc_values_d,
-            np.float64(displacement_bc_scale), np.float64(dt))
+            force_d, u_d, np.float64(dt))
         cl.enqueue_copy(queue, u, u_d)
 
         assert np.all(u == force)
@@ -78,19 +78,10 @@ class TestUpdateDisplacement:
         u = np.zeros(3)
         nnodes = 1
         force = np.array([1.0, 2.0, 3.0], dtype=np.float64)
-        bc_types = np.array([0, 0, 0], dtype=np.intc)
-        bc_values = np.array([0, 0, 0], dtype=np.float64)
-        displacement_bc_scale = 0
         dt = 2.0
 
         # Set buffers
         # Read only
-        bc_types_d = cl.Buffer(
-            context, mf.READ_ONLY | mf.COPY_HOST_PTR,
-            hostbuf=bc_types)
-        bc_values_d = cl.Buffer(
-            context, mf.READ_ONLY | mf.COPY_HOST_PTR,
-            hostbuf=bc_values)
         force_d = cl.Buffer(
             context, mf.READ_ONLY | mf.COPY_HOST_PTR,
             hostbuf=force)
@@ -104,28 +95,28 @@ class TestUpdateDisplacement:
 
         update_displacement_kernel(
             queue, (3 * nnodes,), None,
-            force_d, u_d, bc_types_d, bc_values_d,
-            np.float64(displacement_bc_scale), np.float64(dt))
+            force_d, u_d, np.float64(dt))
         cl.enqueue_copy(queue, u, u_d)
 
         assert np.all(u == 2.0*force)
 
     @context_available
-    def test_update_displacement3(self, context, queue, program):
+    def test_update_displacement3(
+            self, context, queue, program, peridynamics_program):
         """Test displacement update with displacement boundary conditions."""
         u = np.zeros(3)
         nnodes = 1
         force = np.array([1.0, 2.0, 3.0], dtype=np.float64)
-        bc_types = np.array([1, 1, 0], dtype=np.intc)
-        bc_values = np.array([0.0, 0.0, 0.0], dtype=np.float64)
+        bc_dofs = np.array([0, 1], dtype=np.intc)
+        bc_values = np.array([0.0, 0.0], dtype=np.float64)
         displacement_bc_scale = 1.0
         dt = 2.0
 
         # Set buffers
         # Read only
-        bc_types_d = cl.Buffer(
+        bc_dofs_d = cl.Buffer(
             context, mf.READ_ONLY | mf.COPY_HOST_PTR,
-            hostbuf=bc_types)
+            hostbuf=bc_dofs)
         bc_values_d = cl.Buffer(
             context, mf.READ_ONLY | mf.COPY_HOST_PTR,
             hostbuf=bc_values)
@@ -142,8 +133,12 @@ class TestUpdateDisplacement:
 
         update_displacement_kernel(
             queue, (3 * nnodes,), None,
-            force_d, u_d, bc_types_d, bc_values_d,
-            np.float64(displacement_bc_scale), np.float64(dt))
+            force_d, u_d, np.float64(dt))
+        apply_displacement_boundary_conditions = (
+            peridynamics_program.apply_displacement_boundary_conditions)
+        apply_displacement_boundary_conditions(
+            queue, (len(bc_dofs), 1), None, u_d, bc_dofs_d, bc_values_d,
+            np.float64(displacement_bc_scale), np.intc(3 * nnodes))
         cl.enqueue_copy(queue, u, u_d)
 
         u_expected = np.array([0.0, 0.0, 6.0])
@@ -151,21 +146,22 @@ class TestUpdateDisplacement:
         assert np.all(u == u_expected)
 
     @context_available
-    def test_update_displacement4(self, context, queue, program):
+    def test_update_displacement4(
+            self, context, queue, program, peridynamics_program):
         """Test displacement update with displacement B.C. scale."""
         u = np.zeros(3)
         nnodes = 1
         force = np.array([1.0, 2.0, 3.0], dtype=np.float64)
-        bc_types = np.array([1, 1, 0], dtype=np.intc)
-        bc_values = np.array([2.0, 2.0, 0.0], dtype=np.float64)
+        bc_dofs = np.array([0, 1], dtype=np.intc)
+        bc_values = np.array([2.0, 2.0], dtype=np.float64)
         displacement_bc_scale = 0.5
         dt = 2.0
 
         # Set buffers
         # Read only
-        bc_types_d = cl.Buffer(
+        bc_dofs_d = cl.Buffer(
             context, mf.READ_ONLY | mf.COPY_HOST_PTR,
-            hostbuf=bc_types)
+            hostbuf=bc_dofs)
         bc_values_d = cl.Buffer(
             context, mf.READ_ONLY | mf.COPY_HOST_PTR,
             hostbuf=bc_values)
@@ -182,9 +178,45 @@ class TestUpdateDisplacement:
 
         update_displacement_kernel(
             queue, (3 * nnodes,), None,
-            force_d, u_d, bc_types_d, bc_values_d,
-            np.float64(displacement_bc_scale), np.float64(dt))
+            force_d, u_d, np.float64(dt))
+        apply_displacement_boundary_conditions = (
+            peridynamics_program.apply_displacement_boundary_conditions)
+        apply_displacement_boundary_conditions(
+            queue, (len(bc_dofs), 1), None, u_d, bc_dofs_d, bc_values_d,
+            np.float64(displacement_bc_scale), np.intc(3 * nnodes))
         cl.enqueue_copy(queue, u, u_d)
         u_expected = np.array([1.0, 1.0, 6.0])
 
         assert np.all(u == u_expected)
+
+    @context_available
+    def test_update_displacement_offset(self, context):
+        """Test the update of a range of nodes of an ensemble."""
+        nnodes = 2
+        nsamples = 2
+        kernel_source = open(
+                pathlib.Path(__file__).parent.absolute() /
+                "../cl/euler.cl").read()
+        program = cl.Program(context, kernel_source).build(
+            ["-D NNODES={}".format(nnodes)])
+        queue = cl.CommandQueue(context)
+        u = np.zeros((nsamples, nnodes, 3))
+        force = np.arange(nsamples * nnodes * 3, dtype=np.float64).reshape(
+            (nsamples, nnodes, 3))
+
+        force_d = cl.Buffer(
+            context, mf.READ_ONLY | mf.COPY_HOST_PTR,
+            hostbuf=force)
+        u_d = cl.Buffer(
+            context, mf.READ_WRITE | mf.COPY_HOST_PTR,
+            hostbuf=u)
+
+        # Update only the second node of each sample
+        program.update_displacement(
+            queue, (3, nsamples), None, force_d, u_d, np.float64(1.0),
+            global_offset=(3, 0))
+        cl.enqueue_copy(queue, u, u_d)
+
+        u_expected = np.zeros((nsamples, nnodes, 3))
+        u_expected[:, 1] = force[:, 1]
+        assert np.all(u == u_expected)
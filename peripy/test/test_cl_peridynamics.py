@@ -65,9 +65,6 @@ class TestBondForce:
             [1, -1, -1, -1],
             [0, -1, -1, -1]
             ], dtype=np.intc)
-        force_bc_scale = 1.0
-        force_bc_types = np.zeros((nnodes, 3), dtype=np.float64)
-        force_bc_values = np.zeros((nnodes, 3), dtype=np.float64)
 
         force_expected = np.zeros((nnodes, 3), dtype=np.float64)
         force_actual = np.empty_like(force_expected)
@@ -92,12 +89,6 @@ class TestBondForce:
         vols_d = cl.Buffer(
             context, mf.READ_ONLY | mf.COPY_HOST_PTR,
             hostbuf=volume)
-        force_bc_types_d = cl.Buffer(
-           context, mf.READ_ONLY | mf.COPY_HOST_PTR,
-           hostbuf=force_bc_types)
-        force_bc_values_d = cl.Buffer(
-            context, mf.READ_ONLY | mf.COPY_HOST_PTR,
-            hostbuf=force_bc_values)
         # Write only
         force_d = cl.Buffer(context, mf.WRITE_ONLY, force_expected.nbytes)
         # Placeholder buffers
@@ -117,16 +108,27 @@ class TestBondForce:
         body_force_d = cl.Buffer(context, mf.READ_ONLY | mf.COPY_HOST_PTR,
                                  hostbuf=body_force)
 
+        family = np.sum(nlist != -1, axis=1).astype(np.intc)
+        family_d = cl.Buffer(context, mf.READ_ONLY | mf.COPY_HOST_PTR,
+                             hostbuf=family)
+        n_neigh_d = cl.Buffer(context, mf.WRITE_ONLY, family.nbytes)
+        damage_d = cl.Buffer(context, mf.WRITE_ONLY, volume.nbytes)
+
+        bond_events_d = cl.Buffer(
+            context, mf.READ_WRITE, np.dtype(np.float64).itemsize * 4)
+        nbond_events_d = cl.Buffer(
+            context, mf.READ_WRITE, np.dtype(np.uintc).itemsize)
+
         # Call kernel
         bond_force = program.bond_force1
         bond_force(
             queue, (nnodes * max_neigh,),
             (max_neigh,), u_d, force_d, body_force_d, r0_d, vols_d, nlist_d,
-            force_bc_types_d, force_bc_values_d, stiffness_corrections_d,
-            bond_types_d, regimes_d, plus_cs_d, local_mem_x,
-            local_mem_y, local_mem_z, np.float64(bond_stiffness),
-            np.float64(critical_stretch), np.float64(force_bc_scale),
-            np.intc(nregimes))
+            family_d, n_neigh_d, damage_d, stiffness_corrections_d,
+            bond_types_d, regimes_d, plus_cs_d, local_mem_x, local_mem_y,
+            local_mem_z, np.float64(bond_stiffness),
+            np.float64(critical_stretch), np.intc(nregimes), bond_events_d,
+            nbond_events_d, np.intc(0), np.intc(1))
 
         cl.enqueue_copy(queue, force_actual, force_d)
 
@@ -153,9 +155,6 @@ class TestBondForce:
             [0, 2, -1, -1],
             [1, -1, -1, -1]
             ], dtype=np.intc)
-        force_bc_scale = 1.0
-        force_bc_types = np.zeros((nnodes, 3), dtype=np.float64)
-        force_bc_values = np.zeros((nnodes, 3), dtype=np.float64)
         body_force = np.zeros((nnodes, 3), dtype=np.float64)
 
         # Displace particles
@@ -193,12 +192,6 @@ class TestBondForce:
         vols_d = cl.Buffer(
             context, mf.READ_ONLY | mf.COPY_HOST_PTR,
             hostbuf=volume)
-        force_bc_types_d = cl.Buffer(
-           context, mf.READ_ONLY | mf.COPY_HOST_PTR,
-           hostbuf=force_bc_types)
-        force_bc_values_d = cl.Buffer(
-            context, mf.READ_ONLY | mf.COPY_HOST_PTR,
-            hostbuf=force_bc_values)
         # Write only
         force_d = cl.Buffer(context, mf.WRITE_ONLY, force_expected.nbytes)
         # Placeholder buffers
@@ -218,16 +211,27 @@ class TestBondForce:
         body_force_d = cl.Buffer(context, mf.READ_ONLY | mf.COPY_HOST_PTR,
                                  hostbuf=body_force)
 
+        family = np.sum(nlist != -1, axis=1).astype(np.intc)
+        family_d = cl.Buffer(context, mf.READ_ONLY | mf.COPY_HOST_PTR,
+                             hostbuf=family)
+        n_neigh_d = cl.Buffer(context, mf.WRITE_ONLY, family.nbytes)
+        damage_d = cl.Buffer(context, mf.WRITE_ONLY, volume.nbytes)
+
+        bond_events_d = cl.Buffer(
+            context, mf.READ_WRITE, np.dtype(np.float64).itemsize * 4)
+        nbond_events_d = cl.Buffer(
+            context, mf.READ_WRITE, np.dtype(np.uintc).itemsize)
+
         # Call kernel
         bond_force = program.bond_force1
         bond_force(
             queue, (nnodes * max_neigh,),
             (max_neigh,), u_d, force_d, body_force_d, r0_d, vols_d, nlist_d,
-            force_bc_types_d, force_bc_values_d, stiffness_corrections_d,
-            bond_types_d, regimes_d, plus_cs_d, local_mem_x,
-            local_mem_y, local_mem_z, np.float64(bond_stiffness),
-            np.float64(critical_stretch), np.float64(force_bc_scale),
-            np.intc(nregimes))
+            family_d, n_neigh_d, damage_d, stiffness_corrections_d,
+            bond_types_d, regimes_d, plus_cs_d, local_mem_x, local_mem_y,
+            local_mem_z, np.float64(bond_stiffness),
+            np.float64(critical_stretch), np.intc(nregimes), bond_events_d,
+            nbond_events_d, np.intc(0), np.intc(1))
 
         cl.enqueue_copy(queue, force_actual, force_d)
 
@@ -259,9 +263,6 @@ class TestBondForce:
             ], dtype=np.intc)
         n_neigh = np.array([3, 2, 1, 1, 1], dtype=np.intc)
         family = np.array([3, 2, 1, 1, 1], dtype=np.intc)
-        force_bc_scale = 1.0
-        force_bc_types = np.zeros((nnodes, 3), dtype=np.float64)
-        force_bc_values = np.zeros((nnodes, 3), dtype=np.float64)
         body_force = np.zeros((nnodes, 3), dtype=np.float64)
 
         nlist_expected = np.array([
@@ -300,8 +301,6 @@ class TestBondForce:
             np.dtype(np.float64).itemsize * max_neigh)
         local_mem_z = cl.LocalMemory(
             np.dtype(np.float64).itemsize * max_neigh)
-        local_mem = cl.LocalMemory(
-            np.dtype(np.float64).itemsize * max_neigh)
         # Read only
         u_d = cl.Buffer(context, mf.READ_ONLY | mf.COPY_HOST_PTR,
                         hostbuf=u)
@@ -314,12 +313,6 @@ class TestBondForce:
         family_d = cl.Buffer(
             context, mf.READ_ONLY | mf.COPY_HOST_PTR,
             hostbuf=family)
-        force_bc_types_d = cl.Buffer(
-           context, mf.READ_ONLY | mf.COPY_HOST_PTR,
-           hostbuf=force_bc_types)
-        force_bc_values_d = cl.Buffer(
-            context, mf.READ_ONLY | mf.COPY_HOST_PTR,
-            hostbuf=force_bc_values)
         # Write only
         force_d = cl.Buffer(context, mf.WRITE_ONLY, force.nbytes)
         damage_d = cl.Buffer(context, mf.WRITE_ONLY, damage.nbytes)
@@ -340,26 +333,30 @@ class TestBondForce:
         body_force_d = cl.Buffer(context, mf.READ_ONLY | mf.COPY_HOST_PTR,
                                  hostbuf=body_force)
 
+        max_bond_events = 8
+        bond_events = np.empty((max_bond_events, 4), dtype=np.float64)
+        nbond_events = np.zeros(1, dtype=np.uintc)
+        bond_events_d = cl.Buffer(context, mf.READ_WRITE, bond_events.nbytes)
+        nbond_events_d = cl.Buffer(
+            context, mf.READ_WRITE | mf.COPY_HOST_PTR, hostbuf=nbond_events)
+
         # Call kernel
         bond_force = program.bond_force1
-        damage_kernel = program.damage
         bond_force(
             queue, (nnodes * max_neigh,),
             (max_neigh,), u_d, force_d, body_force_d, r0_d, vols_d, nlist_d,
-            force_bc_types_d, force_bc_values_d, stiffness_corrections_d,
-            bond_types_d, regimes_d, plus_cs_d, local_mem_x,
-            local_mem_y, local_mem_z, np.float64(bond_stiffness),
-            np.float64(critical_stretch), np.float64(force_bc_scale),
-            np.intc(nregimes))
-        damage_kernel(
-            queue, (nnodes * max_neigh,),
-            (max_neigh,), nlist_d, family_d, n_neigh_d, damage_d,
-            local_mem)
+            family_d, n_neigh_d, damage_d, stiffness_corrections_d,
+            bond_types_d, regimes_d, plus_cs_d, local_mem_x, local_mem_y,
+            local_mem_z, np.float64(bond_stiffness),
+            np.float64(critical_stretch), np.intc(nregimes), bond_events_d,
+            nbond_events_d, np.intc(max_bond_events), np.intc(3))
 
         cl.enqueue_copy(queue, force, force_d)
         cl.enqueue_copy(queue, nlist, nlist_d)
         cl.enqueue_copy(queue, n_neigh, n_neigh_d)
         cl.enqueue_copy(queue, damage, damage_d)
+        cl.enqueue_copy(queue, bond_events, bond_events_d)
+        cl.enqueue_copy(queue, nbond_events, nbond_events_d)
 
         nlist_expected = np.array([
             [-1, 2, -1, -1],
@@ -374,6 +371,13 @@ class TestBondForce:
         assert np.all(nlist == nlist_expected)
         assert np.all(n_neigh == n_neigh_expected)
         assert np.allclose(damage, damage_expected)
+        # Each broken bond is logged by both of its nodes
+        assert nbond_events[0] == 4
+        events = bond_events[:4]
+        events = events[np.lexsort(events[:, 1::-1].T)]
+        assert np.all(events[:, :2] == [[0, 1], [0, 4], [1, 0], [4, 0]])
+        assert np.all(events[:, 2] == 3)
+        assert np.all(events[:, 3] >= critical_stretch)
 
 
 class TestBondForce2:
@@ -400,9 +404,6 @@ class TestBondForce2:
             [0, 2, -1, -1],
             [1, -1, -1, -1]
             ], dtype=np.intc)
-        force_bc_scale = 1.0
-        force_bc_types = np.zeros((nnodes, 3), dtype=np.float64)
-        force_bc_values = np.zeros((nnodes, 3), dtype=np.float64)
         stiffness_corrections = np.ones((nnodes, max_neigh), dtype=np.float64)
         body_force = np.zeros((nnodes, 3), dtype=np.float64)
 
@@ -441,12 +442,6 @@ class TestBondForce2:
         vols_d = cl.Buffer(
             context, mf.READ_ONLY | mf.COPY_HOST_PTR,
             hostbuf=volume)
-        force_bc_types_d = cl.Buffer(
-           context, mf.READ_ONLY | mf.COPY_HOST_PTR,
-           hostbuf=force_bc_types)
-        force_bc_values_d = cl.Buffer(
-            context, mf.READ_ONLY | mf.COPY_HOST_PTR,
-            hostbuf=force_bc_values)
         stiffness_corrections_d = cl.Buffer(
             context, mf.READ_ONLY | mf.COPY_HOST_PTR,
             hostbuf=stiffness_corrections)
@@ -465,16 +460,27 @@ class TestBondForce2:
         body_force_d = cl.Buffer(context, mf.READ_ONLY | mf.COPY_HOST_PTR,
                                  hostbuf=body_force)
 
+        family = np.sum(nlist != -1, axis=1).astype(np.intc)
+        family_d = cl.Buffer(context, mf.READ_ONLY | mf.COPY_HOST_PTR,
+                             hostbuf=family)
+        n_neigh_d = cl.Buffer(context, mf.WRITE_ONLY, family.nbytes)
+        damage_d = cl.Buffer(context, mf.WRITE_ONLY, volume.nbytes)
+
+        bond_events_d = cl.Buffer(
+            context, mf.READ_WRITE, np.dtype(np.float64).itemsize * 4)
+        nbond_events_d = cl.Buffer(
+            context, mf.READ_WRITE, np.dtype(np.uintc).itemsize)
+
         # Call kernel
         bond_force = program.bond_force2
         bond_force(
             queue, (nnodes * max_neigh,),
             (max_neigh,), u_d, force_d, body_force_d, r0_d, vols_d, nlist_d,
-            force_bc_types_d, force_bc_values_d, stiffness_corrections_d,
-            bond_types_d, regimes_d, plus_cs_d, local_mem_x,
-            local_mem_y, local_mem_z, np.float64(bond_stiffness),
-            np.float64(critical_stretch), np.float64(force_bc_scale),
-            np.intc(nregimes))
+            family_d, n_neigh_d, damage_d, stiffness_corrections_d,
+            bond_types_d, regimes_d, plus_cs_d, local_mem_x, local_mem_y,
+            local_mem_z, np.float64(bond_stiffness),
+            np.float64(critical_stretch), np.intc(nregimes), bond_events_d,
+            nbond_events_d, np.intc(0), np.intc(1))
 
         cl.enqueue_copy(queue, force_actual, force_d)
 
@@ -501,9 +507,6 @@ class TestBondForce2:
             [0, 2, -1, -1],
             [1, -1, -1, -1]
             ], dtype=np.intc)
-        force_bc_scale = 1.0
-        force_bc_types = np.zeros((nnodes, 3), dtype=np.float64)
-        force_bc_values = np.zeros((nnodes, 3), dtype=np.float64)
         body_force = np.zeros((nnodes, 3), dtype=np.float64)
         stiffness_corrections = np.array(
             [[4.0, 1.0, 1.0, 1.0],
@@ -545,12 +548,6 @@ class TestBondForce2:
         vols_d = cl.Buffer(
             context, mf.READ_ONLY | mf.COPY_HOST_PTR,
             hostbuf=volume)
-        force_bc_types_d = cl.Buffer(
-           context, mf.READ_ONLY | mf.COPY_HOST_PTR,
-           hostbuf=force_bc_types)
-        force_bc_values_d = cl.Buffer(
-            context, mf.READ_ONLY | mf.COPY_HOST_PTR,
-            hostbuf=force_bc_values)
         stiffness_corrections_d = cl.Buffer(
             context, mf.READ_ONLY | mf.COPY_HOST_PTR,
             hostbuf=stiffness_corrections)
@@ -569,17 +566,93 @@ class TestBondForce2:
         body_force_d = cl.Buffer(context, mf.READ_ONLY | mf.COPY_HOST_PTR,
                                  hostbuf=body_force)
 
+        family = np.sum(nlist != -1, axis=1).astype(np.intc)
+        family_d = cl.Buffer(context, mf.READ_ONLY | mf.COPY_HOST_PTR,
+                             hostbuf=family)
+        n_neigh_d = cl.Buffer(context, mf.WRITE_ONLY, family.nbytes)
+        damage_d = cl.Buffer(context, mf.WRITE_ONLY, volume.nbytes)
+
+        bond_events_d = cl.Buffer(
+            context, mf.READ_WRITE, np.dtype(np.float64).itemsize * 4)
+        nbond_events_d = cl.Buffer(
+            context, mf.READ_WRITE, np.dtype(np.uintc).itemsize)
+
         # Call kernel
         bond_force = program.bond_force2
         bond_force(
             queue, (nnodes * max_neigh,),
             (max_neigh,), u_d, force_d, body_force_d, r0_d, vols_d, nlist_d,
-            force_bc_types_d, force_bc_values_d, stiffness_corrections_d,
-            bond_types_d, regimes_d, plus_cs_d, local_mem_x,
-            local_mem_y, local_mem_z, np.float64(bond_stiffness),
-            np.float64(critical_stretch), np.float64(force_bc_scale),
-            np.intc(nregimes))
+            family_d, n_neigh_d, damage_d, stiffness_corrections_d,
+            bond_types_d, regimes_d, plus_cs_d, local_mem_x, local_mem_y,
+            local_mem_z, np.float64(bond_stiffness),
+            np.float64(critical_stretch), np.intc(nregimes), bond_events_d,
+            nbond_events_d, np.intc(0), np.intc(1))
 
         cl.enqueue_copy(queue, force_actual, force_d)
 
         assert np.allclose(force_actual, force_expected)
+
+
+class TestBoundaryConditions:
+    """Test the kernels which apply the boundary conditions."""
+
+    @context_available
+    def test_displacement_boundary_conditions(self, context, queue, program):
+        """Test the displacements of the constrained degrees of freedom."""
+        nsamples = 2
+        nnodes = 2
+        u = np.ones((nsamples, nnodes, 3), dtype=np.float64)
+        bc_dofs = np.array([0, 4], dtype=np.intc)
+        bc_values = np.array([1.0, -2.0], dtype=np.float64)
+        bc_scale = 0.5
+
+        u_d = cl.Buffer(context, mf.READ_WRITE | mf.COPY_HOST_PTR,
+                        hostbuf=u)
+        bc_dofs_d = cl.Buffer(context, mf.READ_ONLY | mf.COPY_HOST_PTR,
+                              hostbuf=bc_dofs)
+        bc_values_d = cl.Buffer(context, mf.READ_ONLY | mf.COPY_HOST_PTR,
+                                hostbuf=bc_values)
+
+        # Call kernel
+        apply_displacement_boundary_conditions = (
+            program.apply_displacement_boundary_conditions)
+        apply_displacement_boundary_conditions(
+            queue, (len(bc_dofs), nsamples), None, u_d, bc_dofs_d,
+            bc_values_d, np.float64(bc_scale), np.intc(3 * nnodes))
+        cl.enqueue_copy(queue, u, u_d)
+
+        u_expected = np.ones((nsamples, nnodes, 3), dtype=np.float64)
+        u_expected[:, 0, 0] = 0.5
+        u_expected[:, 1, 1] = -1.0
+        assert np.all(u == u_expected)
+
+    @context_available
+    def test_force_boundary_conditions(self, context, queue, program):
+        """Test the forces of the loaded degrees of freedom."""
+        nsamples = 2
+        nnodes = 2
+        force = np.ones((nsamples, nnodes, 3), dtype=np.float64)
+        force_bc_dofs = np.array([2, 3], dtype=np.intc)
+        force_bc_values = np.array([1.0, -2.0], dtype=np.float64)
+        force_bc_scale = 2.0
+
+        force_d = cl.Buffer(context, mf.READ_WRITE | mf.COPY_HOST_PTR,
+                            hostbuf=force)
+        force_bc_dofs_d = cl.Buffer(
+            context, mf.READ_ONLY | mf.COPY_HOST_PTR, hostbuf=force_bc_dofs)
+        force_bc_values_d = cl.Buffer(
+            context, mf.READ_ONLY | mf.COPY_HOST_PTR, hostbuf=force_bc_values)
+
+        # Call kernel
+        apply_force_boundary_conditions = (
+            program.apply_force_boundary_conditions)
+        apply_force_boundary_conditions(
+            queue, (len(force_bc_dofs), nsamples), None, force_d,
+            force_bc_dofs_d, force_bc_values_d, np.float64(force_bc_scale),
+            np.intc(3 * nnodes))
+        cl.enqueue_copy(queue, force, force_d)
+
+        force_expected = np.ones((nsamples, nnodes, 3), dtype=np.float64)
+        force_expected[:, 0, 2] = 3.0
+        force_expected[:, 1, 0] = -3.0
+        assert np.all(force == force_expected)
@@ -1,6 +1,7 @@
 """Tests for the cl/utilities module."""
-from ..cl import get_context
-from ..cl.utilities import DOUBLE_FP_SUPPORT, output_device_info
+from ..cl import get_context, get_contexts
+from ..cl.utilities import (DOUBLE_FP_SUPPORT, output_device_info,
+                            subgroup_support)
 import pyopencl as cl
 
 
@@ -16,3 +17,26 @@ def test_get_context():
         assert (output_device_info(devices[0]) == 1)
     else:
         assert context is None
+
+
+def test_subgroup_support():
+    """Test the subgroup_support function."""
+    context = get_context()
+
+    if type(context) is cl._cl.Context:
+        device = context.devices[0]
+        support = subgroup_support(device)
+        assert support in (True, False)
+        if "cl_khr_subgroups" in device.extensions.split():
+            assert support
+
+
+def test_get_contexts():
+    """Test the get_contexts function."""
+    contexts = get_contexts()
+
+    for context in contexts:
+        assert len(context.devices) == 1
+        assert (context.devices[0].get_info(cl.device_info.DOUBLE_FP_CONFIG)
+                & DOUBLE_FP_SUPPORT)
+    assert len(get_contexts(len(contexts))) == len(contexts)
@@ -31,6 +31,16 @@ def program(context):
     return cl.Program(context, kernel_source).build()
 
 
+@context_available
+@pytest.fixture(scope="module")
+def peridynamics_program(context):
+    """Create a program object for the boundary condition kernels."""
+    kernel_source = open(
+            pathlib.Path(__file__).parent.absolute() /
+            "../cl/peridynamics.cl").read()
+    return cl.Program(context, kernel_source).build()
+
+
 class TestUpdateDisplacement:
     """Test the displacement update."""
 
@@ -40,23 +50,14 @@ class TestUpdateDisplacement:
         u = np.zeros(3)
         ud = np.zeros(3)
         udd = np.zeros(3)
-        densities = np.ones(3)
+        inverse_densities = np.ones(1, dtype=np.float64)
         nnodes = 1
         force = np.array([1.0, 2.0, 3.0], dtype=np.float64)
-        bc_types = np.array([0, 0, 0], dtype=np.intc)
-        bc_values = np.array([0, 0, 0], dtype=np.float64)
-        displacement_bc_scale = 0
         dt = 1.0
         damping = 1.0
 
         # Set buffers
         # Read only
-        bc_types_d = cl.Buffer(
-            context, mf.READ_ONLY | mf.COPY_HOST_PTR,
-            hostbuf=bc_types)
-        bc_values_d = cl.Buffer(
-            context, mf.READ_ONLY | mf.COPY_HOST_PTR,
-            hostbuf=bc_values)
         force_d = cl.Buffer(
             context, mf.READ_ONLY | mf.COPY_HOST_PTR,
             hostbuf=force)
@@ -70,18 +71,17 @@ class TestUpdateDisplacement:
         udd_d = cl.Buffer(
             context, mf.READ_WRITE | mf.COPY_HOST_PTR,
             hostbuf=udd)
-        densities_d = cl.Buffer(
+        inverse_densities_d = cl.Buffer(
             context, mf.READ_WRITE | mf.COPY_HOST_PTR,
-            hostbuf=densities)
+            hostbuf=inverse_densities)
 
         # Build kernels
         update_displacement_kernel = program.update_displacement
 
         update_displacement_kernel(
             queue, (3 * nnodes,), None,
-            force_d, u_d, ud_d, udd_d, bc_types_d, bc_values_d, densities_d,
-            np.float64(displacement_bc_scale), np.float64(damping),
-            np.float64(dt)
+            force_d, u_d, ud_d, udd_d, inverse_densities_d,
+            np.float64(damping), np.float64(dt)
             )
         cl.enqueue_copy(queue, u, u_d)
         cl.enqueue_copy(queue, ud, ud_d)
@@ -97,23 +97,14 @@ class TestUpdateDisplacement:
         u = np.zeros(3)
         ud = np.zeros(3)
         udd = np.ones(3)
-        densities = np.ones(3)
+        inverse_densities = np.ones(1, dtype=np.float64)
         nnodes = 1
         force = np.array([1.0, 2.0, 3.0], dtype=np.float64)
-        bc_types = np.array([0, 0, 0], dtype=np.intc)
-        bc_values = np.array([0, 0, 0], dtype=np.float64)
-        displacement_bc_scale = 0
         dt = 2.0
         damping = 0.0
 
         # Set buffers
         # Read only
-        bc_types_d = cl.Buffer(
-            context, mf.READ_ONLY | mf.COPY_HOST_PTR,
-            hostbuf=bc_types)
-        bc_values_d = cl.Buffer(
-            context, mf.READ_ONLY | mf.COPY_HOST_PTR,
-            hostbuf=bc_values)
         force_d = cl.Buffer(
             context, mf.READ_ONLY | mf.COPY_HOST_PTR,
             hostbuf=force)
@@ -127,18 +118,17 @@ class TestUpdateDisplacement:
         udd_d = cl.Buffer(
             context, mf.READ_WRITE | mf.COPY_HOST_PTR,
             hostbuf=udd)
-        densities_d = cl.Buffer(
+        inverse_densities_d = cl.Buffer(
             context, mf.READ_WRITE | mf.COPY_HOST_PTR,
-            hostbuf=densities)
+            hostbuf=inverse_densities)
 
         # Build kernels
         update_displacement_kernel = program.update_displacement
 
         update_displacement_kernel(
             queue, (3 * nnodes,), None,
-            force_d, u_d, ud_d, udd_d, bc_types_d, bc_values_d, densities_d,
-            np.float64(displacement_bc_scale), np.float64(damping),
-            np.float64(dt)
+            force_d, u_d, ud_d, udd_d, inverse_densities_d,
+            np.float64(damping), np.float64(dt)
             )
         cl.enqueue_copy(queue, u, u_d)
         cl.enqueue_copy(queue, ud, ud_d)
@@ -152,25 +142,26 @@ class TestUpdateDisplacement:
         assert np.all(udd == udd_expected)
 
     @context_available
-    def test_update_displacement3(self, context, queue, program):
+    def test_update_displacement3(
+            self, context, queue, program, peridynamics_program):
         """Test displacement update with displacement boundary conditions."""
         u = np.zeros(3, dtype=np.float64)
         ud = np.array([1.0, 1.0, 1.0], dtype=np.float64)
         udd = np.zeros(3)
-        densities = np.array([1.0, 1.0, 1.0], dtype=np.float64)
+        inverse_densities = np.ones(1, dtype=np.float64)
         nnodes = 1
         force = np.array([1.0, 2.0, 3.0], dtype=np.float64)
-        bc_types = np.array([1, 1, 0], dtype=np.intc)
-        bc_values = np.array([0.0, 0.0, 0.0], dtype=np.float64)
+        bc_dofs = np.array([0, 1], dtype=np.intc)
+        bc_values = np.array([0.0, 0.0], dtype=np.float64)
         displacement_bc_scale = 1.0
         dt = 2.0
         damping = 2.0
 
         # Set buffers
         # Read only
-        bc_types_d = cl.Buffer(
+        bc_dofs_d = cl.Buffer(
             context, mf.READ_ONLY | mf.COPY_HOST_PTR,
-            hostbuf=bc_types)
+            hostbuf=bc_dofs)
         bc_values_d = cl.Buffer(
             context, mf.READ_ONLY | mf.COPY_HOST_PTR,
             hostbuf=bc_values)
@@ -187,19 +178,23 @@ class TestUpdateDisplacement:
         udd_d = cl.Buffer(
             context, mf.READ_WRITE | mf.COPY_HOST_PTR,
             hostbuf=udd)
-        densities_d = cl.Buffer(
+        inverse_densities_d = cl.Buffer(
             context, mf.READ_WRITE | mf.COPY_HOST_PTR,
-            hostbuf=densities)
+            hostbuf=inverse_densities)
 
         # Build kernels
         update_displacement_kernel = program.update_displacement
 
         update_displacement_kernel(
             queue, (3 * nnodes,), None,
-            force_d, u_d, ud_d, udd_d, bc_types_d, bc_values_d, densities_d,
-            np.float64(displacement_bc_scale), np.float64(damping),
-            np.float64(dt)
+            force_d, u_d, ud_d, udd_d, inverse_densities_d,
+            np.float64(damping), np.float64(dt)
             )
+        apply_displacement_boundary_conditions = (
+            peridynamics_program.apply_displacement_boundary_conditions)
+        apply_displacement_boundary_conditions(
+            queue, (len(bc_dofs), 1), None, u_d, bc_dofs_d, bc_values_d,
+            np.float64(displacement_bc_scale), np.intc(3 * nnodes))
         cl.enqueue_copy(queue, u, u_d)
         cl.enqueue_copy(queue, ud, ud_d)
         cl.enqueue_copy(queue, udd, udd_d)
@@ -212,25 +207,26 @@ class TestUpdateDisplacement:
         assert np.all(u == u_expected)
 
     @context_available
-    def test_update_displacement4(self, context, queue, program):
+    def test_update_displacement4(
+            self, context, queue, program, peridynamics_program):
         """Test displacement update with displacement B.C. scale."""
         u = np.zeros(3)
         ud = np.zeros(3)
         udd = np.zeros(3)
-        densties = np.ones(3)
+        inverse_densities = np.ones(1, dtype=np.float64)
         nnodes = 1
         force = np.array([1.0, 2.0, 3.0], dtype=np.float64)
-        bc_types = np.array([1, 1, 0], dtype=np.intc)
-        bc_values = np.array([2.0, 2.0, 0.0], dtype=np.float64)
+        bc_dofs = np.array([0, 1], dtype=np.intc)
+        bc_values = np.array([2.0, 2.0], dtype=np.float64)
         displacement_bc_scale = 0.5
         dt = 2.0
         damping = 1.0
 
         # Set buffers
         # Read only
-        bc_types_d = cl.Buffer(
+        bc_dofs_d = cl.Buffer(
             context, mf.READ_ONLY | mf.COPY_HOST_PTR,
-            hostbuf=bc_types)
+            hostbuf=bc_dofs)
         bc_values_d = cl.Buffer(
             context, mf.READ_ONLY | mf.COPY_HOST_PTR,
             hostbuf=bc_values)
@@ -247,19 +243,23 @@ class TestUpdateDisplacement:
         udd_d = cl.Buffer(
             context, mf.READ_WRITE | mf.COPY_HOST_PTR,
             hostbuf=udd)
-        densities_d = cl.Buffer(
+        inverse_densities_d = cl.Buffer(
             context, mf.READ_WRITE | mf.COPY_HOST_PTR,
-            hostbuf=densties)
+            hostbuf=inverse_densities)
 
         # Build kernels
         update_displacement_kernel = program.update_displacement
 
         update_displacement_kernel(
             queue, (3 * nnodes,), None,
-            force_d, u_d, ud_d, udd_d, bc_types_d, bc_values_d, densities_d,
-            np.float64(displacement_bc_scale), np.float64(damping),
-            np.float64(dt)
+            force_d, u_d, ud_d, udd_d, inverse_densities_d,
+            np.float64(damping), np.float64(dt)
             )
+        apply_displacement_boundary_conditions = (
+            peridynamics_program.apply_displacement_boundary_conditions)
+        apply_displacement_boundary_conditions(
+            queue, (len(bc_dofs), 1), None, u_d, bc_dofs_d, bc_values_d,
+            np.float64(displacement_bc_scale), np.intc(3 * nnodes))
         cl.enqueue_copy(queue, u, u_d)
         cl.enqueue_copy(queue, ud, ud_d)
         cl.enqueue_copy(queue, udd, udd_d)
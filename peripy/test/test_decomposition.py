@@ -0,0 +1,190 @@
+"""Tests for the decomposition module."""
+from .conftest import context_available, is_crack
+from ..cl import get_context
+from ..decomposition import (DecomposedCL, Partition,
+                             recursive_coordinate_bisection)
+from ..integrators import (AdaptiveDynamicRelaxationCL, Euler, EulerCL,
+                           EulerCromerCL)
+from ..model import Model
+import numpy as np
+import pytest
+
+
+def is_density(x):
+    """Return the density of the nodal volume."""
+    return 1.0
+
+
+class TestRecursiveCoordinateBisection:
+    """Tests for the recursive_coordinate_bisection function."""
+
+    @pytest.mark.parametrize("nparts", [1, 2, 3, 4, 7])
+    def test_balance(self, nparts):
+        """Ensure the partitions have equal numbers of nodes."""
+        coords = np.random.default_rng(0).uniform(size=(100, 3))
+        parts = recursive_coordinate_bisection(coords, nparts)
+        counts = np.bincount(parts, minlength=nparts)
+        assert len(counts) == nparts
+        assert np.max(counts) - np.min(counts) <= 1
+
+    def test_axis(self):
+        """Ensure the nodes are split along the axis of largest extent."""
+        coords = np.zeros((8, 3))
+        coords[:, 1] = np.arange(8)[::-1]
+        parts = recursive_coordinate_bisection(coords, 2)
+        assert np.all(parts == [1, 1, 1, 1, 0, 0, 0, 0])
+
+    @pytest.mark.parametrize("nparts", [0, 1.5, 9])
+    def test_nparts(self, nparts):
+        """Test exception when nparts is not a valid number of partitions."""
+        with pytest.raises(ValueError) as exception:
+            recursive_coordinate_bisection(np.zeros((8, 3)), nparts)
+        assert "nparts must be a positive integer" in str(exception.value)
+
+
+class TestPartition:
+    """Tests for the Partition class."""
+
+    @pytest.fixture
+    def partition(self):
+        """Create the middle partition of a chain of six nodes."""
+        parts = np.array([0, 0, 1, 1, 2, 2])
+        nlist = np.array([[1, -1], [0, 2], [1, 3], [2, 4], [3, 5], [4, -1]])
+        return Partition(parts, nlist, 1), nlist
+
+    def test_nodes(self, partition):
+        """Ensure the boundary, interior and ghost nodes are in order."""
+        partition, nlist = partition
+        assert np.all(partition.nodes == [2, 3, 1, 4])
+        assert partition.nowned == 2
+        assert partition.nboundary == 2
+        assert np.all(partition.local == [-1, 2, 0, 1, 3, -1])
+
+    def test_neighbours(self, partition):
+        """Ensure the neighbour list is numbered locally."""
+        partition, nlist = partition
+        assert np.all(partition.neighbours(nlist) == [
+            [2, 1], [0, 3], [-1, -1], [-1, -1]])
+
+    def test_rows(self, partition):
+        """Ensure the rows of the ghost nodes are zeroed for the owner."""
+        partition, nlist = partition
+        array = np.arange(6) + 1
+        assert np.all(partition.rows(array) == [3, 4, 2, 5])
+        assert np.all(partition.rows(array, True) == [3, 4, 0, 0])
+
+
+class TestDecomposedCL:
+    """Tests for the DecomposedCL class."""
+
+    def model(self, data_path, integrator, simple_displacement_boundary,
+              **kwargs):
+        """Create the example model with an integrator."""
+        return Model(
+            data_path / "example_mesh.vtk", integrator=integrator,
+            horizon=0.1, critical_stretch=0.005,
+            bond_stiffness=18.0 * 0.05 / (np.pi * 0.1**4),
+            initial_crack=is_crack,
+            is_displacement_boundary=simple_displacement_boundary, **kwargs)
+
+    @context_available
+    @pytest.mark.parametrize("kwargs", [
+        {}, {"compaction": 10}, {"nodes_per_group": 1}])
+    def test_simulate(self, data_path, simple_displacement_boundary, kwargs):
+        """Ensure the partitions integrate the model as one device does."""
+        steps = 30
+        magnitudes = 1e-4 * np.arange(1, steps + 1)
+        expected = self.model(
+            data_path, EulerCL(dt=1e-3),
+            simple_displacement_boundary).simulate(
+                steps, displacement_bc_magnitudes=magnitudes)
+        integrator = DecomposedCL(
+            EulerCL, 1e-3, contexts=[get_context()] * 3, **kwargs)
+        model = self.model(data_path, integrator, simple_displacement_boundary)
+        assert all(partition.nboundary
+                   for partition in integrator.partitions)
+        (u, damage, (nlist, n_neigh), force, ud, data) = model.simulate(
+            steps, displacement_bc_magnitudes=magnitudes)
+        assert np.sum(damage) > 0
+        assert np.allclose(u, expected[0])
+        assert np.allclose(damage, expected[1])
+        assert np.all(nlist == expected[2][0])
+        assert np.all(n_neigh == expected[2][1])
+        assert np.allclose(force, expected[3])
+
+    @context_available
+    def test_split(self, data_path, simple_displacement_boundary):
+        """Ensure the velocities are integrated in split time-steps."""
+        steps = 30
+        magnitudes = 1e-4 * np.arange(1, steps + 1)
+        expected = self.model(
+            data_path, EulerCromerCL(10.0, 1e-3),
+            simple_displacement_boundary, is_density=is_density).simulate(
+                steps, displacement_bc_magnitudes=magnitudes)
+        integrator = DecomposedCL(
+            EulerCromerCL, 10.0, 1e-3, contexts=[get_context()] * 3)
+        model = self.model(data_path, integrator, simple_displacement_boundary,
+                           is_density=is_density)
+        assert all(integrator._split(part) is not None for part in range(3))
+        u, *_, ud, _ = model.simulate(
+            steps, displacement_bc_magnitudes=magnitudes)
+        assert np.allclose(u, expected[0])
+        assert np.allclose(ud, expected[4])
+
+    @context_available
+    def test_not_split(self, data_path, simple_displacement_boundary):
+        """Ensure the time-steps of some integrators are not split."""
+        integrator = DecomposedCL(
+            AdaptiveDynamicRelaxationCL, contexts=[get_context()] * 2)
+        model = self.model(data_path, integrator, simple_displacement_boundary)
+        assert integrator._split(0) is None
+        u, *_ = model.simulate(
+            10, displacement_bc_magnitudes=1e-4 * np.arange(1, 11))
+        assert np.all(np.isfinite(u))
+
+    @context_available
+    def test_residual(self, data_path, simple_displacement_boundary):
+        """Ensure the residual is reduced over the owned nodes."""
+        steps = 10
+        magnitudes = 1e-4 * np.arange(1, steps + 1)
+        integrator = EulerCL(dt=1e-3)
+        self.model(data_path, integrator, simple_displacement_boundary
+                   ).simulate(steps, displacement_bc_magnitudes=magnitudes)
+        expected = integrator.residual()
+        integrator = DecomposedCL(
+            EulerCL, 1e-3, contexts=[get_context()] * 3)
+        self.model(data_path, integrator, simple_displacement_boundary
+                   ).simulate(steps, displacement_bc_magnitudes=magnitudes)
+        assert np.allclose(integrator.residual(), expected)
+
+    @context_available
+    def test_bond_events(self, data_path, simple_displacement_boundary,
+                         tmp_path):
+        """Ensure the broken bonds are numbered globally."""
+        steps = 30
+        integrator = DecomposedCL(
+            EulerCL, 1e-3, contexts=[get_context()] * 2, bond_events=10000)
+        model = self.model(data_path, integrator, simple_displacement_boundary)
+        (u, damage, (nlist, n_neigh), *_, data) = model.simulate(
+            steps, displacement_bc_magnitudes=1e-4 * np.arange(1, steps + 1),
+            write=steps, write_path=tmp_path)
+        nodes, step, stretch = data["model"]["bond_events"]
+        assert len(nodes) == np.sum(model.initial_connectivity[1] - n_neigh)
+        assert np.all(np.diff(step) >= 0)
+        # The broken bonds are not in the neighbour lists
+        assert not np.any(nlist[nodes[:, 0]] == nodes[:, [1]])
+
+    def test_integrator(self):
+        """Test exception when the integrator is not an OpenCL integrator."""
+        with pytest.raises(ValueError) as exception:
+            DecomposedCL(Euler, 1e-3)
+        assert "integrator must be an OpenCL integrator" in str(
+            exception.value)
+
+    @context_available
+    def test_ensemble(self):
+        """Test exception when an ensemble is simulated."""
+        integrator = DecomposedCL(EulerCL, 1e-3, contexts=[get_context()])
+        with pytest.raises(ValueError) as exception:
+            integrator.create_ensemble_buffers()
+        assert "ensembles are not supported" in str(exception.value)
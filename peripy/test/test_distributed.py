@@ -0,0 +1,164 @@
+"""Tests for the distributed module."""
+from .conftest import context_available, is_crack
+from ..distributed import MPI, DistributedCL
+from ..integrators import EulerCL
+from ..model import Model
+import numpy as np
+import os
+import pathlib
+import pytest
+import shutil
+import subprocess
+import sys
+
+
+mpi_available = pytest.mark.skipif(
+    MPI is None, reason="mpi4py required.")
+
+#: A script which compares a distributed simulation of the example model to
+#: a simulation on one device, on each rank
+SCRIPT = """
+import meshio
+from mpi4py import MPI
+import numpy as np
+import pathlib
+import sys
+from peripy.distributed import DistributedCL
+from peripy.integrators import EulerCL
+from peripy.model import Model
+from peripy.test.conftest import is_crack
+
+
+def is_boundary(x):
+    if x[0] < 1.5 * 0.1:
+        return [-1, 0, 0]
+    elif x[0] > 1.0 - 1.5 * 0.1:
+        return [1, 0, 0]
+    return [None, None, None]
+
+
+def is_tip(x):
+    if x[0] > 1.0 - 1.5 * 0.1:
+        return [None, 'tip', None]
+    return [None, None, None]
+
+
+def simulate(integrator, write_path):
+    model = Model(
+        pathlib.Path(sys.argv[1]), integrator=integrator, horizon=0.1,
+        critical_stretch=0.005, bond_stiffness=18.0 * 0.05 / (np.pi * 0.1**4),
+        initial_crack=is_crack, is_displacement_boundary=is_boundary,
+        is_tip=is_tip)
+    return model, model.simulate(
+        20, displacement_bc_magnitudes=1e-4 * np.arange(1, 21), write=10,
+        write_path=write_path)
+
+
+# The simulations on one device of the ranks write to their own directory
+rank = MPI.COMM_WORLD.Get_rank()
+for path in [pathlib.Path(str(rank)), pathlib.Path("distributed")]:
+    path.mkdir(exist_ok=True)
+integrator = EulerCL(dt=1e-3, bond_events=10000)
+expected_model, expected = simulate(integrator, pathlib.Path(str(rank)))
+distributed = DistributedCL(EulerCL, 1e-3, bond_events=10000)
+model, actual = simulate(distributed, path)
+
+# Each rank builds its nodes only
+nodes, owned = model.nodes, model.owned
+assert model.nnodes < expected_model.nnodes
+assert model.initial_connectivity[0].shape[0] == model.nnodes
+assert np.sum(MPI.COMM_WORLD.allgather(np.sum(owned))) == (
+    expected_model.nnodes)
+u, damage, (nlist, n_neigh), *_ = actual
+assert np.sum(expected[1]) > 0
+assert np.allclose(u[owned], expected[0][nodes[owned]])
+assert np.allclose(damage[owned], expected[1][nodes[owned]])
+assert np.all(n_neigh[owned] == expected[2][1][nodes[owned]])
+for i in np.flatnonzero(owned):
+    bonds = nodes[nlist[i][nlist[i] != -1]]
+    expected_bonds = expected[2][0][nodes[i]]
+    assert np.all(np.sort(bonds) == np.sort(
+        expected_bonds[expected_bonds != -1]))
+assert np.allclose(distributed.residual(), integrator.residual())
+
+# Every rank returns the data of the whole model
+for tip_type in ["model", "tip"]:
+    for name, values in expected[5][tip_type].items():
+        if name != "bond_events":
+            assert np.allclose(actual[5][tip_type][name], values)
+
+# Rank 0 writes the state and the broken bonds of every node
+if rank == 0:
+    mesh = meshio.read(path / "U_20.vtk")
+    assert np.allclose(mesh.points, expected_model.coords)
+    assert np.allclose(mesh.point_data["damage"], expected[1])
+    assert np.allclose(mesh.point_data["displacements"], expected[0])
+    bonds, _, _ = actual[5]["model"]["bond_events"]
+    expected_bonds, _, _ = expected[5]["model"]["bond_events"]
+    assert np.all(np.unique(bonds, axis=0) == np.unique(
+        expected_bonds, axis=0))
+"""
+
+
+class TestDistributedCL:
+    """Tests for the DistributedCL class."""
+
+    @mpi_available
+    @context_available
+    def test_simulate(self, data_path, simple_displacement_boundary):
+        """Ensure a single rank integrates the model as one device does."""
+        steps = 20
+        magnitudes = 1e-4 * np.arange(1, steps + 1)
+
+        def simulate(integrator):
+            model = Model(
+                data_path / "example_mesh.vtk", integrator=integrator,
+                horizon=0.1, critical_stretch=0.005,
+                bond_stiffness=18.0 * 0.05 / (np.pi * 0.1**4),
+                initial_crack=is_crack,
+                is_displacement_boundary=simple_displacement_boundary)
+            return model.simulate(steps, displacement_bc_magnitudes=magnitudes)
+
+        expected = simulate(EulerCL(dt=1e-3))
+        integrator = DistributedCL(EulerCL, 1e-3, comm=MPI.COMM_SELF)
+        assert integrator.root
+        actual = simulate(integrator)
+        assert np.allclose(actual[0], expected[0])
+        assert np.allclose(actual[1], expected[1])
+        assert np.all(actual[2][0] == expected[2][0])
+
+    @mpi_available
+    @context_available
+    def test_connectivity(self, data_path, cython_model):
+        """Test exception when the connectivity of the model is given."""
+        integrator = DistributedCL(EulerCL, 1e-3, comm=MPI.COMM_SELF)
+        with pytest.raises(ValueError) as exception:
+            Model(data_path / "example_mesh.vtk", integrator=integrator,
+                  horizon=0.1, critical_stretch=0.005,
+                  bond_stiffness=18.0 * 0.05 / (np.pi * 0.1**4),
+                  connectivity=cython_model.initial_connectivity)
+        assert "connectivity is not supported" in str(exception.value)
+
+    @mpi_available
+    @context_available
+    @pytest.mark.skipif(shutil.which("mpirun") is None,
+                        reason="mpirun required.")
+    def test_mpirun(self, data_path, tmp_path):
+        """Ensure four ranks integrate the model as one device does."""
+        script = tmp_path / "simulate.py"
+        script.write_text(SCRIPT)
+        env = dict(os.environ)
+        paths = [str(pathlib.Path(__file__).parents[2])]
+        if "PYTHONPATH" in env:
+            paths.append(env["PYTHONPATH"])
+        env["PYTHONPATH"] = os.pathsep.join(paths)
+        # Open MPI refuses to oversubscribe the cores, or run as root, unless
+        # it is allowed to
+        env.setdefault("OMPI_MCA_rmaps_base_oversubscribe", "1")
+        env.setdefault("OMPI_ALLOW_RUN_AS_ROOT", "1")
+        env.setdefault("OMPI_ALLOW_RUN_AS_ROOT_CONFIRM", "1")
+        result = subprocess.run(
+            ["mpirun", "-n", "4", sys.executable, str(script),
+             str(data_path / "example_mesh.vtk")],
+            cwd=tmp_path, env=env, capture_output=True, timeout=600)
+        assert result.returncode == 0, result.stderr.decode()
@@ -1,10 +1,16 @@
 """Tests for the integrators module."""
 from .conftest import context_available
 from ..integrators import (
-    Integrator, Euler, EulerCL, EulerCromerCL, VelocityVerletCL, ContextError)
+    Integrator, Euler, EulerCL, EulerCromerCL, VelocityVerletCL,
+    AdaptiveDynamicRelaxationCL, EulerCromer, VelocityVerlet, EulerShared,
+    ContextError)
 from ..model import Model, initial_crack_helper
-from ..cl import get_context
+from ..cl import get_context, subgroup_support
+from ..tuning import TuningDatabase
+import json
+from multiprocessing import shared_memory
 import pytest
+import warnings
 import numpy as np
 import pyopencl as cl
 
@@ -37,6 +43,44 @@ def is_density(x):
     return 1.0
 
 
+def is_bond_type(x, y):
+    """Return the type of a bond, which depends on whether it crosses y=0.5."""
+    return int((x[1] > 0.5) != (y[1] > 0.5))
+
+
+def simulate_composite(integrator, data_path, simple_displacement_boundary,
+                       bond_length=None):
+    """
+    Simulate a bilinear composite model with stiffness corrections.
+
+    If bond_length is not None, the bonds longer than bond_length are broken
+    before the simulation.
+    """
+    bond_stiffness = 18.0 * 0.05 / (np.pi * 0.1**4)
+    model = Model(data_path / "example_mesh.vtk", integrator=integrator,
+                  horizon=0.1,
+                  critical_stretch=[[0.002, 0.004], [0.001, 0.003]],
+                  bond_stiffness=[[bond_stiffness, bond_stiffness / 2],
+                                  [bond_stiffness, bond_stiffness / 3]],
+                  is_displacement_boundary=simple_displacement_boundary,
+                  initial_crack=is_crack, is_density=is_density,
+                  is_bond_type=is_bond_type, micromodulus_function=0)
+    connectivity = None
+    if bond_length is not None:
+        nlist, n_neigh = model.initial_connectivity
+        nodes = np.arange(model.nnodes)[:, np.newaxis]
+        bonds = model.coords[np.where(nlist == -1, nodes, nlist)] - (
+            model.coords[nodes])
+        nlist = np.where(
+            np.linalg.norm(bonds, axis=2) > bond_length, -1, nlist)
+        connectivity = (nlist, np.sum(nlist != -1, axis=1).astype(np.intc))
+    steps = 100
+    u, damage, connectivity, force, ud, data = model.simulate(
+        steps, connectivity=connectivity,
+        displacement_bc_magnitudes=2e-4 * np.linspace(0, 1, steps))
+    return u, damage, connectivity[1], force, ud
+
+
 @pytest.fixture(scope="module")
 def euler_integrator(data_path, simple_displacement_boundary):
     """Run the example simulation on the Euler integrator."""
@@ -103,6 +147,22 @@ def velocity_verlet_cl_integrator(data_path, simple_displacement_boundary):
     return model, euler
 
 
+@pytest.fixture(scope="module")
+def adaptive_dynamic_relaxation_integrator(
+        data_path, simple_displacement_boundary):
+    """Create the example model on the ADR integrator."""
+    mesh_file = data_path / "example_mesh.vtk"
+    integrator = AdaptiveDynamicRelaxationCL()
+    # Create model
+    model = Model(mesh_file, integrator=integrator, horizon=0.1,
+                  critical_stretch=0.005,
+                  bond_stiffness=18.0 * 0.05 / (np.pi * 0.1**4),
+                  is_displacement_boundary=simple_displacement_boundary,
+                  initial_crack=is_crack)
+
+    return model, integrator
+
+
 def test_no_context(data_path, monkeypatch):
     """Test raising error when no suitable device is found."""
     from .. import integrators
@@ -195,6 +255,12 @@ class TestEuler:
         assert np.allclose(nlist_actual, nlist_expected)
         assert np.allclose(n_neigh_actual, n_neigh_expected)
 
+    def test_num_threads(self):
+        """Test exception when the number of threads is not positive."""
+        with pytest.raises(ValueError) as exception:
+            Euler(dt=1e-3, num_threads=0)
+            assert "num_threads must be a positive int" in exception.value
+
     def test_create_buffers_nregimes(self, euler_integrator):
         """Test exception when n_regimes is supplied to Euler."""
         model, integrator = euler_integrator
@@ -401,6 +467,108 @@ class TestEuler:
         assert value is None
 
 
+class TestEulerShared:
+    """EulerShared integrator tests."""
+
+    @pytest.fixture(scope="class")
+    def euler_shared_integrator(self, data_path,
+                                simple_displacement_boundary):
+        """Build the example model on the EulerShared integrator."""
+        integrator = EulerShared(dt=1e-3, processes=3)
+        model = Model(data_path / "example_mesh.vtk", integrator=integrator,
+                      horizon=0.1, critical_stretch=0.005,
+                      bond_stiffness=18.0 * 0.05 / (np.pi * 0.1**4),
+                      is_displacement_boundary=simple_displacement_boundary,
+                      initial_crack=is_crack)
+        yield model, integrator
+        integrator.close()
+
+    def test_call(self, data_path, euler_shared_integrator):
+        """Regression test for the EulerShared integrator."""
+        path = data_path
+        model, integrator = euler_shared_integrator
+        nlist, n_neigh = model.initial_connectivity
+        u = np.zeros((model.nnodes, 3), dtype=np.float64)
+        ud = np.zeros((model.nnodes, 3), dtype=np.float64)
+        udd = np.zeros((model.nnodes, 3), dtype=np.float64)
+        force = np.zeros((model.nnodes, 3), dtype=np.float64)
+        body_force = np.zeros((model.nnodes, 3), dtype=np.float64)
+        damage = np.zeros(model.nnodes, dtype=np.float64)
+
+        integrator.create_buffers(
+            nlist, n_neigh, model.bond_stiffness, model.critical_stretch,
+            model.plus_cs, u, ud, udd, force, body_force, damage, None,
+            model.nregimes, model.nbond_types)
+        displacement_bc_magnitudes = 0.00001 / 2 * np.linspace(1, 10, 10)
+        for step in range(10):
+            integrator(displacement_bc_magnitudes[step], 0.0)
+
+        expected_connectivity = np.load(path/"expected_connectivity_crack.npz")
+        (u_actual, _, _, force_actual, _, damage_actual, nlist_actual,
+         n_neigh_actual) = integrator.write(
+             u, ud, udd, force, body_force, damage, nlist, n_neigh)
+        assert np.allclose(
+            u_actual, np.load(path/"expected_displacements.npy"))
+        assert np.allclose(force_actual, np.load(path/"expected_force.npy"))
+        assert np.allclose(damage_actual, np.load(path/"expected_damage.npy"))
+        assert np.all(n_neigh_actual == expected_connectivity["n_neigh"])
+        for i in range(model.nnodes):
+            assert np.all(np.sort(nlist_actual[i, :n_neigh_actual[i]]) == (
+                np.sort(expected_connectivity["nlist"][
+                    i, :n_neigh_actual[i]])))
+
+    def test_simulate(self, euler_shared_integrator, cython_model):
+        """Ensure a simulation is that of the Euler integrator."""
+        model, integrator = euler_shared_integrator
+        magnitudes = 1e-4 * np.arange(1, 21)
+        expected = cython_model.simulate(
+            20, displacement_bc_magnitudes=magnitudes)
+        actual = model.simulate(20, displacement_bc_magnitudes=magnitudes)
+        assert np.sum(actual[1]) > 0
+        assert np.allclose(actual[0], expected[0])
+        assert np.allclose(actual[1], expected[1])
+        assert np.all(actual[2][1] == expected[2][1])
+
+    def test_processes(self):
+        """Test exception when the number of processes is not positive."""
+        with pytest.raises(ValueError) as exception:
+            EulerShared(dt=1e-3, processes=0)
+        assert "processes must be a positive int" in str(exception.value)
+
+    def test_timeout(self):
+        """Test exception when the timeout is not positive."""
+        with pytest.raises(ValueError) as exception:
+            EulerShared(dt=1e-3, timeout=0)
+        assert "timeout must be positive or None" in str(exception.value)
+
+    def test_worker_exited(self, data_path, simple_displacement_boundary):
+        """Ensure the integrator stops when a worker process exits."""
+        integrator = EulerShared(dt=1e-3, processes=2, timeout=5.0)
+        model = Model(data_path / "example_mesh.vtk", integrator=integrator,
+                      horizon=0.1, critical_stretch=0.005,
+                      bond_stiffness=18.0 * 0.05 / (np.pi * 0.1**4),
+                      is_displacement_boundary=simple_displacement_boundary)
+        nlist, n_neigh = model.initial_connectivity
+        u = np.zeros((model.nnodes, 3), dtype=np.float64)
+        integrator.create_buffers(
+            nlist, n_neigh, model.bond_stiffness, model.critical_stretch,
+            model.plus_cs, u, u, u, u, u, None, None, model.nregimes,
+            model.nbond_types)
+        integrator(0.0, 0.0)
+
+        _, _, (_, blocks, *_), _ = integrator._close.peek()
+        blocks = [block.name for block in blocks.values()]
+        integrator._workers[0].kill()
+        integrator._workers[0].join()
+        with pytest.raises(RuntimeError) as exception:
+            integrator(0.0, 0.0)
+        assert "worker process of EulerShared exited" in str(exception.value)
+        assert not any(worker.is_alive() for worker in integrator._workers)
+        for block in blocks:
+            with pytest.raises(FileNotFoundError):
+                shared_memory.SharedMemory(name=block)
+
+
 class TestEulerCL:
     """Euler integrator tests. See test_euler.py for more tests."""
 
@@ -454,6 +622,292 @@ class TestEulerCL:
         assert np.allclose(nlist_actual, nlist_expected)
         assert np.allclose(n_neigh_actual, n_neigh_expected)
 
+    @context_available
+    @pytest.mark.parametrize("bond_geometry", ["double", "float"])
+    def test_bond_geometry(
+            self, data_path, simple_displacement_boundary, bond_geometry):
+        """Ensure the precomputed bond geometry gives the same solution."""
+        path = data_path
+        integrator = EulerCL(dt=1e-3, bond_geometry=bond_geometry)
+        model = Model(path / "example_mesh.vtk", integrator=integrator,
+                      horizon=0.1, critical_stretch=0.005,
+                      bond_stiffness=18.0 * 0.05 / (np.pi * 0.1**4),
+                      is_displacement_boundary=simple_displacement_boundary,
+                      initial_crack=is_crack)
+        displacement_bc_magnitudes = 0.00001 / 2 * np.linspace(
+            1, 10, 10)
+        for _ in range(2):
+            # The second simulation reuses the bond geometry
+            u, damage, connectivity, force, ud, data = model.simulate(
+                10, displacement_bc_magnitudes=displacement_bc_magnitudes)
+            assert np.allclose(u, np.load(path/"expected_displacements.npy"))
+            assert np.allclose(force, np.load(path/"expected_force.npy"))
+            assert np.allclose(damage, np.load(path/"expected_damage.npy"))
+
+    @context_available
+    @pytest.mark.parametrize("bond_geometry", [None, "float"])
+    def test_vector_layout(
+            self, data_path, simple_displacement_boundary, bond_geometry):
+        """Ensure the padded state layout gives the same solution."""
+        path = data_path
+        integrator = EulerCL(dt=1e-3, bond_geometry=bond_geometry,
+                             vector_layout=True)
+        model = Model(path / "example_mesh.vtk", integrator=integrator,
+                      horizon=0.1, critical_stretch=0.005,
+                      bond_stiffness=18.0 * 0.05 / (np.pi * 0.1**4),
+                      is_displacement_boundary=simple_displacement_boundary,
+                      initial_crack=is_crack)
+        u, damage, connectivity, force, ud, data = model.simulate(
+            10, displacement_bc_magnitudes=0.00001 / 2 * np.linspace(
+                1, 10, 10))
+        assert integrator.stride == 4
+        assert np.shape(u) == (model.nnodes, 3)
+        assert np.allclose(u, np.load(path/"expected_displacements.npy"))
+        assert np.allclose(force, np.load(path/"expected_force.npy"))
+        assert np.allclose(damage, np.load(path/"expected_damage.npy"))
+
+    def test_bond_geometry_exception(self):
+        """Test exception when the bond geometry option is unknown."""
+        with pytest.raises(ValueError) as exception:
+            EulerCL(dt=1e-3, bond_geometry="half")
+            assert "bond_geometry must be None" in exception.value
+
+    @context_available
+    @pytest.mark.parametrize("reduction", ["tree", "vector", "subgroup"])
+    def test_reduction(
+            self, data_path, simple_displacement_boundary, reduction):
+        """Ensure each work group reduction gives the same solution."""
+        if (reduction == "subgroup"
+                and not subgroup_support(get_context().devices[0])):
+            pytest.skip("device does not support sub-groups")
+        path = data_path
+        integrator = EulerCL(dt=1e-3, reduction=reduction)
+        model = Model(path / "example_mesh.vtk", integrator=integrator,
+                      horizon=0.1, critical_stretch=0.005,
+                      bond_stiffness=18.0 * 0.05 / (np.pi * 0.1**4),
+                      is_displacement_boundary=simple_displacement_boundary,
+                      initial_crack=is_crack)
+        u, damage, connectivity, force, ud, data = model.simulate(
+            10, displacement_bc_magnitudes=0.00001 / 2 * np.linspace(
+                1, 10, 10))
+        assert integrator.reduction == reduction
+        assert np.allclose(u, np.load(path/"expected_displacements.npy"))
+        assert np.allclose(force, np.load(path/"expected_force.npy"))
+        assert np.allclose(damage, np.load(path/"expected_damage.npy"))
+
+    def test_reduction_exception(self):
+        """Test exception when the reduction option is unknown."""
+        with pytest.raises(ValueError) as exception:
+            EulerCL(dt=1e-3, reduction="atomic")
+            assert "reduction must be None" in exception.value
+
+    def test_compact_metadata_exception(self):
+        """Test exception when the compact metadata option is unknown."""
+        with pytest.raises(ValueError) as exception:
+            EulerCL(dt=1e-3, compact_metadata="half")
+            assert "compact_metadata must be None" in exception.value
+
+    @context_available
+    @pytest.mark.parametrize("nodes_per_group, bonds_per_item", [
+        (4, None), (None, 4), (8, 2)])
+    def test_work_groups(self, data_path, simple_displacement_boundary,
+                         nodes_per_group, bonds_per_item):
+        """Ensure packed and split families give the same solution."""
+        path = data_path
+        integrator = EulerCL(dt=1e-3, reduction="tree",
+                             nodes_per_group=nodes_per_group,
+                             bonds_per_item=bonds_per_item)
+        model = Model(path / "example_mesh.vtk", integrator=integrator,
+                      horizon=0.1, critical_stretch=0.005,
+                      bond_stiffness=18.0 * 0.05 / (np.pi * 0.1**4),
+                      is_displacement_boundary=simple_displacement_boundary,
+                      initial_crack=is_crack)
+        # The last work group is partly past the last node
+        assert integrator.global_size > (
+            model.nnodes * model.max_neighbours // (bonds_per_item or 1))
+        u, damage, connectivity, force, ud, data = model.simulate(
+            10, displacement_bc_magnitudes=0.00001 / 2 * np.linspace(
+                1, 10, 10))
+        assert np.allclose(u, np.load(path/"expected_displacements.npy"))
+        assert np.allclose(force, np.load(path/"expected_force.npy"))
+        assert np.allclose(damage, np.load(path/"expected_damage.npy"))
+
+    @context_available
+    @pytest.mark.parametrize("nodes_per_group", [1, 4])
+    def test_split(self, data_path, simple_displacement_boundary,
+                   nodes_per_group):
+        """Ensure time-steps split into ranges of nodes give the solution."""
+        path = data_path
+
+        class SplitEulerCL(EulerCL):
+            """Split each time-step at the middle node."""
+
+            def __call__(self, displacement_bc_magnitude, force_bc_magnitude):
+                split = self.nnodes // 2 // nodes_per_group * nodes_per_group
+                for nodes in [(0, split), (split, self.nnodes)]:
+                    super().__call__(displacement_bc_magnitude,
+                                     force_bc_magnitude, nodes=nodes)
+
+        integrator = SplitEulerCL(dt=1e-3, nodes_per_group=nodes_per_group)
+        model = Model(path / "example_mesh.vtk", integrator=integrator,
+                      horizon=0.1, critical_stretch=0.005,
+                      bond_stiffness=18.0 * 0.05 / (np.pi * 0.1**4),
+                      is_displacement_boundary=simple_displacement_boundary,
+                      initial_crack=is_crack)
+        u, damage, connectivity, force, ud, data = model.simulate(
+            10, displacement_bc_magnitudes=0.00001 / 2 * np.linspace(
+                1, 10, 10))
+        assert integrator.step == 10
+        assert np.allclose(u, np.load(path/"expected_displacements.npy"))
+        assert np.allclose(force, np.load(path/"expected_force.npy"))
+        assert np.allclose(damage, np.load(path/"expected_damage.npy"))
+
+    @context_available
+    def test_work_groups_autotune(self):
+        """Ensure small families are packed and large families are split."""
+        integrator = EulerCL(dt=1e-3, reduction="vector")
+        assert integrator._work_groups(2113, 32) == (4, 1)
+        assert integrator._work_groups(3, 32) == (2, 1)
+        device = integrator.context.devices[0]
+        max_neighbours = 2 * device.max_work_group_size
+        nodes_per_group, bonds_per_item = integrator._work_groups(
+            2113, max_neighbours)
+        assert nodes_per_group == 1
+        assert max_neighbours // bonds_per_item <= (
+            device.max_work_group_size)
+
+    @context_available
+    def test_autotune(self, data_path, simple_displacement_boundary,
+                      tmp_path, monkeypatch):
+        """Ensure the tuned configuration is stored and reused."""
+        path = data_path
+        database = TuningDatabase(tmp_path / "tuning.json")
+        candidates = [
+            {"reduction": "tree", "vector_layout": False,
+             "bond_geometry": None, "nodes_per_group": 1},
+            {"reduction": "vector", "vector_layout": True,
+             "bond_geometry": "double", "nodes_per_group": 1}]
+        for tuned in [False, True]:
+            integrator = EulerCL(dt=1e-3, autotune=True,
+                                 tuning_database=database)
+            if tuned:
+                # The configuration is read from the database
+                monkeypatch.setattr(integrator, "_candidates", None)
+            else:
+                monkeypatch.setattr(
+                    integrator, "_candidates", lambda: candidates)
+            model = Model(
+                path / "example_mesh.vtk", integrator=integrator,
+                horizon=0.1, critical_stretch=0.005,
+                bond_stiffness=18.0 * 0.05 / (np.pi * 0.1**4),
+                is_displacement_boundary=simple_displacement_boundary,
+                initial_crack=is_crack)
+            u, damage, connectivity, force, ud, data = model.simulate(
+                10, displacement_bc_magnitudes=0.00001 / 2 * np.linspace(
+                    1, 10, 10))
+            config = {name: getattr(integrator, name)
+                      for name in candidates[0]}
+            assert config in candidates
+            assert np.allclose(
+                u, np.load(path/"expected_displacements.npy"))
+            assert np.allclose(force, np.load(path/"expected_force.npy"))
+            assert np.allclose(damage, np.load(path/"expected_damage.npy"))
+        with open(database.path) as file:
+            records = json.load(file)
+        (signatures,) = records.values()
+        assert list(signatures.values()) == [config]
+
+    @pytest.mark.parametrize("kwargs", [
+        {"nodes_per_group": 3}, {"bonds_per_item": 0},
+        {"nodes_per_group": 2, "reduction": "subgroup"}])
+    def test_work_groups_exception(self, kwargs):
+        """Test exception when the work group layout is invalid."""
+        with pytest.raises(ValueError):
+            EulerCL(dt=1e-3, **kwargs)
+
+    @context_available
+    @pytest.mark.parametrize("bond_events", [100000, 1000])
+    def test_bond_events(self, data_path, simple_displacement_boundary,
+                         tmp_path, bond_events):
+        """Ensure the broken bonds are logged in the order they broke."""
+        path = data_path
+        integrator = EulerCL(dt=1e-3, bond_events=bond_events)
+        model = Model(path / "example_mesh.vtk", integrator=integrator,
+                      horizon=0.1, critical_stretch=0.005,
+                      bond_stiffness=18.0 * 0.05 / (np.pi * 0.1**4),
+                      is_displacement_boundary=simple_displacement_boundary,
+                      initial_crack=is_crack)
+        initial_nlist, initial_n_neigh = model.initial_connectivity
+        with warnings.catch_warnings(record=True) as record:
+            warnings.simplefilter("always")
+            u, damage, (nlist, n_neigh), force, ud, data = model.simulate(
+                10, displacement_bc_magnitudes=1e-4 * np.linspace(1, 10, 10),
+                write=5, write_path=tmp_path)
+        bonds, steps, stretches = data["model"]["bond_events"]
+        broken = (initial_nlist != -1) & (nlist == -1)
+        assert np.all(stretches >= 0.005)
+        assert np.all(np.diff(steps) >= 0)
+        assert np.all((steps >= 1) & (steps <= 10))
+        if bond_events > np.sum(broken):
+            i, k = np.nonzero(broken)
+            assert len(bonds) == np.sum(broken)
+            assert set(map(tuple, bonds)) == set(
+                zip(i, initial_nlist[i, k]))
+        else:
+            # The oldest broken bonds were overwritten between the writes
+            assert len(bonds) == 2 * bond_events
+            assert any("overwritten" in str(warning.message)
+                       for warning in record)
+            for bond in bonds:
+                assert bond[1] not in nlist[bond[0]]
+
+    @context_available
+    def test_bond_events_exception(self, euler_cl_integrator):
+        """Test exception when the broken bonds are not logged."""
+        model, integrator = euler_cl_integrator
+        with pytest.raises(ValueError) as exception:
+            integrator.read_bond_events()
+            assert "bond_events must be set" in exception.value
+        with pytest.raises(ValueError) as exception:
+            EulerCL(dt=1e-3, bond_events=0)
+            assert "bond_events must be None" in exception.value
+
+    @context_available
+    def test_create_buffers_reuse(self, euler_cl_integrator):
+        """Test that device buffers are reused between simulations."""
+        model, integrator = euler_cl_integrator
+        nlist, n_neigh = model.initial_connectivity
+        u = np.zeros((model.nnodes, 3), dtype=np.float64)
+        ud = np.zeros((model.nnodes, 3), dtype=np.float64)
+        udd = np.zeros((model.nnodes, 3), dtype=np.float64)
+        force = np.zeros((model.nnodes, 3), dtype=np.float64)
+        body_force = np.zeros((model.nnodes, 3), dtype=np.float64)
+        damage = np.zeros(model.nnodes, dtype=np.float64)
+
+        integrator.create_buffers(
+            nlist, n_neigh, model.bond_stiffness, model.critical_stretch,
+            model.plus_cs, u, ud, udd, force, body_force, damage, None,
+            model.nregimes, model.nbond_types)
+        u_d = integrator.u_d
+        nlist_d = integrator.nlist_d
+        # Displace the nodes on the device
+        integrator(displacement_bc_magnitude=1.0, force_bc_magnitude=0.0)
+
+        u_new = np.full((model.nnodes, 3), 0.5, dtype=np.float64)
+        integrator.create_buffers(
+            nlist, n_neigh, model.bond_stiffness, model.critical_stretch,
+            model.plus_cs, u_new, ud, udd, force, body_force, damage, None,
+            model.nregimes, model.nbond_types)
+        u_actual = np.empty_like(u)
+        ud_actual = np.empty_like(ud)
+        cl.enqueue_copy(integrator.queue, u_actual, integrator.u_d)
+        cl.enqueue_copy(integrator.queue, ud_actual, integrator.ud_d)
+
+        assert integrator.u_d is u_d
+        assert integrator.nlist_d is nlist_d
+        assert np.all(u_actual == u_new)
+        assert np.all(ud_actual == 0)
+
     @context_available
     def test_create_buffers_float(self, euler_cl_integrator):
         """Test initiation of arrays that are dependent on simulation."""
@@ -596,6 +1050,48 @@ class TestEulerCromerCL:
         assert np.allclose(nlist_actual, nlist_expected)
         assert np.allclose(n_neigh_actual, n_neigh_expected)
 
+    @context_available
+    @pytest.mark.parametrize("kwargs", [
+        {}, {"bond_geometry": "double", "bonds_per_item": 2},
+        {"nodes_per_group": 2, "reduction": "tree"}])
+    def test_compaction(self, data_path, simple_displacement_boundary,
+                        kwargs):
+        """Ensure compacting the bond arrays gives the same solution."""
+        # Most bonds are broken
+        expected = simulate_composite(
+            EulerCromerCL(dt=1e-5, damping=1e5, **kwargs), data_path,
+            simple_displacement_boundary, bond_length=0.06)
+        integrator = EulerCromerCL(dt=1e-5, damping=1e5, compaction=10,
+                                   **kwargs)
+        actual = simulate_composite(
+            integrator, data_path, simple_displacement_boundary,
+            bond_length=0.06)
+        assert integrator.width < integrator.max_neighbours
+        assert integrator.global_size < (
+            integrator.max_neighbours * integrator.nnodes)
+        for array, expected_array in zip(actual, expected):
+            assert np.allclose(array, expected_array)
+
+    @context_available
+    @pytest.mark.parametrize("kwargs", [
+        {"compact_metadata": "int"},
+        {"compact_metadata": "float", "compaction": 10}])
+    def test_compact_metadata(self, data_path, simple_displacement_boundary,
+                              kwargs):
+        """Ensure the compact bond metadata gives the same solution."""
+        expected = simulate_composite(
+            EulerCromerCL(dt=1e-5, damping=1e5), data_path,
+            simple_displacement_boundary, bond_length=0.06)
+        integrator = EulerCromerCL(dt=1e-5, damping=1e5, **kwargs)
+        actual = simulate_composite(
+            integrator, data_path, simple_displacement_boundary,
+            bond_length=0.06)
+        assert integrator.neighbour_dtype == np.int16
+        assert integrator.bond_type_dtype == np.uint8
+        assert integrator.regime_dtype == np.uint8
+        for array, expected_array in zip(actual, expected):
+            assert np.allclose(array, expected_array)
+
     @context_available
     def test_create_buffers_float(self, euler_cromer_cl_integrator):
         """Test initiation of arrays that are dependent on simulation."""
@@ -830,3 +1326,190 @@ class TestVelocityVerletCL:
         model, integrator = velocity_verlet_cl_integrator
         value = integrator._create_special_buffers()
         assert value is None
+
+
+class TestAdaptiveDynamicRelaxationCL:
+    """AdaptiveDynamicRelaxationCL integrator tests."""
+
+    def relax(self, model, integrator, steps, **kwargs):
+        """Relax the model at a constant load, return the residual forces."""
+        nlist, n_neigh = model.initial_connectivity
+        u = np.zeros((model.nnodes, 3), dtype=np.float64)
+        ud = np.zeros((model.nnodes, 3), dtype=np.float64)
+        udd = np.zeros((model.nnodes, 3), dtype=np.float64)
+        force = np.zeros((model.nnodes, 3), dtype=np.float64)
+        body_force = np.zeros((model.nnodes, 3), dtype=np.float64)
+        damage = np.zeros(model.nnodes, dtype=np.float64)
+        integrator.create_buffers(
+            nlist, n_neigh, model.bond_stiffness, 1.0, model.plus_cs, u, ud,
+            udd, force, body_force, damage, None, model.nregimes,
+            model.nbond_types, **kwargs)
+        free = np.all(model.bc_types == 0, axis=1)
+        residuals = []
+        for step in range(steps):
+            integrator(1e-4, 0.0)
+            integrator.write(
+                u, ud, udd, force, body_force, damage, nlist, n_neigh)
+            residuals.append(np.linalg.norm(force[free]))
+        return np.array(residuals), u
+
+    @context_available
+    def test_call(self, adaptive_dynamic_relaxation_integrator):
+        """Ensure the residual force of a constant load vanishes."""
+        model, integrator = adaptive_dynamic_relaxation_integrator
+        residuals, _ = self.relax(model, integrator, 200)
+        # There is no force until the load is applied by the first step
+        assert residuals[1] > 0
+        assert residuals[-1] < 1e-6 * residuals[1]
+        assert integrator.read_damping() > 0
+
+    @context_available
+    def test_vector_layout(self, data_path, simple_displacement_boundary,
+                           adaptive_dynamic_relaxation_integrator):
+        """Ensure the padded layout of the state arrays relaxes alike."""
+        model, integrator = adaptive_dynamic_relaxation_integrator
+        _, expected = self.relax(model, integrator, 200)
+        integrator = AdaptiveDynamicRelaxationCL(vector_layout=True)
+        model = Model(data_path / "example_mesh.vtk", integrator=integrator,
+                      horizon=0.1, critical_stretch=0.005,
+                      bond_stiffness=18.0 * 0.05 / (np.pi * 0.1**4),
+                      is_displacement_boundary=simple_displacement_boundary,
+                      initial_crack=is_crack)
+        _, actual = self.relax(model, integrator, 200)
+        assert np.allclose(actual, expected)
+
+    @context_available
+    def test_stiffness_corrections(
+            self, adaptive_dynamic_relaxation_integrator):
+        """Ensure the stiffness corrections scale the masses."""
+        model, integrator = adaptive_dynamic_relaxation_integrator
+        nlist, _ = model.initial_connectivity
+        expected = integrator._inverse_masses(
+            nlist, model.bond_stiffness, model.nbond_types, None)
+        stiffness_corrections = np.full(
+            np.shape(nlist), 2.0, dtype=np.float64)
+        actual = integrator._inverse_masses(
+            nlist, model.bond_stiffness, model.nbond_types,
+            stiffness_corrections)
+        assert np.allclose(actual, expected / 2)
+        residuals, u = self.relax(
+            model, integrator, 200,
+            stiffness_corrections=stiffness_corrections)
+        assert residuals[-1] < 1e-6 * residuals[1]
+
+    @context_available
+    def test_inverse_masses(self, adaptive_dynamic_relaxation_integrator):
+        """Test the fictitious mass of a node."""
+        model, integrator = adaptive_dynamic_relaxation_integrator
+        nlist, _ = model.initial_connectivity
+        inverse_masses = integrator._inverse_masses(
+            nlist, model.bond_stiffness, model.nbond_types, None)
+        neighbours = nlist[0][nlist[0] != -1]
+        lengths = np.linalg.norm(
+            model.coords[neighbours] - model.coords[0], axis=1)
+        mass = integrator.dt**2 / 4 * np.sum(
+            model.bond_stiffness * model.volume[neighbours] / lengths)
+        assert np.isclose(inverse_masses[0], 1.0 / mass)
+
+    @context_available
+    def test_residual(self, adaptive_dynamic_relaxation_integrator):
+        """Ensure the residual is reduced over the free nodes."""
+        model, integrator = adaptive_dynamic_relaxation_integrator
+        self.relax(model, integrator, 10)
+        u = np.zeros((model.nnodes, 3), dtype=np.float64)
+        ud = np.zeros((model.nnodes, 3), dtype=np.float64)
+        force = np.zeros((model.nnodes, 3), dtype=np.float64)
+        nlist, n_neigh = model.initial_connectivity
+        integrator.write(
+            u, ud, u.copy(), force, u.copy(), np.zeros(model.nnodes),
+            nlist.copy(), n_neigh.copy())
+        free = model.bc_types == 0
+        residual = integrator.residual()
+        assert residual[0] > 0
+        assert np.isclose(residual[0], np.linalg.norm(force[free]))
+        assert np.isclose(residual[1], np.linalg.norm(ud[free]))
+
+    @context_available
+    def test_ensemble_exception(self, adaptive_dynamic_relaxation_integrator):
+        """Test exception when an ensemble is simulated."""
+        _, integrator = adaptive_dynamic_relaxation_integrator
+        with pytest.raises(ValueError) as exception:
+            integrator.create_ensemble_buffers()
+        assert "ensembles are not supported" in str(exception.value)
+
+
+class TestEulerCromer:
+    """EulerCromer integrator tests."""
+
+    @context_available
+    def test_call(self, data_path, simple_displacement_boundary):
+        """Ensure the integrator matches EulerCromerCL."""
+        expected = simulate_composite(
+            EulerCromerCL(dt=1e-5, damping=1e5), data_path,
+            simple_displacement_boundary)
+        actual = simulate_composite(
+            EulerCromer(dt=1e-5, damping=1e5), data_path,
+            simple_displacement_boundary)
+        # Some bonds are broken
+        assert np.sum(actual[1]) > 0
+        for actual_array, expected_array in zip(actual, expected):
+            assert np.allclose(actual_array, expected_array)
+
+    def test_build_exception(self, data_path, simple_displacement_boundary):
+        """Test exception when no densities are supplied."""
+        with pytest.raises(ValueError) as exception:
+            Model(data_path / "example_mesh.vtk",
+                  integrator=EulerCromer(dt=1e-5, damping=1e5),
+                  horizon=0.1, critical_stretch=0.005,
+                  bond_stiffness=18.0 * 0.05 / (np.pi * 0.1**4),
+                  is_displacement_boundary=simple_displacement_boundary)
+            assert (
+                str("densities must be supplied") in exception.value)
+
+    def test_num_threads(self):
+        """Test exception when the number of threads is not positive."""
+        with pytest.raises(ValueError) as exception:
+            EulerCromer(dt=1e-5, damping=1e5, num_threads=-1)
+            assert "num_threads must be a positive int" in exception.value
+
+
+class TestVelocityVerlet:
+    """VelocityVerlet integrator tests."""
+
+    @context_available
+    def test_call(self, data_path, simple_displacement_boundary):
+        """Ensure the integrator matches VelocityVerletCL."""
+        expected = simulate_composite(
+            VelocityVerletCL(dt=1e-5, damping=1e5), data_path,
+            simple_displacement_boundary)
+        actual = simulate_composite(
+            VelocityVerlet(dt=1e-5, damping=1e5, num_threads=2), data_path,
+            simple_displacement_boundary)
+        assert np.sum(actual[1]) > 0
+        for actual_array, expected_array in zip(actual, expected):
+            assert np.allclose(actual_array, expected_array)
+
+    @context_available
+    def test_vector_layout(self, data_path, simple_displacement_boundary):
+        """Ensure the padded state layout gives the same solution."""
+        expected = simulate_composite(
+            VelocityVerletCL(dt=1e-5, damping=1e5), data_path,
+            simple_displacement_boundary)
+        actual = simulate_composite(
+            VelocityVerletCL(dt=1e-5, damping=1e5, vector_layout=True),
+            data_path, simple_displacement_boundary)
+        for actual_array, expected_array in zip(actual, expected):
+            assert np.allclose(actual_array, expected_array)
+
+    @context_available
+    def test_work_groups(self, data_path, simple_displacement_boundary):
+        """Ensure packed families give the same solution."""
+        expected = simulate_composite(
+            VelocityVerletCL(dt=1e-5, damping=1e5), data_path,
+            simple_displacement_boundary)
+        actual = simulate_composite(
+            VelocityVerletCL(dt=1e-5, damping=1e5, nodes_per_group=2,
+                             bonds_per_item=2),
+            data_path, simple_displacement_boundary)
+        for actual_array, expected_array in zip(actual, expected):
+            assert np.allclose(actual_array, expected_array)
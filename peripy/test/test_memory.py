@@ -0,0 +1,132 @@
+"""Tests for the memory module."""
+from .conftest import context_available
+from .. import integrators
+from ..integrators import EulerCL
+from ..memory import DeviceMemoryError, fits, footprint
+from types import SimpleNamespace
+import numpy as np
+import pytest
+
+
+class TestFootprint:
+    """Tests for the footprint function."""
+
+    def test_footprint(self):
+        """Ensure the buffers have the sizes allocated by the integrators."""
+        buffers = footprint(10, 8, nbcs=2, nforce_bcs=0)
+        assert buffers["nlist"] == 10 * 8 * 4
+        assert buffers["u"] == 10 * 3 * 8
+        assert buffers["bc_dofs"] == 2 * 4
+        # Placeholders of the arrays the model does not have
+        assert buffers["bond_types"] == 4
+        assert buffers["stiffness_corrections"] == 8
+        assert buffers["force_bc_values"] == 8
+        assert "bond_geometry" not in buffers
+        assert "inverse_densities" not in buffers
+
+    def test_options(self):
+        """Ensure the options of the integrator change the sizes."""
+        buffers = footprint(
+            10, 8, nbond_types=2, nregimes=2, stiffness_corrections=True,
+            bond_geometry="float", vector_layout=True, compaction=10)
+        assert buffers["u"] == 10 * 4 * 8
+        assert buffers["bond_geometry"] == 10 * 8 * 4 * 4
+        assert buffers["regimes"] == 10 * 8 * 4
+        assert buffers["bond_stiffness"] == 2 * 2 * 8
+        assert buffers["compact_nlist"] == 10 * 4 * 4
+
+    @pytest.mark.parametrize("compact_metadata, bond_size", [
+        (None, 20), ("int", 12), ("float", 8)])
+    def test_compact_metadata(self, compact_metadata, bond_size):
+        """Ensure the compact bond metadata reduces the bond arrays."""
+        buffers = footprint(
+            10, 8, nbond_types=2, nregimes=2, stiffness_corrections=True,
+            compact_metadata=compact_metadata)
+        assert sum(buffers[name] for name in [
+            "nlist", "bond_types", "regimes", "stiffness_corrections"]) == (
+                10 * 8 * bond_size)
+
+    def test_ensemble(self):
+        """Ensure the state of each sample is counted."""
+        buffers = footprint(10, 8, nsamples=3)
+        assert buffers["nlist"] == 3 * 10 * 8 * 4
+        assert buffers["damage"] == 3 * 10 * 8
+        assert buffers["bond_stiffness"] == 3 * 8
+
+
+class TestFits:
+    """Tests for the fits function and the DeviceMemoryError exception."""
+
+    device = SimpleNamespace(global_mem_size=100, max_mem_alloc_size=60)
+
+    @pytest.mark.parametrize("buffers, expected", [
+        ({"a": 50, "b": 50}, True),
+        ({"a": 50, "b": 51}, False),
+        ({"a": 61}, False)])
+    def test_fits(self, buffers, expected):
+        """Ensure the total and the largest buffer are compared."""
+        assert fits(buffers, self.device) is expected
+
+    def test_error(self):
+        """Ensure the exception gives a breakdown of the buffers."""
+        message = str(DeviceMemoryError({"u": 40, "nlist": 80}, self.device))
+        assert "got 120 bytes in total" in message
+        assert message.index("nlist: 80") < message.index("u: 40")
+
+
+class TestPlanMemory:
+    """Tests for the plan_memory method."""
+
+    nnodes = 100
+    max_neighbours = 16
+
+    def plan(self, integrator, limit, monkeypatch):
+        """Plan the memory of a model on a device with limit bytes."""
+        monkeypatch.setattr(
+            integrators, "fits",
+            lambda buffers, device: sum(buffers.values()) <= limit)
+        nodes = np.arange(self.nnodes)[:, np.newaxis]
+        nlist = (nodes + np.arange(1, self.max_neighbours + 1)) % self.nnodes
+        return integrator.plan_memory(
+            self.nnodes, 3, self.max_neighbours, 2, 2, nlist,
+            stiffness_corrections=True)
+
+    def limit(self, **options):
+        """Return the memory of the model with options."""
+        return sum(footprint(
+            self.nnodes, self.max_neighbours, nbond_types=2, nregimes=2,
+            stiffness_corrections=True, **options).values())
+
+    @context_available
+    def test_fits(self, monkeypatch):
+        """Ensure the options are kept if the model fits."""
+        integrator = EulerCL(dt=1e-3, vector_layout=True)
+        limit = self.limit(vector_layout=True)
+        buffers = self.plan(integrator, limit, monkeypatch)
+        assert sum(buffers.values()) == limit
+        assert integrator.vector_layout
+
+    @context_available
+    @pytest.mark.parametrize("options, expected", [
+        ({}, "int"), ({"compact_metadata": "int"}, "float")])
+    def test_compact(self, monkeypatch, options, expected):
+        """Ensure the bond metadata is compacted until the model fits."""
+        integrator = EulerCL(dt=1e-3, vector_layout=True,
+                             bond_geometry="double", **options)
+        limit = self.limit(compact_metadata=expected)
+        with pytest.warns(UserWarning, match="do not fit"):
+            self.plan(integrator, limit, monkeypatch)
+        assert not integrator.vector_layout
+        assert integrator.bond_geometry is None
+        assert integrator.compact_metadata == expected
+
+    @context_available
+    def test_exception(self, monkeypatch):
+        """Test exception when the model does not fit in any layout."""
+        integrator = EulerCL(dt=1e-3)
+        limit = self.limit(compact_metadata="float") - 1
+        with pytest.warns(UserWarning):
+            with pytest.raises(DeviceMemoryError) as exception:
+                self.plan(integrator, limit, monkeypatch)
+        assert "do not fit in the memory of the device" in str(
+            exception.value)
@@ -753,8 +753,9 @@ class TestDensities:
         """Test densities support for the EulerCromerCL integrator."""
         mesh_file = data_path / "example_mesh.vtk"
         integrator = EulerCromerCL(dt=1e-3, damping=1.0)
+        # The densities are stored once per node
         expected_densities = np.load(
-            data_path / "expected_densities.npy")
+            data_path / "expected_densities.npy")[:, 0]
 
         def density_function(x):
             if x[0] == 0.0:
@@ -774,10 +775,11 @@ class TestDensities:
         """Test reading density from file behaves as expected."""
         mesh_file = data_path / "example_mesh.vtk"
         integrator = EulerCromerCL(dt=1e-3, damping=1.0)
+        # The densities are stored once per node
         expected_densities = np.load(
-            data_path / "expected_densities.npy")
+            data_path / "expected_densities.npy")[:, 0]
 
-        density = expected_densities[:, 0]
+        density = expected_densities
 
         with pytest.warns(UserWarning, match='Reading density from argument'):
             model = Model(mesh_file, integrator=integrator, horizon=0.1,
@@ -1562,6 +1564,31 @@ class TestSimulate:
         assert np.all(force == expected_force)
         assert np.all(ud == expected_ud)
 
+    @context_available
+    def test_stiffness_corrections(self, cl_model):
+        """Ensure stiffness corrections can be supplied to a simulation."""
+        model = cl_model
+        u = np.zeros((model.nnodes, 3))
+        u[:, 0] = 1e-5 * model.coords[:, 0]
+        _, _, _, expected_force, *_ = model.simulate(steps=1, u=u.copy())
+        stiffness_corrections = np.full(
+            (model.nnodes, model.max_neighbours), 0.5)
+        _, _, _, force, *_ = model.simulate(
+            steps=1, u=u.copy(), stiffness_corrections=stiffness_corrections)
+        assert np.allclose(force, 0.5 * expected_force)
+        # The corrections of the model are restored for later simulations
+        _, _, _, force, *_ = model.simulate(steps=1, u=u.copy())
+        assert np.all(force == expected_force)
+
+    def test_stiffness_corrections_cython(self, cython_model):
+        """Test exception when the integrator does not support corrections."""
+        stiffness_corrections = np.ones(
+            (cython_model.nnodes, cython_model.max_neighbours))
+        with pytest.raises(ValueError) as exception:
+            cython_model.simulate(
+                steps=1, stiffness_corrections=stiffness_corrections)
+            assert "stiffness_corrections are not supported" in exception.value
+
     @pytest.fixture(scope="module")
     def simulate_force_test(self, data_path):
         """Create a minimal model designed for testings force calculation."""
@@ -1687,6 +1714,112 @@ class TestSimulate:
 
         assert mesh.read_bytes() == expected_mesh.read_bytes()
 
+    def test_tolerance(self, cython_model, tmp_path):
+        """Ensure converged load increments are cut short."""
+        model = cython_model
+        magnitudes = np.repeat([1e-5, 2e-5], 1000)
+        expected_u, *_ = model.simulate(
+            steps=2000, displacement_bc_magnitudes=magnitudes)
+        u, *_, data = model.simulate(
+            steps=2000, displacement_bc_magnitudes=magnitudes, write=100,
+            write_path=tmp_path, tolerance=1e-6)
+        assert np.all(data['model']['increments'] == [1, 1001])
+        iterations = data['model']['iterations']
+        assert np.all((iterations > 10) & (iterations < 1000))
+        # The simulation stops once the last increment has converged
+        last_step = 1000 + iterations[1]
+        assert np.all(data['model']['step'] == np.arange(
+            100, last_step + 1, 100))
+        assert np.allclose(u, expected_u)
+
+    def test_tolerance_warning(self, cython_model):
+        """Test warning when the magnitudes change every step."""
+        with pytest.warns(UserWarning, match="tolerance has no effect"):
+            *_, data = cython_model.simulate(
+                steps=10, displacement_bc_magnitudes=1e-5 * np.arange(10),
+                tolerance=1e-6)
+        assert np.all(data['model']['iterations'] == 1)
+
+    @pytest.mark.parametrize("kwargs, message", [
+        ({"tolerance": 0.0}, "tolerance must be None or a positive float"),
+        ({"tolerance": 1e-6, "check": 0},
+         "check must be a positive integer")])
+    def test_tolerance_exception(self, cython_model, kwargs, message):
+        """Test exception when the convergence check is invalid."""
+        with pytest.raises(ValueError) as exception:
+            cython_model.simulate(steps=1, **kwargs)
+        assert message in str(exception.value)
+
+
+class TestSimulateEnsemble:
+    """Tests for the simulate_ensemble method."""
+
+    @context_available
+    def test_matches_simulate(self, cl_model):
+        """Ensure each sample matches a simulation with its parameters."""
+        model = cl_model
+        steps = 10
+        displacement_bc_magnitudes = 1e-4 * np.linspace(1, steps, steps)
+        bond_stiffness = np.array([model.bond_stiffness,
+                                   2.0 * model.bond_stiffness])
+        critical_stretch = np.array([model.critical_stretch, 0.001])
+        (u,
+         damage,
+         (nlist, n_neigh),
+         force,
+         ud) = model.simulate_ensemble(
+            steps, bond_stiffness, critical_stretch,
+            displacement_bc_magnitudes=displacement_bc_magnitudes)
+        assert np.shape(u) == (2, model.nnodes, 3)
+        assert np.shape(damage) == (2, model.nnodes)
+        assert np.shape(nlist) == (2, model.nnodes, model.max_neighbours)
+        for sample in range(2):
+            (expected_u,
+             expected_damage,
+             (expected_nlist, expected_n_neigh),
+             expected_force,
+             *_) = model.simulate(
+                steps, bond_stiffness=bond_stiffness[sample],
+                critical_stretch=critical_stretch[sample],
+                displacement_bc_magnitudes=displacement_bc_magnitudes)
+            assert np.allclose(u[sample], expected_u)
+            assert np.allclose(damage[sample], expected_damage)
+            assert np.all(nlist[sample] == expected_nlist)
+            assert np.all(n_neigh[sample] == expected_n_neigh)
+            assert np.allclose(force[sample], expected_force)
+
+    @context_available
+    def test_stiffness_corrections(self, cl_model):
+        """Ensure per-sample stiffness corrections scale the bond forces."""
+        model = cl_model
+        u = np.zeros((2, model.nnodes, 3))
+        u[:, :, 0] = 1e-5 * model.coords[:, 0]
+        stiffness_corrections = np.ones(
+            (2, model.nnodes, model.max_neighbours))
+        stiffness_corrections[1] = 0.5
+        bond_stiffness = np.full(2, model.bond_stiffness)
+        critical_stretch = np.full(2, model.critical_stretch)
+        *_, force, _ = model.simulate_ensemble(
+            1, bond_stiffness, critical_stretch,
+            stiffness_corrections=stiffness_corrections, u=u)
+        assert np.any(force[0] != 0)
+        assert np.allclose(force[1], 0.5 * force[0])
+
+    def test_cython(self, cython_model):
+        """Test exception when the integrator does not support ensembles."""
+        with pytest.raises(ValueError) as exception:
+            cython_model.simulate_ensemble(
+                1, np.ones(2), np.ones(2))
+            assert "ensembles are not supported" in exception.value
+
+    @context_available
+    def test_critical_stretch_shape(self, cl_model):
+        """Test exception when critical_stretch shape is wrong."""
+        with pytest.raises(ValueError) as exception:
+            cl_model.simulate_ensemble(
+                1, np.ones(2), np.ones(3))
+            assert "critical_stretch shape is wrong" in exception.value
+
 
 class TestSimulateInitialise:
     """Tests for the _simulate_initialise function."""
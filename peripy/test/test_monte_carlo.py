@@ -0,0 +1,152 @@
+"""Tests for the Monte Carlo module."""
+from .conftest import context_available
+from ..integrators import Euler
+from ..monte_carlo import MonteCarlo, MultilevelMonteCarlo, RunningStatistics
+from ..utilities import read_array
+import numpy as np
+import pytest
+
+
+def is_displacement_boundary(x):
+    """Return the displacement boundary of the example mesh."""
+    bnd = [None, None, None]
+    if x[0] < 1.5 * 0.1:
+        bnd = [-1, 0, 0]
+    elif x[0] > 1.0 - 1.5 * 0.1:
+        bnd = [1, 0, 0]
+    return bnd
+
+
+def is_tip(x):
+    """Return the tip of the example mesh."""
+    tip = [None, None, None]
+    if x[0] > 1.0 - 1.5 * 0.1:
+        tip[0] = 1
+    return tip
+
+
+def sampler(rng):
+    """Sample the damage model of the example model."""
+    return {"critical_stretch": rng.uniform(0.001, 0.005),
+            "bond_stiffness": 18.0 * 0.05 / (np.pi * 0.1**4)}
+
+
+def mean_force(u, damage, connectivity, force, ud, data):
+    """Return the mean absolute force of a simulation."""
+    return np.mean(np.abs(force))
+
+
+class TestRunningStatistics:
+    """Tests for the RunningStatistics class."""
+
+    def test_statistics(self):
+        """Ensure the statistics match numpy's."""
+        samples = np.random.default_rng(0).normal(size=(10, 4, 3))
+        statistics = RunningStatistics()
+        for sample in samples:
+            statistics.update(sample)
+        assert statistics.n == 10
+        assert np.allclose(statistics.mean, np.mean(samples, axis=0))
+        assert np.allclose(statistics.variance,
+                           np.var(samples, axis=0, ddof=1))
+
+    def test_variance_one_sample(self):
+        """Ensure the variance of a single sample is None."""
+        statistics = RunningStatistics()
+        statistics.update(1.0)
+        assert statistics.mean == 1.0
+        assert statistics.variance is None
+
+
+class TestMonteCarlo:
+    """Tests for the MonteCarlo class."""
+
+    @pytest.fixture(scope="class")
+    def monte_carlo(self, data_path, tmp_path_factory):
+        """Create a MonteCarlo object of the example model."""
+        write_path = tmp_path_factory.mktemp("monte_carlo") / "model.h5"
+        return MonteCarlo(
+            data_path / "example_mesh.vtk", Euler, sampler, write_path,
+            integrator_kwargs={"dt": 1e-3}, processes=2, horizon=0.1,
+            critical_stretch=0.005,
+            bond_stiffness=18.0 * 0.05 / (np.pi * 0.1**4),
+            is_displacement_boundary=is_displacement_boundary,
+            is_tip=is_tip)
+
+    def test_shared_arrays(self, monte_carlo):
+        """Ensure the model arrays are written to the shared file."""
+        for name in ["volume", "family", "nlist", "n_neigh"]:
+            assert read_array(monte_carlo.write_path, name) is not None
+
+    def test_run(self, monte_carlo):
+        """Ensure the statistics are independent of the processes."""
+        steps = 10
+        kwargs = {
+            "displacement_bc_magnitudes": 1e-4 * np.linspace(1, steps, steps),
+            "write": 5
+            }
+        statistics = monte_carlo.run(4, steps, seed=42, **kwargs)
+        assert statistics["damage"].n == 4
+        assert np.shape(statistics["damage"].mean) == (
+            len(statistics["damage"].mean),)
+        assert statistics["1"]["force"].n == 4
+        assert np.shape(statistics["1"]["force"].mean) == (2,)
+        assert np.all(statistics["1"]["force"].variance >= 0)
+
+        monte_carlo.processes = 1
+        expected = monte_carlo.run(4, steps, seed=42, **kwargs)
+        monte_carlo.processes = 2
+        assert np.allclose(statistics["damage"].mean,
+                           expected["damage"].mean)
+        assert np.allclose(statistics["1"]["displacement"].mean,
+                           expected["1"]["displacement"].mean)
+
+
+class TestMultilevelMonteCarlo:
+    """Tests for the MultilevelMonteCarlo class."""
+
+    steps = 5
+
+    @pytest.fixture
+    def mlmc(self, cl_model):
+        """Create a two level MultilevelMonteCarlo object."""
+        return MultilevelMonteCarlo(
+            [cl_model, cl_model], self.steps, mean_force, sampler=sampler,
+            correlation_length=0.3,
+            simulate_kwargs={
+                "displacement_bc_magnitudes": 1e-4 * np.ones(self.steps)})
+
+    @context_available
+    def test_coupling(self, mlmc):
+        """Ensure the simulations of a pair share their random inputs."""
+        mlmc._sample(1, np.random.SeedSequence(0))
+        mlmc._sample(1, np.random.SeedSequence(1))
+        # The levels are the same model, so the corrections vanish
+        assert mlmc.statistics[1].mean == 0
+        assert mlmc.statistics[1].variance == 0
+        assert mlmc.cost[1] > 0
+
+    @context_available
+    def test_run(self, mlmc):
+        """Ensure the estimate is the sum of the level means."""
+        estimate, nsamples = mlmc.run(1e-2, initial_samples=3, seed=0)
+        assert nsamples[0] >= 3
+        # The corrections vanish, so no further samples are taken
+        assert nsamples[1] == 3
+        assert estimate == pytest.approx(mlmc.statistics[0].mean)
+        variance = mlmc.statistics[0].variance
+        assert variance / nsamples[0] <= 1e-2**2 / 2
+
+    def test_levels(self, cython_model):
+        """Test exception when steps does not have a value for each level."""
+        with pytest.raises(ValueError) as exception:
+            MultilevelMonteCarlo(
+                [cython_model, cython_model], [1, 2, 3], mean_force)
+            assert "must have a value for each level" in exception.value
+
+    def test_initial_samples(self, cython_model):
+        """Test exception when too few initial samples are requested."""
+        mlmc = MultilevelMonteCarlo([cython_model], 1, mean_force)
+        with pytest.raises(ValueError) as exception:
+            mlmc.run(1.0, initial_samples=1)
+            assert "initial_samples must be at least 2" in exception.value
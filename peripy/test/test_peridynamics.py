@@ -1,7 +1,26 @@
 """Tests for the peridynamics modules."""
 import numpy as np
+import pytest
 from peripy.peridynamics import (damage, bond_force, break_bonds,
-                                 update_displacement)
+                                 update_displacement, euler_step,
+                                 bond_force4)
+
+
+@pytest.fixture(scope="module")
+def lattice():
+    """Create a perturbed lattice with a symmetric neighbour list."""
+    rng = np.random.default_rng(0)
+    r0 = np.stack(np.meshgrid(*[np.arange(6.0)] * 3), axis=-1)
+    r0 = r0.reshape(-1, 3)
+    r = r0 + rng.normal(scale=0.1, size=r0.shape)
+    nnodes = len(r0)
+    distance = np.linalg.norm(r0[:, np.newaxis] - r0[np.newaxis], axis=2)
+    family = (distance > 0) & (distance < 2.01)
+    n_neigh = np.sum(family, axis=1).astype(np.intc)
+    nl = np.zeros((nnodes, np.max(n_neigh)), dtype=np.intc)
+    for i in range(nnodes):
+        nl[i, :n_neigh[i]] = np.flatnonzero(family[i])
+    return r, r0, nl, n_neigh
 
 
 def test_damage():
@@ -207,3 +226,193 @@ class TestUpdateDisplacement:
                                [1.0, 1.0, 6.0],
                                [1.0, 1.0, 6.0]])
         assert np.all(u == u_expected)
+
+
+class TestNumThreads:
+    """Test the OpenMP parallel functions are independent of the threads."""
+
+    @pytest.mark.parametrize("num_threads", [2, 4])
+    def test_bond_force(self, lattice, num_threads):
+        """Ensure the forces do not depend on the number of threads."""
+        r, r0, nl, n_neigh = lattice
+        nnodes = len(r0)
+        volume = np.ones(nnodes)
+        force_bc_types = np.zeros((nnodes, 3), dtype=np.int32)
+        force_bc_types[0] = 1
+        force_bc_values = np.ones((nnodes, 3), dtype=np.float64)
+        expected = bond_force(
+            r, r0, nl, n_neigh, volume, 1.0, force_bc_values,
+            force_bc_types, 0.5, num_threads=1)
+        actual = bond_force(
+            r, r0, nl, n_neigh, volume, 1.0, force_bc_values,
+            force_bc_types, 0.5, num_threads=num_threads)
+        assert np.allclose(actual, expected)
+
+    @pytest.mark.parametrize("num_threads", [2, 4])
+    def test_break_bonds(self, lattice, num_threads):
+        """Ensure the broken bonds do not depend on the number of threads."""
+        r, r0, nl, n_neigh = lattice
+        nl_expected = nl.copy()
+        n_neigh_expected = n_neigh.copy()
+        break_bonds(r, r0, nl_expected, n_neigh_expected, 0.1, num_threads=1)
+        nl_actual = nl.copy()
+        n_neigh_actual = n_neigh.copy()
+        break_bonds(r, r0, nl_actual, n_neigh_actual, 0.1,
+                    num_threads=num_threads)
+        assert np.any(n_neigh_expected < n_neigh)
+        assert np.all(nl_actual == nl_expected)
+        assert np.all(n_neigh_actual == n_neigh_expected)
+        # Bonds remain symmetric
+        for i in range(len(r0)):
+            for j in nl_actual[i, :n_neigh_actual[i]]:
+                assert i in nl_actual[j, :n_neigh_actual[j]]
+
+    def test_invalid_num_threads(self, lattice):
+        """Test exception when the number of threads is not positive."""
+        r, r0, nl, n_neigh = lattice
+        with pytest.raises(ValueError) as exception:
+            break_bonds(r, r0, nl.copy(), n_neigh.copy(), 0.1, num_threads=0)
+            assert "num_threads must be a positive int" in exception.value
+
+
+class TestRange:
+    """Test the functions over ranges of nodes."""
+
+    bounds = [0, 50, 51, 150, 216]
+
+    def test_bond_force(self, lattice):
+        """Ensure the forces of the ranges are those of all nodes."""
+        r, r0, nl, n_neigh = lattice
+        nnodes = len(r0)
+        volume = np.linspace(1.0, 2.0, nnodes)
+        force_bc_types = np.zeros((nnodes, 3), dtype=np.int32)
+        force_bc_types[0] = 1
+        force_bc_values = np.ones((nnodes, 3), dtype=np.float64)
+        expected = bond_force(
+            r, r0, nl, n_neigh, volume, 1.0, force_bc_values,
+            force_bc_types, 0.5, num_threads=1)
+        actual = np.full((nnodes, 3), np.nan)
+        for first, last in zip(self.bounds[:-1], self.bounds[1:]):
+            bond_force(
+                r, r0, nl, n_neigh, volume, 1.0, force_bc_values,
+                force_bc_types, 0.5, num_threads=1, first=first, last=last,
+                force=actual)
+        assert np.allclose(actual, expected)
+
+    def test_break_bonds(self, lattice):
+        """Ensure the bonds broken by the ranges are those of all nodes."""
+        r, r0, nl, n_neigh = lattice
+        nl_expected = nl.copy()
+        n_neigh_expected = n_neigh.copy()
+        break_bonds(r, r0, nl_expected, n_neigh_expected, 0.1, num_threads=1)
+        nl_actual = nl.copy()
+        n_neigh_actual = n_neigh.copy()
+        for first, last in zip(self.bounds[:-1], self.bounds[1:]):
+            break_bonds(r, r0, nl_actual, n_neigh_actual, 0.1, num_threads=1,
+                        first=first, last=last)
+        assert np.all(nl_actual == nl_expected)
+        assert np.all(n_neigh_actual == n_neigh_expected)
+
+
+class TestEulerStep:
+    """Test the fused Euler step."""
+
+    @pytest.mark.parametrize("num_threads", [1, 4])
+    def test_euler_step(self, lattice, num_threads):
+        """Ensure the step matches the separate functions."""
+        r, r0, nl, n_neigh = lattice
+        nnodes = len(r0)
+        u = r - r0
+        volume = np.ones(nnodes)
+        force_bc_types = np.zeros((nnodes, 3), dtype=np.int32)
+        force_bc_types[0] = 1
+        force_bc_values = np.ones((nnodes, 3), dtype=np.float64)
+        bc_types = np.zeros((nnodes, 3), dtype=np.int32)
+        bc_types[-1] = 1
+        bc_values = np.ones((nnodes, 3), dtype=np.float64)
+
+        nl_expected = nl.copy()
+        n_neigh_expected = n_neigh.copy()
+        u_expected = u.copy()
+        break_bonds(r, r0, nl_expected, n_neigh_expected, 0.1)
+        force_expected = bond_force(
+            r, r0, nl_expected, n_neigh_expected, volume, 1.0,
+            force_bc_values, force_bc_types, 0.5)
+        update_displacement(u_expected, bc_values, bc_types, force_expected,
+                            2.0, 0.1)
+
+        nl_actual = nl.copy()
+        n_neigh_actual = n_neigh.copy()
+        u_actual = u.copy()
+        force_actual = np.empty((nnodes, 3))
+        local_force = np.zeros((num_threads, nnodes, 3))
+        euler_step(
+            u_actual, r0, nl_actual, n_neigh_actual, volume, 1.0, 0.1,
+            force_bc_values, force_bc_types, 0.5, bc_values, bc_types, 2.0,
+            0.1, force_actual, local_force)
+
+        assert np.all(nl_actual == nl_expected)
+        assert np.all(n_neigh_actual == n_neigh_expected)
+        assert np.allclose(force_actual, force_expected)
+        assert np.allclose(u_actual, u_expected)
+        # The work arrays are ready for the next step
+        assert np.all(local_force == 0)
+
+    @pytest.mark.parametrize("node", [0, 1])
+    def test_critical_strain(self, node):
+        """Ensure a bond at the critical strain breaks from both nodes."""
+        r0 = np.array([[0.44, 0.95, 0.5], [0.43, 0.62, 1.0]])
+        u = np.array([[0.00949, 0.0046, 0.00758],
+                      [0.00497, 0.00529, 0.00786]])
+        # The strain of the bond from one node, which rounds differently to
+        # the strain from the other node if the displacements are added to
+        # the initial bond vector
+        other = 1 - node
+        l0 = np.linalg.norm(r0[other] - r0[node])
+        length = np.linalg.norm(r0[other] - r0[node] + u[other] - u[node])
+        critical_strain = abs((length - l0) / l0)
+        nl = np.array([[1], [0]], dtype=np.intc)
+        n_neigh = np.array([1, 1], dtype=np.intc)
+        zeros = np.zeros((2, 3))
+        types = np.zeros((2, 3), dtype=np.int32)
+
+        euler_step(
+            u, r0, nl, n_neigh, np.ones(2), 1.0, critical_strain, zeros,
+            types, 0.0, zeros, types, 0.0, 1e-3, np.empty((2, 3)),
+            np.zeros((1, 2, 3)))
+
+        assert n_neigh[0] == n_neigh[1]
+
+
+class TestBondForce4:
+    """Test the bond force with n-linear damage models."""
+
+    @pytest.mark.parametrize("node", [0, 1])
+    def test_critical_stretch(self, node):
+        """Ensure a bond at the critical stretch changes regime together."""
+        r0 = np.array([[0.91, 0.13, 0.05], [0.71, 0.18, 0.3]])
+        u = np.array([[0.00999, 0.00883, 0.00155],
+                      [0.00372, 0.00407, 0.00059]])
+        # The stretch of the bond from one node, which rounds differently to
+        # the stretch from the other node if the displacements are added to
+        # the initial bond vector
+        other = 1 - node
+        dx, dy, dz = r0[other] - r0[node]
+        xi = np.sqrt(dx * dx + dy * dy + dz * dz)
+        dx, dy, dz = r0[other] - r0[node] + u[other] - u[node]
+        y = np.sqrt(dx * dx + dy * dy + dz * dz)
+        critical_stretch = np.array([(y - xi) / xi])
+        nlist = np.array([[1], [0]], dtype=np.intc)
+        n_neigh = np.array([1, 1], dtype=np.intc)
+        regimes = np.zeros((2, 1), dtype=np.intc)
+        zeros = np.zeros((2, 3))
+        types = np.zeros((2, 3), dtype=np.intc)
+
+        bond_force4(
+            u, np.empty((2, 3)), np.empty((2, 3)), r0, np.ones(2), nlist,
+            n_neigh, types, zeros, None, None, regimes, np.zeros(1),
+            np.ones(1), critical_stretch, 0.0, 1)
+
+        assert n_neigh[0] == n_neigh[1]
+        assert (nlist[0, 0] == -1) == (nlist[1, 0] == -1)
+        assert regimes[0, 0] == regimes[1, 0]
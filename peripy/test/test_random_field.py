@@ -0,0 +1,85 @@
+"""Tests for the random field module."""
+from ..random_field import RandomField
+import numpy as np
+import pytest
+
+
+@pytest.fixture(scope="module")
+def random_field(cython_model):
+    """Create a random field on the example model."""
+    return RandomField(cython_model, correlation_length=0.3)
+
+
+def test_correlation_length(cython_model):
+    """Test exception when the correlation length is not positive."""
+    with pytest.raises(ValueError) as exception:
+        RandomField(cython_model, correlation_length=0.0)
+        assert "correlation_length must be positive" in exception.value
+
+
+class TestSample:
+    """Tests for the sample method."""
+
+    def test_shape(self, random_field, cython_model):
+        """Ensure the samples have the correct shape."""
+        rng = np.random.default_rng(0)
+        assert np.shape(random_field.sample(rng)) == (cython_model.nnodes,)
+        assert np.shape(random_field.sample(rng, size=3)) == (
+            3, cython_model.nnodes)
+
+    def test_reproducible(self, random_field):
+        """Ensure the samples are determined by the generator."""
+        expected = random_field.sample(np.random.default_rng(1))
+        actual = random_field.sample(np.random.default_rng(1))
+        assert np.all(actual == expected)
+
+    def test_statistics(self, random_field, cython_model):
+        """Ensure the field has zero mean and unit variance in the interior."""
+        samples = random_field.sample(np.random.default_rng(0), size=2000)
+        coords = cython_model.coords
+        interior = np.all(
+            (coords[:, :2] > 0.3) & (coords[:, :2] < 0.7), axis=1)
+        assert np.abs(np.mean(samples)) < 0.05
+        assert np.mean(np.var(samples[:, interior], axis=0)) == pytest.approx(
+            1.0, abs=0.15)
+
+    def test_correlation(self, random_field, cython_model):
+        """Ensure the correlation decays with distance."""
+        samples = random_field.sample(np.random.default_rng(0), size=2000)
+        distance = np.linalg.norm(
+            cython_model.coords - [0.5, 0.5, 0.0], axis=1)
+        i = np.argmin(distance)
+        near = np.argmin(np.abs(distance - 0.1))
+        far = np.argmin(np.abs(distance - 0.45))
+        correlation = np.corrcoef(samples[:, [i, near, far]].T)
+        assert correlation[0, 1] > 0.5
+        assert correlation[0, 1] > correlation[0, 2]
+
+
+class TestBonds:
+    """Tests for the bonds method."""
+
+    def test_bonds(self, random_field, cython_model):
+        """Ensure the bond field is the mean of the node values."""
+        field = random_field.sample(np.random.default_rng(0))
+        bond_field = random_field.bonds(field)
+        nlist, n_neigh = cython_model.initial_connectivity
+        assert np.shape(bond_field) == (
+            cython_model.nnodes, cython_model.max_neighbours)
+        for i in [0, 100, 1000]:
+            for k in range(n_neigh[i]):
+                j = nlist[i, k]
+                assert bond_field[i, k] == pytest.approx(
+                    0.5 * (field[i] + field[j]))
+                # Bonds are symmetric
+                assert bond_field[i, k] == pytest.approx(
+                    bond_field[j, list(nlist[j, :n_neigh[j]]).index(i)])
+            assert np.all(bond_field[i, n_neigh[i]:] == 0)
+
+    def test_bonds_size(self, random_field, cython_model):
+        """Ensure samples of the field are mapped onto the bonds."""
+        field = random_field.sample(np.random.default_rng(0), size=2)
+        bond_field = random_field.bonds(field)
+        assert np.shape(bond_field) == (
+            2, cython_model.nnodes, cython_model.max_neighbours)
+        assert np.allclose(bond_field[1], random_field.bonds(field[1]))
@@ -0,0 +1,47 @@
+"""Tests for the tuning module."""
+from .conftest import context_available
+from ..cl import get_context
+from ..tuning import TuningDatabase, device_key
+import json
+import pytest
+
+
+@pytest.fixture(scope="module")
+def device():
+    """Return the default device."""
+    context = get_context()
+    return None if context is None else context.devices[0]
+
+
+class TestTuningDatabase:
+    """Tests for the TuningDatabase class."""
+
+    def test_default_path(self, tmp_path, monkeypatch):
+        """Ensure the environment variable overrides the default path."""
+        path = tmp_path / "tuning.json"
+        monkeypatch.setenv("PERIPY_TUNING_DATABASE", str(path))
+        assert TuningDatabase().path == path
+        assert TuningDatabase(tmp_path / "other.json").path == (
+            tmp_path / "other.json")
+
+    @context_available
+    def test_get_missing(self, tmp_path, device):
+        """Ensure an untuned problem has no configuration."""
+        database = TuningDatabase(tmp_path / "tuning.json")
+        assert database.get(device, "problem") is None
+        assert not database.path.exists()
+
+    @context_available
+    def test_set(self, tmp_path, device):
+        """Ensure stored configurations are read back by new databases."""
+        path = tmp_path / "nested" / "tuning.json"
+        database = TuningDatabase(path)
+        database.set(device, "problem", {"reduction": "tree"})
+        database.set(device, "other", {"reduction": "vector"})
+        database = TuningDatabase(path)
+        assert database.get(device, "problem") == {"reduction": "tree"}
+        assert database.get(device, "other") == {"reduction": "vector"}
+        with open(path) as file:
+            assert list(json.load(file)) == [device_key(device)]
+        # No temporary files are left behind
+        assert list(path.parent.iterdir()) == [path]
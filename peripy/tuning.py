@@ -0,0 +1,96 @@
+"""A persistent database of the autotuned configurations of the kernels."""
+import json
+import os
+import pathlib
+
+
+#: The default path of the tuning database, which is overridden by the
+#: PERIPY_TUNING_DATABASE environment variable.
+DEFAULT_PATH = pathlib.Path.home() / ".peripy" / "tuning.json"
+
+
+def device_key(device):
+    """
+    Return the key of a device in the tuning database.
+
+    The key identifies the platform, the device and its driver, as a
+    configuration tuned for one driver need not be the fastest for another.
+
+    :arg device: The OpenCL device.
+    :type device: :class:`pyopencl._cl.Device`
+
+    :returns: The key of the device.
+    :rtype: str
+    """
+    return "{} | {} | {}".format(
+        device.platform.name.strip(), device.name.strip(),
+        device.driver_version.strip())
+
+
+class TuningDatabase(object):
+    """
+    A database of the fastest kernel configuration of each problem.
+
+    The configurations are stored in a JSON file, keyed by the device and by
+    the signature of the problem, so that they are reused by subsequent runs
+    rather than benchmarked again.
+    """
+
+    def __init__(self, path=None):
+        """
+        Create a :class:`TuningDatabase` object.
+
+        :arg path: The path of the JSON file of the database, which is
+            created when the first configuration is stored. Default is None,
+            which uses the PERIPY_TUNING_DATABASE environment variable if it
+            is set and :const:`DEFAULT_PATH` otherwise.
+        :type path: str or :class:`pathlib.Path`
+
+        :returns: A :class:`TuningDatabase` object
+        """
+        if path is None:
+            path = os.environ.get("PERIPY_TUNING_DATABASE", DEFAULT_PATH)
+        self.path = pathlib.Path(path)
+
+    def _read(self):
+        """Return the records of the database."""
+        if not self.path.exists():
+            return {}
+        with open(self.path) as file:
+            return json.load(file)
+
+    def get(self, device, signature):
+        """
+        Return the stored configuration of a problem.
+
+        :arg device: The OpenCL device.
+        :type device: :class:`pyopencl._cl.Device`
+        :arg str signature: The signature of the problem.
+
+        :returns: The configuration, or None if the problem has not been
+            tuned on the device.
+        :rtype: dict or NoneType
+        """
+        return self._read().get(device_key(device), {}).get(signature)
+
+    def set(self, device, signature, config):
+        """
+        Store the configuration of a problem.
+
+        The file is replaced atomically, so that concurrent runs never read a
+        partly written database.
+
+        :arg device: The OpenCL device.
+        :type device: :class:`pyopencl._cl.Device`
+        :arg str signature: The signature of the problem.
+        :arg dict config: The configuration, which must be serialisable to
+            JSON.
+        """
+        records = self._read()
+        records.setdefault(device_key(device), {})[signature] = config
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self.path.with_name(
+            "{}.{}.tmp".format(self.path.name, os.getpid()))
+        with open(temporary, "w") as file:
+            json.dump(records, file, indent=2, sort_keys=True)
+        os.replace(temporary, self.path)
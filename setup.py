@@ -1,7 +1,11 @@
 """Setup script for peridynamics."""
 from setuptools import setup, find_packages, Extension
+from setuptools.command.build_ext import build_ext
+from setuptools.errors import CompileError, LinkError
 from Cython.Build import cythonize
+import os
 import pathlib
+import tempfile
 
 # The directory containing this file
 HERE = pathlib.Path(__file__).parent
@@ -9,8 +13,10 @@ HERE = pathlib.Path(__file__).parent
 # The text of the README file
 README = (HERE / "README.md").read_text()
 
-extra_compile_args = ['-O3']
-extra_link_args = []
+OPENMP_FLAG = '-fopenmp'
+
+extra_compile_args = ['-O3', OPENMP_FLAG]
+extra_link_args = [OPENMP_FLAG]
 
 ext_modules = [
     Extension(
@@ -40,6 +46,44 @@ ext_modules = [
     ]
 
 
+class BuildExt(build_ext):
+    """Build the extensions serially if the compiler does not have OpenMP."""
+
+    def build_extensions(self):
+        """Remove the OpenMP flags before building, if they do not work."""
+        if not self._openmp_available():
+            self.warn(
+                "the compiler does not support OpenMP, the Cython functions "
+                "will run on one thread")
+            for extension in self.extensions:
+                extension.extra_compile_args = [
+                    arg for arg in extension.extra_compile_args
+                    if arg != OPENMP_FLAG]
+                extension.extra_link_args = [
+                    arg for arg in extension.extra_link_args
+                    if arg != OPENMP_FLAG]
+        super().build_extensions()
+
+    def _openmp_available(self):
+        """Return whether a test program compiles and links with OpenMP."""
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, "openmp.c")
+            with open(source, "w") as file:
+                file.write(
+                    "#include <omp.h>\n"
+                    "int main(void) { return omp_get_max_threads() < 1; }\n")
+            try:
+                objects = self.compiler.compile(
+                    [source], output_dir=directory,
+                    extra_postargs=[OPENMP_FLAG])
+                self.compiler.link_executable(
+                    objects, os.path.join(directory, "openmp"),
+                    extra_postargs=[OPENMP_FLAG])
+            except (CompileError, LinkError):
+                return False
+        return True
+
+
 setup(
     name="peripy",
     version="0.1.0",
@@ -55,6 +99,7 @@ setup(
         'console_scripts': ['peripy=peripy.cli:main']
         },
     ext_modules=cythonize(ext_modules),
+    cmdclass={'build_ext': BuildExt},
     install_requires=[
         'meshio',
         'numpy',